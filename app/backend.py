@@ -1,18 +1,57 @@
 # app/backend.py
+import asyncio
+import hmac
+import json
 import time
 import logging
-from typing import List, Optional
+from dataclasses import replace
+from typing import Awaitable, Callable, List, Optional
 
-from fastapi import FastAPI, Request, HTTPException
+from contextlib import asynccontextmanager
+
+from fastapi import APIRouter, FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from openai import OpenAI
 
-from app.retrieval import read_pdf_text, chunk_text, TfidfRetriever
-from app.utils import call_chat, budget_messages, should_evaluate
-from app.evaluator import evaluar_respuesta
-from app.config import GROQ_API_KEY, AGENT_MODEL, PDF_PATH, SUMMARY_PATH, NOMBRE
+from app.resources import Recursos
+from app.cache import retrieval_fingerprint
+from app.coalesce import SingleFlight, coalesce_key
+from app.metrics import REGISTRY, REQUEST_SECONDS, STAGE_SECONDS, CONTEXT_TOKENS, record_usage
+from app.context import compress_passages, format_passages, select_mmr
+from app.utils import call_chat_async, budget_messages, error_transitorio, with_fallback
+from app.llm_scheduler import get_scheduler
+from app.resilience import LLMUnavailable, breakers_snapshot, current_deadline, deadline
+from app.tokens import prompt_budget
+from app.pipeline import MODOS, Etapas, PipelineStats, ejecutar
+from app.profile_store import DEFAULT_PROFILE, DatosPerfil
+from app.rate_limit import Budget, RateLimiter, RateLimitMiddleware, build_rate_limit_store
+from app.evaluator import evaluar_respuesta_async, aclose_clients as cerrar_clientes_evaluador
+from app.config import (
+    GROQ_API_KEY,
+    AGENT_MODEL,
+    NOMBRE,
+    RATE_LIMIT_WINDOW,
+    RATE_LIMIT_MAX,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_CHEAP_MAX,
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_PATH,
+    RATE_LIMIT_EVICT_INTERVAL,
+    CACHE_BACKEND,
+    PIPELINE_MODE,
+    METRICS_FLUSH_INTERVAL,
+    APP_PRELOAD,
+    REQUEST_DEADLINE,
+    AGENT_FALLBACK_MODEL,
+    AGENT_HEDGE_AFTER,
+    CONTEXT_CANDIDATES,
+    CONTEXT_PASSAGES,
+    PROFILE_WATCH_INTERVAL,
+    ADMIN_TOKEN,
+    CORPUS_DIR,
+)
 
 # ------------------------
 # Configuración básica
@@ -26,61 +65,57 @@ logger = logging.getLogger("agente_cv_backend")
 # (load_dotenv ya se hace en config, pero no molesta si se repite)
 load_dotenv(override=True)
 
-if not GROQ_API_KEY:
-    raise RuntimeError("GROQ_API_KEY no encontrada. Revisa tu .env")
-
-# ------------------------
-# Inicialización de recursos globales
-# ------------------------
-logger.info("Cargando texto del CV desde %s", PDF_PATH)
-texto_cv = read_pdf_text(PDF_PATH)
-chunks_cv = chunk_text(texto_cv, max_chars=1200)
-retriever = TfidfRetriever(chunks_cv)
-
-logger.info("Leyendo resumen desde %s", SUMMARY_PATH)
-with open(SUMMARY_PATH, "r", encoding="utf-8") as f:
-    RESUMEN = f.read()
-
-PERFIL = texto_cv  # texto completo del CV para el evaluador
-
-client_openai = OpenAI(
-    base_url="https://api.groq.com/openai/v1",
-    api_key=GROQ_API_KEY,
-)
-
 # ------------------------
-# FastAPI app
+# Recursos globales (perezosos, ver app/resources.py)
 # ------------------------
-app = FastAPI(title="Agente CV Backend", version="0.1.0")
-
-# CORS (para que Gradio u otras UIs puedan llamar al backend)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # en producción, restringe esto (dominio concreto)
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+# Índice, retriever, corpus, caché, sesiones y cliente del agente se construyen
+# en el primer uso; importar este módulo no carga scikit-learn ni los SDK.
+recursos = Recursos()
+
+# Nombres de antes del refactor (backend.retriever, backend.RESUMEN...)
+_ALIAS_RECURSOS = {
+    "texto_cv": "texto_cv",
+    "tfidf_retriever": "tfidf_retriever",
+    "retriever": "retriever",
+    "corpus": "corpus",
+    "RESUMEN": "resumen",
+    "PERFIL": "perfil",
+    "response_cache": "response_cache",
+    "sessions": "sessions",
+    "client_openai": "client_openai",
+}
+
+
+def __getattr__(nombre: str):
+    if nombre in _ALIAS_RECURSOS:
+        return getattr(recursos, _ALIAS_RECURSOS[nombre])
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+# Coste/latencia por modo de ejecución agente -> evaluador -> reintento
+if PIPELINE_MODE not in MODOS:
+    raise ValueError(f"PIPELINE_MODE desconocido: {PIPELINE_MODE!r} ({' | '.join(MODOS)})")
+pipeline_stats = PipelineStats()
+
+# Preguntas idénticas en vuelo comparten una sola llamada al agente/evaluador
+single_flight = SingleFlight()
+
+# Rate limiting GCRA (ver app/rate_limit.py): presupuesto propio para los
+# endpoints que llaman al LLM y otro, más holgado, para el resto. El almacén se
+# crea en la primera petición de cada worker.
+rate_limiter = RateLimiter(
+    None,
+    budgets=[
+        Budget("llm", RATE_LIMIT_MAX, RATE_LIMIT_WINDOW, RATE_LIMIT_BURST),
+        Budget("cheap", RATE_LIMIT_CHEAP_MAX, RATE_LIMIT_WINDOW, RATE_LIMIT_CHEAP_MAX),
+    ],
+    rules=[(r"^/chat(/stream)?$|^/sessions/[^/]+/messages(/stream)?$", "llm")],
+    default="cheap",
+    exempt=("/healthz", "/metrics"),
+    store_factory=lambda: build_rate_limit_store(RATE_LIMIT_BACKEND, RATE_LIMIT_PATH),
 )
 
-# ------------------------
-# Rate limiting ultra simple (en memoria)
-# ------------------------
-RATE_LIMIT_WINDOW = 60   # segundos
-RATE_LIMIT_MAX = 20      # requests por ventana
-
-# Estructura: {ip: [timestamps]}
-_rate_limiter_store: dict[str, List[float]] = {}
-
-
-def check_rate_limit(ip: str):
-    now = time.time()
-    lst = _rate_limiter_store.get(ip, [])
-    # nos quedamos con las peticiones en la ventana
-    lst = [t for t in lst if now - t < RATE_LIMIT_WINDOW]
-    if len(lst) >= RATE_LIMIT_MAX:
-        raise HTTPException(status_code=429, detail="Too Many Requests")
-    lst.append(now)
-    _rate_limiter_store[ip] = lst
+router = APIRouter()
 
 
 # ------------------------
@@ -94,6 +129,23 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List[ChatMessage]] = None
+    profile_id: Optional[str] = None  # con CORPUS_DIR: perfil del corpus con que se responde
+
+
+class SessionRequest(BaseModel):
+    profile_id: Optional[str] = None
+
+
+class SessionMessageRequest(BaseModel):
+    message: str
+
+
+class SessionResponse(BaseModel):
+    session_id: str
+    profile_id: Optional[str] = None
+    n_messages: int
+    history_tokens: int
+    summary: str
 
 
 class ChatResponse(BaseModel):
@@ -109,30 +161,91 @@ class ChatResponse(BaseModel):
 def history_to_messages(historial: Optional[List[ChatMessage]]) -> List[dict]:
     """
     Convierte la history del frontend (ChatMessage) a messages estilo OpenAI.
-    Ignora roles no soportados.
+    Ignora roles no soportados. El historial de una sesión ya viene como dicts.
     """
     if not historial:
         return []
     msgs: List[dict] = []
     for m in historial:
-        if m.role in {"system", "user", "assistant"} and isinstance(m.content, str):
+        if isinstance(m, dict):
+            msgs.append(m)
+        elif m.role in {"system", "user", "assistant"} and isinstance(m.content, str):
             msgs.append({"role": m.role, "content": m.content})
     return msgs
 
 
-def build_messages(user_message: str, history: Optional[List[ChatMessage]]) -> List[dict]:
+class PerfilDesconocido(LookupError):
+    """
+    profile_id que no existe: ni en el corpus ni, sin CORPUS_DIR, DEFAULT_PROFILE.
+    """
+
+
+def datos_perfil(profile_id: Optional[str] = None) -> DatosPerfil:
+    """
+    Nombre, resumen y texto del CV con que se responde: los de `profile_id`
+    en el corpus o, sin profile_id (o sin CORPUS_DIR), los del CV configurado.
+    Lanza PerfilDesconocido si el perfil no existe.
+    """
+    if profile_id is not None and recursos.corpus is not None:
+        datos = recursos.corpus.profile(profile_id)
+        if datos is None:
+            raise PerfilDesconocido(profile_id)
+        if datos.name is None:  # sin profile.json
+            datos = replace(datos, name=NOMBRE if profile_id == DEFAULT_PROFILE else profile_id)
+        return datos
+    if profile_id not in (None, DEFAULT_PROFILE):
+        raise PerfilDesconocido(profile_id)
+    perfil = recursos.perfil_actual
+    return DatosPerfil(DEFAULT_PROFILE, NOMBRE, perfil.resumen, perfil.texto_cv, perfil.version)
+
+
+def recuperar_fragmentos(user_message: str, profile_id: Optional[str] = None) -> List[tuple[str, float]]:
+    """
+    CONTEXT_PASSAGES fragmentos (texto, score) para la pregunta, de los
+    documentos de `profile_id` en el corpus o, sin profile_id (o sin
+    CORPUS_DIR), del CV configurado, igual que datos_perfil. Se eligen por MMR
+    entre los CONTEXT_CANDIDATES mejores.
+    """
+    return recuperar_fragmentos_lote([user_message], profile_id)[0]
+
+
+def recuperar_fragmentos_lote(
+    user_messages: List[str],
+    profile_id: Optional[str] = None,
+) -> List[List[tuple[str, float]]]:
+    """
+    recuperar_fragmentos para varias preguntas en una sola pasada del retriever.
+    """
+    k = max(CONTEXT_CANDIDATES, CONTEXT_PASSAGES)
+    with STAGE_SECONDS.time("retrieval"):
+        if profile_id is not None and recursos.corpus is not None:
+            candidatos = recursos.corpus.retrieve_batch(user_messages, k=k, profile_id=profile_id)
+        else:
+            candidatos = recursos.retriever.retrieve_batch(user_messages, k=k)
+    return [select_mmr(m, c, k=CONTEXT_PASSAGES) for m, c in zip(user_messages, candidatos)]
+
+
+def build_messages(
+    user_message: str,
+    history: Optional[List[ChatMessage]],
+    profile_id: Optional[str] = None,
+    passages: Optional[List[tuple[str, float]]] = None,
+) -> List[dict]:
     """
     Construye la conversación completa para el LLM del agente:
-    - System principal (persona de Nicolás + resumen)
+    - System principal (persona + resumen del perfil, ver datos_perfil)
     - Historial (user/assistant)
-    - Contexto recuperado del CV (RAG ligero)
+    - Contexto recuperado del CV (RAG ligero; `passages` si ya se recuperó antes),
+      sin lo que ya dice el resumen y recortado a CONTEXT_MAX_TOKENS (app/context.py)
     - Mensaje de usuario
     """
     # 1) System base con resumen
+    datos = datos_perfil(profile_id)
+    resumen = datos.summary[:12000]
     prompt_sistema = (
-        f"Actúas como {NOMBRE} y respondes preguntas sobre su perfil profesional, "
+        f"Actúas como {datos.name} y respondes preguntas sobre su perfil profesional, "
         f"experiencia, habilidades y trayectoria. Si no sabes algo, dilo con honestidad.\n\n"
-        f"## Resumen de {NOMBRE}:\n{RESUMEN[:12000]}\n"
+        f"## Resumen de {datos.name}:\n{resumen}\n"
     )
     mensajes: List[dict] = [{"role": "system", "content": prompt_sistema}]
 
@@ -140,8 +253,13 @@ def build_messages(user_message: str, history: Optional[List[ChatMessage]]) -> L
     mensajes += history_to_messages(history)
 
     # 3) RAG: fragmentos del CV relevantes
-    top_passages = retriever.retrieve(user_message, k=3)
-    contexto = "\n\n".join(f"- {p}" for p in top_passages)
+    top_passages = passages if passages is not None else recuperar_fragmentos(user_message, profile_id)
+    with STAGE_SECONDS.time("context"):
+        ctx = compress_passages(user_message, [p for p, _score in top_passages], resumen)
+    CONTEXT_TOKENS.observe(ctx.tokens_before, "retrieved")
+    CONTEXT_TOKENS.observe(ctx.tokens_after, "sent")
+    CONTEXT_TOKENS.observe(ctx.tokens_saved, "saved")
+    contexto = format_passages(ctx.passages)
     mensajes.append(
         {
             "role": "system",
@@ -155,89 +273,567 @@ def build_messages(user_message: str, history: Optional[List[ChatMessage]]) -> L
     # 4) input del usuario
     mensajes.append({"role": "user", "content": user_message})
 
-    # 5) recorte de historial (tokens)
-    mensajes = budget_messages(mensajes, max_tokens=6000)
+    # 5) recorte de historial al presupuesto de tokens del modelo del agente
+    with STAGE_SECONDS.time("budget_messages"):
+        mensajes = budget_messages(mensajes, max_tokens=prompt_budget(AGENT_MODEL))
     return mensajes
 
 
-def reintentar_respuesta(
+async def llamar_agente(mensajes: List[dict], **kwargs):
+    """
+    Llamada al agente con el modelo de reserva (AGENT_FALLBACK_MODEL) si
+    AGENT_MODEL falla, tiene el circuito abierto o tarda más de AGENT_HEDGE_AFTER.
+    """
+    return await with_fallback(
+        call_chat_async,
+        recursos.client_openai,
+        AGENT_MODEL,
+        mensajes,
+        fallback_model=AGENT_FALLBACK_MODEL,
+        hedge_after=AGENT_HEDGE_AFTER,
+        **kwargs,
+    )
+
+
+async def reintentar_respuesta(
     respuesta: str,
     mensaje: str,
     history: Optional[List[ChatMessage]],
     retroalimentacion: str,
+    profile_id: Optional[str] = None,
 ) -> str:
     """
     Construye un nuevo prompt de sistema explicando por qué la respuesta anterior fue rechazada
     y pide al modelo que la rehaga.
     """
+    nombre = datos_perfil(profile_id).name
     prompt_sistema_actualizado = (
-        f"Actúas como {NOMBRE}. Tu respuesta anterior fue rechazada por el sistema de control de calidad.\n"
+        f"Actúas como {nombre}. Tu respuesta anterior fue rechazada por el sistema de control de calidad.\n"
         f"Debes responder de nuevo corrigiendo lo siguiente:\n{retroalimentacion}\n\n"
-        f"Evita repetir exactamente tu respuesta anterior. Mantén un tono profesional y fiel al perfil de {NOMBRE}."
+        f"Evita repetir exactamente tu respuesta anterior. Mantén un tono profesional y fiel al perfil de {nombre}."
     )
 
     mensajes: List[dict] = [{"role": "system", "content": prompt_sistema_actualizado}]
     mensajes += history_to_messages(history)
     mensajes.append({"role": "user", "content": mensaje})
+    mensajes = budget_messages(mensajes, max_tokens=prompt_budget(AGENT_MODEL))
 
-    resp = call_chat(client_openai, AGENT_MODEL, mensajes)
+    with STAGE_SECONDS.time("retry"):
+        resp = await llamar_agente(mensajes, priority="retry")
     return resp.choices[0].message.content
 
 
+PROMPT_CONSERVADOR = (
+    "Responde de forma concisa y ciñéndote estrictamente a los fragmentos del CV y al resumen: "
+    "no des cifras, fechas, cargos ni títulos que no aparezcan en ellos; si un dato no consta, dilo."
+)
+
+
+def build_etapas(
+    user_msg: str,
+    history,
+    mensajes: List[dict],
+    passages: Optional[List[tuple[str, float]]] = None,
+    profile_id: Optional[str] = None,
+) -> Etapas:
+    """
+    Etapas del pipeline (app/pipeline.py) sobre los clientes del backend.
+    El evaluador juzga con los datos del perfil `profile_id` (datos_perfil).
+    La alternativa es la misma conversación con una instrucción más conservadora.
+    El gating (app/gating.py) decide qué respuestas se evalúan; con EVAL_LOG_PATH
+    cada veredicto se registra para reentrenarlo. Si el LLM no está disponible
+    (sin cuota, circuito abierto, plazo agotado o errores transitorios), la
+    alternativa y la evaluación se omiten (None).
+    """
+    conservadores = mensajes[:-1] + [{"role": "system", "content": PROMPT_CONSERVADOR}] + mensajes[-1:]
+    decisiones = {}
+    datos = datos_perfil(profile_id)
+
+    async def generar() -> str:
+        with STAGE_SECONDS.time("agent"):
+            resp = await llamar_agente(mensajes)
+        return resp.choices[0].message.content
+
+    async def alternativa() -> Optional[str]:
+        try:
+            with STAGE_SECONDS.time("agent_alternative"):
+                resp = await call_chat_async(recursos.client_openai, AGENT_MODEL, conservadores, priority="alternative")
+        except Exception as e:
+            if not (isinstance(e, LLMUnavailable) or error_transitorio(e)):
+                raise
+            logger.warning("Candidato alternativo no disponible (%s): se recurre al reintento", e)
+            return None
+        return resp.choices[0].message.content
+
+    def debe_evaluar(respuesta: str) -> bool:
+        with STAGE_SECONDS.time("gate"):
+            decisiones[respuesta] = recursos.gate.decide(user_msg, respuesta, passages)
+        return decisiones[respuesta].evaluate
+
+    async def evaluar(respuesta: str):
+        try:
+            with STAGE_SECONDS.time("evaluator"):
+                ev = await evaluar_respuesta_async(
+                    nombre=datos.name,
+                    resumen=datos.summary,
+                    perfil=datos.cv_text,
+                    respuesta=respuesta,
+                    mensaje=user_msg,
+                    historial=history_to_messages(history),
+                    fragmentos=[p for p, _ in passages] if passages else None,
+                )
+        except Exception as e:
+            if not (isinstance(e, LLMUnavailable) or error_transitorio(e)):
+                raise
+            logger.warning("Evaluador no disponible (%s): la respuesta sale sin evaluar", e)
+            return None
+        if recursos.verdict_log is not None:
+            recursos.verdict_log.append(
+                user_msg,
+                respuesta,
+                passages,
+                ev.es_aceptable,
+                ev.retroalimentacion,
+                decisiones.get(respuesta),
+                source=ev.source,
+            )
+        return ev
+
+    async def reintentar(respuesta: str, retroalimentacion: str) -> str:
+        logger.info("Respuesta rechazada por el evaluador. Reintentando...")
+        return await reintentar_respuesta(respuesta, user_msg, history, retroalimentacion, profile_id)
+
+    return Etapas(
+        generar=generar,
+        alternativa=alternativa,
+        evaluar=evaluar,
+        reintentar=reintentar,
+        debe_evaluar=debe_evaluar,
+    )
+
+
+async def evaluar_y_corregir(
+    answer: str,
+    user_msg: str,
+    history,
+    passages: Optional[List[tuple[str, float]]] = None,
+    mensajes: Optional[List[dict]] = None,
+    profile_id: Optional[str] = None,
+) -> ChatResponse:
+    """
+    Aplica el gating (EVAL_GATE) y, si toca, el evaluador sobre una
+    respuesta ya generada (streaming). Si se rechaza, la sustituye según
+    PIPELINE_MODE (reintento con retroalimentación o candidato alternativo).
+    """
+    if mensajes is None:
+        mensajes = build_messages(user_msg, history, profile_id, passages=passages)
+    etapas = build_etapas(user_msg, history, mensajes, passages, profile_id)
+    resultado = await ejecutar(PIPELINE_MODE, etapas, user_msg, respuesta=answer, stats=pipeline_stats)
+    return ChatResponse(
+        answer=resultado.answer,
+        evaluated=resultado.evaluated,
+        es_aceptable=resultado.es_aceptable,
+        retroalimentacion=resultado.retroalimentacion,
+    )
+
+
+def cache_fingerprint(
+    history: Optional[List[ChatMessage]],
+    passages: List[tuple[str, float]],
+    profile_id: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Huella para la caché de respuestas, o None si la petición no es cacheable
+    (caché desactivada o conversación con historial).
+    """
+    if recursos.response_cache is None or history:
+        return None
+    return context_fingerprint(passages, profile_id)
+
+
+def context_fingerprint(passages: List[tuple[str, float]], profile_id: Optional[str] = None) -> str:
+    """
+    Huella del contexto de una respuesta: fragmentos, modelo del agente y
+    perfil con su versión (tras una recarga no se reutiliza nada del CV
+    anterior, ni se comparten respuestas entre perfiles).
+    """
+    datos = datos_perfil(profile_id)
+    extra = f"{AGENT_MODEL}|{recursos.perfil_actual.version}|{datos.profile_id}|{datos.version}"
+    return retrieval_fingerprint([p for p, _ in passages], extra=extra)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """
+    Serializa un evento Server-Sent Events.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 # ------------------------
 # Endpoint principal
 # ------------------------
-@app.post("/chat", response_model=ChatResponse)
+@router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(req: ChatRequest, request: Request):
-    # 1) rate limit
+    # (el rate limit lo aplica RateLimitMiddleware antes de llegar aquí)
     ip = request.client.host if request.client else "unknown"
-    check_rate_limit(ip)
-
-    user_msg = req.message
-    history = req.history or []
-
-    logger.info("Nueva petición de %s: %s", ip, user_msg)
-
-    # 2) construir mensajes para el agente
-    mensajes = build_messages(user_msg, history)
-
-    # 3) llamada al modelo agente
-    resp = call_chat(client_openai, AGENT_MODEL, mensajes)
-    answer = resp.choices[0].message.content
-
-    evaluated = False
-    es_aceptable = None
-    retroalimentacion = None
-
-    # 4) decidir si evaluamos
-    if should_evaluate(answer, user_msg):
-        evaluated = True
-        eval_res = evaluar_respuesta(
-            nombre=NOMBRE,
-            resumen=RESUMEN,
-            perfil=PERFIL,
-            respuesta=answer,
-            mensaje=user_msg,
-            historial=history_to_messages(history),
+
+    logger.info("Nueva petición de %s: %s", ip, req.message)
+    # La petición entera trabaja con la versión del perfil que había al llegar
+    with REQUEST_SECONDS.time("/chat"), deadline(REQUEST_DEADLINE), recursos.profiles.pinned():
+        return await responder(req.message, req.history or [], req.profile_id)
+
+
+async def responder(user_msg: str, history, profile_id: Optional[str] = None) -> ChatResponse:
+    """
+    Recuperación, caché, agente y evaluación para un mensaje. `history` puede ser
+    la lista de ChatMessage de /chat o el historial (dicts) de una sesión.
+    """
+    datos_perfil(profile_id)  # perfil desconocido: 404 antes de hacer nada
+    # 2) recuperación y caché de respuestas
+    passages = recuperar_fragmentos(user_msg, profile_id)
+    fingerprint = cache_fingerprint(history, passages, profile_id)
+    if fingerprint:
+        cached = await recursos.response_cache.alookup(user_msg, fingerprint)
+        if cached is not None:
+            return ChatResponse(**cached)
+
+    async def calcular() -> ChatResponse:
+        # 3) construir mensajes para el agente
+        with STAGE_SECONDS.time("build_messages"):
+            mensajes = build_messages(user_msg, history, profile_id, passages=passages)
+
+        # 4-5) agente, evaluación (si toca) y corrección, con el solape de PIPELINE_MODE
+        etapas = build_etapas(user_msg, history, mensajes, passages, profile_id)
+        resultado = await ejecutar(PIPELINE_MODE, etapas, user_msg, stats=pipeline_stats)
+        final = ChatResponse(
+            answer=resultado.answer,
+            evaluated=resultado.evaluated,
+            es_aceptable=resultado.es_aceptable,
+            retroalimentacion=resultado.retroalimentacion,
         )
-        es_aceptable = eval_res.es_aceptable
-        retroalimentacion = eval_res.retroalimentacion
+        if fingerprint:
+            await recursos.response_cache.astore(user_msg, fingerprint, final.model_dump())
+        return final
+
+    # Single-flight: misma pregunta, mismo historial y mismo contexto -> un solo cálculo
+    clave = coalesce_key(
+        user_msg,
+        history_to_messages(history),
+        context_fingerprint(passages, profile_id),
+        profile_id,
+    )
+    return await single_flight.do(clave, calcular)
 
-        if not eval_res.es_aceptable:
-            logger.info("Respuesta rechazada por el evaluador. Reintentando...")
-            answer = reintentar_respuesta(answer, user_msg, history, eval_res.retroalimentacion)
 
-    return ChatResponse(
-        answer=answer,
-        evaluated=evaluated,
-        es_aceptable=es_aceptable,
-        retroalimentacion=retroalimentacion,
+# ------------------------
+# Sesiones
+# ------------------------
+def session_response(sesion) -> SessionResponse:
+    return SessionResponse(
+        session_id=sesion.session_id,
+        profile_id=sesion.profile_id,
+        n_messages=sesion.n_messages,
+        history_tokens=sesion.history_tokens,
+        summary=sesion.summary,
     )
 
-@app.get("/")
+
+async def get_session_or_404(session_id: str):
+    sesion = await recursos.sessions.aget(session_id)
+    if sesion is None:
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o caducada")
+    return sesion
+
+
+@router.post("/sessions", response_model=SessionResponse)
+async def create_session(req: Optional[SessionRequest] = None):
+    if req is not None:
+        datos_perfil(req.profile_id)
+    return session_response(await recursos.sessions.acreate(profile_id=req.profile_id if req else None))
+
+
+@router.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str):
+    return session_response(await get_session_or_404(session_id))
+
+
+@router.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not await recursos.sessions.adelete(session_id):
+        raise HTTPException(status_code=404, detail="Sesión no encontrada o caducada")
+    return {"deleted": True}
+
+
+@router.post("/sessions/{session_id}/messages", response_model=ChatResponse)
+async def session_message(session_id: str, req: SessionMessageRequest, request: Request):
+    """
+    Como /chat, pero el historial (resumen + últimos turnos) sale de la sesión.
+    """
+    ip = request.client.host if request.client else "unknown"
+
+    sesion = await get_session_or_404(session_id)
+    logger.info("Nueva petición de %s en sesión %s: %s", ip, session_id, req.message)
+
+    with REQUEST_SECONDS.time("/sessions/messages"), deadline(REQUEST_DEADLINE), recursos.profiles.pinned():
+        final = await responder(req.message, recursos.sessions.history(sesion), sesion.profile_id)
+        await recursos.sessions.aappend_turn(sesion, req.message, final.answer)
+    return final
+
+
+@router.post("/sessions/{session_id}/messages/stream")
+async def session_message_stream(session_id: str, req: SessionMessageRequest, request: Request):
+    """
+    Como /chat/stream, con el historial de la sesión: el cliente sólo envía
+    el mensaje nuevo. El turno se guarda al emitir el evento final.
+    """
+    ip = request.client.host if request.client else "unknown"
+
+    sesion = await get_session_or_404(session_id)
+    logger.info("Nueva petición (stream) de %s en sesión %s: %s", ip, session_id, req.message)
+
+    async def guardar_turno(final: ChatResponse) -> None:
+        await recursos.sessions.aappend_turn(sesion, req.message, final.answer)
+
+    with recursos.profiles.pinned():
+        return await responder_stream(
+            req.message,
+            recursos.sessions.history(sesion),
+            sesion.profile_id,
+            al_terminar=guardar_turno,
+            ruta="/sessions/messages/stream",
+        )
+
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest, request: Request):
+    """
+    Igual que /chat pero en Server-Sent Events:
+      - event: token  -> {"delta": "..."} según llegan los tokens del agente
+      - event: final  -> ChatResponse + "replaced" (true si el evaluador
+                         rechazó la respuesta y "answer" es el reintento)
+      - event: error  -> {"detail": "..."} si algo falla a mitad de stream
+    """
+    ip = request.client.host if request.client else "unknown"
+    logger.info("Nueva petición (stream) de %s: %s", ip, req.message)
+    with recursos.profiles.pinned():
+        return await responder_stream(req.message, req.history or [], req.profile_id)
+
+
+async def responder_stream(
+    user_msg: str,
+    history,
+    profile_id: Optional[str] = None,
+    al_terminar: Optional[Callable[[ChatResponse], Awaitable[None]]] = None,
+    ruta: str = "/chat/stream",
+) -> StreamingResponse:
+    """
+    Versión SSE de responder(). `al_terminar` (asíncrona) recibe la respuesta final
+    (p.ej. para guardarla en la sesión) antes de emitir el evento "final".
+    El plazo REQUEST_DEADLINE cubre también la evaluación tras el stream: si
+    se agota, la respuesta sale sin evaluar. Lo mismo con la versión del perfil.
+    """
+    perfil = recursos.perfil_actual
+    datos_perfil(profile_id)  # perfil desconocido: 404 antes de abrir el stream
+    passages = recuperar_fragmentos(user_msg, profile_id)
+    fingerprint = cache_fingerprint(history, passages, profile_id)
+    cached = await recursos.response_cache.alookup(user_msg, fingerprint) if fingerprint else None
+    if cached is not None:
+        async def eventos_cache():
+            if al_terminar:
+                await al_terminar(ChatResponse(**cached))
+            yield sse_event("token", {"delta": cached["answer"]})
+            yield sse_event("final", {**cached, "replaced": False})
+
+        return StreamingResponse(eventos_cache(), media_type="text/event-stream")
+
+    t0 = time.perf_counter()
+    with STAGE_SECONDS.time("build_messages"):
+        mensajes = build_messages(user_msg, history, profile_id, passages=passages)
+    # Abrimos el stream antes de responder para que los errores de conexión
+    # (con sus reintentos) salgan como HTTP de error y no a mitad del SSE
+    t_agente = time.perf_counter()
+    with deadline(REQUEST_DEADLINE):
+        plazo = current_deadline()
+        stream = await llamar_agente(mensajes, stream=True)
+
+    async def eventos():
+        partes: List[str] = []
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    partes.append(delta)
+                    yield sse_event("token", {"delta": delta})
+
+            answer = "".join(partes)
+            STAGE_SECONDS.observe(time.perf_counter() - t_agente, "agent_stream")
+            record_usage(AGENT_MODEL, mensajes, completion=answer)
+            with deadline(at=plazo), recursos.profiles.pinned(perfil):
+                final = await evaluar_y_corregir(answer, user_msg, history, passages, mensajes, profile_id)
+            if fingerprint:
+                await recursos.response_cache.astore(user_msg, fingerprint, final.model_dump())
+            if al_terminar:
+                await al_terminar(final)
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, ruta)
+            yield sse_event("final", {**final.model_dump(), "replaced": final.answer != answer})
+        except Exception as e:  # el status HTTP ya se envió: informamos en el propio stream
+            logger.exception("Error durante el streaming")
+            yield sse_event("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def volcar_metricas_periodicamente(interval: float) -> None:
+    # Con METRICS_DIR, cada worker publica su estado para el que sirva /metrics
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            REGISTRY.flush()
+        except OSError:
+            logger.exception("No se pudieron volcar las métricas")
+
+
+@router.get("/")
 async def root():
     return {"status": "ok", "message": "Agente CV backend up"}
 
-@app.get("/healthz")
+@router.get("/cache/stats")
+async def cache_stats():
+    if recursos.response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, "backend": CACHE_BACKEND, **(await recursos.response_cache.astats())}
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    REGISTRY.flush()
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/coalesce/stats")
+async def coalesce_stats():
+    return single_flight.stats()
+
+
+@router.get("/pipeline/stats")
+async def pipeline_stats_endpoint():
+    return {"mode": PIPELINE_MODE, "modes": pipeline_stats.snapshot()}
+
+
+@router.get("/llm/stats")
+async def llm_stats():
+    return {"quota": get_scheduler().snapshot(), "circuits": breakers_snapshot()}
+
+
+async def llm_unavailable_handler(request: Request, exc: LLMUnavailable) -> JSONResponse:
+    # El agente no pudo responder (sin cuota, circuito abierto: 503; plazo agotado: 504)
+    # con Retry-After, en vez de un 500
+    return JSONResponse(
+        {"detail": "El servicio está saturado; vuelve a intentarlo en unos segundos."},
+        status_code=exc.status_code,
+        headers={"Retry-After": str(max(1, int(exc.retry_after + 0.999)))},
+    )
+
+
+async def perfil_desconocido_handler(request: Request, exc: PerfilDesconocido) -> JSONResponse:
+    return JSONResponse({"detail": f"Perfil desconocido: {exc.args[0]}"}, status_code=404)
+
+
+@router.post("/admin/reload")
+async def admin_reload(request: Request, force: bool = False):
+    """
+    Recarga el perfil (CV, índice y resumen) de este worker si sus ficheros
+    cambiaron, o siempre con ?force=true, y con CORPUS_DIR re-sincroniza el
+    corpus (sólo los documentos que cambiaron). Las peticiones en curso
+    terminan con la versión anterior del perfil. Sólo existe si hay ADMIN_TOKEN.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administración no válido")
+    try:
+        # Fuera del event loop: el worker sigue respondiendo con el perfil actual
+        resultado = await asyncio.to_thread(recursos.profiles.reload, force)
+        if CORPUS_DIR:
+            resultado["corpus"] = await asyncio.to_thread(lambda: recursos.corpus.sync_directory(CORPUS_DIR))
+        return resultado
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"No se pudo recargar el perfil: {e}")
+
+
+def vaciar_cache_respuestas(anterior, nuevo) -> None:
+    # Las huellas ya llevan la versión; esto libera las entradas del perfil anterior
+    if "response_cache" in recursos.__dict__ and recursos.response_cache is not None:
+        recursos.response_cache.clear()
+
+
+@router.get("/healthz")
 async def healthz():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok", "profile_version": recursos.profiles.version}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Arranque de cada worker: datos de sólo lectura (ya en memoria si se
+    precargaron antes del fork), tareas de fondo y, al parar, cierre de los
+    clientes que se llegaron a crear.
+    """
+    recursos.preload()
+    recursos.profiles.on_swap(vaciar_cache_respuestas)
+    tareas = [asyncio.create_task(rate_limiter.evict_periodically(RATE_LIMIT_EVICT_INTERVAL))]
+    if PROFILE_WATCH_INTERVAL > 0:
+        tareas.append(asyncio.create_task(recursos.profiles.watch(PROFILE_WATCH_INTERVAL)))
+        if CORPUS_DIR:
+            tareas.append(asyncio.create_task(recursos.corpus.watch(CORPUS_DIR, PROFILE_WATCH_INTERVAL)))
+    if REGISTRY.directory:
+        tareas.append(asyncio.create_task(volcar_metricas_periodicamente(METRICS_FLUSH_INTERVAL)))
+    try:
+        yield
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+        # Cierra los pools HTTP de los clientes asíncronos
+        await recursos.aclose()
+        await cerrar_clientes_evaluador()
+
+
+def create_app(preload: bool = APP_PRELOAD) -> FastAPI:
+    """
+    Construye la aplicación. Con `preload` los datos de sólo lectura (índice,
+    retriever, corpus, resumen) se cargan ya, en el proceso que llama: con
+    `gunicorn --preload` es el maestro y los workers los heredan por
+    copy-on-write. Sin él se cargan en el arranque (lifespan) de cada worker.
+    Los clientes HTTP y las conexiones sqlite son siempre de cada worker.
+    """
+    if not GROQ_API_KEY:
+        logger.warning("GROQ_API_KEY no encontrada: las llamadas al LLM fallarán. Revisa tu .env")
+    if preload:
+        recursos.preload()
+
+    app = FastAPI(title="Agente CV Backend", version="0.1.0", lifespan=lifespan)
+
+    # Antes que CORS para que las respuestas 429 también lleven sus cabeceras
+    app.add_middleware(RateLimitMiddleware, limiter=rate_limiter)
+
+    # CORS (para que Gradio u otras UIs puedan llamar al backend)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # en producción, restringe esto (dominio concreto)
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.include_router(router)
+    app.add_exception_handler(LLMUnavailable, llm_unavailable_handler)
+    app.add_exception_handler(PerfilDesconocido, perfil_desconocido_handler)
+    return app
+
+
+app = create_app()
\ No newline at end of file
@@ -0,0 +1,268 @@
+# app/batch.py
+"""
+CLI para responder por lotes un fichero JSONL de preguntas con el mismo
+pipeline que /chat (recuperación + MMR, build_messages, agente, gating,
+evaluador y reintento o alternativa según PIPELINE_MODE), en el propio
+proceso: sin HTTP ni rate limit por IP.
+
+    python -m app.batch preguntas.jsonl --out respuestas.jsonl --concurrency 8
+    python -m app.batch benchmarks/questions.jsonl --out /tmp/respuestas.jsonl --dry-run
+
+Entrada: una pregunta por línea, {"question": "..."} ("message" también
+vale), con "id", "history" y "profile_id" opcionales. Sin "id", la clave es
+el número de línea.
+
+  - La recuperación de todas las preguntas se hace en una sola pasada por
+    lotes del retriever (una por profile_id).
+  - Como mucho --concurrency preguntas tienen llamadas al LLM en vuelo; por
+    encima, la cuota de LLM_RATE_LIMITS la sigue aplicando el scheduler.
+  - Cada resultado se añade a --out en cuanto termina. Si el proceso se
+    corta, relanzarlo con el mismo --out salta las preguntas que ya tienen
+    respuesta y repite las fallidas (la última línea de cada id es la que vale).
+  - Por pregunta se guardan la respuesta, el veredicto, los fragmentos,
+    tiempos por etapa, llamadas al LLM y tokens estimados.
+
+Con --dry-run se arranca el stub LLM local (benchmarks/stub_llm.py) y los
+clientes apuntan a él: no se consume la API de Groq.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+# app.config lee el entorno al importarse y --dry-run tiene que cambiar
+# GROQ_BASE_URL antes: los módulos de app se importan dentro de las funciones.
+
+logger = logging.getLogger("agente_cv_batch")
+
+
+def read_items(path: str) -> list[dict]:
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for n, linea in enumerate(f, 1):
+            if not linea.strip():
+                continue
+            item = json.loads(linea)
+            pregunta = item.get("question") or item.get("message")
+            if not pregunta:
+                raise ValueError(f"{path}:{n}: falta 'question'")
+            items.append({**item, "id": str(item.get("id", n)), "question": pregunta})
+    return items
+
+
+def completed_ids(path: str) -> set[str]:
+    """
+    Ids cuya última línea en `path` es una respuesta (no un error).
+    """
+    estado = {}
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except json.JSONDecodeError:
+                continue  # línea a medias de una ejecución cortada
+            estado[registro["id"]] = "error" not in registro
+    return {i for i, ok in estado.items() if ok}
+
+
+def _abrir_para_anadir(path: str):
+    # Si la ejecución anterior se cortó a mitad de línea, la siguiente empieza en una nueva
+    if os.path.exists(path) and os.path.getsize(path):
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            cortada = f.read(1) != b"\n"
+    else:
+        cortada = False
+    out = open(path, "a", encoding="utf-8")
+    if cortada:
+        out.write("\n")
+    return out
+
+
+async def responder_item(item: dict, passages: list, modo: str, plazo: float, t_recuperacion: float) -> dict:
+    from app import backend
+    from app.pipeline import PipelineStats, ejecutar
+    from app.resilience import deadline
+    from app.tokens import count_tokens, get_token_counter
+
+    pregunta, history = item["question"], item.get("history") or []
+    registro = {"id": item["id"], "question": pregunta, "profile_version": backend.recursos.perfil_actual.version}
+    tiempos = {"retrieval_s": t_recuperacion}
+    t0 = time.perf_counter()
+    try:
+        with deadline(plazo):
+            mensajes = backend.build_messages(pregunta, history, item.get("profile_id"), passages=passages)
+            tiempos["build_s"] = time.perf_counter() - t0
+            stats = PipelineStats(window=1)
+            etapas = backend.build_etapas(pregunta, history, mensajes, passages, item.get("profile_id"))
+            resultado = await ejecutar(modo, etapas, pregunta, stats=stats)
+    except Exception as e:
+        logger.warning("Pregunta %s fallida: %s", item["id"], e)
+        registro["error"] = f"{type(e).__name__}: {e}"
+    else:
+        coste = stats.snapshot()[modo]
+        registro.update(
+            answer=resultado.answer,
+            evaluated=resultado.evaluated,
+            es_aceptable=resultado.es_aceptable,
+            retroalimentacion=resultado.retroalimentacion,
+            replaced=resultado.replaced,
+            passages=[p for p, _ in passages],
+            llm_calls={"agent": coste["agent_calls"], "evaluator": coste["eval_calls"], "wasted": coste["wasted_calls"]},
+            tokens={
+                "prompt": get_token_counter().count_messages(mensajes),
+                "completion": count_tokens(resultado.answer),
+            },
+        )
+        tiempos["pipeline_s"] = time.perf_counter() - t0 - tiempos["build_s"]
+    tiempos["total_s"] = t_recuperacion + time.perf_counter() - t0
+    registro["timings"] = tiempos
+    return registro
+
+
+async def run_batch(
+    items: list[dict],
+    out_path: str,
+    concurrency: int = 8,
+    mode: Optional[str] = None,
+    deadline_s: Optional[float] = None,
+) -> dict:
+    """
+    Responde las preguntas de `items` que no estén ya en `out_path` y añade
+    allí los resultados. Devuelve un resumen de la ejecución.
+    """
+    from app import backend
+    from app.config import PIPELINE_MODE, REQUEST_DEADLINE
+
+    modo = mode or PIPELINE_MODE
+    plazo = REQUEST_DEADLINE if deadline_s is None else deadline_s
+    hechos = completed_ids(out_path)
+    pendientes = [it for it in items if it["id"] not in hechos]
+    t_inicio = time.perf_counter()
+    resumen = {"total": len(items), "skipped": len(items) - len(pendientes), "ok": 0, "errors": 0}
+    latencias, tokens = [], 0
+
+    # Todo el lote con la misma versión del perfil, aunque se recargue a mitad
+    with backend.recursos.profiles.pinned() as perfil:
+        grupos = defaultdict(list)
+        for i, it in enumerate(pendientes):
+            grupos[it.get("profile_id")].append(i)
+        fragmentos: list = [None] * len(pendientes)
+        t0 = time.perf_counter()
+        for profile_id, indices in grupos.items():
+            lote = backend.recuperar_fragmentos_lote([pendientes[i]["question"] for i in indices], profile_id)
+            for i, passages in zip(indices, lote):
+                fragmentos[i] = passages
+        t_recuperacion = (time.perf_counter() - t0) / max(1, len(pendientes))
+
+        sem = asyncio.Semaphore(concurrency)
+        with _abrir_para_anadir(out_path) as out:
+
+            async def una(i: int) -> None:
+                nonlocal tokens
+                async with sem:
+                    registro = await responder_item(pendientes[i], fragmentos[i], modo, plazo, t_recuperacion)
+                out.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                out.flush()
+                if "error" in registro:
+                    resumen["errors"] += 1
+                else:
+                    resumen["ok"] += 1
+                    latencias.append(registro["timings"]["total_s"])
+                    tokens += registro["tokens"]["prompt"] + registro["tokens"]["completion"]
+
+            await asyncio.gather(*(una(i) for i in range(len(pendientes))))
+
+    segundos = time.perf_counter() - t_inicio
+    resumen.update(
+        profile_version=perfil.version,
+        mode=modo,
+        seconds=segundos,
+        questions_per_s=len(pendientes) / segundos if segundos else 0.0,
+        p50_s=statistics.median(latencias) if latencias else None,
+        p95_s=statistics.quantiles(latencias, n=20)[-1] if len(latencias) > 1 else None,
+        tokens_estimated=tokens,
+    )
+    return resumen
+
+
+@contextmanager
+def stub_llm(port: int, timeout: float = 30.0):
+    """
+    Arranca benchmarks/stub_llm.py en `port` y apunta los clientes a él.
+    """
+    import httpx
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.stub_llm:app", "--port", str(port), "--log-level", "warning"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        t0 = time.time()
+        while True:
+            try:
+                httpx.get(f"{url}/docs", timeout=1)
+                break
+            except httpx.HTTPError:
+                if proc.poll() is not None or time.time() - t0 > timeout:
+                    raise RuntimeError(f"El stub LLM no arrancó en {url}")
+                time.sleep(0.2)
+        os.environ["GROQ_BASE_URL"] = url
+        os.environ["GROQ_API_KEY"] = "stub-key"
+        yield url
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+async def _ejecutar(args) -> dict:
+    from app import backend
+    from app.evaluator import aclose_clients
+
+    try:
+        return await run_batch(
+            read_items(args.input), args.out, concurrency=args.concurrency, mode=args.mode, deadline_s=args.deadline
+        )
+    finally:
+        await backend.recursos.aclose()
+        await aclose_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Responde por lotes un JSONL de preguntas con el pipeline de /chat")
+    parser.add_argument("input", help="JSONL con una pregunta por línea")
+    parser.add_argument("--out", required=True, help="JSONL de resultados; si existe, se reanuda")
+    parser.add_argument("--concurrency", type=int, default=8, help="preguntas con llamadas al LLM en vuelo")
+    parser.add_argument("--mode", default=None, help="PIPELINE_MODE para este lote (por defecto el configurado)")
+    parser.add_argument("--deadline", type=float, default=None, help="plazo por pregunta en s (por defecto REQUEST_DEADLINE)")
+    parser.add_argument("--dry-run", action="store_true", help="usa el stub LLM local en vez de la API")
+    parser.add_argument("--stub-port", type=int, default=9100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(name)s | %(message)s")
+    if args.dry_run:
+        with stub_llm(args.stub_port) as url:
+            from app.config import GROQ_BASE_URL
+
+            if GROQ_BASE_URL != url:  # p.ej. un .env que fija GROQ_BASE_URL
+                parser.error(f"--dry-run: GROQ_BASE_URL sigue apuntando a {GROQ_BASE_URL}")
+            resumen = asyncio.run(_ejecutar(args))
+    else:
+        resumen = asyncio.run(_ejecutar(args))
+    print(json.dumps(resumen, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
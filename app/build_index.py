@@ -0,0 +1,32 @@
+# app/build_index.py
+"""
+CLI para construir el índice de recuperación por adelantado (p.ej. en el build de Docker):
+
+    python -m app.build_index --pdf app/data/CV.pdf --index-dir app/data/index
+"""
+import argparse
+import logging
+
+from app.config import PDF_PATH, INDEX_DIR, CHUNK_MAX_CHARS, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, INGEST_WORKERS
+from app.index_store import build_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye el índice TF-IDF del CV")
+    parser.add_argument("--pdf", default=PDF_PATH, help="ruta del PDF (por defecto PDF_PATH)")
+    parser.add_argument("--index-dir", default=INDEX_DIR, help="directorio de índices (por defecto INDEX_DIR)")
+    parser.add_argument("--max-chars", type=int, default=CHUNK_MAX_CHARS)
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS, help="0 = sin tope de tokens")
+    parser.add_argument("--overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="procesos para extraer las páginas")
+    args = parser.parse_args()
+
+    if not args.pdf:
+        parser.error("indica --pdf o define PDF_PATH")
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+    print(build_index(args.pdf, args.index_dir, args.max_chars, args.max_tokens, args.overlap_tokens, args.workers))
+
+
+if __name__ == "__main__":
+    main()
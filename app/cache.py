@@ -0,0 +1,275 @@
+# app/cache.py
+"""
+Caché semántica de respuestas para las preguntas repetidas de reclutadores.
+
+La clave es (huella de recuperación, pregunta normalizada):
+  - la huella es un hash de los fragmentos recuperados para la pregunta, así que
+    dos preguntas sólo comparten respuesta si el contexto del CV es el mismo;
+  - dentro de una misma huella, una pregunta casi idéntica (similitud de
+    trigramas de caracteres >= umbral) también cuenta como acierto.
+
+Cada entrada guarda la respuesta junto al veredicto del evaluador. Hay dos
+backends: en memoria (LRU + TTL, por proceso) y sqlite en disco (compartido
+entre workers de la misma máquina). Desde el event loop se usan alookup/astore,
+que con sqlite hacen la E/S en un hilo.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Optional
+
+_NO_ALFANUM = re.compile(r"[^\w\s]")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_pregunta(texto: str) -> str:
+    """
+    Minúsculas, sin tildes, sin signos de puntuación y con espacios colapsados:
+    "¿Cuántos años de experiencia tienes?" -> "cuantos anos de experiencia tienes"
+    """
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = _NO_ALFANUM.sub(" ", texto)
+    return _ESPACIOS.sub(" ", texto).strip()
+
+
+def retrieval_fingerprint(passages: list[str], extra: str = "") -> str:
+    """
+    Huella de los fragmentos recuperados (y de cualquier otro contexto que
+    condicione la respuesta, p.ej. el modelo), independiente del orden.
+    """
+    h = hashlib.sha1(extra.encode("utf-8"))
+    for p in sorted(passages):
+        h.update(b"\x00")
+        h.update(p.encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+def _trigramas(texto: str) -> set[str]:
+    t = f"  {texto} "
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+def similitud(a: str, b: str) -> float:
+    """
+    Jaccard de trigramas de caracteres entre dos preguntas ya normalizadas.
+    """
+    ta, tb = _trigramas(a), _trigramas(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+class MemoryCacheBackend:
+    """
+    LRU con TTL en memoria del proceso. Indexado por huella para que la búsqueda
+    de casi-duplicados sólo recorra las preguntas con el mismo contexto.
+    """
+
+    blocking = False  # sin E/S: se puede llamar desde el event loop
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[tuple[str, str], tuple[float, dict]] = OrderedDict()
+        self._buckets: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def bucket(self, fingerprint: str) -> dict[str, dict]:
+        ahora = self.clock()
+        with self._lock:
+            vivos = {}
+            for pregunta in list(self._buckets.get(fingerprint, ())):
+                key = (fingerprint, pregunta)
+                expira, payload = self._entries[key]
+                if expira <= ahora:
+                    self._delete(key)
+                    continue
+                vivos[pregunta] = payload
+            return vivos
+
+    def touch(self, fingerprint: str, pregunta: str) -> None:
+        with self._lock:
+            key = (fingerprint, pregunta)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def set(self, fingerprint: str, pregunta: str, payload: dict) -> None:
+        with self._lock:
+            key = (fingerprint, pregunta)
+            self._entries[key] = (self.clock() + self.ttl, payload)
+            self._entries.move_to_end(key)
+            self._buckets.setdefault(fingerprint, set()).add(pregunta)
+            while len(self._entries) > self.max_entries:
+                self._delete(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def _delete(self, key: tuple[str, str]) -> None:
+        self._entries.pop(key, None)
+        bucket = self._buckets.get(key[0])
+        if bucket is not None:
+            bucket.discard(key[1])
+            if not bucket:
+                del self._buckets[key[0]]
+
+
+class SqliteCacheBackend:
+    """
+    Misma interfaz que MemoryCacheBackend sobre un fichero sqlite (modo WAL),
+    de modo que todos los workers de la máquina comparten la caché.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 1024, ttl: float = 3600, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " fingerprint TEXT NOT NULL, question TEXT NOT NULL, payload TEXT NOT NULL,"
+                " expires_at REAL NOT NULL, last_access REAL NOT NULL,"
+                " PRIMARY KEY (fingerprint, question))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_lru ON response_cache (last_access)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+    def bucket(self, fingerprint: str) -> dict[str, dict]:
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT question, payload FROM response_cache WHERE fingerprint = ? AND expires_at > ?",
+                (fingerprint, self.clock()),
+            ).fetchall()
+        return {q: json.loads(p) for q, p in filas}
+
+    def touch(self, fingerprint: str, pregunta: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE response_cache SET last_access = ? WHERE fingerprint = ? AND question = ?",
+                (self.clock(), fingerprint, pregunta),
+            )
+
+    def set(self, fingerprint: str, pregunta: str, payload: dict) -> None:
+        ahora = self.clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, pregunta, json.dumps(payload, ensure_ascii=False), ahora + self.ttl, ahora),
+            )
+            # Expiradas fuera y, si seguimos por encima del máximo, las menos usadas
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (ahora,))
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE rowid IN ("
+                " SELECT rowid FROM response_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+
+
+class ResponseCache:
+    def __init__(self, backend, threshold: float = 0.85):
+        self.backend = backend
+        self.threshold = threshold
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def lookup(self, question: str, fingerprint: str) -> Optional[dict]:
+        pregunta = normalizar_pregunta(question)
+        entradas = self.backend.bucket(fingerprint)
+
+        if pregunta in entradas:
+            self.hits += 1
+            self.backend.touch(fingerprint, pregunta)
+            return entradas[pregunta]
+
+        mejor, mejor_sim = None, 0.0
+        for otra in entradas:
+            sim = similitud(pregunta, otra)
+            if sim > mejor_sim:
+                mejor, mejor_sim = otra, sim
+        if mejor is not None and mejor_sim >= self.threshold:
+            self.near_hits += 1
+            self.backend.touch(fingerprint, mejor)
+            return entradas[mejor]
+
+        self.misses += 1
+        return None
+
+    def store(self, question: str, fingerprint: str, payload: dict) -> None:
+        self.backend.set(fingerprint, normalizar_pregunta(question), payload)
+
+    async def alookup(self, question: str, fingerprint: str) -> Optional[dict]:
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(self.lookup, question, fingerprint)
+        return self.lookup(question, fingerprint)
+
+    async def astore(self, question: str, fingerprint: str, payload: dict) -> None:
+        if getattr(self.backend, "blocking", True):
+            await asyncio.to_thread(self.store, question, fingerprint, payload)
+        else:
+            self.store(question, fingerprint, payload)
+
+    async def astats(self) -> dict:
+        if getattr(self.backend, "blocking", True):
+            return await asyncio.to_thread(self.stats)
+        return self.stats()
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / total if total else 0.0,
+            "size": len(self.backend),
+        }
+
+
+def build_response_cache(
+    backend: str,
+    path: str,
+    max_entries: int,
+    ttl: float,
+    threshold: float,
+) -> Optional[ResponseCache]:
+    """
+    backend: "memory" | "sqlite" | "off"
+    """
+    if backend == "off":
+        return None
+    if backend == "memory":
+        return ResponseCache(MemoryCacheBackend(max_entries=max_entries, ttl=ttl), threshold=threshold)
+    if backend == "sqlite":
+        return ResponseCache(SqliteCacheBackend(path, max_entries=max_entries, ttl=ttl), threshold=threshold)
+    raise ValueError(f"CACHE_BACKEND desconocido: {backend!r} (memory | sqlite | off)")
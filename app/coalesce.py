@@ -0,0 +1,55 @@
+# app/coalesce.py
+"""
+Single-flight: peticiones concurrentes con la misma clave comparten una sola
+ejecución. La primera (líder) lanza el cálculo y las que llegan mientras sigue
+en vuelo esperan su resultado en vez de repetir agente + evaluador.
+
+El cálculo corre en su propia tarea: si el cliente del líder se desconecta, los
+demás siguen recibiendo la respuesta. Los errores se propagan a todos.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Awaitable, Callable, Optional
+
+from app.cache import normalizar_pregunta
+
+
+def coalesce_key(message: str, history: list[dict], fingerprint: str, profile_id: Optional[str] = None) -> str:
+    """
+    Pregunta normalizada + historial + huella del contexto recuperado.
+    """
+    h = hashlib.sha1(normalizar_pregunta(message).encode("utf-8"))
+    h.update(b"\x00" + (profile_id or "").encode("utf-8"))
+    h.update(b"\x00" + fingerprint.encode("utf-8"))
+    h.update(b"\x00" + json.dumps(history, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._en_vuelo: dict[str, asyncio.Task] = {}
+        self.leaders = 0  # cálculos reales (llamadas upstream)
+        self.followers = 0  # peticiones que reutilizaron uno en vuelo
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        tarea = self._en_vuelo.get(key)
+        if tarea is not None:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            tarea = asyncio.ensure_future(fn())
+            self._en_vuelo[key] = tarea
+            tarea.add_done_callback(lambda _t: self._en_vuelo.pop(key, None))
+        # shield: cancelar a quien espera no cancela el cálculo compartido
+        return await asyncio.shield(tarea)
+
+    def stats(self) -> dict:
+        total = self.leaders + self.followers
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "upstream_calls_saved": self.followers,
+            "saved_ratio": self.followers / total if total else 0.0,
+            "in_flight": len(self._en_vuelo),
+        }
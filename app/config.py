@@ -10,3 +10,146 @@ EVAL_MODEL = os.getenv("EVAL_MODEL")
 PDF_PATH = os.getenv("PDF_PATH")
 SUMMARY_PATH = os.getenv("SUMMARY_PATH")
 NOMBRE = os.getenv("NOMBRE")
+
+# Endpoint compatible OpenAI/Groq (permite apuntar a un stub local en benchmarks)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com")
+
+# Pool HTTP compartido por los clientes asíncronos
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+# Reintentos internos de los SDK (openai/groq), aparte de los de call_chat (tenacity)
+LLM_SDK_RETRIES = int(os.getenv("LLM_SDK_RETRIES", "2"))
+
+# Plazo total de cada petición que llama al LLM, en segundos (0 = sin plazo):
+# reintentos, colas y llamadas se cortan al agotarse (ver app/resilience.py)
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "30"))
+# Circuit breaker por modelo: fallos transitorios seguidos para abrirlo y segundos abierto
+CIRCUIT_FAILURES = int(os.getenv("CIRCUIT_FAILURES", "5"))
+CIRCUIT_COOLDOWN = float(os.getenv("CIRCUIT_COOLDOWN", "30"))
+# Modelo de reserva del agente (más rápido/barato), vacío = sin reserva. Se usa
+# si AGENT_MODEL falla o tiene el circuito abierto y, con AGENT_HEDGE_AFTER > 0,
+# también si no ha respondido en esos segundos (gana el primero que responda).
+AGENT_FALLBACK_MODEL = os.getenv("AGENT_FALLBACK_MODEL")
+AGENT_HEDGE_AFTER = float(os.getenv("AGENT_HEDGE_AFTER", "0"))
+
+# Control de admisión de llamadas al LLM (ver app/llm_scheduler.py). Cuota por
+# modelo y proceso, "modelo=rpm/tpm,modelo2=rpm/tpm"; sin definir no se limita.
+LLM_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS")
+# Espera máxima en cola por prioridad (agent, retry, evaluator, alternative), "agent=30,evaluator=5"
+LLM_QUEUE_TIMEOUTS = os.getenv("LLM_QUEUE_TIMEOUTS")
+LLM_COMPLETION_ESTIMATE = int(os.getenv("LLM_COMPLETION_ESTIMATE", "512"))  # tokens de respuesta sin max_tokens
+LLM_RATE_WINDOW = float(os.getenv("LLM_RATE_WINDOW", "60"))  # segundos de la ventana deslizante
+
+# Rate limiting del backend (GCRA, ver app/rate_limit.py)
+RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))
+RATE_LIMIT_MAX = int(os.getenv("RATE_LIMIT_MAX", "20"))  # endpoints que llaman al LLM
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", os.getenv("RATE_LIMIT_MAX", "20")))
+RATE_LIMIT_CHEAP_MAX = int(os.getenv("RATE_LIMIT_CHEAP_MAX", "300"))  # resto de endpoints
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite (compartido entre workers)
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", ".cache/rate_limit.sqlite")
+RATE_LIMIT_EVICT_INTERVAL = float(os.getenv("RATE_LIMIT_EVICT_INTERVAL", "60"))  # limpieza de IPs inactivas
+
+# Índice de recuperación persistente (ver app/index_store.py)
+INDEX_DIR = os.getenv("INDEX_DIR", "app/data/index")
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1200"))
+# Tope de tokens por chunk (0 = sólo CHUNK_MAX_CHARS) y solape entre chunks
+# consecutivos de la misma sección, ver app/ingest.py
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "0"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+# Procesos para extraer el texto de PDFs grandes o de muchos documentos (1 = secuencial)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+
+# Corpus multi-documento opcional (ver app/corpus.py). Si se define, /chat
+# acepta "profile_id" y recupera de los documentos de ese perfil (con su nombre,
+# resumen y CV); sin profile_id sigue usando el CV configurado y su índice.
+CORPUS_DIR = os.getenv("CORPUS_DIR")
+
+# Retriever: "tfidf" (por defecto), "bm25", "dense" o "hybrid" (RRF de BM25 + denso)
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "tfidf")
+# Modelo sentence-transformers para el modo denso; vacío = codificador local LSA
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "int8")  # int8 | float16 | float32
+
+# Recarga en caliente del perfil (ver app/profile_store.py): cada cuántos
+# segundos se comprueba si PDF_PATH/SUMMARY_PATH cambiaron (0 = nunca) y token
+# que pide POST /admin/reload en X-Admin-Token (sin él, el endpoint no existe)
+PROFILE_WATCH_INTERVAL = float(os.getenv("PROFILE_WATCH_INTERVAL", "10"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Caché de respuestas (ver app/cache.py): memory | sqlite | off
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_PATH = os.getenv("CACHE_PATH", ".cache/response_cache.sqlite")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "3600"))  # segundos
+CACHE_SIMILARITY = float(os.getenv("CACHE_SIMILARITY", "0.85"))  # umbral de casi-duplicados
+
+# Contexto recuperado del prompt del agente (ver app/context.py): se recuperan
+# CONTEXT_CANDIDATES fragmentos, se eligen CONTEXT_PASSAGES por MMR y sus frases
+# se comprimen hasta CONTEXT_MAX_TOKENS (0 = fragmentos completos)
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+CONTEXT_PASSAGES = int(os.getenv("CONTEXT_PASSAGES", "3"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))  # 1 = sólo relevancia
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "600"))
+CONTEXT_REDUNDANCY = float(os.getenv("CONTEXT_REDUNDANCY", "0.8"))  # cobertura para dar una frase por repetida
+
+# Contexto del evaluador: "full" (resumen + CV completo) o "compact"
+# (perfil resumido + sólo los fragmentos recuperados para la pregunta)
+EVAL_CONTEXT_MODE = os.getenv("EVAL_CONTEXT_MODE", "full")
+EVAL_DIGEST_CHARS = int(os.getenv("EVAL_DIGEST_CHARS", "1500"))
+
+# Conteo de tokens (ver app/tokens.py): vocabulario BPE local en formato tiktoken
+# (o tokenizer.json); sin él se usa una estimación heurística.
+TOKENIZER_PATH = os.getenv("TOKENIZER_PATH")
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "0"))  # tope opcional por coste (0 = la ventana del modelo)
+COMPLETION_RESERVE_TOKENS = int(os.getenv("COMPLETION_RESERVE_TOKENS", "1024"))  # hueco para la respuesta
+# Ventanas de contexto extra o corregidas: "modelo=tokens,modelo2=tokens"
+MODEL_CONTEXT_WINDOWS = os.getenv("MODEL_CONTEXT_WINDOWS")
+
+# Sesiones de conversación en el servidor (ver app/sessions.py): memory | sqlite
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_PATH = os.getenv("SESSION_PATH", ".cache/sessions.sqlite")
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))  # segundos sin actividad
+SESSION_HISTORY_TOKENS = int(os.getenv("SESSION_HISTORY_TOKENS", "2000"))  # turnos recientes literales
+SESSION_SUMMARY_CHARS = int(os.getenv("SESSION_SUMMARY_CHARS", "1500"))  # resumen de los antiguos
+
+# Comprobación local de datos (ver app/grounding.py) antes del evaluador LLM:
+# off | shortcircuit (el LLM sólo en los casos ambiguos) | local (nunca el LLM)
+EVAL_GROUNDING = os.getenv("EVAL_GROUNDING", "off")
+
+# Gating del evaluador (ver app/gating.py): heuristic | classifier. El
+# clasificador se entrena con app/train_gate.py sobre el registro EVAL_LOG_PATH.
+EVAL_GATE = os.getenv("EVAL_GATE", "heuristic")
+EVAL_GATE_MODEL_DIR = os.getenv("EVAL_GATE_MODEL_DIR", "app/data/gate")
+# Umbral de P(rechazo) a partir del cual se evalúa (por defecto, el elegido al entrenar)
+EVAL_GATE_THRESHOLD = float(os.environ["EVAL_GATE_THRESHOLD"]) if os.getenv("EVAL_GATE_THRESHOLD") else None
+EVAL_GATE_EXPLORE = float(os.getenv("EVAL_GATE_EXPLORE", "0.05"))  # fracción de "no evaluar" que se evalúa igualmente
+EVAL_LOG_PATH = os.getenv("EVAL_LOG_PATH")  # JSONL de veredictos; sin definir no se registran
+
+# Solape agente -> evaluador -> reintento (ver app/pipeline.py):
+# sequential | speculative | parallel
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "sequential")
+
+# Métricas Prometheus (GET /metrics, ver app/metrics.py). Con varios workers,
+# METRICS_DIR es un directorio compartido donde cada uno vuelca su estado.
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))
+
+# Arranque (ver create_app en app/backend.py): con APP_PRELOAD=1 el índice y el
+# resto de datos de sólo lectura se cargan al importar la app, en el proceso
+# maestro de `gunicorn --preload`, y los workers los comparten por copy-on-write.
+APP_PRELOAD = os.getenv("APP_PRELOAD", "0").lower() in {"1", "true", "yes"}
+
+# Frontend Gradio (ver app/frontend_client.py): una o varias réplicas del
+# backend separadas por comas; el frontend reparte entre las sanas (/healthz).
+FRONTEND_BACKEND_URLS = [
+    u.strip().rstrip("/") for u in os.getenv("FRONTEND_BACKEND_URLS", "http://127.0.0.1:8000").split(",") if u.strip()
+]
+FRONTEND_HTTP2 = os.getenv("FRONTEND_HTTP2", "0").lower() in {"1", "true", "yes"}  # requiere el paquete h2
+FRONTEND_MAX_CONNECTIONS = int(os.getenv("FRONTEND_MAX_CONNECTIONS", "100"))
+FRONTEND_TIMEOUT = float(os.getenv("FRONTEND_TIMEOUT", "60"))  # máximo entre dos eventos del stream
+FRONTEND_HEALTH_INTERVAL = float(os.getenv("FRONTEND_HEALTH_INTERVAL", "10"))  # segundos entre chequeos
+FRONTEND_CONCURRENCY = int(os.getenv("FRONTEND_CONCURRENCY", "32"))  # conversaciones atendidas a la vez
+FRONTEND_QUEUE_SIZE = int(os.getenv("FRONTEND_QUEUE_SIZE", "256"))  # en espera; el resto se rechaza
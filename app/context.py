@@ -0,0 +1,171 @@
+# app/context.py
+"""
+Ensamblado del contexto recuperado que va en el prompt del agente.
+
+Los chunks del CV se solapan entre sí (mismo puesto contado en la
+experiencia y en el resumen de perfil, párrafos repetidos por el solape de
+la ingesta) y con el resumen que ya lleva el prompt de sistema, así que
+mandar el top-3 entero paga los mismos datos dos o tres veces por llamada.
+
+  - Selección MMR (maximal marginal relevance): se recuperan
+    CONTEXT_CANDIDATES fragmentos y se eligen CONTEXT_PASSAGES de uno en uno,
+    puntuando cada candidato con lambda * relevancia - (1 - lambda) * parecido
+    con los ya elegidos (CONTEXT_MMR_LAMBDA). Un casi-duplicado del primero
+    deja sitio al siguiente fragmento distinto.
+  - Compresión extractiva: los fragmentos elegidos se parten en frases, se
+    quitan las que ya cubre el resumen o un fragmento anterior (al menos
+    CONTEXT_REDUNDANCY de sus palabras en una misma frase) y se empaquetan
+    las más relevantes para la pregunta hasta CONTEXT_MAX_TOKENS tokens,
+    conservando el orden original.
+
+Todo es léxico (palabras normalizadas sin tildes ni palabras vacías): no
+necesita el índice ni embeddings y cuesta en torno a 1 ms por petición.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from app.config import (
+    CONTEXT_PASSAGES,
+    CONTEXT_MMR_LAMBDA,
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_REDUNDANCY,
+)
+from app.grounding import normalizar
+from app.tokens import count_tokens
+
+_FRASE = re.compile(r"(?<=[.!?])\s+|\n+")
+_PALABRA = re.compile(r"\w+")
+
+# Palabras que no dicen nada del contenido (no cuentan para parecidos ni cobertura)
+_VACIAS = frozenset(
+    "a al algo ante como con cual cuales de del desde donde el ella en entre era es esa ese esta este fue "
+    "ha han has hay la las le lo los mas me mi mis muy no o os para pero por que se ser si sin sobre son "
+    "su sus te tu tus un una uno unos y ya yo".split()
+)
+
+
+@lru_cache(maxsize=8192)
+def terminos(texto: str) -> frozenset:
+    return frozenset(p for p in _PALABRA.findall(normalizar(texto)) if p not in _VACIAS and len(p) > 1)
+
+
+def parecido(a: frozenset, b: frozenset) -> float:
+    """
+    Coseno entre conjuntos de términos (0 si alguno está vacío).
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+def cobertura(frase: frozenset, otra: frozenset) -> float:
+    """
+    Fracción de los términos de `frase` que ya aparecen en `otra`.
+    """
+    return len(frase & otra) / len(frase) if frase else 1.0
+
+
+def split_sentences(texto: str) -> list[str]:
+    return [f.strip() for f in _FRASE.split(texto) if f.strip()]
+
+
+def select_mmr(
+    query: str,
+    passages: list[tuple[str, float]],
+    k: int = CONTEXT_PASSAGES,
+    lambda_: float = CONTEXT_MMR_LAMBDA,
+) -> list[tuple[str, float]]:
+    """
+    Elige k de `passages` (texto, score del retriever) por MMR, en orden de
+    selección y con su score original. La relevancia es el score dividido por
+    el mayor (o escalado a [0, 1] si hay negativos); si todos empatan, el
+    parecido con la pregunta.
+    """
+    if len(passages) <= k:
+        return list(passages)
+    scores = [s for _, s in passages]
+    bajo, alto = min(scores), max(scores)
+    if alto > bajo:
+        bajo = min(bajo, 0.0)
+        relevancia = [(s - bajo) / (alto - bajo) for s in scores]
+    else:
+        q = terminos(query)
+        relevancia = [parecido(q, terminos(p)) for p, _ in passages]
+
+    conjuntos = [terminos(p) for p, _ in passages]
+    elegidos: list[int] = []
+    restantes = list(range(len(passages)))
+    while restantes and len(elegidos) < k:
+        mejor = max(
+            restantes,
+            key=lambda i: lambda_ * relevancia[i]
+            - (1 - lambda_) * max((parecido(conjuntos[i], conjuntos[j]) for j in elegidos), default=0.0),
+        )
+        elegidos.append(mejor)
+        restantes.remove(mejor)
+    return [passages[i] for i in elegidos]
+
+
+def format_passages(passages: list[str]) -> str:
+    return "\n\n".join(f"- {p}" for p in passages)
+
+
+@dataclass
+class Contexto:
+    passages: list[str] = field(default_factory=list)
+    tokens_before: int = 0  # fragmentos completos
+    tokens_after: int = 0  # lo que va en el prompt
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def compress_passages(
+    query: str,
+    passages: list[str],
+    summary: str = "",
+    max_tokens: int = CONTEXT_MAX_TOKENS,
+    redundancy: float = CONTEXT_REDUNDANCY,
+) -> Contexto:
+    """
+    Quita de `passages` las frases que ya cubre `summary` u otra frase
+    anterior y deja las más relevantes para `query` hasta `max_tokens`
+    (0 = sin compresión). Devuelve los fragmentos resultantes, en su orden,
+    y los tokens antes y después.
+    """
+    antes = count_tokens(format_passages(passages)) if passages else 0
+    if max_tokens <= 0 or not passages:
+        return Contexto(list(passages), antes, antes)
+
+    cubiertas = [terminos(f) for f in split_sentences(summary)]
+    q = terminos(query)
+    candidatas = []  # (fragmento, posición, términos, texto)
+    for i, p in enumerate(passages):
+        for j, frase in enumerate(split_sentences(p)):
+            t = terminos(frase)
+            if not t or any(cobertura(t, c) >= redundancy for c in cubiertas):
+                continue
+            cubiertas.append(t)
+            candidatas.append((i, j, t, frase))
+
+    # Primero lo que más se parece a la pregunta; a igualdad, el orden de relevancia del retriever
+    orden = sorted(candidatas, key=lambda c: (-parecido(q, c[2]), c[0], c[1]))
+    # "- " y separadores de cada fragmento; se cuentan aparte para no re-tokenizar el bloque
+    presupuesto = max_tokens - count_tokens(format_passages([""] * len(passages)))
+    elegidas, usados = set(), 0
+    for i, j, _t, frase in orden:
+        n = count_tokens(frase) + 1
+        if usados + n <= presupuesto or not elegidas:
+            elegidas.add((i, j))
+            usados += n
+
+    resultado = []
+    for i in range(len(passages)):
+        frases = [frase for fi, j, _t, frase in candidatas if fi == i and (fi, j) in elegidas]
+        if frases:
+            resultado.append(" ".join(frases))
+    despues = count_tokens(format_passages(resultado)) if resultado else 0
+    return Contexto(resultado, antes, despues)
@@ -0,0 +1,467 @@
+# app/corpus.py
+"""
+Corpus multi-documento con indexado incremental.
+
+Pensado para servir varios perfiles (o un perfil + portfolio, cartas, READMEs)
+desde el mismo proceso sin reajustar el modelo entero en cada cambio:
+
+  - Vectorización con HashingVectorizer: no tiene estado, así que añadir un
+    documento no obliga a recalcular el vocabulario.
+  - Cada documento es un segmento (matriz dispersa de sus chunks). Los segmentos
+    se fusionan periódicamente en un índice invertido principal (términos x filas);
+    los añadidos desde la última fusión se consultan aparte (delta).
+  - Borrar/actualizar marca el documento como muerto en el índice principal
+    (tombstone) hasta la siguiente fusión.
+  - El IDF se mantiene incrementalmente (frecuencia de documento por feature)
+    y se aplica en el lado de la consulta.
+
+Las consultas sólo recorren las listas de postings de los términos de la
+pregunta, así que la latencia apenas crece con el tamaño del corpus.
+
+En marcha, el backend vuelve a sincronizar el directorio (solo lo que cambió)
+con POST /admin/reload y con `watch()` cada PROFILE_WATCH_INTERVAL segundos.
+
+Cada perfil tiene además sus datos para el prompt y el evaluador (`profile()`):
+el nombre (`profile.json`, {"name": ...}), el resumen (`resumen.txt` o
+`summary.txt`, que no se indexan) y el texto completo de sus documentos.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from app.ingest import iter_documents, iter_paragraphs, chunk_paragraphs, pages_text
+from app.profile_store import DEFAULT_PROFILE, DatosPerfil
+from app.retrieval import top_k_indices
+
+logger = logging.getLogger(__name__)
+
+HASHING_PARAMS = {
+    "ngram_range": (1, 2),
+    "n_features": 2**20,
+    "alternate_sign": False,
+    "norm": "l2",
+}
+
+# Extensiones que sabe ingerir sync_directory()
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+
+# Ficheros de datos del perfil en su directorio (no se indexan)
+PROFILE_FILE = "profile.json"
+SUMMARY_FILES = ("resumen.txt", "summary.txt")
+
+
+@dataclass
+class Documento:
+    doc_id: str
+    profile_id: str
+    content_hash: str
+    chunks: list[str]
+    matrix: sp.csr_matrix  # una fila (tf normalizado) por chunk
+    path: Optional[str] = None
+    source_hash: Optional[str] = None  # hash de los bytes del fichero de origen
+    chunk_meta: list[dict] = field(default_factory=list)  # página, sección y offsets por chunk
+    text: str = ""
+
+
+class _Segmento:
+    """
+    Índice invertido inmutable sobre un grupo de documentos
+    (postings términos x filas + a qué documento/chunk corresponde cada fila).
+    Lo único que cambia tras construirlo es `alive` (tombstones).
+    """
+
+    def __init__(self, docs: list[Documento]):
+        self.doc_ids = np.array([d.doc_id for d in docs], dtype=object)
+        self.profiles = np.array([d.profile_id for d in docs], dtype=object)
+        self.alive = np.ones(len(docs), dtype=bool)
+        self.pos = {d.doc_id: i for i, d in enumerate(docs)}
+
+        mats = [d.matrix for d in docs if d.matrix.shape[0]]
+        self.postings = sp.vstack(mats, format="csr").T.tocsr() if mats else None
+        self.row_doc = np.concatenate(
+            [np.full(d.matrix.shape[0], i, dtype=np.int64) for i, d in enumerate(docs)] or [np.zeros(0, np.int64)]
+        )
+        self.row_chunk = np.concatenate(
+            [np.arange(d.matrix.shape[0], dtype=np.int64) for d in docs] or [np.zeros(0, np.int64)]
+        )
+
+    def kill(self, doc_id: str) -> None:
+        if doc_id in self.pos:
+            self.alive[self.pos.pop(doc_id)] = False
+
+    def search(self, qm: sp.csr_matrix, k: int, profile_id=None, permitidos=None) -> list[list[tuple[str, int, float]]]:
+        """
+        Top-k por cada fila de `qm` (una consulta por fila): lista de (doc_id, chunk, score).
+        """
+        if self.postings is None:
+            return [[] for _ in range(qm.shape[0])]
+        # Sólo se recorren los postings de los términos de las consultas
+        res = (qm @ self.postings).tocsr()
+        resultados = []
+        for j in range(qm.shape[0]):
+            inicio, fin = res.indptr[j], res.indptr[j + 1]
+            filas, scores = res.indices[inicio:fin], res.data[inicio:fin]
+            docs_fila = self.row_doc[filas]
+            mask = self.alive[docs_fila]
+            if profile_id is not None:
+                mask &= self.profiles[docs_fila] == profile_id
+            if permitidos is not None:
+                mask &= np.isin(self.doc_ids[docs_fila], list(permitidos))
+            filas, scores, docs_fila = filas[mask], scores[mask], docs_fila[mask]
+            resultados.append([
+                (self.doc_ids[docs_fila[i]], int(self.row_chunk[filas[i]]), float(scores[i]))
+                for i in top_k_indices(scores, k)
+            ])
+        return resultados
+
+
+class CorpusManager:
+    def __init__(
+        self,
+        max_chars: int = 1200,
+        compact_every: int = 64,
+        max_tokens: int = 0,
+        overlap_tokens: int = 0,
+        workers: int = 1,
+    ):
+        self.max_chars = max_chars
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.workers = workers  # procesos para extraer texto en sync_directory
+        self.compact_every = compact_every
+        self.vectorizer = HashingVectorizer(**HASHING_PARAMS)
+
+        self._docs: dict[str, Documento] = {}
+        self._meta: dict[str, dict] = {}  # profile_id -> {"name", "summary"}
+        self._perfiles: dict[str, DatosPerfil] = {}  # caché de profile(), se invalida al cambiar
+        self._df = np.zeros(HASHING_PARAMS["n_features"], dtype=np.int64)
+        self._n_chunks = 0
+        self._lock = threading.RLock()
+        self._sincronizando = threading.Lock()  # un sync_directory a la vez
+        self._firmas: dict[str, tuple] = {}  # raíz -> firma_directorio de la última sincronización
+
+        # Índice principal (fusionado) y documentos añadidos desde la última fusión.
+        # El segmento delta se reconstruye perezosamente en la siguiente consulta.
+        self._main = _Segmento([])
+        self._delta: list[str] = []
+        self._delta_segment: Optional[_Segmento] = None
+
+    # ------------------------
+    # Ingesta
+    # ------------------------
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def n_chunks(self) -> int:
+        return self._n_chunks
+
+    def profile_ids(self) -> list[str]:
+        with self._lock:
+            return sorted({d.profile_id for d in self._docs.values()} | set(self._meta))
+
+    def set_profile(self, profile_id: str, name: Optional[str] = None, summary: str = "") -> None:
+        with self._lock:
+            self._meta[profile_id] = {"name": name, "summary": summary}
+            self._perfiles.pop(profile_id, None)
+
+    def profile(self, profile_id: str) -> Optional[DatosPerfil]:
+        """
+        Nombre, resumen y texto del CV (sus documentos, por doc_id) de
+        `profile_id`, o None si el perfil no existe.
+        """
+        with self._lock:
+            datos = self._perfiles.get(profile_id)
+            if datos is not None:
+                return datos
+            docs = sorted((d for d in self._docs.values() if d.profile_id == profile_id), key=lambda d: d.doc_id)
+            meta = self._meta.get(profile_id)
+            if not docs and meta is None:
+                return None
+            meta = meta or {"name": None, "summary": ""}
+            h = hashlib.sha256(json.dumps(meta, sort_keys=True).encode("utf-8"))
+            for d in docs:
+                h.update(f"{d.doc_id}|{d.content_hash}".encode("utf-8"))
+            datos = DatosPerfil(
+                profile_id,
+                meta["name"],
+                meta["summary"],
+                "\n\n".join(d.text for d in docs),
+                h.hexdigest()[:16],
+            )
+            self._perfiles[profile_id] = datos
+            return datos
+
+    def document_ids(self, profile_id: Optional[str] = None) -> list[str]:
+        with self._lock:
+            return [
+                d.doc_id for d in self._docs.values()
+                if profile_id is None or d.profile_id == profile_id
+            ]
+
+    def add_document(
+        self,
+        doc_id: str,
+        text: str,
+        profile_id: str = DEFAULT_PROFILE,
+        path: Optional[str] = None,
+        source_hash: Optional[str] = None,
+        pages: Optional[list[tuple[int, str]]] = None,
+    ) -> bool:
+        """
+        Añade o actualiza un documento. Devuelve False si ya estaba indexado
+        con el mismo contenido (no hace nada). Con `pages` (las de un PDF) los
+        chunks llevan su número de página; `text` debe ser pages_text(pages).
+        """
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        actual = self._docs.get(doc_id)
+        if actual is not None and actual.content_hash == content_hash and actual.profile_id == profile_id:
+            actual.source_hash = source_hash or actual.source_hash
+            return False
+
+        trozos = list(chunk_paragraphs(
+            iter_paragraphs(pages or [(1, text)], doc=doc_id),
+            max_chars=self.max_chars,
+            max_tokens=self.max_tokens or None,
+            overlap_tokens=self.overlap_tokens,
+        ))
+        chunks = [c.text for c in trozos]
+        matrix = self.vectorizer.transform(chunks) if chunks else sp.csr_matrix((0, HASHING_PARAMS["n_features"]))
+        doc = Documento(
+            doc_id, profile_id, content_hash, chunks, matrix.tocsr(), path, source_hash, [c.meta() for c in trozos], text
+        )
+
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove_locked(doc_id)
+            self._docs[doc_id] = doc
+            self._perfiles.pop(profile_id, None)
+            self._update_df(doc.matrix, +1)
+            self._n_chunks += len(chunks)
+            self._delta.append(doc_id)
+            self._delta_segment = None
+            if len(self._delta) >= self.compact_every:
+                self.compact()
+        return True
+
+    def remove_document(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id not in self._docs:
+                return False
+            self._remove_locked(doc_id)
+            return True
+
+    def _remove_locked(self, doc_id: str) -> None:
+        doc = self._docs.pop(doc_id)
+        self._perfiles.pop(doc.profile_id, None)
+        self._update_df(doc.matrix, -1)
+        self._n_chunks -= len(doc.chunks)
+        if doc_id in self._delta:
+            self._delta.remove(doc_id)
+            self._delta_segment = None
+        self._main.kill(doc_id)
+
+    def _update_df(self, matrix: sp.csr_matrix, signo: int) -> None:
+        # Frecuencia de "documento" contada por chunk, que es la unidad que se recupera
+        features, counts = np.unique(matrix.indices, return_counts=True)
+        self._df[features] += signo * counts
+
+    def sync_directory(self, root: str) -> dict:
+        """
+        Sincroniza el corpus con un directorio. Cada subdirectorio de primer nivel
+        es un perfil (los ficheros sueltos van al perfil 'default'); el doc_id es la
+        ruta relativa. Sólo se reindexan los ficheros nuevos o modificados, y se
+        eliminan los documentos de `root` que ya no existen. Los datos de cada
+        perfil (PROFILE_FILE y SUMMARY_FILES en su directorio) se releen siempre.
+        Las consultas siguen atendiéndose mientras tanto.
+        """
+        with self._sincronizando:
+            self._firmas[root] = firma_directorio(root)
+            return self._sincronizar(root)
+
+    async def watch(self, root: str, interval: float) -> None:
+        """
+        Vuelve a sincronizar `root` cuando sus ficheros cambian y se mantienen
+        igual durante una comprobación (como ProfileStore.watch).
+        """
+        vista = None
+        while True:
+            await asyncio.sleep(interval)
+            firma = firma_directorio(root)
+            if firma == self._firmas.get(root):
+                vista = None
+                continue
+            if firma != vista:
+                vista = firma  # todavía se puede estar copiando
+                continue
+            try:
+                logger.info("Corpus re-sincronizado: %s", await asyncio.to_thread(self.sync_directory, root))
+            except Exception:
+                self._firmas[root] = firma  # no se reintenta hasta el siguiente cambio
+                logger.exception("No se pudo sincronizar el corpus de %s", root)
+
+    def _sincronizar(self, root: str) -> dict:
+        vistos: set[str] = set()
+        resumen = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        pendientes: dict[str, tuple[str, str, str, bool]] = {}  # ruta -> (doc_id, perfil, hash, existía)
+        datos: dict[str, dict] = {}
+
+        for dirpath, _dirnames, filenames in os.walk(root):
+            relativo = os.path.relpath(dirpath, root).replace(os.sep, "/")
+            perfil_dir = relativo.split("/")[0] if relativo != "." else DEFAULT_PROFILE
+            de_perfil = relativo.count("/") == 0  # raíz o directorio de un perfil
+            if de_perfil:
+                meta = _leer_datos_perfil(dirpath)
+                if meta is not None:
+                    datos[perfil_dir] = meta
+            for nombre in sorted(filenames):
+                if not nombre.lower().endswith(SUPPORTED_EXTENSIONS) or (de_perfil and nombre.lower() in SUMMARY_FILES):
+                    continue
+                ruta = os.path.join(dirpath, nombre)
+                doc_id = os.path.relpath(ruta, root).replace(os.sep, "/")
+                partes = doc_id.split("/")
+                profile_id = partes[0] if len(partes) > 1 else DEFAULT_PROFILE
+                vistos.add(doc_id)
+
+                # Comparamos los bytes antes de parsear: un PDF sin cambios no se vuelve a leer
+                fuente = _hash_file(ruta)
+                actual = self._docs.get(doc_id)
+                if actual is not None and actual.source_hash == fuente and actual.profile_id == profile_id:
+                    resumen["unchanged"] += 1
+                    continue
+                pendientes[ruta] = (doc_id, profile_id, fuente, actual is not None)
+
+        # Sólo se parsean los nuevos o modificados, repartidos entre `workers` procesos
+        for ruta, paginas in iter_documents(list(pendientes), workers=self.workers):
+            doc_id, profile_id, fuente, existia = pendientes[ruta]
+            texto = pages_text(paginas)
+            if self.add_document(doc_id, texto, profile_id=profile_id, path=ruta, source_hash=fuente, pages=paginas):
+                resumen["updated" if existia else "added"] += 1
+            else:
+                resumen["unchanged"] += 1
+
+        # Sólo se borran documentos bajo `root` (no los de /data/corpus2 al sincronizar /data/corpus)
+        raiz = os.path.abspath(root)
+        for doc in list(self._docs.values()):
+            if doc.path and os.path.commonpath([raiz, os.path.abspath(doc.path)]) == raiz and doc.doc_id not in vistos:
+                self.remove_document(doc.doc_id)
+                resumen["removed"] += 1
+
+        with self._lock:
+            for profile_id in set(self._meta) | set(datos):
+                if self._meta.get(profile_id) != datos.get(profile_id):
+                    self._perfiles.pop(profile_id, None)
+            self._meta = datos
+        return resumen
+
+    def compact(self) -> None:
+        """
+        Fusiona todos los documentos vivos en el índice invertido principal
+        y descarta delta y tombstones. Coste O(nnz total), sin reajustar nada.
+        """
+        with self._lock:
+            self._main = _Segmento(list(self._docs.values()))
+            self._delta = []
+            self._delta_segment = None
+
+    # ------------------------
+    # Consulta
+    # ------------------------
+    def _query_matrix(self, queries: list[str]) -> sp.csr_matrix:
+        qm = self.vectorizer.transform(queries).tocsr()
+        idf = np.log((1 + self._n_chunks) / (1 + self._df[qm.indices])) + 1.0
+        qm.data = qm.data * idf
+        return qm
+
+    def retrieve_batch(
+        self,
+        queries: list[str],
+        k: int = 3,
+        profile_id: Optional[str] = None,
+        doc_ids: Optional[Iterable[str]] = None,
+    ) -> list[list[tuple[str, float]]]:
+        """
+        Top-k chunks por consulta, opcionalmente restringido a un perfil
+        y/o a un conjunto de documentos. Devuelve (fragmento, score) por consulta.
+        """
+        if not queries:
+            return []
+        permitidos = set(doc_ids) if doc_ids is not None else None
+
+        with self._lock:
+            qm = self._query_matrix(queries)
+            if self._delta_segment is None:
+                self._delta_segment = _Segmento([self._docs[d] for d in self._delta])
+            por_segmento = [
+                segmento.search(qm, k, profile_id=profile_id, permitidos=permitidos)
+                for segmento in (self._main, self._delta_segment)
+            ]
+
+            resultados = []
+            for j in range(len(queries)):
+                candidatos = [c for res in por_segmento for c in res[j]]
+                candidatos.sort(key=lambda c: c[2], reverse=True)
+                resultados.append([(self._docs[doc_id].chunks[i], score) for doc_id, i, score in candidatos[:k]])
+            return resultados
+
+    def retrieve(
+        self,
+        query: str,
+        k: int = 3,
+        profile_id: Optional[str] = None,
+        doc_ids: Optional[Iterable[str]] = None,
+    ) -> list[str]:
+        return [p for p, _ in self.retrieve_batch([query], k=k, profile_id=profile_id, doc_ids=doc_ids)[0]]
+
+
+def firma_directorio(root: str) -> tuple:
+    """
+    (ruta, mtime, tamaño) de todos los ficheros bajo `root`: cambia si se
+    añade, borra o modifica alguno.
+    """
+    firma = []
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for nombre in filenames:
+            ruta = os.path.join(dirpath, nombre)
+            try:
+                st = os.stat(ruta)
+            except OSError:
+                continue
+            firma.append((ruta, st.st_mtime_ns, st.st_size))
+    return tuple(sorted(firma))
+
+
+def _leer_datos_perfil(directorio: str) -> Optional[dict]:
+    # {"name", "summary"} del directorio de un perfil, o None si no tiene ninguno
+    nombre, resumen, hay = None, "", False
+    ruta = os.path.join(directorio, PROFILE_FILE)
+    if os.path.isfile(ruta):
+        with open(ruta, encoding="utf-8") as f:
+            nombre = json.load(f).get("name")
+        hay = True
+    for fichero in SUMMARY_FILES:
+        ruta = os.path.join(directorio, fichero)
+        if os.path.isfile(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                resumen = f.read()
+            hay = True
+            break
+    return {"name": nombre, "summary": resumen} if hay else None
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
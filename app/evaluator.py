@@ -1,22 +1,73 @@
 # app/evaluator.py
 import json
+from functools import lru_cache
+from typing import Literal, Optional
 
 from pydantic import BaseModel, ValidationError
-from groq import Groq
 
-from app.config import GROQ_API_KEY, EVAL_MODEL
+from app.config import (
+    GROQ_API_KEY,
+    GROQ_BASE_URL,
+    EVAL_MODEL,
+    EVAL_CONTEXT_MODE,
+    EVAL_DIGEST_CHARS,
+    EVAL_GROUNDING,
+    LLM_SDK_RETRIES,
+)
+from app.utils import build_async_http_client, budget_messages, call_chat, call_chat_async
+from app.tokens import count_tokens, prompt_budget, MESSAGE_OVERHEAD
+from app.metrics import EVAL_GROUNDING_OUTCOMES, EVAL_VERDICTS
+from app.grounding import FactIndex, comprobar
 
-if not GROQ_API_KEY:
-    raise RuntimeError("GROQ_API_KEY no encontrada para evaluator. Revisa tu .env")
+GROUNDING_MODES = ("off", "shortcircuit", "local")
 
-client_llama = Groq(api_key=GROQ_API_KEY)
+
+# Los clientes (y el SDK de groq) se crean en la primera evaluación, no al
+# importar: así el módulo se puede importar sin clave y sin pagar el import.
+@lru_cache(maxsize=1)
+def get_client_llama():
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY no encontrada para evaluator. Revisa tu .env")
+    from groq import Groq
+
+    return Groq(api_key=GROQ_API_KEY, base_url=GROQ_BASE_URL, max_retries=LLM_SDK_RETRIES)
+
+
+@lru_cache(maxsize=1)
+def get_client_llama_async():
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY no encontrada para evaluator. Revisa tu .env")
+    from groq import AsyncGroq
+
+    return AsyncGroq(
+        api_key=GROQ_API_KEY,
+        base_url=GROQ_BASE_URL,
+        http_client=build_async_http_client(),
+        max_retries=LLM_SDK_RETRIES,
+    )
+
+
+async def aclose_clients() -> None:
+    """
+    Cierra el pool del cliente asíncrono si llegó a crearse.
+    """
+    if get_client_llama_async.cache_info().currsize:
+        await get_client_llama_async().close()
+        get_client_llama_async.cache_clear()
 
 
 class Evaluacion(BaseModel):
     es_aceptable: bool
     retroalimentacion: str
+    # Quién dio el veredicto: el LLM evaluador o el comprobador local (app/grounding.py)
+    source: Literal["llm", "grounding"] = "llm"
 
 
+# El prompt de sistema del evaluador es estático por perfil: se construye una vez
+# (lru_cache) y va siempre primero y byte a byte idéntico, para que el caché de
+# prompts del proveedor reutilice el prefijo. Todo lo que cambia por petición
+# (fragmentos, historial, respuesta) va después, en el mensaje de usuario.
+@lru_cache(maxsize=16)
 def build_system_prompt(nombre: str, resumen: str, perfil: str) -> str:
     return (
         f"Eres un evaluador que decide si una respuesta a una pregunta es aceptable.\n"
@@ -29,6 +80,33 @@ def build_system_prompt(nombre: str, resumen: str, perfil: str) -> str:
     )
 
 
+@lru_cache(maxsize=16)
+def build_profile_digest(resumen: str, max_chars: int = EVAL_DIGEST_CHARS) -> str:
+    """
+    Resumen compacto del perfil para el modo "compact": el resumen recortado
+    por frases hasta max_chars (sin el CV completo).
+    """
+    if len(resumen) <= max_chars:
+        return resumen.strip()
+    recorte = resumen[:max_chars]
+    corte = recorte.rfind(". ")
+    return (recorte[:corte + 1] if corte > 0 else recorte).strip()
+
+
+@lru_cache(maxsize=16)
+def build_compact_system_prompt(nombre: str, resumen: str) -> str:
+    return (
+        f"Eres un evaluador que decide si una respuesta a una pregunta es aceptable.\n"
+        f"Se te proporciona una conversación entre un Usuario y un AgenteIA que representa a {nombre}.\n"
+        f"El Agente debe ser profesional y atractivo (potencial cliente o empleador).\n\n"
+        f"## Perfil resumido de {nombre}:\n{build_profile_digest(resumen)}\n\n"
+        f"Con cada evaluación recibirás los fragmentos del CV relevantes para la pregunta: "
+        f"úsalos como evidencia; un dato que no esté ni en el perfil ni en los fragmentos no está respaldado.\n\n"
+        f"Instrucciones de salida: Responde EXCLUSIVAMENTE en JSON con la estructura exacta "
+        f'{{"es_aceptable": true|false, "retroalimentacion": "texto"}}, sin texto adicional.'
+    )
+
+
 def format_history_for_eval(historial) -> str:
     """
     Acepta history en formato:
@@ -64,9 +142,18 @@ def format_history_for_eval(historial) -> str:
     return "\n".join(lineas) if lineas else "(sin historial previo)"
 
 
-def build_user_prompt_for_eval(respuesta: str, mensaje: str, historial) -> str:
+def build_user_prompt_for_eval(
+    respuesta: str,
+    mensaje: str,
+    historial,
+    fragmentos: Optional[list[str]] = None,
+) -> str:
     hist_str = format_history_for_eval(historial)
+    evidencia = ""
+    if fragmentos:
+        evidencia = "Fragmentos del CV relevantes:\n" + "\n\n".join(f"- {f}" for f in fragmentos) + "\n\n"
     return (
+        f"{evidencia}"
         f"Conversación previa:\n{hist_str}\n\n"
         f"Último mensaje del Usuario:\n{mensaje}\n\n"
         f"Última respuesta del AgenteIA:\n{respuesta}\n\n"
@@ -75,33 +162,160 @@ def build_user_prompt_for_eval(respuesta: str, mensaje: str, historial) -> str:
     )
 
 
-def evaluar_respuesta(
+def build_eval_messages(
     nombre: str,
     resumen: str,
     perfil: str,
     respuesta: str,
     mensaje: str,
     historial,
-) -> Evaluacion:
-    system_prompt = build_system_prompt(nombre, resumen, perfil)
-    user_prompt = build_user_prompt_for_eval(respuesta, mensaje, historial)
+    fragmentos: Optional[list[str]] = None,
+    modo: str = EVAL_CONTEXT_MODE,
+) -> list[dict]:
+    """
+    modo "full": resumen + CV completo en el prompt de sistema.
+    modo "compact": perfil resumido en el sistema + sólo los fragmentos recuperados
+    en el mensaje de usuario (si no hay fragmentos se usa "full").
+    """
+    if modo == "compact" and fragmentos:
+        system_prompt = build_compact_system_prompt(nombre, resumen)
+    else:
+        system_prompt = build_system_prompt(nombre, resumen, perfil)
+        fragmentos = None
+
+    # El historial es lo único recortable: se deja el más reciente que quepa
+    # en el presupuesto del modelo evaluador junto al resto del prompt.
+    if historial and all(isinstance(x, dict) for x in historial):
+        fijo = count_tokens(system_prompt) + count_tokens(
+            build_user_prompt_for_eval(respuesta, mensaje, [], fragmentos)
+        ) + 2 * MESSAGE_OVERHEAD
+        historial = budget_messages(historial, max_tokens=prompt_budget(EVAL_MODEL) - fijo)
 
-    mensajes = [
+    user_prompt = build_user_prompt_for_eval(respuesta, mensaje, historial, fragmentos)
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt},
     ]
 
-    resp = client_llama.chat.completions.create(
-        model=EVAL_MODEL,
-        messages=mensajes,
-        response_format={"type": "json_object"},
-        temperature=0,
-    )
-    contenido = resp.choices[0].message.content
 
+def parse_evaluacion(contenido: str) -> Evaluacion:
     # Parse robusto
     try:
-        return Evaluacion.model_validate_json(contenido)
+        evaluacion = Evaluacion.model_validate_json(contenido)
     except ValidationError:
         data = json.loads(contenido)
-        return Evaluacion.model_validate(data)
\ No newline at end of file
+        evaluacion = Evaluacion.model_validate(data)
+    EVAL_VERDICTS.inc("accepted" if evaluacion.es_aceptable else "rejected")
+    return evaluacion
+
+
+@lru_cache(maxsize=16)
+def build_fact_index(perfil: str, resumen: str) -> FactIndex:
+    return FactIndex([perfil, resumen])
+
+
+def evaluacion_local(
+    perfil: str,
+    resumen: str,
+    respuesta: str,
+    mensaje: str,
+    modo: str = EVAL_GROUNDING,
+) -> Optional[Evaluacion]:
+    """
+    Veredicto del comprobador local (app/grounding.py) si es concluyente, o None
+    si hay que preguntar al LLM. En modo "local" los casos ambiguos se aceptan.
+    """
+    if modo not in GROUNDING_MODES:
+        raise ValueError(f"EVAL_GROUNDING desconocido: {modo!r} ({' | '.join(GROUNDING_MODES)})")
+    if modo == "off":
+        return None
+
+    comprobacion = comprobar(build_fact_index(perfil, resumen), respuesta, mensaje)
+    EVAL_GROUNDING_OUTCOMES.inc(comprobacion.veredicto)
+    if comprobacion.veredicto == "reject":
+        evaluacion = Evaluacion(
+            es_aceptable=False,
+            retroalimentacion=(
+                f"La respuesta incluye datos que no aparecen en el CV ni en el resumen: "
+                f"{', '.join(comprobacion.sin_respaldo)}. Elimínalos o corrígelos con información del perfil."
+            ),
+            source="grounding",
+        )
+    elif comprobacion.veredicto == "accept":
+        evaluacion = Evaluacion(
+            es_aceptable=True,
+            retroalimentacion="Los datos concretos de la respuesta aparecen en el perfil.",
+            source="grounding",
+        )
+    elif modo == "local":
+        evaluacion = Evaluacion(
+            es_aceptable=True,
+            retroalimentacion="Sin datos contradictorios con el perfil (comprobación local).",
+            source="grounding",
+        )
+    else:
+        return None
+    EVAL_VERDICTS.inc("accepted" if evaluacion.es_aceptable else "rejected")
+    return evaluacion
+
+
+def evaluar_respuesta(
+    nombre: str,
+    resumen: str,
+    perfil: str,
+    respuesta: str,
+    mensaje: str,
+    historial,
+    fragmentos: Optional[list[str]] = None,
+) -> Evaluacion:
+    """
+    Versión síncrona (para hilos y scripts, no para el event loop): la llamada
+    espera su cuota del LLMScheduler con prioridad "evaluator" igual que la
+    asíncrona.
+    """
+    local = evaluacion_local(perfil, resumen, respuesta, mensaje)
+    if local is not None:
+        return local
+    mensajes = build_eval_messages(nombre, resumen, perfil, respuesta, mensaje, historial, fragmentos)
+
+    resp = call_chat(
+        get_client_llama(),
+        EVAL_MODEL,
+        mensajes,
+        response_format={"type": "json_object"},
+        temperature=0,
+        priority="evaluator",
+    )
+    return parse_evaluacion(resp.choices[0].message.content)
+
+
+async def evaluar_respuesta_async(
+    nombre: str,
+    resumen: str,
+    perfil: str,
+    respuesta: str,
+    mensaje: str,
+    historial,
+    fragmentos: Optional[list[str]] = None,
+) -> Evaluacion:
+    """
+    Versión asíncrona de evaluar_respuesta (AsyncGroq), para no bloquear el event loop.
+    La llamada pasa por el LLMScheduler con prioridad "evaluator" y respeta el
+    plazo de la petición y el circuito de EVAL_MODEL: sin cuota, con el plazo
+    agotado o el circuito abierto lanza LLMUnavailable y quien llama decide
+    omitir la evaluación.
+    """
+    local = evaluacion_local(perfil, resumen, respuesta, mensaje)
+    if local is not None:
+        return local
+    mensajes = build_eval_messages(nombre, resumen, perfil, respuesta, mensaje, historial, fragmentos)
+
+    resp = await call_chat_async(
+        get_client_llama_async(),
+        EVAL_MODEL,
+        mensajes,
+        priority="evaluator",
+        response_format={"type": "json_object"},
+        temperature=0,
+    )
+    return parse_evaluacion(resp.choices[0].message.content)
\ No newline at end of file
@@ -0,0 +1,353 @@
+# app/frontend_client.py
+"""
+Cliente del backend para el frontend Gradio (sin dependencia de gradio).
+
+  - Un único httpx.AsyncClient compartido por todas las conversaciones, con
+    pool de conexiones keep-alive y HTTP/2 opcional (FRONTEND_HTTP2, requiere
+    el paquete `h2`).
+  - BackendPool: varias réplicas del backend (FRONTEND_BACKEND_URLS). Cada
+    mensaje va a la réplica sana con menos streams en curso; una réplica que
+    falla (conexión, 5xx) se marca caída y el mensaje se reintenta en otra si
+    todavía no se había mostrado nada. Un chequeo periódico de /healthz las
+    vuelve a dar de alta.
+  - Sesiones en el servidor: cada conversación crea una sesión en su réplica
+    y después sólo envía el mensaje nuevo (/sessions/{id}/messages/stream),
+    en lugar de reenviar todo el historial en cada turno. Si la sesión se
+    pierde (caducada o réplica caída) la conversación sigue con /chat/stream
+    y el historial que tiene el navegador.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Iterable, Optional
+
+import httpx
+
+from app.config import (
+    FRONTEND_BACKEND_URLS,
+    FRONTEND_HTTP2,
+    FRONTEND_MAX_CONNECTIONS,
+    FRONTEND_TIMEOUT,
+    FRONTEND_HEALTH_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Conversaciones con sesión en el servidor que se recuerdan (las más antiguas se olvidan)
+MAX_CONVERSACIONES = 10000
+
+# Chequeos de /healthz fallidos seguidos para dar una réplica por caída (un
+# backend saturado puede tardar en contestar uno sin estar caído)
+FALLOS_HEALTHZ = 2
+
+
+class _ParserSSE:
+    """
+    Parser incremental de Server-Sent Events: feed(línea) devuelve (event, data)
+    al cerrar un evento (línea vacía), con data ya decodificado de JSON.
+    """
+
+    def __init__(self):
+        self.event, self.data = "message", []
+
+    def feed(self, line: str) -> Optional[tuple[str, dict]]:
+        if not line:
+            res = (self.event, json.loads("\n".join(self.data))) if self.data else None
+            self.event, self.data = "message", []
+            return res
+        if line.startswith("event:"):
+            self.event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            self.data.append(line[len("data:"):].strip())
+        return None
+
+    def close(self) -> Optional[tuple[str, dict]]:
+        return self.feed("")
+
+
+def iter_sse(lines: Iterable[str]):
+    """
+    Parsea un stream Server-Sent Events línea a línea.
+    Devuelve tuplas (event, data) con data ya decodificado de JSON.
+    """
+    parser = _ParserSSE()
+    for line in lines:
+        evento = parser.feed(line)
+        if evento:
+            yield evento
+    evento = parser.close()
+    if evento:
+        yield evento
+
+
+async def aiter_sse(lines: AsyncIterator[str]):
+    parser = _ParserSSE()
+    async for line in lines:
+        evento = parser.feed(line)
+        if evento:
+            yield evento
+    evento = parser.close()
+    if evento:
+        yield evento
+
+
+@dataclass
+class Replica:
+    url: str
+    healthy: bool = True
+    in_flight: int = 0
+    failures: int = 0
+    last_check: float = 0.0
+
+
+class BackendPool:
+    """
+    Réplicas del backend con balanceo por menos streams en curso (empates en
+    round-robin) y chequeo de salud por /healthz.
+    """
+
+    def __init__(self, urls: list[str], clock: Callable[[], float] = time.monotonic):
+        if not urls:
+            raise ValueError("FRONTEND_BACKEND_URLS está vacío")
+        self.replicas = [Replica(u.rstrip("/")) for u in urls]
+        self.clock = clock
+        self._turno = 0
+        self._tarea: Optional[asyncio.Task] = None
+
+    def candidates(self) -> list[Replica]:
+        """
+        Réplicas en orden de preferencia. Si ninguna está sana se prueban
+        todas: mejor intentarlo que rechazar sin más.
+        """
+        self._turno = (self._turno + 1) % len(self.replicas)
+        rotadas = self.replicas[self._turno:] + self.replicas[:self._turno]
+        sanas = [r for r in rotadas if r.healthy] or rotadas
+        return sorted(sanas, key=lambda r: r.in_flight)  # sorted es estable: conserva la rotación
+
+    def get(self, url: str) -> Optional[Replica]:
+        return next((r for r in self.replicas if r.url == url), None)
+
+    def mark_down(self, replica: Replica, motivo: str = "") -> None:
+        if replica.healthy:
+            logger.warning("Backend %s marcado como caído: %s", replica.url, motivo)
+        replica.healthy = False
+        replica.failures += 1
+
+    def mark_up(self, replica: Replica) -> None:
+        if not replica.healthy:
+            logger.info("Backend %s de nuevo disponible", replica.url)
+        replica.healthy = True
+        replica.failures = 0
+
+    async def check(self, client: httpx.AsyncClient, timeout: float = 2.0) -> dict[str, bool]:
+        """
+        GET /healthz a todas las réplicas en paralelo; actualiza su estado.
+        """
+        async def una(replica: Replica) -> bool:
+            try:
+                resp = await client.get(f"{replica.url}/healthz", timeout=timeout)
+                ok = resp.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            replica.last_check = self.clock()
+            if ok:
+                self.mark_up(replica)
+            elif replica.healthy and replica.failures + 1 < FALLOS_HEALTHZ:
+                replica.failures += 1
+            else:
+                self.mark_down(replica, "healthz")
+            return ok
+
+        estados = await asyncio.gather(*(una(r) for r in self.replicas))
+        return {r.url: ok for r, ok in zip(self.replicas, estados)}
+
+    def start_health_checks(self, client: httpx.AsyncClient, interval: float) -> None:
+        """
+        Lanza (una vez por event loop) el chequeo periódico en segundo plano.
+        """
+        if self._tarea is not None and not self._tarea.done():
+            return
+
+        async def bucle():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.check(client)
+                except Exception:
+                    logger.exception("Error en el chequeo de salud de los backends")
+
+        self._tarea = asyncio.get_running_loop().create_task(bucle())
+
+
+class _SesionPerdida(Exception):
+    pass
+
+
+class _StreamFallido(Exception):
+    pass
+
+
+def build_frontend_http_client(http2: bool = FRONTEND_HTTP2, transport=None) -> httpx.AsyncClient:
+    if http2:
+        try:
+            import h2  # noqa: F401  (dependencia opcional de httpx[http2])
+        except ImportError:
+            logger.warning("FRONTEND_HTTP2=1 sin el paquete h2 instalado: se usa HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        transport=transport,
+        limits=httpx.Limits(
+            max_connections=FRONTEND_MAX_CONNECTIONS,
+            max_keepalive_connections=FRONTEND_MAX_CONNECTIONS,
+        ),
+        # read: tiempo máximo entre dos eventos del stream, no de la respuesta entera
+        timeout=httpx.Timeout(FRONTEND_TIMEOUT, connect=5.0),
+    )
+
+
+def _solo_rol_y_contenido(history: Optional[list]) -> list[dict]:
+    # Gradio añade campos propios (metadata, options...) que el backend no necesita
+    return [
+        {"role": m["role"], "content": m["content"]}
+        for m in history or []
+        if isinstance(m.get("content"), str)
+    ]
+
+
+class FrontendClient:
+    def __init__(
+        self,
+        urls: Optional[list[str]] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        health_interval: float = FRONTEND_HEALTH_INTERVAL,
+    ):
+        self.pool = BackendPool(urls or FRONTEND_BACKEND_URLS)
+        self.health_interval = health_interval
+        self._client = client
+        # conversación -> (url de la réplica, session_id)
+        self._sesiones: OrderedDict[str, tuple[str, str]] = OrderedDict()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Se crea en el primer uso, dentro del event loop que lo va a usar
+        if self._client is None:
+            self._client = build_frontend_http_client()
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def chat(self, conversation: str, message: str, history: Optional[list] = None) -> AsyncIterator[str]:
+        """
+        Generador asíncrono con la respuesta parcial según llegan los tokens.
+        `conversation` identifica la conversación (p.ej. el session_hash de
+        Gradio); con `history` vacío empieza una nueva.
+        """
+        if self.health_interval > 0:
+            self.pool.start_health_checks(self.client, self.health_interval)
+        history = _solo_rol_y_contenido(history)
+        if not history:
+            self._sesiones.pop(conversation, None)
+        sesion = self._sesiones.get(conversation)
+
+        intentos = self.pool.candidates()
+        if sesion is not None:
+            replica = self.pool.get(sesion[0])
+            if replica is not None and replica.healthy:
+                intentos = [replica] + [r for r in intentos if r is not replica]
+            else:
+                self._sesiones.pop(conversation, None)
+                sesion = None
+
+        ultimo_error = "ningún backend disponible"
+        while intentos:
+            replica = intentos.pop(0)
+            mostrado = False
+            try:
+                if sesion is not None and replica.url == sesion[0]:
+                    url, payload = f"{replica.url}/sessions/{sesion[1]}/messages/stream", {"message": message}
+                elif not history:
+                    session_id = await self._crear_sesion(replica)
+                    self._recordar(conversation, replica.url, session_id)
+                    url, payload = f"{replica.url}/sessions/{session_id}/messages/stream", {"message": message}
+                else:
+                    # La réplica no tiene la conversación: se envía el historial completo
+                    url, payload = f"{replica.url}/chat/stream", {"message": message, "history": history}
+
+                async for parcial in self._stream(replica, url, payload):
+                    mostrado = True
+                    yield parcial
+                return
+            except _SesionPerdida:
+                # Caducó en el servidor: misma réplica, ahora con el historial completo
+                self._sesiones.pop(conversation, None)
+                sesion = None
+                intentos.insert(0, replica)
+                continue
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 429:
+                    yield "Demasiadas peticiones seguidas; espera unos segundos y vuelve a intentarlo."
+                    return
+                if e.response.status_code == 503 and "retry-after" in e.response.headers:
+                    # Sin cuota del LLM (compartida por todas las réplicas): la réplica no está caída
+                    yield "El asistente está saturado ahora mismo; vuelve a intentarlo en unos segundos."
+                    return
+                ultimo_error = f"HTTP {e.response.status_code}"
+                if e.response.status_code >= 500:
+                    self.pool.mark_down(replica, ultimo_error)
+            except httpx.TransportError as e:
+                ultimo_error = str(e) or type(e).__name__
+                self.pool.mark_down(replica, ultimo_error)
+            except _StreamFallido as e:
+                ultimo_error = str(e)
+            if mostrado:
+                # ya se mostró parte de la respuesta: no la duplicamos en otra réplica
+                return
+            if sesion is not None and sesion[0] == replica.url:
+                # la conversación continúa en otra réplica, sin sesión
+                self._sesiones.pop(conversation, None)
+                sesion = None
+
+        yield f"Error al contactar con el backend: {ultimo_error}"
+
+    async def _crear_sesion(self, replica: Replica) -> str:
+        resp = await self.client.post(f"{replica.url}/sessions", json={})
+        resp.raise_for_status()
+        return resp.json()["session_id"]
+
+    def _recordar(self, conversation: str, url: str, session_id: str) -> None:
+        self._sesiones[conversation] = (url, session_id)
+        self._sesiones.move_to_end(conversation)
+        while len(self._sesiones) > MAX_CONVERSACIONES:
+            self._sesiones.popitem(last=False)
+
+    async def _stream(self, replica: Replica, url: str, payload: dict) -> AsyncIterator[str]:
+        parcial = ""
+        replica.in_flight += 1
+        try:
+            async with self.client.stream("POST", url, json=payload) as resp:
+                if resp.status_code == 404 and "/sessions/" in url:
+                    raise _SesionPerdida()
+                if resp.status_code >= 400:
+                    await resp.aread()
+                    resp.raise_for_status()
+                async for event, data in aiter_sse(resp.aiter_lines()):
+                    if event == "token":
+                        parcial += data.get("delta", "")
+                        yield parcial
+                    elif event == "final":
+                        # Si el evaluador la rechazó, "answer" trae la respuesta corregida
+                        yield data.get("answer", parcial)
+                        return
+                    elif event == "error":
+                        raise _StreamFallido(data.get("detail", "error en el stream"))
+            if not parcial:
+                raise _StreamFallido("stream vacío")
+        finally:
+            replica.in_flight -= 1
@@ -1,36 +1,27 @@
 # frontend_gradio.py
-import httpx
 import gradio as gr
 
+from app.config import FRONTEND_CONCURRENCY, FRONTEND_QUEUE_SIZE
+from app.frontend_client import FrontendClient
 
-BACKEND_URL = "http://127.0.0.1:8000/chat"
+# Un cliente (pool HTTP, réplicas, sesiones) compartido por todas las conversaciones
+cliente = FrontendClient()
 
 
-def gradio_chat(message, history):
+async def gradio_chat(message, history, request: gr.Request):
     """
     Gradio pasa:
       - message: str
       - history: List[Dict{role, content}]  (por type="messages")
-    Enviamos message + history al backend y devolvemos sólo 'answer'.
+      - request: para identificar la conversación (session_hash)
+    Generador asíncrono: va devolviendo la respuesta parcial según llegan
+    tokens sin ocupar un hilo por usuario. Si el evaluador la rechaza, el
+    último valor es la respuesta corregida. El historial vive en la sesión
+    del backend; sólo se reenvía si esa sesión se pierde.
     """
-    payload = {
-        "message": message,
-        "history": history or [],
-    }
-
-    # Llamada síncrona al backend
-    try:
-        resp = httpx.post(BACKEND_URL, json=payload, timeout=60)
-        resp.raise_for_status()
-    except httpx.HTTPError as e:
-        return f"Error al contactar con el backend: {e}"
-
-    data = resp.json()
-    answer = data.get("answer", "")
-
-    # Opcional: podríamos mostrar retroalimentación si evaluated == True
-    # pero por ahora devolvemos solo la respuesta del agente.
-    return answer
+    conversacion = getattr(request, "session_hash", None) or "anon"
+    async for parcial in cliente.chat(conversacion, message, history):
+        yield parcial
 
 
 demo = gr.ChatInterface(
@@ -39,6 +30,8 @@ demo = gr.ChatInterface(
     title="Asistente de CV de Nicolás",
     description="Hazme una pregunta sobre mi perfil profesional",
 )
+# Conversaciones atendidas a la vez y cola máxima; por encima Gradio rechaza en lugar de acumular
+demo.queue(default_concurrency_limit=FRONTEND_CONCURRENCY, max_size=FRONTEND_QUEUE_SIZE)
 
 if __name__ == "__main__":
     demo.launch()
@@ -0,0 +1,323 @@
+# app/gating.py
+"""
+Decidir si una respuesta pasa por el evaluador (que cuesta una llamada al LLM).
+
+  - HeuristicGate: la heurística de siempre (utils.should_evaluate: respuestas
+    largas o preguntas con palabras clave sensibles).
+  - ClassifierGate: un modelo lineal local estima la probabilidad de que el
+    evaluador rechace la respuesta y sólo se evalúa por encima de un umbral.
+    Además, una fracción `explore` de las respuestas que no se evaluarían se
+    evalúa igualmente, para que el registro de veredictos con el que se
+    reentrena no contenga sólo los casos que el modelo ya consideraba dudosos.
+
+Rasgos del modelo (GateModel):
+  - TF-IDF de la respuesta y de la pregunta con el vocabulario/IDF del índice
+    de recuperación (se copian al entrenar, así el modelo no depende de que el
+    índice cambie después).
+  - Señales de grounding frente a los fragmentos recuperados: solape de
+    unigramas/bigramas/trigramas, cifras de la respuesta que no aparecen en
+    los fragmentos, score del mejor fragmento, longitud y pregunta sensible.
+
+La inferencia es un producto escalar; se guarda como .npy/.json, igual que el
+índice. El entrenamiento está en app/train_gate.py y usa el registro de
+veredictos (VerdictLog, EVAL_LOG_PATH).
+"""
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from app.metrics import EVAL_GATE_DECISIONS
+from app.utils import should_evaluate, pregunta_sensible
+
+logger = logging.getLogger(__name__)
+
+DENSE_FEATURES = (
+    "overlap_1",
+    "overlap_2",
+    "overlap_3",
+    "unsupported_numbers",
+    "unsupported_number_ratio",
+    "top_score",
+    "log_chars",
+    "sensitive_question",
+)
+
+_PALABRA = re.compile(r"\w+")
+_NUMERO = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def _tokens(texto: str) -> list[str]:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _PALABRA.findall(texto)
+
+
+def _ngramas(tokens: list[str], n: int) -> set[tuple[str, ...]]:
+    return {tuple(tokens[i:i + n]) for i in range(len(tokens) - n + 1)}
+
+
+def grounding_features(
+    question: str,
+    answer: str,
+    passages: Optional[list[tuple[str, float]]],
+) -> list[float]:
+    """
+    Rasgos densos (en el orden de DENSE_FEATURES) de una respuesta frente a
+    los fragmentos recuperados. Sin fragmentos el solape es 0.
+    """
+    passages = passages or []
+    fuente = _tokens(" ".join(p for p, _ in passages))
+    resp = _tokens(answer)
+
+    rasgos = []
+    for n in (1, 2, 3):
+        de_respuesta = _ngramas(resp, n)
+        rasgos.append(len(de_respuesta & _ngramas(fuente, n)) / len(de_respuesta) if de_respuesta else 1.0)
+
+    cifras = set(_NUMERO.findall(answer))
+    sin_respaldo = cifras - set(_NUMERO.findall(" ".join(p for p, _ in passages)))
+    rasgos.append(float(len(sin_respaldo)))
+    rasgos.append(len(sin_respaldo) / len(cifras) if cifras else 0.0)
+
+    rasgos.append(max((float(s) for _, s in passages), default=0.0))
+    rasgos.append(math.log1p(len(answer)))
+    rasgos.append(float(pregunta_sensible(question)))
+    return rasgos
+
+
+class GateModel:
+    """
+    Regresión logística sobre [TF-IDF(respuesta) | TF-IDF(pregunta) | grounding
+    estandarizado]. predict_proba devuelve P(el evaluador rechaza).
+    """
+
+    def __init__(
+        self,
+        vectorizer,
+        coef,
+        intercept: float,
+        mean,
+        scale,
+        threshold: float = 0.5,
+        meta: Optional[dict] = None,
+    ):
+        import numpy as np
+
+        self.vectorizer = vectorizer
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.threshold = threshold
+        self.meta = meta or {}
+
+    @staticmethod
+    def design_matrix(vectorizer, questions: list[str], answers: list[str], passages: list, mean=None, scale=None):
+        """
+        Matriz de rasgos (CSR) y, si no se dan, media/escala de los rasgos densos.
+        """
+        import numpy as np
+        import scipy.sparse as sp
+
+        densos = np.array(
+            [grounding_features(q, a, p) for q, a, p in zip(questions, answers, passages)],
+            dtype=np.float64,
+        ).reshape(len(answers), len(DENSE_FEATURES))
+        if mean is None:
+            mean = densos.mean(axis=0)
+            scale = densos.std(axis=0)
+            scale[scale == 0] = 1.0
+        x = sp.hstack(
+            [vectorizer.transform(answers), vectorizer.transform(questions), sp.csr_matrix((densos - mean) / scale)],
+            format="csr",
+        )
+        return x, mean, scale
+
+    @classmethod
+    def fit(
+        cls,
+        vectorizer,
+        questions: list[str],
+        answers: list[str],
+        passages: list,
+        rejected: list[bool],
+        c: float = 1.0,
+    ) -> "GateModel":
+        from sklearn.linear_model import LogisticRegression
+
+        x, mean, scale = cls.design_matrix(vectorizer, questions, answers, passages)
+        clf = LogisticRegression(C=c, class_weight="balanced", max_iter=1000)
+        clf.fit(x, rejected)
+        return cls(vectorizer, clf.coef_[0], clf.intercept_[0], mean, scale)
+
+    def predict_proba(self, questions: list[str], answers: list[str], passages: list):
+        from scipy.special import expit
+
+        x, _, _ = self.design_matrix(self.vectorizer, questions, answers, passages, self.mean, self.scale)
+        return expit(x @ self.coef + self.intercept)
+
+    def save(self, path: str) -> None:
+        import numpy as np
+
+        os.makedirs(path, exist_ok=True)
+        vocab = sorted(self.vectorizer.vocabulary_, key=self.vectorizer.vocabulary_.get)
+        with open(os.path.join(path, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        np.save(os.path.join(path, "idf.npy"), self.vectorizer.idf_)
+        np.save(os.path.join(path, "coef.npy"), self.coef)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    **self.meta,
+                    "intercept": self.intercept,
+                    "dense_features": list(DENSE_FEATURES),
+                    "mean": self.mean.tolist(),
+                    "scale": self.scale.tolist(),
+                    "threshold": self.threshold,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "GateModel":
+        import numpy as np
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from app.retrieval import VECTORIZER_PARAMS
+
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("dense_features") != list(DENSE_FEATURES):
+            raise ValueError(f"Modelo de gating en {path} con rasgos distintos: reentrena con app.train_gate")
+        with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(vocab)}
+        vectorizer.idf_ = np.load(os.path.join(path, "idf.npy"))
+        return cls(
+            vectorizer,
+            np.load(os.path.join(path, "coef.npy")),
+            meta.pop("intercept"),
+            meta.pop("mean"),
+            meta.pop("scale"),
+            threshold=meta.pop("threshold"),
+            meta=meta,
+        )
+
+
+@dataclass
+class Decision:
+    evaluate: bool
+    p_reject: Optional[float] = None
+    explored: bool = False  # evaluada sólo por exploración
+
+
+class HeuristicGate:
+    def decide(self, question: str, answer: str, passages=None) -> Decision:
+        decision = Decision(evaluate=should_evaluate(answer, question))
+        EVAL_GATE_DECISIONS.inc("evaluate" if decision.evaluate else "skip")
+        return decision
+
+
+class ClassifierGate:
+    def __init__(
+        self,
+        model: GateModel,
+        threshold: Optional[float] = None,
+        explore: float = 0.0,
+        rng: Callable[[], float] = random.random,
+    ):
+        self.model = model
+        self.threshold = model.threshold if threshold is None else threshold
+        self.explore = explore
+        self.rng = rng
+
+    def decide(self, question: str, answer: str, passages=None) -> Decision:
+        p = float(self.model.predict_proba([question], [answer], [passages or []])[0])
+        if p >= self.threshold:
+            decision = Decision(True, p)
+        elif self.explore and self.rng() < self.explore:
+            decision = Decision(True, p, explored=True)
+        else:
+            decision = Decision(False, p)
+        EVAL_GATE_DECISIONS.inc("explore" if decision.explored else "evaluate" if decision.evaluate else "skip")
+        return decision
+
+
+def build_gate(mode: str, model_dir: str, threshold: Optional[float] = None, explore: float = 0.0):
+    """
+    mode: "heuristic" | "classifier". Sin modelo entrenado en `model_dir` el
+    clasificador cae a la heurística (con un aviso).
+    """
+    if mode == "heuristic":
+        return HeuristicGate()
+    if mode == "classifier":
+        if not os.path.exists(os.path.join(model_dir, "meta.json")):
+            logger.warning("EVAL_GATE=classifier sin modelo en %s: se usa la heurística", model_dir)
+            return HeuristicGate()
+        return ClassifierGate(GateModel.load(model_dir), threshold=threshold, explore=explore)
+    raise ValueError(f"EVAL_GATE desconocido: {mode!r} (heuristic | classifier)")
+
+
+class VerdictLog:
+    """
+    Registro JSONL de veredictos del evaluador: pregunta, respuesta, fragmentos
+    (texto y score), veredicto, quién lo dio (`source`: "llm" o "grounding")
+    y la decisión del gating. Los veredictos del LLM son el conjunto de
+    entrenamiento de app/train_gate.py.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def append(
+        self,
+        question: str,
+        answer: str,
+        passages: Optional[list[tuple[str, float]]],
+        es_aceptable: bool,
+        retroalimentacion: str = "",
+        decision: Optional[Decision] = None,
+        source: str = "llm",
+    ) -> None:
+        registro = {
+            "ts": time.time(),
+            "question": question,
+            "answer": answer,
+            "passages": [[p, float(s)] for p, s in (passages or [])],
+            "es_aceptable": es_aceptable,
+            "retroalimentacion": retroalimentacion,
+            "source": source,
+            "p_reject": decision.p_reject if decision else None,
+            "explored": decision.explored if decision else False,
+        }
+        linea = json.dumps(registro, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(linea)
+
+
+def read_verdicts(path: str, source: Optional[str] = None) -> list[dict]:
+    """
+    Registros de `path`; con `source`, sólo los de ese origen (los registros
+    anteriores al campo cuentan como "llm").
+    """
+    registros = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            if linea.strip():
+                registro = json.loads(linea)
+                if source is None or registro.get("source", "llm") == source:
+                    registros.append(registro)
+    return registros
@@ -0,0 +1,181 @@
+# app/grounding.py
+"""
+Comprobación local (CPU, determinista) de que los datos concretos de una
+respuesta están en el perfil, para no pagar el evaluador LLM en los casos
+claros.
+
+Se extraen de la respuesta las afirmaciones verificables:
+  - años (1990, 2021), cifras y duraciones ("5 años"),
+  - entidades: secuencias de palabras en mayúscula a mitad de frase
+    (empresas, universidades, títulos, tecnologías) y siglas (AWS, PMP),
+y se buscan en un índice de hechos construido con el CV y el resumen
+(texto normalizado sin tildes y conjunto de cifras).
+
+Veredicto:
+  - "reject": algún dato fuerte (año, cifra, entidad de varias palabras,
+    sigla) o dos débiles (entidad de una palabra) no aparecen en el perfil.
+  - "accept": hay al menos un dato comprobable y todos están respaldados.
+  - "ambiguous": el resto (sin datos, duraciones que pueden ser cálculos,
+    entidades sólo parcialmente presentes, datos que ya venían en la
+    pregunta...). Es lo único que llega al LLM.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+
+_NUMERO = re.compile(r"\d+(?:[.,]\d+)*")
+_PALABRA = re.compile(r"[^\W\d_][\w+#&.\-]*[\w+#]|[^\W\d_]")
+_FRASE = re.compile(r"(?<=[.!?])\s+|\n")
+_INCISO = re.compile(r"[,;:()/]")  # separan elementos de una enumeración
+_UNIDAD_DURACION = re.compile(r"\s*(?:\+\s*)?(?:años|año|meses|mes|semanas)\b", re.IGNORECASE)
+_ANIO = re.compile(r"(?:19|20)\d\d")
+
+# Palabras que pueden unir una entidad de varias palabras: "Universidad de Sevilla"
+_CONECTORES = {"de", "del", "la", "las", "los", "y", "&", "en"}
+
+# Prefijo con el que dos palabras cuentan como la misma ("Ingeniería" / "Ingeniero")
+_PREFIJO = 6
+
+
+def normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _tokens_norm(texto: str) -> list[str]:
+    return re.findall(r"\w+", normalizar(texto))
+
+
+def normalizar_numero(n: str) -> str:
+    """
+    "1.200" y "1200" -> "1200"; "3,5" -> "3.5".
+    """
+    if re.fullmatch(r"\d{1,3}(?:[.,]\d{3})+", n):
+        return re.sub(r"[.,]", "", n)
+    return n.replace(",", ".")
+
+
+@dataclass
+class Afirmacion:
+    texto: str
+    tipo: str  # "anio" | "numero" | "duracion" | "entidad" | "sigla"
+    estado: str = "pending"  # "supported" | "partial" | "unsupported" | "in_question"
+
+    @property
+    def fuerte(self) -> bool:
+        return self.tipo in {"anio", "numero", "sigla"} or (self.tipo == "entidad" and " " in self.texto)
+
+
+@dataclass
+class Comprobacion:
+    veredicto: str  # "accept" | "reject" | "ambiguous"
+    afirmaciones: list[Afirmacion] = field(default_factory=list)
+
+    @property
+    def sin_respaldo(self) -> list[str]:
+        return [a.texto for a in self.afirmaciones if a.estado == "unsupported"]
+
+
+def _es_mayuscula(token: str) -> bool:
+    return token[0].isupper()
+
+
+def extraer_afirmaciones(respuesta: str) -> list[Afirmacion]:
+    afirmaciones: list[Afirmacion] = []
+    vistas = set()
+
+    def agregar(texto: str, tipo: str) -> None:
+        if (texto, tipo) not in vistas:
+            vistas.add((texto, tipo))
+            afirmaciones.append(Afirmacion(texto, tipo))
+
+    for m in _NUMERO.finditer(respuesta):
+        n = m.group(0)
+        if _UNIDAD_DURACION.match(respuesta, m.end()):
+            agregar(normalizar_numero(n), "duracion")
+        elif _ANIO.fullmatch(n):
+            agregar(n, "anio")
+        elif len(n.strip(".,")) > 1:  # los dígitos sueltos suelen ser enumeraciones
+            agregar(normalizar_numero(n), "numero")
+
+    for frase in _FRASE.split(respuesta):
+        for n_inciso, inciso in enumerate(_INCISO.split(frase)):
+            palabras = [m.group(0) for m in _PALABRA.finditer(inciso)]
+            i = 0
+            while i < len(palabras):
+                if not _es_mayuscula(palabras[i]):
+                    i += 1
+                    continue
+                j = i + 1
+                while j < len(palabras) and (
+                    _es_mayuscula(palabras[j])
+                    or (palabras[j].lower() in _CONECTORES and j + 1 < len(palabras) and _es_mayuscula(palabras[j + 1]))
+                ):
+                    j += 1
+                run = palabras[i:j]
+                if i == 0 and n_inciso == 0:  # la primera palabra de la frase va en mayúscula por ortografía
+                    run = run[1:]
+                    while run and run[0].lower() in _CONECTORES:
+                        run = run[1:]
+                if run:
+                    texto = " ".join(run)
+                    if len(run) == 1 and run[0].isupper() and len(run[0]) > 2:
+                        agregar(texto, "sigla")
+                    elif len(run) > 1 or len(run[0]) > 2:
+                        agregar(texto, "entidad")
+                i = j
+    return afirmaciones
+
+
+class FactIndex:
+    """
+    Texto normalizado (para buscar entidades como secuencia de palabras) y
+    conjunto de cifras del perfil.
+    """
+
+    def __init__(self, textos: list[str]):
+        tokens = _tokens_norm(" ".join(textos))
+        self._texto = " " + " ".join(tokens) + " "
+        self._vocabulario = set(tokens)
+        self._prefijos = {t[:_PREFIJO] for t in tokens if len(t) >= _PREFIJO}
+        self._numeros = {normalizar_numero(n) for t in textos for n in _NUMERO.findall(t)}
+
+    def estado(self, afirmacion: Afirmacion) -> str:
+        if afirmacion.tipo in {"anio", "numero", "duracion"}:
+            if afirmacion.texto in self._numeros:
+                return "supported"
+            # una duración puede calcularse a partir de fechas del CV: lo decide el LLM
+            return "partial" if afirmacion.tipo == "duracion" else "unsupported"
+
+        tokens = _tokens_norm(afirmacion.texto)
+        if " " + " ".join(tokens) + " " in self._texto:
+            return "supported"
+        # Con alguna palabra ajena al perfil ("Universidad de Oxford") no puede
+        # estar; si todas aparecen sueltas ("Ingeniería Industrial") es dudosa
+        significativos = [t for t in tokens if t not in _CONECTORES]
+        if all(self._conoce(t) for t in significativos):
+            return "partial"
+        return "unsupported"
+
+    def _conoce(self, token: str) -> bool:
+        return token in self._vocabulario or (len(token) >= _PREFIJO and token[:_PREFIJO] in self._prefijos)
+
+
+def comprobar(indice: FactIndex, respuesta: str, pregunta: str = "") -> Comprobacion:
+    """
+    Clasifica la respuesta en accept / reject / ambiguous (ver el docstring del módulo).
+    """
+    afirmaciones = extraer_afirmaciones(respuesta)
+    pregunta_norm = " " + " ".join(_tokens_norm(pregunta)) + " "
+    for a in afirmaciones:
+        a.estado = indice.estado(a)
+        # "¿Has trabajado en Google?" -> "No, en Google no": el dato viene de la pregunta
+        if a.estado != "supported" and " " + " ".join(_tokens_norm(a.texto)) + " " in pregunta_norm:
+            a.estado = "in_question"
+
+    sin_respaldo = [a for a in afirmaciones if a.estado == "unsupported"]
+    if any(a.fuerte for a in sin_respaldo) or len(sin_respaldo) >= 2:
+        return Comprobacion("reject", afirmaciones)
+    if afirmaciones and all(a.estado == "supported" for a in afirmaciones):
+        return Comprobacion("accept", afirmaciones)
+    return Comprobacion("ambiguous", afirmaciones)
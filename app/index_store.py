@@ -0,0 +1,136 @@
+# app/index_store.py
+"""
+Índice de recuperación persistente y direccionado por contenido.
+
+La clave del índice es un hash de los bytes del PDF y de los parámetros de
+troceado/vectorización, así que un cambio de CV o de parámetros genera un
+índice nuevo y nunca se sirve uno obsoleto. Layout en disco:
+
+    <index_dir>/<clave>/
+        meta.json      parámetros y ruta de origen
+        texto.txt      texto completo del CV (para el evaluador)
+        chunks_meta.json  página, sección y offsets [start, end) en texto.txt de cada chunk
+        chunks.json, vocabulary.json, idf.npy, data.npy, indices.npy, indptr.npy, shape.json
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import sklearn
+
+from app.ingest import iter_pdf_pages, iter_paragraphs, chunk_paragraphs, tokenizer_id
+from app.retrieval import TfidfRetriever, VECTORIZER_PARAMS
+
+logger = logging.getLogger("agente_cv_index")
+
+# Súbelo si cambia el formato de los ficheros del índice
+INDEX_FORMAT_VERSION = 2
+
+
+def index_params(max_chars: int, max_tokens: int = 0, overlap_tokens: int = 0) -> dict:
+    return {
+        "format": INDEX_FORMAT_VERSION,
+        "max_chars": max_chars,
+        "max_tokens": max_tokens,
+        "overlap_tokens": overlap_tokens,
+        "tokenizer": tokenizer_id(max_tokens, overlap_tokens),
+        "vectorizer": {k: list(v) if isinstance(v, tuple) else v for k, v in VECTORIZER_PARAMS.items()},
+        "sklearn": sklearn.__version__,
+    }
+
+
+def index_key(pdf_path: str, max_chars: int, max_tokens: int = 0, overlap_tokens: int = 0) -> str:
+    h = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    h.update(json.dumps(index_params(max_chars, max_tokens, overlap_tokens), sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def build_index(
+    pdf_path: str,
+    index_dir: str,
+    max_chars: int = 1200,
+    max_tokens: int = 0,
+    overlap_tokens: int = 0,
+    workers: int = 1,
+) -> str:
+    """
+    Parsea el PDF, trocea, ajusta TF-IDF y guarda el índice. Devuelve su ruta.
+    Las páginas se extraen (en paralelo con `workers` > 1) y se trocean por
+    streaming: el texto se va escribiendo en texto.txt página a página.
+    Se escribe en un directorio temporal y se renombra al final, así que
+    varios workers construyendo a la vez nunca ven un índice a medias.
+    """
+    destino = os.path.join(index_dir, index_key(pdf_path, max_chars, max_tokens, overlap_tokens))
+    if os.path.isdir(destino):
+        return destino
+
+    logger.info("Construyendo índice de %s en %s", pdf_path, destino)
+    os.makedirs(index_dir, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=index_dir)
+    try:
+        with open(os.path.join(tmp, "texto.txt"), "w", encoding="utf-8") as f:
+
+            def paginas():
+                # Mismo texto que read_pdf_text: páginas no vacías separadas por una línea en blanco
+                separador = ""
+                for n, texto in iter_pdf_pages(pdf_path, workers=workers):
+                    if texto:
+                        f.write(separador + texto)
+                        separador = "\n\n"
+                    yield n, texto
+
+            chunks = list(chunk_paragraphs(
+                iter_paragraphs(paginas(), doc=os.path.basename(pdf_path)),
+                max_chars=max_chars,
+                max_tokens=max_tokens or None,
+                overlap_tokens=overlap_tokens,
+            ))
+
+        TfidfRetriever([c.text for c in chunks]).save(tmp)
+        with open(os.path.join(tmp, "chunks_meta.json"), "w", encoding="utf-8") as f:
+            json.dump([c.meta() for c in chunks], f, ensure_ascii=False)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"pdf_path": pdf_path, **index_params(max_chars, max_tokens, overlap_tokens)}, f)
+        os.rename(tmp, destino)
+    except OSError:
+        # Otro proceso ganó la carrera: nos quedamos con su índice
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(destino):
+            raise
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return destino
+
+
+def load_index(
+    pdf_path: str,
+    index_dir: str,
+    max_chars: int = 1200,
+    max_tokens: int = 0,
+    overlap_tokens: int = 0,
+    workers: int = 1,
+) -> tuple[str, TfidfRetriever]:
+    """
+    Devuelve (texto del CV, retriever) a partir del índice en disco,
+    construyéndolo si todavía no existe. El retriever se carga perezosamente.
+    """
+    ruta = build_index(pdf_path, index_dir, max_chars, max_tokens, overlap_tokens, workers)
+    with open(os.path.join(ruta, "texto.txt"), encoding="utf-8") as f:
+        texto = f.read()
+    return texto, TfidfRetriever.load(ruta)
+
+
+def load_chunk_meta(ruta: str) -> list[dict]:
+    """
+    Metadatos (doc, page, section, start, end) de cada chunk de un índice, en
+    el orden de chunks.json.
+    """
+    with open(os.path.join(ruta, "chunks_meta.json"), encoding="utf-8") as f:
+        return json.load(f)
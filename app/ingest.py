@@ -0,0 +1,327 @@
+# app/ingest.py
+"""
+Ingesta de documentos por streaming: páginas -> párrafos -> chunks.
+
+  - iter_pdf_pages: extrae el texto página a página. Con `workers > 1` reparte
+    rangos de páginas entre procesos (pypdf es CPU y no suelta el GIL) y las
+    devuelve en orden a medida que terminan. iter_documents hace lo mismo
+    con un documento por tarea, para directorios con muchos ficheros.
+  - iter_paragraphs: una línea no vacía es un párrafo; lleva documento,
+    página, sección (detectar_seccion sobre las cabeceras: "EXPERIENCIA
+    LABORAL", "## Formación"...) y su offset en el texto del documento (las
+    páginas unidas con una línea en blanco, como read_pdf_text y texto.txt).
+  - chunk_paragraphs: agrupa párrafos en chunks que no superan `max_chars` ni
+    `max_tokens`, sin cruzar secciones, con un solape de `overlap_tokens`
+    (párrafos completos del final del chunk anterior). Un párrafo que no cabe
+    se parte por frases, luego por palabras y, en último caso, por caracteres.
+
+Todo son generadores: el texto completo no se materializa y el indexador
+consume los chunks según se producen.
+"""
+import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Callable, Iterable, Iterator, Optional
+
+# Páginas por tarea al repartir un PDF entre procesos
+PAGES_PER_TASK = 8
+
+# Nombre canónico de sección -> cabeceras normalizadas (minúsculas, sin tildes)
+SECCIONES = {
+    "Experiencia": ("experiencia", "experiencia laboral", "experiencia profesional", "trayectoria profesional"),
+    "Formación": ("formacion", "formacion academica", "estudios", "estudios academicos", "educacion"),
+    "Habilidades": ("habilidades", "competencias", "conocimientos", "aptitudes", "skills", "tecnologias"),
+    "Idiomas": ("idiomas",),
+    "Certificaciones": ("certificaciones", "licencias y certificaciones", "cursos", "cursos y certificaciones"),
+    "Proyectos": ("proyectos", "portfolio"),
+    "Perfil": ("sobre mi", "perfil", "resumen", "extracto"),
+    "Contacto": ("contacto", "datos de contacto"),
+    "Otros": ("otros", "otros datos", "intereses", "aficiones"),
+}
+_ALIAS = {alias: nombre for nombre, aliases in SECCIONES.items() for alias in aliases}
+_ALIAS_MAS_LARGOS_PRIMERO = sorted(_ALIAS, key=len, reverse=True)
+_MAX_ALIAS = max(map(len, _ALIAS)) + 1  # con ":" final
+
+_CABECERA_MD = re.compile(r"^#{1,6}\s+")
+_FRASES = re.compile(r"(?<=[.!?])\s+")
+_PALABRAS = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class Parrafo:
+    text: str
+    doc: str
+    page: int
+    section: Optional[str]
+    start: int  # offset en el texto del documento
+
+
+@dataclass(frozen=True)
+class Chunk:
+    text: str
+    doc: str
+    page: int  # página del primer párrafo
+    section: Optional[str]
+    start: int  # [start, end) en el texto del documento
+    end: int
+
+    def meta(self) -> dict:
+        d = asdict(self)
+        del d["text"]
+        return d
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return " ".join("".join(c for c in texto if not unicodedata.combining(c)).split())
+
+
+def detectar_seccion(linea: str) -> Optional[str]:
+    """
+    Nombre canónico si la línea es una cabecera de sección, o None.
+    Reconoce los alias de SECCIONES (en cualquier caja, con ":" final o como
+    título Markdown) y, en mayúsculas, una cabecera que empieza por uno de
+    ellos ("ESTUDIOS ACADÉMICOS EXPERIENCIA LABORAL" en un CV a dos columnas).
+    Un título Markdown desconocido también abre sección, con su propio nombre.
+    """
+    markdown = bool(_CABECERA_MD.match(linea))
+    if not markdown and len(linea) > _MAX_ALIAS and not linea.isupper():
+        return None  # descarte rápido: la inmensa mayoría de líneas no son cabeceras
+    texto = _CABECERA_MD.sub("", linea).strip().rstrip(":").strip()
+    if not texto or len(texto) > 60:
+        return None
+    norm = _normalizar(texto)
+    if norm in _ALIAS:
+        return _ALIAS[norm]
+    if texto.isupper():
+        for alias in _ALIAS_MAS_LARGOS_PRIMERO:
+            if norm.startswith(alias + " "):
+                return _ALIAS[alias]
+    return texto if markdown else None
+
+
+# ------------------------
+# Extracción
+# ------------------------
+def _extraer_paginas(tarea: tuple[str, int, int]) -> list[tuple[int, str]]:
+    from pypdf import PdfReader
+
+    path, inicio, fin = tarea
+    lector = PdfReader(path)
+    return [(i + 1, (lector.pages[i].extract_text() or "").strip()) for i in range(inicio, fin)]
+
+
+def iter_pdf_pages(path: str, workers: int = 1, pages_per_task: int = PAGES_PER_TASK) -> Iterator[tuple[int, str]]:
+    """
+    (nº de página desde 1, texto sin espacios en los extremos), en orden.
+    """
+    from pypdf import PdfReader
+
+    lector = PdfReader(path)
+    n = len(lector.pages)
+    if workers <= 1 or n <= pages_per_task:
+        for i, pagina in enumerate(lector.pages):
+            yield i + 1, (pagina.extract_text() or "").strip()
+        return
+
+    tareas = [(path, i, min(n, i + pages_per_task)) for i in range(0, n, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(tareas))) as pool:
+        # map conserva el orden y entrega cada rango en cuanto está listo
+        for paginas in pool.map(_extraer_paginas, tareas):
+            yield from paginas
+
+
+def read_pages(path: str) -> list[tuple[int, str]]:
+    """
+    Páginas de un PDF, o el fichero de texto (TXT/MD) entero como página 1.
+    """
+    if path.lower().endswith(".pdf"):
+        return list(iter_pdf_pages(path))
+    with open(path, encoding="utf-8") as f:
+        return [(1, f.read())]
+
+
+def iter_documents(paths: list[str], workers: int = 1) -> Iterator[tuple[str, list[tuple[int, str]]]]:
+    """
+    (ruta, páginas) por documento, en el orden de `paths`, con un documento
+    por tarea repartido entre `workers` procesos.
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield path, read_pages(path)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        yield from zip(paths, pool.map(read_pages, paths))
+
+
+def pages_text(pages: Iterable[tuple[int, str]]) -> str:
+    """
+    Texto del documento: las páginas no vacías separadas por una línea en blanco.
+    """
+    return "\n\n".join(t for _, t in pages if t.strip())
+
+
+# ------------------------
+# Párrafos y chunks
+# ------------------------
+def iter_paragraphs(pages: Iterable[tuple[int, str]], doc: str = "") -> Iterator[Parrafo]:
+    """
+    Párrafos (líneas no vacías) con su sección y offset en pages_text(pages).
+    Las líneas de cabecera abren sección y también se emiten, para que el
+    nombre de la sección forme parte del primer chunk.
+    """
+    seccion: Optional[str] = None
+    base = 0
+    for n_pagina, texto in pages:
+        if not texto.strip():
+            continue
+        for m in re.finditer(r"[^\n]+", texto):
+            linea = m.group(0)
+            limpia = linea.strip()
+            if not limpia:
+                continue
+            seccion = detectar_seccion(limpia) or seccion
+            inicio = base + m.start() + (len(linea) - len(linea.lstrip()))
+            yield Parrafo(limpia, doc, n_pagina, seccion, inicio)
+        base += len(texto) + 2
+
+
+def _trozos(texto: str, separador: re.Pattern) -> list[tuple[int, int]]:
+    spans, inicio = [], 0
+    for m in separador.finditer(texto):
+        if m.start() > inicio:
+            spans.append((inicio, m.start()))
+        inicio = m.end()
+    if inicio < len(texto):
+        spans.append((inicio, len(texto)))
+    return spans
+
+
+def _partir(p: Parrafo, cabe: Callable[[str], bool], niveles=(_FRASES, _PALABRAS)) -> Iterator[Parrafo]:
+    """
+    Parte un párrafo que no cabe en un chunk en trozos que sí caben.
+    """
+    if cabe(p.text):
+        yield p
+        return
+    if not niveles:
+        # Ni una palabra cabe: corte duro por caracteres
+        lo, hi = 1, len(p.text) - 1  # el prefijo más largo que cabe
+        while lo < hi:
+            medio = (lo + hi + 1) // 2
+            lo, hi = (medio, hi) if cabe(p.text[:medio]) else (lo, medio - 1)
+        fin = lo
+        yield Parrafo(p.text[:fin], p.doc, p.page, p.section, p.start)
+        if p.text[fin:].strip():
+            resto = p.text[fin:]
+            desplazamiento = fin + len(resto) - len(resto.lstrip())
+            yield from _partir(Parrafo(resto.strip(), p.doc, p.page, p.section, p.start + desplazamiento), cabe, ())
+        return
+
+    grupo: Optional[tuple[int, int]] = None
+    for inicio, fin in _trozos(p.text, niveles[0]):
+        if grupo is not None and not cabe(p.text[grupo[0]:fin]):
+            yield from _partir(Parrafo(p.text[grupo[0]:grupo[1]], p.doc, p.page, p.section, p.start + grupo[0]), cabe, niveles[1:])
+            grupo = None
+        grupo = (grupo[0] if grupo else inicio, fin)
+    if grupo is not None:
+        yield from _partir(Parrafo(p.text[grupo[0]:grupo[1]], p.doc, p.page, p.section, p.start + grupo[0]), cabe, niveles[1:])
+
+
+def chunk_paragraphs(
+    paragraphs: Iterable[Parrafo],
+    max_chars: int = 1200,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    count: Optional[Callable[[str], int]] = None,
+) -> Iterator[Chunk]:
+    """
+    Chunks de párrafos consecutivos de la misma sección y documento (ver el
+    docstring del módulo). `count` cuenta tokens (por defecto, el contador
+    configurado en app/tokens.py); sólo se usa con max_tokens u overlap_tokens.
+    """
+    if count is None and (max_tokens or overlap_tokens):
+        from app.tokens import get_token_counter
+
+        count = get_token_counter().count
+
+    def medir(texto: str) -> int:
+        return count(texto) if count else 0
+
+    def cabe(chars: int, tokens: int) -> bool:
+        return chars <= max_chars and (not max_tokens or tokens <= max_tokens)
+
+    buf: list[tuple[Parrafo, int]] = []  # (párrafo, tokens)
+    solapados = 0  # párrafos del principio de buf que ya se emitieron en el chunk anterior
+    chars = tokens = 0  # del texto de buf unido con "\n"
+
+    def emitir() -> Chunk:
+        primero, ultimo = buf[0][0], buf[-1][0]
+        return Chunk(
+            "\n".join(p.text for p, _ in buf),
+            primero.doc,
+            primero.page,
+            primero.section,
+            primero.start,
+            ultimo.start + len(ultimo.text),
+        )
+
+    for parrafo in paragraphs:
+        if buf and (parrafo.section != buf[-1][0].section or parrafo.doc != buf[-1][0].doc):
+            if len(buf) > solapados:
+                yield emitir()
+            buf, solapados, chars, tokens = [], 0, 0, 0
+
+        for pieza in _partir(parrafo, lambda t: cabe(len(t), medir(t))):
+            t = medir(pieza.text)
+            if buf and not cabe(chars + 1 + len(pieza.text), tokens + t):
+                if len(buf) > solapados:
+                    yield emitir()
+                # Solape: párrafos completos del final mientras quepan en overlap_tokens
+                cola, acumulado = [], 0
+                for p, pt in reversed(buf):
+                    if not overlap_tokens or acumulado + pt > overlap_tokens:
+                        break
+                    cola.insert(0, (p, pt))
+                    acumulado += pt
+                # ...y siempre que quede sitio para el párrafo nuevo
+                while cola and not cabe(sum(len(p.text) + 1 for p, _ in cola) + len(pieza.text), acumulado + t):
+                    acumulado -= cola.pop(0)[1]
+                buf, solapados = cola, len(cola)
+                chars = sum(len(p.text) + 1 for p, _ in buf) - 1 if buf else 0
+                tokens = acumulado
+            chars += len(pieza.text) + (1 if buf else 0)
+            tokens += t
+            buf.append((pieza, t))
+
+    if len(buf) > solapados:
+        yield emitir()
+
+
+def tokenizer_id(max_tokens: Optional[int], overlap_tokens: int) -> Optional[str]:
+    """
+    Identifica el contador de tokens que usaría chunk_paragraphs (entra en la
+    clave del índice: otro tokenizer trocea distinto).
+    """
+    if not (max_tokens or overlap_tokens):
+        return None
+    from app.tokens import get_token_counter
+
+    counter = get_token_counter()
+    path = getattr(counter, "path", None)
+    return f"{type(counter).__name__}:{os.path.basename(path)}" if path else type(counter).__name__
+
+
+def ingest_pdf(
+    path: str,
+    max_chars: int = 1200,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: int = 0,
+    workers: int = 1,
+    doc: Optional[str] = None,
+) -> Iterator[Chunk]:
+    paginas = iter_pdf_pages(path, workers=workers)
+    parrafos = iter_paragraphs(paginas, doc=doc or os.path.basename(path))
+    return chunk_paragraphs(parrafos, max_chars=max_chars, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
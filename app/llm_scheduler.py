@@ -0,0 +1,352 @@
+# app/llm_scheduler.py
+"""
+Control de admisión de las llamadas al LLM.
+
+El agente (client_openai) y el evaluador (client_llama) comparten la cuenta de
+Groq, que limita peticiones (RPM) y tokens (TPM) por minuto y modelo. Sin
+coordinación, una ráfaga acaba en RateLimitError y en reintentos a ciegas.
+Todas las llamadas de call_chat_async y call_chat pasan por LLMScheduler:
+
+  - El coste de cada llamada se estima antes de enviarla (tokens del prompt
+    ya construido + max_tokens o LLM_COMPLETION_ESTIMATE de respuesta) y se
+    descuenta de una ventana deslizante por modelo (LLM_RATE_WINDOW, 60 s).
+    Al terminar se corrige con el `usage` real del proveedor y se fecha con
+    la llegada de la respuesta: con el proceso cargado la petición llega al
+    proveedor más tarde de lo que se concedió, y su ventana caduca después.
+  - Si no cabe, la llamada espera en una cola por prioridad: primero el
+    agente (el usuario está esperando), después los reintentos con
+    retroalimentación, el evaluador y por último los candidatos especulativos.
+  - Cada prioridad tiene una espera máxima (LLM_QUEUE_TIMEOUTS). Si la cuota
+    no llega a tiempo la llamada se descarta con LLMOverloaded: el backend
+    omite la evaluación (la respuesta sale sin evaluar) o, si era el agente,
+    responde 503 con Retry-After, en lugar de acumular 429 del proveedor.
+  - Un 429 del proveedor con Retry-After bloquea el modelo ese tiempo para
+    todas las llamadas, no sólo para la que lo recibió.
+
+La ruta síncrona (call_chat, desde hilos) espera con acquire_blocking en la
+misma cola, que vive en el event loop del proceso; sin event loop en marcha
+la espera se hace en uno temporal, una llamada síncrona cada vez.
+
+Los límites son por proceso: con varios workers hay que repartir la cuota
+(p.ej. LLM_RATE_LIMITS dividido entre el número de workers).
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from app.config import LLM_RATE_LIMITS, LLM_QUEUE_TIMEOUTS, LLM_COMPLETION_ESTIMATE, LLM_RATE_WINDOW
+from app.metrics import LLM_QUEUE_SECONDS, LLM_SHED
+from app.resilience import LLMUnavailable, remaining
+from app.tokens import get_token_counter
+
+logger = logging.getLogger(__name__)
+
+# Menor número = antes en la cola
+PRIORIDADES = {"agent": 0, "retry": 1, "evaluator": 2, "alternative": 3}
+
+# Espera máxima por prioridad (s). Los candidatos especulativos no esperan:
+# si no hay cuota libre se descartan sin más.
+TIMEOUTS_POR_DEFECTO = {"agent": 30.0, "retry": 30.0, "evaluator": 5.0, "alternative": 0.0}
+
+
+class LLMOverloaded(LLMUnavailable):
+    """
+    No hay cuota para la llamada dentro de la espera máxima de su prioridad.
+    """
+
+    def __init__(self, model: str, priority: str, retry_after: float):
+        super().__init__(f"Sin cuota del LLM para {model} ({priority}); reintentar en {retry_after:.1f}s", retry_after)
+        self.model = model
+        self.priority = priority
+
+
+@dataclass(frozen=True)
+class Limite:
+    rpm: int = 0  # 0 = sin límite
+    tpm: int = 0
+
+
+def parse_limits(spec: Optional[str]) -> dict[str, Limite]:
+    # "modelo=rpm/tpm,modelo2=rpm/tpm" (0 = sin límite en esa dimensión)
+    limites = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            modelo, valores = item.rsplit("=", 1)
+            rpm, _, tpm = valores.partition("/")
+            limites[modelo.strip()] = Limite(int(rpm or 0), int(tpm or 0))
+    return limites
+
+
+def parse_timeouts(spec: Optional[str]) -> dict[str, float]:
+    # "agent=30,evaluator=5"; las prioridades que no aparecen usan TIMEOUTS_POR_DEFECTO
+    timeouts = dict(TIMEOUTS_POR_DEFECTO)
+    for item in (spec or "").split(","):
+        if "=" in item:
+            prioridad, segundos = item.split("=", 1)
+            timeouts[prioridad.strip()] = float(segundos)
+    return timeouts
+
+
+@dataclass(eq=False)
+class Reserva:
+    model: str
+    tokens: int
+    t: float
+
+
+@dataclass
+class _Modelo:
+    limite: Limite
+    eventos: list = field(default_factory=list)  # Reserva dentro de la ventana
+    tokens: int = 0
+    bloqueado_hasta: float = 0.0
+    cola: list = field(default_factory=list)  # heap de (prioridad, orden, coste, future)
+    temporizador: Optional[asyncio.TimerHandle] = None
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        limits: Optional[dict[str, Limite]] = None,
+        timeouts: Optional[dict[str, float]] = None,
+        completion_estimate: int = LLM_COMPLETION_ESTIMATE,
+        window: float = LLM_RATE_WINDOW,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limits = limits or {}
+        self.timeouts = {**TIMEOUTS_POR_DEFECTO, **(timeouts or {})}
+        self.completion_estimate = completion_estimate
+        self.window = window
+        self.clock = clock
+        self._modelos: dict[str, _Modelo] = {}
+        self._orden = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # donde vive la cola
+        self._sin_loop = threading.Lock()  # esperas síncronas sin event loop en marcha
+
+    def estimate(self, messages: list[dict], max_tokens: Optional[int] = None) -> int:
+        """
+        Tokens que consumirá la llamada: prompt + respuesta máxima esperada.
+        """
+        return get_token_counter().count_messages(messages) + (max_tokens or self.completion_estimate)
+
+    def _modelo(self, model: str) -> _Modelo:
+        m = self._modelos.get(model)
+        if m is None:
+            m = self._modelos[model] = _Modelo(self.limits.get(model, Limite()))
+        return m
+
+    def _purgar(self, m: _Modelo, ahora: float) -> None:
+        limite = ahora - self.window
+        if any(e.t <= limite for e in m.eventos):
+            m.eventos = [e for e in m.eventos if e.t > limite]
+            m.tokens = sum(e.tokens for e in m.eventos)
+
+    def _coste(self, m: _Modelo, coste: int) -> int:
+        # Una llamada mayor que el TPM entero no cabría nunca: ocupa la ventana completa
+        return min(coste, m.limite.tpm) if m.limite.tpm else coste
+
+    def _espera(self, m: _Modelo, coste: int, ahora: float) -> float:
+        """
+        Segundos hasta que `coste` quepa en la ventana (0 = ya cabe).
+        """
+        espera = max(0.0, m.bloqueado_hasta - ahora)
+        # settle() re-fecha las reservas al terminar: no están ordenadas
+        eventos = sorted(m.eventos, key=lambda e: e.t)
+        if m.limite.rpm and len(eventos) >= m.limite.rpm:
+            espera = max(espera, eventos[len(eventos) - m.limite.rpm].t + self.window - ahora)
+        if m.limite.tpm and m.tokens + coste > m.limite.tpm:
+            sobran = m.tokens + coste - m.limite.tpm
+            for e in eventos:
+                sobran -= e.tokens
+                if sobran <= 0:
+                    espera = max(espera, e.t + self.window - ahora)
+                    break
+        return espera
+
+    def _conceder(self, model: str, m: _Modelo, coste: int, ahora: float) -> Reserva:
+        reserva = Reserva(model, coste, ahora)
+        m.eventos.append(reserva)
+        m.tokens += coste
+        return reserva
+
+    async def acquire(self, model: str, cost: int, priority: str = "agent") -> Reserva:
+        """
+        Espera (como mucho el timeout de `priority`, y nunca más allá del plazo
+        de la petición) a que haya cuota para `cost` tokens en `model` y la
+        reserva. Lanza LLMOverloaded si no llega.
+        """
+        self._loop = asyncio.get_running_loop()
+        m = self._modelo(model)
+        coste = self._coste(m, cost)
+        ahora = self.clock()
+        self._purgar(m, ahora)
+        espera = self._espera(m, coste, ahora)
+        if espera <= 0 and not m.cola:
+            LLM_QUEUE_SECONDS.observe(0.0, priority)
+            return self._conceder(model, m, coste, ahora)
+
+        timeout = self.timeouts.get(priority, 0.0)
+        queda = remaining()
+        if queda is not None:
+            timeout = max(0.0, min(timeout, queda))
+        if espera > timeout:
+            # Ni con la cola vacía llegaría a tiempo: se descarta ya, sin ocupar sitio
+            self._descartar(model, priority, espera)
+
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        heapq.heappush(m.cola, (PRIORIDADES.get(priority, len(PRIORIDADES)), next(self._orden), coste, futuro))
+        vencimiento = loop.call_later(timeout, self._vencer, futuro, model, priority)
+        self._despachar(model)
+        try:
+            reserva = await futuro
+        except asyncio.CancelledError:
+            # Cancelada con la cuota ya concedida: la llamada no se hará, se devuelve
+            if futuro.done() and not futuro.cancelled() and futuro.exception() is None:
+                self.release(futuro.result())
+            raise
+        finally:
+            vencimiento.cancel()
+        LLM_QUEUE_SECONDS.observe(self.clock() - ahora, priority)
+        return reserva
+
+    def _loop_ajeno(self) -> Optional[asyncio.AbstractEventLoop]:
+        # El event loop de la cola si está en marcha y no es el de este hilo
+        loop = self._loop
+        if loop is None or not loop.is_running():
+            return None
+        try:
+            actual = asyncio.get_running_loop()
+        except RuntimeError:
+            actual = None
+        if actual is loop:
+            raise RuntimeError("Llamada síncrona al LLM desde el event loop: usar call_chat_async")
+        return loop
+
+    def acquire_blocking(self, model: str, cost: int, priority: str = "agent") -> Reserva:
+        """
+        acquire() para código síncrono: bloquea el hilo hasta tener la reserva,
+        en la misma cola por prioridad que las llamadas asíncronas y con la
+        misma espera máxima. No se puede llamar desde el event loop.
+        """
+        loop = self._loop_ajeno()
+        if loop is not None:
+            # El contexto (plazo de la petición) viaja con la corrutina
+            return asyncio.run_coroutine_threadsafe(self.acquire(model, cost, priority), loop).result()
+        with self._sin_loop:
+            return asyncio.run(self.acquire(model, cost, priority))
+
+    def call_threadsafe(self, fn: Callable, *args) -> None:
+        """
+        Ejecuta `fn` (settle, penalize) en el event loop de la cola si está
+        en marcha en otro hilo; si no, aquí mismo.
+        """
+        loop = self._loop_ajeno()
+        if loop is not None:
+            loop.call_soon_threadsafe(fn, *args)
+        else:
+            with self._sin_loop:
+                fn(*args)
+
+    def _descartar(self, model: str, priority: str, retry_after: float):
+        LLM_SHED.inc(model, priority)
+        logger.warning("Llamada %s a %s descartada por falta de cuota (%.1fs)", priority, model, retry_after)
+        raise LLMOverloaded(model, priority, retry_after)
+
+    def _vencer(self, futuro: asyncio.Future, model: str, priority: str) -> None:
+        if futuro.done():
+            return
+        m = self._modelo(model)
+        try:
+            self._descartar(model, priority, max(self._espera(m, 0, self.clock()), 1.0))
+        except LLMOverloaded as e:
+            futuro.set_exception(e)
+        # Se saca de la cola en el siguiente despacho; puede desbloquear a los de detrás
+        self._despachar(model)
+
+    def _despachar(self, model: str) -> None:
+        """
+        Concede cuota a la cabeza de la cola mientras quepa; si no, programa
+        el siguiente intento para cuando se libere.
+        """
+        m = self._modelo(model)
+        if m.temporizador is not None:
+            m.temporizador.cancel()
+            m.temporizador = None
+        ahora = self.clock()
+        self._purgar(m, ahora)
+        while m.cola:
+            _, _, coste, futuro = m.cola[0]
+            if futuro.done():  # vencida o cancelada
+                heapq.heappop(m.cola)
+                continue
+            espera = self._espera(m, coste, ahora)
+            if espera > 0:
+                m.temporizador = futuro.get_loop().call_later(espera, self._despachar, model)
+                return
+            heapq.heappop(m.cola)
+            futuro.set_result(self._conceder(model, m, coste, ahora))
+
+    def settle(self, reserva: Reserva, tokens: Optional[int] = None) -> None:
+        """
+        Llamada terminada: la reserva cuenta desde ahora y, si se conocen,
+        con los tokens reales (usage del proveedor) en vez de la estimación.
+        """
+        m = self._modelo(reserva.model)
+        reserva.t = max(reserva.t, self.clock())
+        if isinstance(tokens, int) and tokens != reserva.tokens:
+            if reserva in m.eventos:
+                m.tokens += tokens - reserva.tokens
+            reserva.tokens = tokens
+            if m.cola:
+                self._despachar(reserva.model)
+
+    def release(self, reserva: Reserva) -> None:
+        """
+        Reserva concedida que no llegó a usarse: sale de la ventana.
+        """
+        m = self._modelo(reserva.model)
+        if reserva in m.eventos:
+            m.eventos.remove(reserva)
+            m.tokens -= reserva.tokens
+            if m.cola:
+                self._despachar(reserva.model)
+
+    def penalize(self, model: str, retry_after: float) -> None:
+        """
+        El proveedor devolvió 429 con Retry-After: nadie llama a `model` hasta entonces.
+        """
+        m = self._modelo(model)
+        m.bloqueado_hasta = max(m.bloqueado_hasta, self.clock() + retry_after)
+        if m.cola:
+            self._despachar(model)
+
+    def snapshot(self) -> dict:
+        ahora = self.clock()
+        res = {}
+        for model, m in self._modelos.items():
+            self._purgar(m, ahora)
+            res[model] = {
+                "rpm_limit": m.limite.rpm,
+                "tpm_limit": m.limite.tpm,
+                "requests_last_window": len(m.eventos),
+                "tokens_last_window": m.tokens,
+                "queued": sum(1 for *_, f in m.cola if not f.done()),
+                "blocked_s": max(0.0, m.bloqueado_hasta - ahora),
+            }
+        return res
+
+
+_scheduler: Optional[LLMScheduler] = None
+
+
+def get_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler(parse_limits(LLM_RATE_LIMITS), parse_timeouts(LLM_QUEUE_TIMEOUTS))
+    return _scheduler
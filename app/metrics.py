@@ -0,0 +1,300 @@
+# app/metrics.py
+"""
+Métricas en formato de texto de Prometheus, sin dependencias externas.
+
+Los colectores viven en memoria del proceso (un dict por métrica y un lock),
+así que registrar una observación cuesta unos microsegundos. Con varios workers
+de uvicorn cada uno vuelca su estado a METRICS_DIR/<pid>.json cada
+METRICS_FLUSH_INTERVAL segundos (y al servir /metrics); el worker que atiende
+/metrics suma los ficheros de todos, de modo que los contadores e histogramas
+son los del servicio entero y no sólo los del worker que responde.
+"""
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.config import METRICS_DIR
+from app.tokens import get_token_counter
+
+# Latencias de 5 ms a 60 s: cubre recuperación local y llamadas al LLM
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _formatear_labels(nombres: tuple[str, ...], valores: tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    tipo = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._valores: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._valores[labels] = self._valores.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._valores.get(labels, 0.0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {json.dumps(k): v for k, v in self._valores.items()}
+
+    @staticmethod
+    def merge(a: dict, b: dict) -> dict:
+        res = dict(a)
+        for k, v in b.items():
+            res[k] = res.get(k, 0.0) + v
+        return res
+
+    def render(self, estado: dict) -> list[str]:
+        return [
+            f"{self.name}{_formatear_labels(self.labelnames, tuple(json.loads(k)))} {v}"
+            for k, v in sorted(estado.items())
+        ]
+
+
+class Histogram:
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # por labels: [conteos por bucket (no acumulados) + overflow, suma]
+        self._valores: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            estado = self._valores.get(labels)
+            if estado is None:
+                estado = self._valores[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            estado[0][i] += 1
+            estado[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def count(self, *labels: str) -> int:
+        estado = self._valores.get(labels)
+        return sum(estado[0]) if estado else 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {json.dumps(k): [list(c), s] for k, (c, s) in self._valores.items()}
+
+    @staticmethod
+    def merge(a: dict, b: dict) -> dict:
+        res = {k: [list(c), s] for k, (c, s) in a.items()}
+        for k, (c, s) in b.items():
+            if k in res:
+                res[k] = [[x + y for x, y in zip(res[k][0], c)], res[k][1] + s]
+            else:
+                res[k] = [list(c), s]
+        return res
+
+    def render(self, estado: dict) -> list[str]:
+        lineas = []
+        for k, (conteos, suma) in sorted(estado.items()):
+            labels = tuple(json.loads(k))
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), conteos):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                etiquetas = _formatear_labels(self.labelnames, labels, 'le="' + le + '"')
+                lineas.append(f"{self.name}_bucket{etiquetas} {acumulado}")
+            lineas.append(f"{self.name}_sum{_formatear_labels(self.labelnames, labels)} {suma}")
+            lineas.append(f"{self.name}_count{_formatear_labels(self.labelnames, labels)} {acumulado}")
+        return lineas
+
+
+class Registry:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._metricas: dict[str, object] = {}
+
+    def register(self, metrica):
+        self._metricas[metrica.name] = metrica
+        return metrica
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, **kwargs))
+
+    def snapshot(self) -> dict:
+        return {nombre: m.snapshot() for nombre, m in self._metricas.items()}
+
+    def flush(self) -> None:
+        """
+        Vuelca el estado de este worker a su fichero (escritura atómica).
+        """
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        ruta = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp = f"{ruta}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, ruta)
+
+    def collect(self) -> dict:
+        """
+        Estado agregado: este proceso + los ficheros del resto de workers.
+        """
+        estado = self.snapshot()
+        if not self.directory:
+            return estado
+        propio = os.path.join(self.directory, f"{os.getpid()}.json")
+        for ruta in glob.glob(os.path.join(self.directory, "*.json")):
+            if ruta == propio:
+                continue
+            try:
+                with open(ruta, encoding="utf-8") as f:
+                    otro = json.load(f)
+            except (OSError, ValueError):
+                continue  # fichero a medio escribir o de un worker que ya no existe
+            for nombre, valores in otro.items():
+                if nombre in self._metricas:
+                    estado[nombre] = self._metricas[nombre].merge(estado.get(nombre, {}), valores)
+        return estado
+
+    def render(self) -> str:
+        estado = self.collect()
+        lineas = []
+        for nombre, m in self._metricas.items():
+            lineas.append(f"# HELP {nombre} {m.documentation}")
+            lineas.append(f"# TYPE {nombre} {m.tipo}")
+            lineas += m.render(estado.get(nombre, {}))
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRY = Registry(METRICS_DIR)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "agente_cv_stage_seconds",
+    "Latencia por etapa del pipeline de /chat",
+    ("stage",),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "agente_cv_request_seconds",
+    "Latencia total por endpoint",
+    ("endpoint",),
+)
+LLM_RETRIES = REGISTRY.counter(
+    "agente_cv_llm_retries_total",
+    "Reintentos de llamadas al LLM (tenacity), por modelo y excepción",
+    ("model", "error"),
+)
+EVAL_VERDICTS = REGISTRY.counter(
+    "agente_cv_evaluator_verdicts_total",
+    "Veredictos del evaluador",
+    ("verdict",),
+)
+EVAL_GROUNDING_OUTCOMES = REGISTRY.counter(
+    "agente_cv_eval_grounding_total",
+    "Resultados del comprobador local de datos (accept, reject, ambiguous)",
+    ("outcome",),
+)
+EVAL_GATE_DECISIONS = REGISTRY.counter(
+    "agente_cv_eval_gate_decisions_total",
+    "Decisiones del gating del evaluador (evaluate, skip, explore)",
+    ("decision",),
+)
+LLM_TOKENS = REGISTRY.counter(
+    "agente_cv_llm_tokens_total",
+    "Tokens de prompt/respuesta por modelo (usage del proveedor o estimados)",
+    ("model", "kind"),
+)
+RATE_LIMITED = REGISTRY.counter(
+    "agente_cv_rate_limited_total",
+    "Peticiones rechazadas por el rate limiter, por presupuesto",
+    ("budget",),
+)
+
+LLM_QUEUE_SECONDS = REGISTRY.histogram(
+    "agente_cv_llm_queue_seconds",
+    "Espera por cuota del LLM (app/llm_scheduler.py), por prioridad",
+    ("priority",),
+)
+LLM_SHED = REGISTRY.counter(
+    "agente_cv_llm_shed_total",
+    "Llamadas al LLM descartadas por falta de cuota, por modelo y prioridad",
+    ("model", "priority"),
+)
+
+LLM_CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "agente_cv_llm_circuit_transitions_total",
+    "Aperturas y cierres del circuit breaker por modelo",
+    ("model", "state"),
+)
+LLM_FALLBACKS = REGISTRY.counter(
+    "agente_cv_llm_fallbacks_total",
+    "Llamadas al modelo de reserva, por modelo y motivo (error, circuit_open, hedge)",
+    ("model", "reason"),
+)
+
+CONTEXT_TOKENS = REGISTRY.histogram(
+    "agente_cv_context_tokens",
+    "Tokens de los fragmentos recuperados por petición: completos (retrieved), en el prompt (sent) y ahorrados (saved)",
+    ("kind",),
+    buckets=(0, 50, 100, 200, 400, 800, 1600, 3200),
+)
+
+PROFILE_RELOADS = REGISTRY.counter(
+    "agente_cv_profile_reloads_total",
+    "Recargas del perfil (CV, índice y resumen) por resultado (reloaded, unchanged, error)",
+    ("outcome",),
+)
+
+
+def record_usage(model: str, messages: list[dict], resp=None, completion: Optional[str] = None) -> None:
+    """
+    Suma los tokens de una llamada: los del `usage` de la respuesta si el
+    proveedor los da y, si no (p.ej. streaming), una estimación con app.tokens.
+    """
+    usage = getattr(resp, "usage", None)
+    prompt = getattr(usage, "prompt_tokens", None)
+    salida = getattr(usage, "completion_tokens", None)
+    counter = get_token_counter()
+    if not isinstance(prompt, int):
+        prompt = counter.count_messages(messages)
+    if not isinstance(salida, int):
+        if completion is None and resp is not None and getattr(resp, "choices", None):
+            completion = getattr(resp.choices[0].message, "content", None)
+        salida = counter.count(completion) if completion else 0
+    LLM_TOKENS.inc(model or "", "prompt", amount=prompt)
+    if salida:
+        LLM_TOKENS.inc(model or "", "completion", amount=salida)
@@ -0,0 +1,236 @@
+# app/pipeline.py
+"""
+Orquestación agente -> evaluador -> reintento con distintos grados de solape.
+
+  - "sequential": generar, evaluar y, si se rechaza, reintentar con la
+    retroalimentación. Una respuesta rechazada cuesta tres viajes completos.
+  - "speculative": en cuanto la respuesta necesita evaluación se lanza a la vez
+    un candidato alternativo (más conservador). Si el evaluador acepta la
+    primera se descarta; si la rechaza, la alternativa ya está (casi) lista.
+    Latencia en el peor caso ~ agente + max(evaluador, agente).
+  - "parallel": para preguntas sensibles los dos candidatos se generan a la vez
+    desde el principio y el evaluador juzga ambos en paralelo; gana el primero
+    aceptado. Sólo si se rechazan los dos se reintenta con retroalimentación.
+
+Las etapas se inyectan como corrutinas (Etapas), así que el mismo código sirve
+para el backend y para la simulación de benchmarks/bench_pipeline.py. Con el
+LLM sin cuota (app/llm_scheduler.py) el evaluador y la alternativa pueden
+devolver None: la respuesta sale sin evaluar, o se corrige con reintentar (lo
+mismo si el candidato alternativo falla por un error transitorio). Cada
+ejecución deja su coste (llamadas al LLM, llamadas desperdiciadas) y latencia
+en PipelineStats.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from app.resilience import LLMUnavailable
+from app.utils import error_transitorio, should_evaluate, pregunta_sensible
+
+MODOS = ("sequential", "speculative", "parallel")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Etapas:
+    generar: Callable[[], Awaitable[str]]  # respuesta del agente
+    alternativa: Callable[[], Awaitable[Optional[str]]]  # segundo candidato (None = descartado)
+    evaluar: Callable[[str], Awaitable]  # respuesta -> Evaluacion (None = evaluación omitida)
+    reintentar: Callable[[str, str], Awaitable[str]]  # (respuesta, retroalimentación) -> respuesta
+    # respuesta -> ¿evaluar? (gating, app/gating.py); por defecto utils.should_evaluate
+    debe_evaluar: Optional[Callable[[str], bool]] = None
+
+
+@dataclass
+class Resultado:
+    answer: str
+    evaluated: bool
+    es_aceptable: Optional[bool] = None
+    retroalimentacion: Optional[str] = None
+    replaced: bool = False
+
+
+@dataclass
+class Coste:
+    agent_calls: int = 0
+    eval_calls: int = 0
+    wasted_calls: int = 0  # llamadas lanzadas cuyo resultado no se usó
+    latency: float = 0.0
+
+
+class PipelineStats:
+    """
+    Agregados por modo: peticiones, llamadas al LLM y percentiles de latencia
+    (sobre las últimas `window` peticiones).
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._modos: dict[str, dict] = {}
+
+    def record(self, modo: str, coste: Coste, resultado: Resultado) -> None:
+        m = self._modos.setdefault(modo, {
+            "requests": 0, "evaluated": 0, "replaced": 0,
+            "agent_calls": 0, "eval_calls": 0, "wasted_calls": 0,
+            "latencias": deque(maxlen=self.window),
+        })
+        m["requests"] += 1
+        m["evaluated"] += int(resultado.evaluated)
+        m["replaced"] += int(resultado.replaced)
+        m["agent_calls"] += coste.agent_calls
+        m["eval_calls"] += coste.eval_calls
+        m["wasted_calls"] += coste.wasted_calls
+        m["latencias"].append(coste.latency)
+
+    def snapshot(self) -> dict:
+        import numpy as np
+
+        res = {}
+        for modo, m in self._modos.items():
+            lat = np.array(m["latencias"]) if m["latencias"] else np.zeros(1)
+            n = m["requests"]
+            res[modo] = {
+                **{k: v for k, v in m.items() if k != "latencias"},
+                "llm_calls_per_request": (m["agent_calls"] + m["eval_calls"]) / n,
+                "p50_s": float(np.percentile(lat, 50)),
+                "p95_s": float(np.percentile(lat, 95)),
+                "p99_s": float(np.percentile(lat, 99)),
+            }
+        return res
+
+
+def _aceptada(respuesta: str, ev) -> Resultado:
+    # Aceptada por el evaluador, o sin evaluar si la evaluación se omitió (ev None)
+    if ev is None:
+        return Resultado(answer=respuesta, evaluated=False)
+    return Resultado(respuesta, True, True, ev.retroalimentacion)
+
+
+async def _candidato(tarea: asyncio.Task) -> Optional[str]:
+    # Sin cuota o con un error transitorio el segundo candidato se da por descartado (None)
+    try:
+        return await tarea
+    except Exception as e:
+        if not (isinstance(e, LLMUnavailable) or error_transitorio(e)):
+            raise
+        logger.warning("Candidato alternativo no disponible (%s): se recurre al reintento", e)
+        return None
+
+
+async def _descartar(tarea: Optional[asyncio.Task], coste: Coste, llamadas: int = 1) -> None:
+    if tarea is None:
+        return
+    if not tarea.done():
+        tarea.cancel()
+    coste.wasted_calls += llamadas
+    try:
+        await tarea
+    except BaseException:  # cancelada o fallida: su resultado ya no importa
+        pass
+
+
+async def ejecutar(
+    modo: str,
+    etapas: Etapas,
+    user_msg: str,
+    respuesta: Optional[str] = None,
+    stats: Optional[PipelineStats] = None,
+) -> Resultado:
+    """
+    Ejecuta el pipeline en `modo`. Si `respuesta` ya viene generada (streaming),
+    empieza en la decisión de evaluar; "parallel" se comporta entonces como
+    "speculative" porque el primer candidato ya existe.
+    """
+    if modo not in MODOS:
+        raise ValueError(f"PIPELINE_MODE desconocido: {modo!r} ({' | '.join(MODOS)})")
+
+    t0 = time.perf_counter()
+    coste = Coste()
+    alternativa: Optional[asyncio.Task] = None
+
+    async def generar_alternativa() -> str:
+        coste.agent_calls += 1
+        return await etapas.alternativa()
+
+    async def evaluar(r: str):
+        coste.eval_calls += 1
+        return await etapas.evaluar(r)
+
+    try:
+        if respuesta is None:
+            if modo == "parallel" and pregunta_sensible(user_msg):
+                alternativa = asyncio.create_task(generar_alternativa())
+            coste.agent_calls += 1
+            respuesta = await etapas.generar()
+
+        hay_que_evaluar = etapas.debe_evaluar(respuesta) if etapas.debe_evaluar else should_evaluate(respuesta, user_msg)
+        if not hay_que_evaluar:
+            await _descartar(alternativa, coste)
+            resultado = Resultado(answer=respuesta, evaluated=False)
+
+        elif modo == "sequential":
+            ev = await evaluar(respuesta)
+            if ev is None:  # evaluador sin cuota: la respuesta sale sin evaluar
+                resultado = Resultado(answer=respuesta, evaluated=False)
+            else:
+                resultado = Resultado(respuesta, True, ev.es_aceptable, ev.retroalimentacion)
+                if not ev.es_aceptable:
+                    coste.agent_calls += 1
+                    resultado.answer = await etapas.reintentar(respuesta, ev.retroalimentacion)
+                    resultado.replaced = True
+
+        elif modo == "speculative" or alternativa is None:
+            alternativa = asyncio.create_task(generar_alternativa())
+            ev = await evaluar(respuesta)
+            if ev is None or ev.es_aceptable:
+                await _descartar(alternativa, coste)
+                resultado = _aceptada(respuesta, ev)
+            else:
+                resultado = Resultado(respuesta, True, False, ev.retroalimentacion, replaced=True)
+                resultado.answer = await _candidato(alternativa)
+                if resultado.answer is None:  # alternativa descartada: reintento con retroalimentación
+                    coste.agent_calls += 1
+                    resultado.answer = await etapas.reintentar(respuesta, ev.retroalimentacion)
+            alternativa = None
+
+        else:  # parallel con los dos candidatos en marcha
+            segundo = alternativa
+            alternativa = None
+
+            evaluando = False
+
+            async def evaluar_segundo():
+                nonlocal evaluando
+                otra = await _candidato(segundo)
+                if otra is None:
+                    return None, None
+                evaluando = True
+                return otra, await evaluar(otra)
+
+            ev1 = asyncio.create_task(evaluar(respuesta))
+            ev2 = asyncio.create_task(evaluar_segundo())
+            ev = await ev1
+            if ev is None or ev.es_aceptable:
+                # el segundo candidato (y su evaluación si ya empezó) no se usa
+                await _descartar(ev2, coste, llamadas=2 if evaluando else 1)
+                resultado = _aceptada(respuesta, ev)
+            else:
+                otra, ev_otra = await ev2
+                resultado = Resultado(otra or respuesta, True, False, ev.retroalimentacion, replaced=True)
+                # sin segundo candidato, o también rechazado: reintento con la retroalimentación
+                # (si su evaluación se omitió por falta de cuota, se queda el segundo)
+                if otra is None or (ev_otra is not None and not ev_otra.es_aceptable):
+                    coste.agent_calls += 1
+                    resultado.answer = await etapas.reintentar(respuesta, ev.retroalimentacion)
+    finally:
+        if alternativa is not None:
+            await _descartar(alternativa, coste)
+
+    coste.latency = time.perf_counter() - t0
+    if stats is not None:
+        stats.record(modo, coste, resultado)
+    return resultado
@@ -0,0 +1,200 @@
+# app/profile_store.py
+"""
+Perfil versionado (texto del CV, retriever y resumen) con recarga en caliente.
+
+Los datos del perfil forman una instantánea inmutable (Perfil) con una
+versión derivada del contenido de sus ficheros. ProfileStore guarda la
+actual y la sustituye de golpe al recargar:
+
+  - La nueva instantánea se construye entera (parseo del PDF o índice en
+    disco, retriever cargado) en un hilo aparte, fuera del event loop; el
+    worker sigue atendiendo con la anterior mientras tanto.
+  - Cada petición fija al empezar la instantánea con la que trabaja
+    (`pinned()`, en un contextvar como el plazo de app/resilience.py): una
+    recarga a mitad de petición no le cambia el CV entre la recuperación y la
+    evaluación, y la instantánea vieja se libera cuando terminan las
+    peticiones que la usan.
+  - `watch()` comprueba cada PROFILE_WATCH_INTERVAL segundos si los ficheros
+    han cambiado (mtime y tamaño) y recarga cuando llevan una comprobación
+    sin moverse, para no leer un PDF a medio copiar. POST /admin/reload
+    fuerza la recarga.
+  - Si la recarga falla se conserva la instantánea anterior.
+
+Tras cada cambio de versión se avisa a los suscriptores (`on_swap`), p.ej.
+para vaciar la caché de respuestas.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from app.metrics import PROFILE_RELOADS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Perfil:
+    version: str
+    texto_cv: str
+    tfidf_retriever: Any
+    retriever: Any
+    resumen: str
+    loaded_at: float = field(default_factory=time.time)
+
+
+# Perfil de los documentos sueltos del corpus y, sin corpus, el único que hay
+DEFAULT_PROFILE = "default"
+
+
+@dataclass(frozen=True)
+class DatosPerfil:
+    """
+    Lo que el prompt del agente y el evaluador necesitan de un perfil: el del
+    CV configurado (PDF_PATH, SUMMARY_PATH, NOMBRE) o uno del corpus.
+    """
+
+    profile_id: str
+    name: Optional[str]
+    summary: str
+    cv_text: str
+    version: str  # cambia con cualquiera de los anteriores
+
+
+_FIJADO: ContextVar[Optional[Perfil]] = ContextVar("perfil_fijado", default=None)
+
+
+def firma_ficheros(paths: tuple[str, ...]) -> tuple:
+    """
+    (mtime, tamaño) de cada fichero; None si no existe.
+    """
+    firma = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            firma.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            firma.append(None)
+    return tuple(firma)
+
+
+class ProfileStore:
+    def __init__(self, loader: Callable[[], Perfil], sources: tuple[str, ...] = ()):
+        self.loader = loader
+        self.sources = tuple(p for p in sources if p)
+        self._actual: Optional[Perfil] = None
+        self._firma: Optional[tuple] = None  # de los ficheros con los que se cargó _actual
+        self._carga = threading.Lock()  # una sola construcción a la vez
+        self._suscriptores: list[Callable[[Optional[Perfil], Perfil], None]] = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._actual is not None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._actual.version if self._actual is not None else None
+
+    def current(self) -> Perfil:
+        """
+        Última instantánea (la carga en el primer uso).
+        """
+        perfil = self._actual
+        if perfil is None:
+            with self._carga:
+                if self._actual is None:
+                    self._firma = firma_ficheros(self.sources)
+                    self._actual = self.loader()
+                    logger.info("Perfil cargado (versión %s)", self._actual.version)
+            perfil = self._actual
+        return perfil
+
+    def get(self) -> Perfil:
+        """
+        La instantánea fijada para esta petición o, fuera de una, la última.
+        """
+        return _FIJADO.get() or self.current()
+
+    @contextmanager
+    def pinned(self, perfil: Optional[Perfil] = None):
+        """
+        Fija `perfil` (por defecto, el último) para el código que se ejecute
+        dentro; las peticiones anidadas conservan el que ya estuviera fijado.
+        """
+        if _FIJADO.get() is not None:
+            yield _FIJADO.get()
+            return
+        perfil = perfil or self.current()
+        token = _FIJADO.set(perfil)
+        try:
+            yield perfil
+        finally:
+            _FIJADO.reset(token)
+
+    def on_swap(self, callback: Callable[[Optional[Perfil], Perfil], None]) -> None:
+        if callback not in self._suscriptores:
+            self._suscriptores.append(callback)
+
+    def changed(self) -> bool:
+        return self._actual is not None and firma_ficheros(self.sources) != self._firma
+
+    def reload(self, force: bool = False) -> dict:
+        """
+        Reconstruye el perfil si sus ficheros cambiaron (o siempre, con
+        `force`) y lo pone en servicio. Bloqueante: llamar desde un hilo.
+        """
+        t0 = time.perf_counter()
+        with self._carga:
+            anterior = self._actual
+            firma = firma_ficheros(self.sources)
+            if anterior is not None and not force and firma == self._firma:
+                PROFILE_RELOADS.inc("unchanged")
+                return {"reloaded": False, "version": anterior.version, "previous": anterior.version}
+            try:
+                nuevo = self.loader()
+            except Exception:
+                PROFILE_RELOADS.inc("error")
+                logger.exception("No se pudo recargar el perfil; sigue en servicio la versión %s", self.version)
+                raise
+            self._firma = firma
+            if anterior is not None and nuevo.version == anterior.version:
+                # Ficheros tocados sin cambiar su contenido
+                PROFILE_RELOADS.inc("unchanged")
+                return {"reloaded": False, "version": anterior.version, "previous": anterior.version}
+            self._actual = nuevo
+
+        PROFILE_RELOADS.inc("reloaded")
+        previa = anterior.version if anterior is not None else None
+        logger.info("Perfil recargado: versión %s -> %s (%.2fs)", previa, nuevo.version, time.perf_counter() - t0)
+        for callback in self._suscriptores:
+            try:
+                callback(anterior, nuevo)
+            except Exception:
+                logger.exception("Fallo al notificar el cambio de perfil")
+        return {"reloaded": True, "version": nuevo.version, "previous": previa, "seconds": time.perf_counter() - t0}
+
+    async def watch(self, interval: float) -> None:
+        """
+        Recarga cuando los ficheros cambian y se mantienen igual durante una comprobación.
+        """
+        vista = fallida = None
+        while True:
+            await asyncio.sleep(interval)
+            if not self.changed():
+                vista = None
+                continue
+            firma = firma_ficheros(self.sources)
+            if firma != vista:
+                vista = firma  # todavía se puede estar escribiendo
+                continue
+            if firma == fallida:
+                continue  # ya falló con estos ficheros: se espera al siguiente cambio
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception:
+                fallida = firma  # ya registrado
@@ -0,0 +1,255 @@
+# app/rate_limit.py
+"""
+Rate limiting con GCRA (Generic Cell Rate Algorithm, equivalente a un token
+bucket) como middleware ASGI.
+
+Por clave (presupuesto + IP) sólo se guarda un número: el TAT ("theoretical
+arrival time"), el instante en que el bucket volvería a estar lleno. Una
+petición se admite si, sumándole un intervalo de emisión (window / limit), el
+TAT no se adelanta al reloj más de lo que permite la ráfaga:
+
+    tat' = max(tat, ahora) + T        admitida si tat' - ahora <= burst * T
+
+Una clave con tat <= ahora equivale a un bucket lleno, así que se puede borrar
+sin cambiar el comportamiento: la limpieza periódica de claves inactivas mantiene
+la memoria acotada frente a escáneres.
+
+Almacenes:
+  - MemoryGCRAStore: por proceso.
+  - SqliteGCRAStore: fichero compartido por todos los workers de la máquina,
+    de modo que el límite es global y no N_workers x límite. Sus operaciones
+    pueden esperar al lock del fichero (hasta 5 s), así que el middleware y
+    la limpieza las ejecutan en un hilo, fuera del event loop.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from starlette.responses import JSONResponse
+
+from app.metrics import RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Budget:
+    name: str
+    limit: int  # peticiones por ventana en régimen sostenido
+    window: float  # segundos
+    burst: int  # peticiones seguidas permitidas con el bucket lleno
+
+    @property
+    def interval(self) -> float:
+        return self.window / self.limit
+
+
+def gcra(tat: Optional[float], ahora: float, budget: Budget) -> tuple[bool, float, float]:
+    """
+    Devuelve (admitida, nuevo_tat, retry_after).
+    """
+    nuevo = max(tat or 0.0, ahora) + budget.interval
+    exceso = nuevo - ahora - budget.burst * budget.interval
+    if exceso > 0:
+        return False, tat, exceso
+    return True, nuevo, 0.0
+
+
+class MemoryGCRAStore:
+    blocking = False  # sin E/S: se puede llamar desde el event loop
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._tat: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+    def hit(self, key: str, budget: Budget) -> tuple[bool, float]:
+        with self._lock:
+            ok, tat, retry_after = gcra(self._tat.get(key), self.clock(), budget)
+            if ok:
+                self._tat[key] = tat
+            return ok, retry_after
+
+    def evict(self) -> int:
+        ahora = self.clock()
+        with self._lock:
+            inactivas = [k for k, tat in self._tat.items() if tat <= ahora]
+            for k in inactivas:
+                del self._tat[k]
+        return len(inactivas)
+
+
+class SqliteGCRAStore:
+    """
+    Misma interfaz sobre sqlite (WAL). La lectura y escritura del TAT van en una
+    transacción IMMEDIATE, así que dos workers no pueden admitir la misma plaza.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS rate_limit (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM rate_limit").fetchone()[0]
+
+    def hit(self, key: str, budget: Budget) -> tuple[bool, float]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                fila = self._conn.execute("SELECT tat FROM rate_limit WHERE key = ?", (key,)).fetchone()
+                ok, tat, retry_after = gcra(fila[0] if fila else None, self.clock(), budget)
+                if ok:
+                    self._conn.execute("INSERT OR REPLACE INTO rate_limit VALUES (?, ?)", (key, tat))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ok, retry_after
+
+    def evict(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM rate_limit WHERE tat <= ?", (self.clock(),)).rowcount
+
+
+class RateLimiter:
+    """
+    Asocia cada ruta a un presupuesto: la primera regla (regex sobre el path)
+    que encaja decide; las rutas exentas no consumen nada y el resto usa `default`.
+
+    Con `store_factory` (y store=None) el almacén se crea en la primera petición,
+    ya dentro del worker: una conexión sqlite no debe heredarse de un fork.
+    """
+
+    def __init__(
+        self,
+        store,
+        budgets: list[Budget],
+        rules: list[tuple[str, str]],
+        default: Optional[str] = None,
+        exempt: tuple[str, ...] = (),
+        store_factory: Optional[Callable[[], object]] = None,
+    ):
+        self._store = store
+        self._store_factory = store_factory
+        self._creando = threading.Lock()
+        self.budgets = {b.name: b for b in budgets}
+        self.rules = [(re.compile(patron), nombre) for patron, nombre in rules]
+        self.default = default
+        self.exempt = set(exempt)
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._creando:
+                if self._store is None:
+                    self._store = self._store_factory()
+        return self._store
+
+    @store.setter
+    def store(self, store) -> None:
+        self._store = store
+
+    def budget_for(self, path: str) -> Optional[Budget]:
+        if path in self.exempt:
+            return None
+        for patron, nombre in self.rules:
+            if patron.match(path):
+                return self.budgets[nombre]
+        return self.budgets.get(self.default) if self.default else None
+
+    def hit(self, path: str, client: str) -> tuple[bool, float, Optional[Budget]]:
+        budget = self.budget_for(path)
+        if budget is None:
+            return True, 0.0, None
+        ok, retry_after = self.store.hit(f"{budget.name}:{client}", budget)
+        return ok, retry_after, budget
+
+    def _bloqueante(self) -> bool:
+        # Un almacén por crear también cuenta: crearlo abre el fichero sqlite
+        return self._store is None or getattr(self._store, "blocking", True)
+
+    async def ahit(self, path: str, client: str) -> tuple[bool, float, Optional[Budget]]:
+        """
+        hit() para código asíncrono: con un almacén que hace E/S se ejecuta
+        en un hilo para no parar el event loop mientras espera al fichero.
+        """
+        if self.budget_for(path) is None:
+            return True, 0.0, None
+        if self._bloqueante():
+            return await asyncio.to_thread(self.hit, path, client)
+        return self.hit(path, client)
+
+    async def evict_periodically(self, interval: float) -> None:
+        """
+        Tarea de fondo: borra cada `interval` segundos las claves inactivas.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if self._bloqueante():
+                    n = await asyncio.to_thread(lambda: self.store.evict())
+                else:
+                    n = self.store.evict()
+                if n:
+                    logger.debug("Rate limit: %d claves inactivas eliminadas", n)
+            except Exception:
+                logger.exception("Error limpiando el rate limiter")
+
+
+class RateLimitMiddleware:
+    """
+    Middleware ASGI: responde 429 con Retry-After antes de llegar al endpoint.
+    """
+
+    def __init__(self, app, limiter: RateLimiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        ok, retry_after, budget = await self.limiter.ahit(scope["path"], client)
+        if not ok:
+            RATE_LIMITED.inc(budget.name)
+            respuesta = JSONResponse(
+                {"detail": "Too Many Requests", "budget": budget.name},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+            await respuesta(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
+def build_rate_limit_store(backend: str, path: str):
+    """
+    backend: "memory" | "sqlite"
+    """
+    if backend == "memory":
+        return MemoryGCRAStore()
+    if backend == "sqlite":
+        return SqliteGCRAStore(path)
+    raise ValueError(f"RATE_LIMIT_BACKEND desconocido: {backend!r} (memory | sqlite)")
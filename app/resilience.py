@@ -0,0 +1,180 @@
+# app/resilience.py
+"""
+Plazos, circuit breaker y errores comunes de las llamadas al LLM.
+
+  - Plazo por petición: chat_endpoint (y el resto de endpoints que llaman al
+    LLM) fija con `deadline()` cuánto puede tardar la petición entera
+    (REQUEST_DEADLINE). El plazo viaja en un contextvar, así que llega a
+    call_chat, al evaluador y a las tareas del pipeline sin pasarlo como
+    argumento. Cada intento usa como timeout lo que queda, y no se reintenta
+    si la espera no cabe en el plazo.
+  - Circuit breaker por modelo: tras CIRCUIT_FAILURES fallos transitorios
+    seguidos (5xx, timeouts, conexión) el circuito se abre y las llamadas a
+    ese modelo fallan al momento (CircuitOpen) durante CIRCUIT_COOLDOWN
+    segundos. Después pasa una sola llamada de prueba. Si sale bien el
+    circuito se cierra y, si no, vuelve a abrirse.
+
+Las excepciones derivan de LLMUnavailable, que el backend convierte en una
+respuesta degradada (sin evaluar) o en 503/504 con Retry-After.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from app.config import CIRCUIT_FAILURES, CIRCUIT_COOLDOWN
+from app.metrics import LLM_CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """
+    El LLM no puede atender la llamada ahora; `retry_after` es una estimación
+    de cuándo volver a intentarlo.
+    """
+
+    status_code = 503
+
+    def __init__(self, mensaje: str, retry_after: float = 1.0):
+        super().__init__(mensaje)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(LLMUnavailable):
+    status_code = 504
+
+    def __init__(self, model: str = ""):
+        super().__init__(f"Plazo de la petición agotado esperando a {model or 'el LLM'}")
+        self.model = model
+
+
+class CircuitOpen(LLMUnavailable):
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"Circuito abierto para {model}; reintentar en {retry_after:.0f}s", retry_after)
+        self.model = model
+
+
+# ------------------------
+# Plazo por petición
+# ------------------------
+_PLAZO: ContextVar[Optional[float]] = ContextVar("plazo_llm", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float] = None, at: Optional[float] = None):
+    """
+    Fija el plazo (time.monotonic absoluto `at`, o `seconds` desde ahora) del
+    código que se ejecute dentro. Si ya había uno más estricto se conserva.
+    Sin `seconds` ni `at` (o con seconds <= 0) no cambia nada.
+    """
+    if at is None and seconds and seconds > 0:
+        at = time.monotonic() + seconds
+    actual = _PLAZO.get()
+    if at is None or (actual is not None and actual <= at):
+        yield actual
+        return
+    token = _PLAZO.set(at)
+    try:
+        yield at
+    finally:
+        _PLAZO.reset(token)
+
+
+def current_deadline() -> Optional[float]:
+    return _PLAZO.get()
+
+
+def remaining() -> Optional[float]:
+    """
+    Segundos que quedan del plazo actual (None = sin plazo).
+    """
+    plazo = _PLAZO.get()
+    return None if plazo is None else plazo - time.monotonic()
+
+
+# ------------------------
+# Circuit breaker
+# ------------------------
+class CircuitBreaker:
+    def __init__(
+        self,
+        model: str,
+        failures: int = CIRCUIT_FAILURES,
+        cooldown: float = CIRCUIT_COOLDOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.model = model
+        self.failures = failures
+        self.cooldown = cooldown
+        self.clock = clock
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+        self._sondeando = False  # hay una llamada de prueba en curso (semiabierto)
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.cooldown else "open"
+
+    def available(self) -> bool:
+        """
+        ¿Admitiría una llamada ahora? (sin consumir la de prueba)
+        """
+        estado = self.state
+        return estado == "closed" or (estado == "half_open" and not self._sondeando)
+
+    def before_call(self) -> None:
+        """
+        Lanza CircuitOpen si el circuito no admite la llamada; en semiabierto
+        deja pasar sólo una, de prueba.
+        """
+        estado = self.state
+        if estado == "closed":
+            return
+        if estado == "half_open" and not self._sondeando:
+            self._sondeando = True
+            return
+        raise CircuitOpen(self.model, max(1.0, self.opened_at + self.cooldown - self.clock()))
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Circuito de %s cerrado", self.model)
+            LLM_CIRCUIT_TRANSITIONS.inc(self.model, "closed")
+        self.consecutive = 0
+        self.opened_at = None
+        self._sondeando = False
+
+    def record_failure(self) -> None:
+        self.consecutive += 1
+        if self._sondeando or (self.opened_at is None and self.consecutive >= self.failures):
+            logger.warning("Circuito de %s abierto tras %d fallos seguidos", self.model, self.consecutive)
+            LLM_CIRCUIT_TRANSITIONS.inc(self.model, "open")
+            self.opened_at = self.clock()
+        self._sondeando = False
+
+    def record_neutral(self) -> None:
+        """
+        La llamada no llegó a saber nada del modelo (sin cuota, 4xx...): si era
+        la de prueba, otra podrá intentarlo.
+        """
+        self._sondeando = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.consecutive}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model)
+    return breaker
+
+
+def breakers_snapshot() -> dict:
+    return {model: b.snapshot() for model, b in _breakers.items()}
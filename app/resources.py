@@ -0,0 +1,232 @@
+# app/resources.py
+"""
+Recursos del backend construidos bajo demanda.
+
+Importar app.backend ya no carga el índice ni crea clientes: cada recurso se
+construye la primera vez que se usa (cached_property) e importa sus módulos
+pesados (scikit-learn, openai, httpx...) en ese momento. Hay dos grupos:
+
+  - Datos (índice, retriever, corpus, resumen): de sólo lectura. Con
+    APP_PRELOAD se cargan en el proceso maestro antes de hacer fork, de modo
+    que los workers los comparten por copy-on-write en lugar de tener una
+    copia cada uno. El CV, su índice y el resumen forman una instantánea
+    versionada que se puede recargar sin reiniciar (app/profile_store.py);
+    tras una recarga cada worker tiene ya su propia copia.
+  - Por worker (clientes HTTP, conexiones sqlite de caché y sesiones): nunca se
+    precargan; un pool de conexiones o un descriptor sqlite no deben cruzar un fork.
+"""
+import logging
+from functools import cached_property
+
+from app.config import (
+    GROQ_API_KEY,
+    GROQ_BASE_URL,
+    PDF_PATH,
+    SUMMARY_PATH,
+    INDEX_DIR,
+    CHUNK_MAX_CHARS,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    INGEST_WORKERS,
+    CORPUS_DIR,
+    RETRIEVER_MODE,
+    EMBEDDING_MODEL,
+    EMBEDDING_DIM,
+    EMBEDDING_DTYPE,
+    CACHE_BACKEND,
+    CACHE_PATH,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL,
+    CACHE_SIMILARITY,
+    SESSION_BACKEND,
+    SESSION_PATH,
+    SESSION_MAX,
+    SESSION_TTL,
+    SESSION_HISTORY_TOKENS,
+    SESSION_SUMMARY_CHARS,
+    LLM_SDK_RETRIES,
+    EVAL_GATE,
+    EVAL_GATE_MODEL_DIR,
+    EVAL_GATE_THRESHOLD,
+    EVAL_GATE_EXPLORE,
+    EVAL_LOG_PATH,
+)
+
+logger = logging.getLogger("agente_cv_backend")
+
+# Recursos de sólo lectura que se pueden precargar antes del fork
+DATOS = ("profiles", "texto_cv", "corpus", "gate")
+
+# Datos de la instantánea del perfil (app/profile_store.py)
+CAMPOS_PERFIL = ["texto_cv", "tfidf_retriever", "retriever", "resumen"]
+
+
+class Recursos:
+    @cached_property
+    def profiles(self):
+        # Texto del CV, retriever y resumen: una instantánea versionada que se
+        # puede recargar en caliente (app/profile_store.py)
+        from app.profile_store import ProfileStore
+
+        return ProfileStore(self._cargar_perfil, sources=(PDF_PATH, SUMMARY_PATH))
+
+    def _cargar_perfil(self):
+        # El índice (texto, chunks, TF-IDF) se lee de disco si ya existe para este PDF;
+        # si no, se construye una vez y lo reutilizan el resto de workers/arranques.
+        import hashlib
+
+        from app.index_store import index_key, load_index
+        from app.profile_store import Perfil
+        from app.retrievers import build_retriever
+
+        logger.info("Cargando índice del CV (%s) desde %s", PDF_PATH, INDEX_DIR)
+        texto, tfidf = load_index(
+            PDF_PATH,
+            INDEX_DIR,
+            max_chars=CHUNK_MAX_CHARS,
+            max_tokens=CHUNK_MAX_TOKENS,
+            overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            workers=INGEST_WORKERS,
+        )
+        retriever = build_retriever(
+            RETRIEVER_MODE,
+            tfidf,
+            embedding_model=EMBEDDING_MODEL,
+            dim=EMBEDDING_DIM,
+            dtype=EMBEDDING_DTYPE,
+        )
+        # Que la primera petición con este perfil no pague la carga perezosa del índice
+        retriever.retrieve_batch(["experiencia"], k=1)
+
+        logger.info("Leyendo resumen desde %s", SUMMARY_PATH)
+        with open(SUMMARY_PATH, "r", encoding="utf-8") as f:
+            resumen = f.read()
+        h = hashlib.sha256(index_key(PDF_PATH, CHUNK_MAX_CHARS, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS).encode())
+        h.update(f"{RETRIEVER_MODE}|{EMBEDDING_MODEL}|{EMBEDDING_DIM}|{EMBEDDING_DTYPE}".encode())
+        h.update(resumen.encode("utf-8"))
+        return Perfil(h.hexdigest()[:16], texto, tfidf, retriever, resumen)
+
+    @property
+    def perfil_actual(self):
+        return self.profiles.get()
+
+    @property
+    def texto_cv(self) -> str:
+        return self.perfil_actual.texto_cv
+
+    @property
+    def perfil(self) -> str:
+        return self.texto_cv  # texto completo del CV para el evaluador
+
+    @property
+    def tfidf_retriever(self):
+        return self.perfil_actual.tfidf_retriever
+
+    @property
+    def retriever(self):
+        return self.perfil_actual.retriever
+
+    @property
+    def resumen(self) -> str:
+        return self.perfil_actual.resumen
+
+    @cached_property
+    def corpus(self):
+        # Corpus multi-documento (varios perfiles / documentos de apoyo), opcional
+        if not CORPUS_DIR:
+            return None
+        from app.corpus import CorpusManager
+
+        logger.info("Indexando corpus desde %s", CORPUS_DIR)
+        corpus = CorpusManager(
+            max_chars=CHUNK_MAX_CHARS,
+            max_tokens=CHUNK_MAX_TOKENS,
+            overlap_tokens=CHUNK_OVERLAP_TOKENS,
+            workers=INGEST_WORKERS,
+        )
+        logger.info("Corpus: %s", corpus.sync_directory(CORPUS_DIR))
+        corpus.compact()
+        return corpus
+
+    @cached_property
+    def gate(self):
+        # Decide qué respuestas pasan por el evaluador (heurística o clasificador local)
+        from app.gating import build_gate
+
+        return build_gate(EVAL_GATE, EVAL_GATE_MODEL_DIR, threshold=EVAL_GATE_THRESHOLD, explore=EVAL_GATE_EXPLORE)
+
+    @cached_property
+    def verdict_log(self):
+        # Registro de veredictos para reentrenar el gating (None sin EVAL_LOG_PATH)
+        if not EVAL_LOG_PATH:
+            return None
+        from app.gating import VerdictLog
+
+        return VerdictLog(EVAL_LOG_PATH)
+
+    @cached_property
+    def response_cache(self):
+        # Caché de respuestas (preguntas repetidas sin historial)
+        from app.cache import build_response_cache
+
+        return build_response_cache(
+            CACHE_BACKEND,
+            CACHE_PATH,
+            max_entries=CACHE_MAX_ENTRIES,
+            ttl=CACHE_TTL,
+            threshold=CACHE_SIMILARITY,
+        )
+
+    @cached_property
+    def sessions(self):
+        # Sesiones: el historial se guarda aquí y el cliente sólo manda session_id
+        from app.sessions import build_session_manager
+
+        return build_session_manager(
+            SESSION_BACKEND,
+            SESSION_PATH,
+            max_sessions=SESSION_MAX,
+            ttl=SESSION_TTL,
+            max_history_tokens=SESSION_HISTORY_TOKENS,
+            summary_chars=SESSION_SUMMARY_CHARS,
+        )
+
+    @cached_property
+    def client_openai(self):
+        # Cliente asíncrono con pool de conexiones: varias llamadas al LLM pueden estar
+        # en vuelo a la vez en el mismo worker sin bloquear el event loop.
+        if not GROQ_API_KEY:
+            raise RuntimeError("GROQ_API_KEY no encontrada. Revisa tu .env")
+        from openai import AsyncOpenAI
+        from app.utils import build_async_http_client
+
+        return AsyncOpenAI(
+            base_url=f"{GROQ_BASE_URL}/openai/v1",
+            api_key=GROQ_API_KEY,
+            http_client=build_async_http_client(),
+            max_retries=LLM_SDK_RETRIES,
+        )
+
+    def cargados(self) -> list[str]:
+        """
+        Recursos ya construidos en este proceso.
+        """
+        nombres = [nombre for nombre in self.__dict__ if not nombre.startswith("_")]
+        if "profiles" in nombres and self.profiles.loaded:
+            nombres += CAMPOS_PERFIL
+        return nombres
+
+    def preload(self, nombres: tuple[str, ...] = DATOS) -> None:
+        """
+        Construye ya los recursos indicados (por defecto, los de sólo lectura).
+        """
+        for nombre in nombres:
+            getattr(self, nombre)
+
+    async def aclose(self) -> None:
+        """
+        Cierra el cliente del agente si llegó a crearse.
+        """
+        cliente = self.__dict__.pop("client_openai", None)
+        if cliente is not None:
+            await cliente.close()
@@ -1,45 +1,160 @@
 # retrieval.py
-from pypdf import PdfReader
+import json
+import os
+
+import numpy as np
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from app.ingest import iter_pdf_pages, iter_paragraphs, chunk_paragraphs, pages_text
+
+# Parámetros del vectorizador (forman parte de la clave del índice en disco)
+VECTORIZER_PARAMS = {"ngram_range": (1, 2)}
+
+# Atributos que se cargan perezosamente desde disco (TfidfRetriever.load)
+_LAZY_ATTRS = ("chunks", "vectorizer", "doc_mat")
+
+# Máximo de celdas (consultas x chunks) de la matriz densa de similitudes por bloque
+_MAX_SIM_CELLS = 1 << 22
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Índices de los k mayores `scores`, ordenados de mayor a menor, en O(n)
+    (argpartition) en lugar de ordenar todo. Los empates se resuelven a favor
+    del índice mayor, igual que el antiguo `scores.argsort()[::-1][:k]`.
+    """
+    n = len(scores)
+    k = min(k, n)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = scores[np.argpartition(scores, n - k)[n - k]]  # k-ésimo mayor valor
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[::-1][: k - len(above)]
+    cand = np.concatenate([above, ties])
+    return cand[np.lexsort((-cand, -scores[cand]))]
 
 
 def read_pdf_text(path_pdf: str) -> str:
-    lector = PdfReader(path_pdf)
-    texto = []
-    for pag in lector.pages:
-        t = pag.extract_text() or ""
-        if t.strip():
-            texto.append(t.strip())
-    return "\n\n".join(texto)
+    return pages_text(iter_pdf_pages(path_pdf))
 
 
 def chunk_text(text: str, max_chars: int = 1200) -> list[str]:
     """
-    Trocea el texto en chunks de ~max_chars, respetando párrafos.
+    Trocea el texto en chunks de hasta max_chars, respetando párrafos y
+    secciones; los párrafos más largos se parten por frases (app/ingest.py).
+    """
+    return [c.text for c in chunk_paragraphs(iter_paragraphs([(1, text)]), max_chars=max_chars)]
+
+
+class BaseRetriever:
+    """
+    Interfaz común de los retrievers: `retrieve_batch` devuelve, por consulta,
+    una lista de (fragmento, score) ordenada de mayor a menor score.
     """
-    paras = [p.strip() for p in text.split("\n") if p.strip()]
-    chunks, buf = [], ""
-    for p in paras:
-        if len(buf) + len(p) + 1 <= max_chars:
-            buf = (buf + "\n" + p).strip()
-        else:
-            if buf:
-                chunks.append(buf)
-            buf = p
-    if buf:
-        chunks.append(buf)
-    return chunks
-
-
-class TfidfRetriever:
+
+    chunks: list[str]
+
+    def retrieve_batch(self, queries: list[str], k: int = 3) -> list[list[tuple[str, float]]]:
+        raise NotImplementedError
+
+    def retrieve(self, query: str, k: int = 3) -> list[str]:
+        return [p for p, _ in self.retrieve_batch([query], k=k)[0]]
+
+    def _rank(self, qm: sp.csr_matrix, postings: sp.csr_matrix, k: int) -> list[list[tuple[str, float]]]:
+        """
+        Scores = qm (consultas x términos) @ postings (términos x chunks), por bloques
+        de consultas para acotar la matriz densa, y top-k por argpartition.
+        """
+        n_chunks = postings.shape[1]
+        bloque = max(1, _MAX_SIM_CELLS // max(1, n_chunks))
+
+        resultados: list[list[tuple[str, float]]] = []
+        for inicio in range(0, qm.shape[0], bloque):
+            sims = (qm[inicio:inicio + bloque] @ postings).toarray()
+            for fila in sims:
+                resultados.append([(self.chunks[i], float(fila[i])) for i in top_k_indices(fila, k)])
+        return resultados
+
+
+class TfidfRetriever(BaseRetriever):
     def __init__(self, chunks: list[str]):
         self.chunks = chunks
-        self.vectorizer = TfidfVectorizer(ngram_range=(1, 2))
+        self.vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
         self.doc_mat = self.vectorizer.fit_transform(chunks)
 
-    def retrieve(self, query: str, k: int = 3) -> list[str]:
-        qv = self.vectorizer.transform([query])
-        sims = cosine_similarity(qv, self.doc_mat).ravel()
-        idx = sims.argsort()[::-1][:k]
-        return [self.chunks[i] for i in idx]
+    def save(self, path: str) -> None:
+        """
+        Guarda chunks, vocabulario/IDF y la matriz dispersa (CSR) en `path`.
+        Los arrays de la matriz van en .npy sueltos para poder abrirlos con mmap.
+        """
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(self.chunks, f, ensure_ascii=False)
+
+        vocab = sorted(self.vectorizer.vocabulary_, key=self.vectorizer.vocabulary_.get)
+        with open(os.path.join(path, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        np.save(os.path.join(path, "idf.npy"), self.vectorizer.idf_)
+
+        mat = self.doc_mat.tocsr()
+        np.save(os.path.join(path, "data.npy"), mat.data)
+        np.save(os.path.join(path, "indices.npy"), mat.indices)
+        np.save(os.path.join(path, "indptr.npy"), mat.indptr)
+        with open(os.path.join(path, "shape.json"), "w", encoding="utf-8") as f:
+            json.dump(list(mat.shape), f)
+
+    @classmethod
+    def load(cls, path: str) -> "TfidfRetriever":
+        """
+        Devuelve un retriever respaldado por un índice guardado con save().
+        No lee nada todavía: los datos se cargan la primera vez que se usan.
+        """
+        obj = cls.__new__(cls)
+        obj._index_path = path
+        obj.index_path = path  # se conserva: otros retrievers guardan aquí sus artefactos
+        return obj
+
+    def __getattr__(self, name):
+        # Sólo se llama si el atributo no existe: carga perezosa del índice
+        if name in _LAZY_ATTRS and "_index_path" in self.__dict__:
+            self._load_from_disk(self.__dict__["_index_path"])
+            del self.__dict__["_index_path"]
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def _load_from_disk(self, path: str) -> None:
+        with open(os.path.join(path, "chunks.json"), encoding="utf-8") as f:
+            self.chunks = json.load(f)
+
+        with open(os.path.join(path, "vocabulary.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        vectorizer.vocabulary_ = {term: i for i, term in enumerate(vocab)}
+        vectorizer.idf_ = np.load(os.path.join(path, "idf.npy"))
+        self.vectorizer = vectorizer
+
+        with open(os.path.join(path, "shape.json"), encoding="utf-8") as f:
+            shape = tuple(json.load(f))
+        arrays = [
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("data", "indices", "indptr")
+        ]
+        self.doc_mat = sp.csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+    def _postings(self) -> sp.csr_matrix:
+        # doc_mat traspuesta (términos x chunks), calculada una vez
+        if "_doc_mat_t" not in self.__dict__:
+            self._doc_mat_t = self.doc_mat.T.tocsr()
+        return self._doc_mat_t
+
+    def retrieve_batch(self, queries: list[str], k: int = 3) -> list[list[tuple[str, float]]]:
+        """
+        Recupera para varias consultas a la vez: un único producto disperso
+        (consultas x términos) @ (términos x chunks) y top-k por argpartition.
+        Devuelve, por consulta, una lista de (fragmento, similitud coseno).
+        """
+        if not queries:
+            return []
+        # TfidfVectorizer normaliza en L2, así que el producto escalar ya es el coseno
+        return self._rank(self.vectorizer.transform(queries), self._postings(), k)
@@ -0,0 +1,297 @@
+# app/retrievers.py
+"""
+Retrievers alternativos a TfidfRetriever, todos con la interfaz BaseRetriever:
+
+  - BM25Retriever:   BM25 clásico (Okapi) sobre unigramas.
+  - DenseRetriever:  embeddings densos cuantizados (int8/float16) guardados en disco.
+                     Por defecto usa un codificador local en CPU (LSA sobre n-gramas
+                     de caracteres); con EMBEDDING_MODEL y sentence-transformers
+                     instalado usa un modelo de embeddings real.
+  - HybridRetriever: fusión por Reciprocal Rank Fusion (RRF) de varios retrievers.
+
+El modo se elige con RETRIEVER_MODE en app/config.py (ver build_retriever).
+"""
+import json
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+
+from app.retrieval import BaseRetriever, TfidfRetriever, top_k_indices
+
+RETRIEVER_MODES = ("tfidf", "bm25", "dense", "hybrid")
+
+# Filas de la matriz de embeddings que se decuantizan de una vez
+_DENSE_BLOCK = 1 << 16
+
+# Por debajo de estas componentes la SVD no aporta (corpus diminuto): se usan
+# directamente los vectores TF-IDF de n-gramas de caracteres
+_MIN_LSA_COMPONENTS = 8
+
+
+class BM25Retriever(BaseRetriever):
+    def __init__(self, chunks: list[str], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.vectorizer = CountVectorizer(strip_accents="unicode", lowercase=True)
+        tf = self.vectorizer.fit_transform(chunks).tocsr().astype(np.float64)
+
+        n = tf.shape[0]
+        dl = np.asarray(tf.sum(axis=1)).ravel()
+        avgdl = dl.mean() if n else 1.0
+        df = np.bincount(tf.indices, minlength=tf.shape[1])
+        idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+        # Peso BM25 precalculado por (chunk, término): la consulta sólo suma
+        filas = np.repeat(np.arange(n), np.diff(tf.indptr))
+        norm = k1 * (1.0 - b + b * dl[filas] / (avgdl or 1.0))
+        tf.data = idf[tf.indices] * tf.data * (k1 + 1.0) / (tf.data + norm)
+        self._postings = tf.T.tocsr()
+
+    def retrieve_batch(self, queries: list[str], k: int = 3) -> list[list[tuple[str, float]]]:
+        if not queries:
+            return []
+        qm = self.vectorizer.transform(queries).tocsr()
+        qm.data[:] = 1.0  # cada término de la consulta cuenta una vez
+        return self._rank(qm, self._postings, k)
+
+
+class LsaEncoder:
+    """
+    Codificador denso local y barato: TF-IDF de n-gramas de caracteres + SVD truncada.
+    Los n-gramas de caracteres capturan variantes morfológicas (trabajó/trabajo,
+    experiencia/experiencias) que el TF-IDF de palabras no ve.
+    """
+
+    name = "lsa"
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.vectorizer = TfidfVectorizer(
+            analyzer="char_wb",
+            ngram_range=(3, 5),
+            sublinear_tf=True,
+            strip_accents="unicode",
+        )
+        self.components: Optional[np.ndarray] = None
+
+    def fit(self, texts: list[str]) -> "LsaEncoder":
+        x = self.vectorizer.fit_transform(texts)
+        n_comp = min(self.dim, x.shape[0] - 1, x.shape[1] - 1)
+        self.components = None
+        if n_comp >= _MIN_LSA_COMPONENTS:
+            self.components = TruncatedSVD(n_components=n_comp, random_state=0).fit(x).components_
+        return self
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        x = self.vectorizer.transform(texts)
+        emb = x.toarray() if self.components is None else x @ self.components.T
+        return _l2_normalize(np.asarray(emb, dtype=np.float32))
+
+    def save(self, path: str) -> None:
+        vocab = sorted(self.vectorizer.vocabulary_, key=self.vectorizer.vocabulary_.get)
+        with open(os.path.join(path, "encoder_vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        np.save(os.path.join(path, "encoder_idf.npy"), self.vectorizer.idf_)
+        if self.components is not None:
+            np.save(os.path.join(path, "encoder_components.npy"), self.components)
+
+    @classmethod
+    def load(cls, path: str) -> "LsaEncoder":
+        enc = cls()
+        with open(os.path.join(path, "encoder_vocabulary.json"), encoding="utf-8") as f:
+            enc.vectorizer.vocabulary_ = {t: i for i, t in enumerate(json.load(f))}
+        enc.vectorizer.idf_ = np.load(os.path.join(path, "encoder_idf.npy"))
+        components = os.path.join(path, "encoder_components.npy")
+        if os.path.exists(components):
+            enc.components = np.load(components)
+            enc.dim = enc.components.shape[0]
+        return enc
+
+
+class SentenceTransformerEncoder:
+    """
+    Modelo de embeddings pequeño en CPU vía sentence-transformers (dependencia opcional).
+    """
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_MODEL requiere 'sentence-transformers' (pip install sentence-transformers)"
+            ) from e
+        self.name = model_name.replace("/", "_")
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def fit(self, texts: list[str]) -> "SentenceTransformerEncoder":
+        return self  # modelo preentrenado: nada que ajustar
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def save(self, path: str) -> None:
+        pass  # el modelo vive en la caché de Hugging Face
+
+
+def _l2_normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def quantize(emb: np.ndarray, dtype: str) -> tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Cuantiza embeddings normalizados. int8 usa una escala por fila (simétrica).
+    """
+    if dtype == "float16":
+        return emb.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(emb).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.round(emb / scales[:, None]).astype(np.int8)
+        return q, scales.astype(np.float32)
+    if dtype == "float32":
+        return emb.astype(np.float32), None
+    raise ValueError(f"dtype de embeddings no soportado: {dtype}")
+
+
+class DenseRetriever(BaseRetriever):
+    def __init__(self, chunks: list[str], encoder=None, dtype: str = "int8"):
+        self.chunks = chunks
+        self.encoder = (encoder or LsaEncoder()).fit(chunks)
+        self.dtype = dtype
+        self.embeddings, self.scales = quantize(self.encoder.encode(chunks), dtype)
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.encoder.save(path)
+        np.save(os.path.join(path, "embeddings.npy"), self.embeddings)
+        if self.scales is not None:
+            np.save(os.path.join(path, "scales.npy"), self.scales)
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"encoder": self.encoder.name, "dtype": self.dtype}, f)
+
+    @classmethod
+    def load(cls, path: str, chunks: list[str], encoder=None) -> "DenseRetriever":
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        obj = cls.__new__(cls)
+        obj.chunks = chunks
+        obj.encoder = encoder or LsaEncoder.load(path)
+        obj.dtype = meta["dtype"]
+        obj.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        scales = os.path.join(path, "scales.npy")
+        obj.scales = np.load(scales) if os.path.exists(scales) else None
+        return obj
+
+    def retrieve_batch(self, queries: list[str], k: int = 3) -> list[list[tuple[str, float]]]:
+        if not queries:
+            return []
+        qv = self.encoder.encode(queries)  # (consultas x dim), normalizado
+
+        # Decuantizamos por bloques de chunks para no materializar toda la matriz en float32
+        sims = np.empty((len(queries), len(self.chunks)), dtype=np.float32)
+        for inicio in range(0, len(self.chunks), _DENSE_BLOCK):
+            bloque = np.asarray(self.embeddings[inicio:inicio + _DENSE_BLOCK], dtype=np.float32)
+            if self.scales is not None:
+                bloque *= self.scales[inicio:inicio + _DENSE_BLOCK, None]
+            sims[:, inicio:inicio + _DENSE_BLOCK] = qv @ bloque.T
+
+        return [[(self.chunks[i], float(fila[i])) for i in top_k_indices(fila, k)] for fila in sims]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Reciprocal Rank Fusion: score(d) = sum_r 1 / (k_rrf + rank_r(d)).
+    Sólo usa posiciones, así que no hace falta calibrar scores de distinta naturaleza.
+    """
+
+    def __init__(self, retrievers: list[BaseRetriever], k_rrf: int = 60, candidates: int = 20):
+        self.retrievers = retrievers
+        self.chunks = retrievers[0].chunks
+        self.k_rrf = k_rrf
+        self.candidates = candidates
+
+    def retrieve_batch(self, queries: list[str], k: int = 3) -> list[list[tuple[str, float]]]:
+        if not queries:
+            return []
+        n_cand = max(k, self.candidates)
+        por_retriever = [r.retrieve_batch(queries, k=n_cand) for r in self.retrievers]
+
+        resultados = []
+        for j in range(len(queries)):
+            fusion: dict[str, float] = {}
+            for res in por_retriever:
+                for rank, (passage, _score) in enumerate(res[j], start=1):
+                    fusion[passage] = fusion.get(passage, 0.0) + 1.0 / (self.k_rrf + rank)
+            mejores = sorted(fusion.items(), key=lambda x: x[1], reverse=True)[:k]
+            resultados.append(mejores)
+        return resultados
+
+
+def build_encoder(embedding_model: Optional[str], dim: int):
+    if embedding_model:
+        return SentenceTransformerEncoder(embedding_model)
+    return LsaEncoder(dim=dim)
+
+
+def load_or_build_dense(
+    chunks: list[str],
+    index_path: Optional[str],
+    embedding_model: Optional[str] = None,
+    dim: int = 256,
+    dtype: str = "int8",
+) -> DenseRetriever:
+    """
+    Embeddings precalculados junto al índice TF-IDF (mismo directorio direccionado por
+    contenido), en un subdirectorio por codificador/dimensión/dtype.
+    """
+    encoder = build_encoder(embedding_model, dim)
+    if not index_path:
+        return DenseRetriever(chunks, encoder=encoder, dtype=dtype)
+
+    destino = os.path.join(index_path, f"dense-{encoder.name}-{dim}-{dtype}")
+    reuse = encoder if embedding_model else None  # el codificador LSA se carga de disco
+    if os.path.isdir(destino):
+        return DenseRetriever.load(destino, chunks, encoder=reuse)
+
+    dense = DenseRetriever(chunks, encoder=encoder, dtype=dtype)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=index_path)
+    try:
+        dense.save(tmp)
+        os.rename(tmp, destino)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(destino):
+            raise
+    return dense
+
+
+def build_retriever(
+    mode: str,
+    tfidf: TfidfRetriever,
+    embedding_model: Optional[str] = None,
+    dim: int = 256,
+    dtype: str = "int8",
+) -> BaseRetriever:
+    """
+    Construye el retriever del modo pedido a partir del índice TF-IDF
+    (del que reutiliza los chunks y, si lo hay, el directorio en disco).
+    """
+    if mode not in RETRIEVER_MODES:
+        raise ValueError(f"RETRIEVER_MODE desconocido: {mode!r} (opciones: {', '.join(RETRIEVER_MODES)})")
+    if mode == "tfidf":
+        return tfidf
+
+    index_path = getattr(tfidf, "index_path", None)
+    if mode == "bm25":
+        return BM25Retriever(tfidf.chunks)
+    dense = load_or_build_dense(tfidf.chunks, index_path, embedding_model, dim, dtype)
+    if mode == "dense":
+        return dense
+    return HybridRetriever([BM25Retriever(tfidf.chunks), dense])
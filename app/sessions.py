@@ -0,0 +1,335 @@
+# app/sessions.py
+"""
+Sesiones de conversación guardadas en el servidor.
+
+El cliente sólo envía el session_id y el mensaje nuevo; el historial vive aquí:
+  - Cada mensaje se guarda con su recuento de tokens (se tokeniza una vez) y la
+    sesión mantiene el total incrementalmente.
+  - Cuando el historial supera `max_history_tokens`, los turnos más viejos se
+    pliegan en un resumen acotado que se guarda con la sesión. Así lo que se
+    envía al LLM (resumen + últimos turnos) y el trabajo por turno no crecen
+    con la longitud de la conversación.
+  - Cada sesión lleva una versión que sube en cada turno. append_turn sólo
+    guarda si la versión guardada es la que leyó; si otra petición de la misma
+    sesión guardó antes, relee la sesión y vuelve a añadir el turno en vez de
+    pisar el de la otra.
+
+Dos backends con la misma interfaz que los de app/cache.py: en memoria (LRU +
+TTL, por proceso) y sqlite en disco (compartido entre workers). Desde el
+event loop se usan los métodos a* de SessionManager, que con sqlite hacen la
+E/S en un hilo.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Optional
+
+from app.tokens import MESSAGE_OVERHEAD, count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Intentos de append_turn ante escrituras concurrentes en la misma sesión
+MAX_INTENTOS_TURNO = 5
+
+
+@dataclass
+class Sesion:
+    session_id: str
+    profile_id: Optional[str] = None
+    turns: list[dict] = field(default_factory=list)  # {"role", "content", "tokens"}
+    summary: str = ""
+    history_tokens: int = 0  # suma de "tokens" de turns
+    n_messages: int = 0  # mensajes totales, incluidos los ya resumidos
+    version: int = 0  # sube en cada turno guardado
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Sesion":
+        return cls(**data)
+
+    def copy(self) -> "Sesion":
+        return Sesion.from_dict(self.to_dict())
+
+
+def _recortar(texto: str, max_chars: int) -> str:
+    texto = " ".join(texto.split())
+    if len(texto) <= max_chars:
+        return texto
+    corte = texto.rfind(". ", 0, max_chars)
+    return texto[:corte + 1] if corte > 0 else texto[:max_chars].rstrip() + "…"
+
+
+def resumen_extractivo(previo: str, mensajes: list[dict], max_chars: int = 1500) -> str:
+    """
+    Resumidor por defecto (sin LLM): una línea corta por mensaje plegado; si el
+    resumen pasa de max_chars se descartan las líneas más antiguas.
+    """
+    etiquetas = {"user": "Usuario", "assistant": "AgenteIA"}
+    lineas = previo.splitlines() if previo else []
+    for m in mensajes:
+        lineas.append(f"{etiquetas.get(m['role'], m['role'])}: {_recortar(m['content'], 200)}")
+    while len(lineas) > 1 and sum(len(x) + 1 for x in lineas) > max_chars:
+        lineas.pop(0)
+    return "\n".join(lineas)
+
+
+class MemorySessionStore:
+    blocking = False  # sin E/S: se puede llamar desde el event loop
+
+    def __init__(self, max_sessions: int = 1000, ttl: float = 86400, clock: Callable[[], float] = time.time):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        self._sesiones: OrderedDict[str, Sesion] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sesiones)
+
+    def get(self, session_id: str) -> Optional[Sesion]:
+        with self._lock:
+            sesion = self._sesiones.get(session_id)
+            if sesion is None:
+                return None
+            if sesion.updated_at + self.ttl <= self.clock():
+                del self._sesiones[session_id]
+                return None
+            self._sesiones.move_to_end(session_id)
+            return sesion.copy()  # como con sqlite: modificarla no toca la guardada
+
+    def save(self, sesion: Sesion) -> None:
+        with self._lock:
+            self._guardar(sesion)
+
+    def replace(self, sesion: Sesion, expected_version: int) -> bool:
+        """
+        Guarda `sesion` sólo si la guardada sigue en `expected_version`.
+        """
+        with self._lock:
+            actual = self._sesiones.get(sesion.session_id)
+            if actual is None or actual.version != expected_version:
+                return False
+            self._guardar(sesion)
+            return True
+
+    def _guardar(self, sesion: Sesion) -> None:
+        self._sesiones[sesion.session_id] = sesion.copy()
+        self._sesiones.move_to_end(sesion.session_id)
+        while len(self._sesiones) > self.max_sessions:
+            self._sesiones.popitem(last=False)
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sesiones.pop(session_id, None) is not None
+
+
+class SqliteSessionStore:
+    """
+    Misma interfaz que MemorySessionStore sobre sqlite (modo WAL); la sesión
+    se guarda serializada en JSON.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_sessions: int = 1000, ttl: float = 86400, clock: Callable[[], float] = time.time):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.clock = clock
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY, payload TEXT NOT NULL, updated_at REAL NOT NULL,"
+                " version INTEGER NOT NULL DEFAULT 0)"
+            )
+            columnas = {fila[1] for fila in self._conn.execute("PRAGMA table_info(sessions)")}
+            if "version" not in columnas:  # fichero creado antes de versionar las sesiones
+                self._conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_lru ON sessions (updated_at)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def get(self, session_id: str) -> Optional[Sesion]:
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT payload FROM sessions WHERE session_id = ? AND updated_at > ?",
+                (session_id, self.clock() - self.ttl),
+            ).fetchone()
+        return Sesion.from_dict(json.loads(fila[0])) if fila else None
+
+    def save(self, sesion: Sesion) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, payload, updated_at, version) VALUES (?, ?, ?, ?)",
+                (sesion.session_id, json.dumps(sesion.to_dict(), ensure_ascii=False), sesion.updated_at, sesion.version),
+            )
+            self._podar()
+
+    def replace(self, sesion: Sesion, expected_version: int) -> bool:
+        """
+        Guarda `sesion` sólo si la guardada sigue en `expected_version`
+        (UPDATE ... WHERE version = ?, atómico entre workers).
+        """
+        with self._lock:
+            cambiadas = self._conn.execute(
+                "UPDATE sessions SET payload = ?, updated_at = ?, version = ? WHERE session_id = ? AND version = ?",
+                (
+                    json.dumps(sesion.to_dict(), ensure_ascii=False),
+                    sesion.updated_at,
+                    sesion.version,
+                    sesion.session_id,
+                    expected_version,
+                ),
+            ).rowcount
+            if cambiadas:
+                self._podar()
+            return cambiadas > 0
+
+    def _podar(self) -> None:
+        self._conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (self.clock() - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE rowid IN ("
+            " SELECT rowid FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+
+class SessionManager:
+    def __init__(
+        self,
+        store,
+        max_history_tokens: int = 2000,
+        summary_chars: int = 1500,
+        summarizer: Callable[[str, list[dict], int], str] = resumen_extractivo,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.store = store
+        self.max_history_tokens = max_history_tokens
+        self.summary_chars = summary_chars
+        self.summarizer = summarizer
+        self.clock = clock
+
+    def create(self, profile_id: Optional[str] = None) -> Sesion:
+        ahora = self.clock()
+        sesion = Sesion(uuid.uuid4().hex, profile_id=profile_id, created_at=ahora, updated_at=ahora)
+        self.store.save(sesion)
+        return sesion
+
+    def get(self, session_id: str) -> Optional[Sesion]:
+        return self.store.get(session_id)
+
+    def delete(self, session_id: str) -> bool:
+        return self.store.delete(session_id)
+
+    def history(self, sesion: Sesion) -> list[dict]:
+        """
+        Historial listo para el LLM: resumen de lo antiguo (si lo hay) + últimos turnos.
+        """
+        mensajes = []
+        if sesion.summary:
+            mensajes.append({
+                "role": "system",
+                "content": f"Resumen de la conversación anterior:\n{sesion.summary}",
+            })
+        mensajes += [{"role": m["role"], "content": m["content"]} for m in sesion.turns]
+        return mensajes
+
+    def append_turn(self, sesion: Sesion, user_msg: str, answer: str) -> Sesion:
+        """
+        Añade pregunta y respuesta, pliega en el resumen lo que no quepa y guarda.
+        Sólo se tokenizan los dos mensajes nuevos. Si otra petición guardó un
+        turno en la sesión desde que se leyó `sesion`, se relee y se añade
+        sobre esa; devuelve la sesión guardada.
+        """
+        nuevos = [
+            {"role": role, "content": content, "tokens": count_tokens(content) + MESSAGE_OVERHEAD}
+            for role, content in (("user", user_msg), ("assistant", answer))
+        ]
+        for _ in range(MAX_INTENTOS_TURNO):
+            leida = sesion.version
+            self._anadir(sesion, nuevos)
+            if self.store.replace(sesion, leida):
+                return sesion
+            actual = self.store.get(sesion.session_id)
+            if actual is None:
+                logger.warning("La sesión %s se borró o caducó durante la petición", sesion.session_id)
+                return sesion
+            sesion = actual
+        raise RuntimeError(f"Demasiadas escrituras concurrentes en la sesión {sesion.session_id}")
+
+    def _anadir(self, sesion: Sesion, nuevos: list[dict]) -> None:
+        for m in nuevos:
+            sesion.turns.append(dict(m))
+            sesion.history_tokens += m["tokens"]
+            sesion.n_messages += 1
+
+        # Se pliegan pares enteros y siempre queda al menos el último turno
+        plegados = []
+        while sesion.history_tokens > self.max_history_tokens and len(sesion.turns) > 2:
+            for m in sesion.turns[:2]:
+                sesion.history_tokens -= m["tokens"]
+                plegados.append(m)
+            del sesion.turns[:2]
+        if plegados:
+            sesion.summary = self.summarizer(sesion.summary, plegados, self.summary_chars)
+
+        sesion.updated_at = self.clock()
+        sesion.version += 1
+
+    async def _en_hilo(self, fn, *args):
+        if getattr(self.store, "blocking", True):
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def acreate(self, profile_id: Optional[str] = None) -> Sesion:
+        return await self._en_hilo(self.create, profile_id)
+
+    async def aget(self, session_id: str) -> Optional[Sesion]:
+        return await self._en_hilo(self.get, session_id)
+
+    async def adelete(self, session_id: str) -> bool:
+        return await self._en_hilo(self.delete, session_id)
+
+    async def aappend_turn(self, sesion: Sesion, user_msg: str, answer: str) -> Sesion:
+        return await self._en_hilo(self.append_turn, sesion, user_msg, answer)
+
+
+def build_session_manager(
+    backend: str,
+    path: str,
+    max_sessions: int,
+    ttl: float,
+    max_history_tokens: int,
+    summary_chars: int,
+) -> SessionManager:
+    """
+    backend: "memory" | "sqlite"
+    """
+    if backend == "memory":
+        store = MemorySessionStore(max_sessions=max_sessions, ttl=ttl)
+    elif backend == "sqlite":
+        store = SqliteSessionStore(path, max_sessions=max_sessions, ttl=ttl)
+    else:
+        raise ValueError(f"SESSION_BACKEND desconocido: {backend!r} (memory | sqlite)")
+    return SessionManager(store, max_history_tokens=max_history_tokens, summary_chars=summary_chars)
@@ -0,0 +1,190 @@
+# app/tokens.py
+"""
+Conteo de tokens para recortar mensajes al presupuesto del modelo.
+
+  - BPECounter: BPE a nivel de byte con un vocabulario local en formato
+    tiktoken (una línea "<token en base64> <rank>" por token, p.ej.
+    o200k_base.tiktoken). Usa `tiktoken` si está instalado y, si no, una
+    implementación en Python puro con caché por palabra. Un tokenizer.json de
+    HuggingFace también vale si está instalado `tokenizers`.
+  - HeuristicCounter: estimación rápida sin vocabulario, por palabras, bastante
+    más cercana en español que len(s) // 4.
+
+Todos cachean el recuento por texto, así que en un historial largo sólo se
+tokenizan los mensajes nuevos de cada turno.
+"""
+import base64
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import Optional
+
+from app.config import TOKENIZER_PATH, PROMPT_MAX_TOKENS, COMPLETION_RESERVE_TOKENS, MODEL_CONTEXT_WINDOWS
+
+logger = logging.getLogger(__name__)
+
+# Pre-tokenización aproximada a la de los BPE de OpenAI con el módulo `re`
+# (sin \p{L}): contracciones, letras, números de hasta 3 dígitos, signos y espacios.
+_PRETOKEN = re.compile(
+    r"""'(?i:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+)
+_PALABRAS = re.compile(r"\w+|[^\w\s]")
+
+# Tokens de formato que añade la plantilla de chat por mensaje (rol, separadores)
+MESSAGE_OVERHEAD = 4
+
+# Ventana de contexto por modelo; se puede ampliar con MODEL_CONTEXT_WINDOWS
+CONTEXT_WINDOWS = {
+    "openai/gpt-oss-120b": 131072,
+    "openai/gpt-oss-20b": 131072,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+    "gemma2-9b-it": 8192,
+    "mixtral-8x7b-32768": 32768,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+
+class TokenCounter:
+    """
+    Interfaz común: count(texto) -> nº de tokens, cacheado por texto.
+    Las subclases implementan _count().
+    """
+
+    def __init__(self, cache_size: int = 4096):
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    def _count(self, text: str) -> int:
+        raise NotImplementedError
+
+    def count_messages(self, messages: list[dict]) -> int:
+        return sum(self.count(m.get("content") or "") + MESSAGE_OVERHEAD for m in messages)
+
+
+class HeuristicCounter(TokenCounter):
+    """
+    Una palabra corta es un token y las largas se parten cada ~4 caracteres;
+    cada signo de puntuación cuenta aparte.
+    """
+
+    def _count(self, text: str) -> int:
+        return max(1, sum(math.ceil(len(p) / 4) for p in _PALABRAS.findall(text)))
+
+
+def load_tiktoken_ranks(path: str) -> dict[bytes, int]:
+    ranks = {}
+    with open(path, "rb") as f:
+        for linea in f:
+            if linea.strip():
+                token, rank = linea.split()
+                ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def _bpe_len(ranks: dict[bytes, int], pieza: bytes) -> int:
+    """
+    Nº de tokens de una pieza: fusiona repetidamente el par adyacente de menor rank.
+    """
+    partes = [pieza[i:i + 1] for i in range(len(pieza))]
+    while len(partes) > 1:
+        mejor, idx = None, -1
+        for i in range(len(partes) - 1):
+            rank = ranks.get(partes[i] + partes[i + 1])
+            if rank is not None and (mejor is None or rank < mejor):
+                mejor, idx = rank, i
+        if mejor is None:
+            break
+        partes[idx:idx + 2] = [partes[idx] + partes[idx + 1]]
+    return len(partes)
+
+
+class BPECounter(TokenCounter):
+    def __init__(self, path: str, cache_size: int = 4096):
+        super().__init__(cache_size)
+        self.path = path
+        self._encode = None
+
+        if path.endswith(".json"):
+            from tokenizers import Tokenizer  # dependencia opcional
+
+            tok = Tokenizer.from_file(path)
+            self._encode = lambda t: len(tok.encode(t, add_special_tokens=False).ids)
+            return
+
+        ranks = load_tiktoken_ranks(path)
+        try:
+            import tiktoken
+        except ImportError:
+            # Las palabras se repiten mucho: cachear por pieza hace el BPE en Python asumible
+            self._piece_len = lru_cache(maxsize=65536)(lambda p: _bpe_len(ranks, p))
+        else:
+            enc = tiktoken.Encoding(
+                name=path, pat_str=_PRETOKEN.pattern, mergeable_ranks=ranks, special_tokens={}
+            )
+            self._encode = lambda t: len(enc.encode_ordinary(t))
+
+    def _count(self, text: str) -> int:
+        if self._encode is not None:
+            return self._encode(text)
+        return sum(self._piece_len(p.encode("utf-8")) for p in _PRETOKEN.findall(text))
+
+
+def build_token_counter(path: Optional[str] = TOKENIZER_PATH) -> TokenCounter:
+    """
+    BPECounter si hay vocabulario configurado y se puede cargar; si no, HeuristicCounter.
+    """
+    if path:
+        try:
+            return BPECounter(path)
+        except (OSError, ValueError, ImportError) as e:
+            logger.warning("No se pudo cargar el tokenizer %s (%s); uso la estimación heurística", path, e)
+    return HeuristicCounter()
+
+
+_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        _counter = build_token_counter()
+    return _counter
+
+
+def count_tokens(text: str) -> int:
+    return get_token_counter().count(text)
+
+
+def context_window(model: Optional[str]) -> int:
+    overrides = _parse_windows(MODEL_CONTEXT_WINDOWS)
+    if model in overrides:
+        return overrides[model]
+    return CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+
+def prompt_budget(
+    model: Optional[str],
+    reserve: int = COMPLETION_RESERVE_TOKENS,
+    max_tokens: int = PROMPT_MAX_TOKENS,
+) -> int:
+    """
+    Tokens de prompt permitidos para `model`: lo que quepa en su contexto
+    dejando `reserve` para la respuesta y, si `max_tokens` > 0, como mucho
+    eso (tope de coste, igual para todos los modelos).
+    """
+    presupuesto = context_window(model) - reserve
+    if max_tokens > 0:
+        presupuesto = min(max_tokens, presupuesto)
+    return max(0, presupuesto)
+
+
+@lru_cache(maxsize=8)
+def _parse_windows(spec: Optional[str]) -> dict[str, int]:
+    # "modelo=tokens,modelo2=tokens"
+    ventanas = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            modelo, tokens = item.rsplit("=", 1)
+            ventanas[modelo.strip()] = int(tokens)
+    return ventanas
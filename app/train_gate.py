@@ -0,0 +1,129 @@
+# app/train_gate.py
+"""
+CLI para entrenar el gating del evaluador (app/gating.py) con el registro de
+veredictos del LLM evaluador (EVAL_LOG_PATH):
+
+    python -m app.train_gate --log .cache/eval_verdicts.jsonl --out app/data/gate --min-recall 0.95
+
+Con validación cruzada estratificada estima, para cada umbral, qué fracción
+de respuestas se evaluaría y qué fracción de los rechazos reales seguiría
+detectándose; elige el mayor umbral que mantiene --min-recall y lo guarda con
+el modelo (EVAL_GATE_THRESHOLD lo sobrescribe en el backend). Como
+referencia se muestra lo mismo para la heurística actual (should_evaluate).
+
+Los veredictos del comprobador local (source "grounding") no se usan: el
+gating decide si hace falta llamar al LLM y esos casos ya no lo llaman.
+"""
+import argparse
+import logging
+import math
+
+import numpy as np
+
+from app.config import (
+    PDF_PATH,
+    INDEX_DIR,
+    CHUNK_MAX_CHARS,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    EVAL_LOG_PATH,
+    EVAL_GATE_MODEL_DIR,
+)
+from app.gating import GateModel, read_verdicts
+from app.index_store import load_index
+from app.utils import should_evaluate
+
+
+def elegir_umbral(p_rechazadas: np.ndarray, min_recall: float) -> float:
+    """
+    Mayor umbral con el que al menos `min_recall` de los rechazos tienen p >= umbral.
+    """
+    ordenadas = np.sort(p_rechazadas)
+    return float(ordenadas[int(math.floor((1 - min_recall) * len(ordenadas)))])
+
+
+def tasas(evaluar: np.ndarray, rechazada: np.ndarray) -> tuple[float, float]:
+    """
+    (fracción de respuestas evaluadas, fracción de rechazos que se evalúan)
+    """
+    return float(evaluar.mean()), float(evaluar[rechazada].mean()) if rechazada.any() else 1.0
+
+
+def validacion_cruzada(vectorizer, registros: list[dict], folds: int, c: float) -> np.ndarray:
+    from sklearn.model_selection import StratifiedKFold
+
+    y = np.array([not r["es_aceptable"] for r in registros])
+    p = np.zeros(len(registros))
+    for train, test in StratifiedKFold(n_splits=folds, shuffle=True, random_state=0).split(np.zeros(len(y)), y):
+        modelo = GateModel.fit(vectorizer, *_columnas([registros[i] for i in train]), y[train].tolist(), c=c)
+        p[test] = modelo.predict_proba(*_columnas([registros[i] for i in test]))
+    return p
+
+
+def _columnas(registros: list[dict]) -> tuple[list, list, list]:
+    return (
+        [r["question"] for r in registros],
+        [r["answer"] for r in registros],
+        [[(t, s) for t, s in r.get("passages", [])] for r in registros],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entrena el gating del evaluador con los veredictos registrados")
+    parser.add_argument("--log", default=EVAL_LOG_PATH, help="registro JSONL (por defecto EVAL_LOG_PATH)")
+    parser.add_argument("--out", default=EVAL_GATE_MODEL_DIR, help="directorio del modelo (por defecto EVAL_GATE_MODEL_DIR)")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="fracción de rechazos que deben seguir evaluándose")
+    parser.add_argument("--c", type=float, default=1.0, help="inversa de la regularización (LogisticRegression C)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--pdf", default=PDF_PATH, help="PDF cuyo índice aporta el vocabulario TF-IDF")
+    parser.add_argument("--index-dir", default=INDEX_DIR)
+    args = parser.parse_args()
+
+    if not args.log:
+        parser.error("indica --log o define EVAL_LOG_PATH")
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s | %(message)s")
+
+    registros = read_verdicts(args.log, source="llm")
+    y = np.array([not r["es_aceptable"] for r in registros])
+    if min(y.sum(), (~y).sum()) < args.folds:
+        parser.error(f"hacen falta al menos {args.folds} veredictos de cada clase (hay {y.sum()} rechazos de {len(y)})")
+
+    # Vocabulario/IDF del índice de recuperación: el modelo guarda su propia copia
+    _texto, tfidf = load_index(
+        args.pdf, args.index_dir, CHUNK_MAX_CHARS, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS
+    )
+    vectorizer = tfidf.vectorizer
+
+    from sklearn.metrics import roc_auc_score
+
+    p = validacion_cruzada(vectorizer, registros, args.folds, args.c)
+    umbral = elegir_umbral(p[y], args.min_recall)
+    auc = float(roc_auc_score(y, p))
+
+    print(f"{len(registros)} veredictos, {y.mean():.1%} rechazados, AUC (CV) {auc:.3f}")
+    print(f"{'gating':<22} {'evalúa':>8} {'rechazos detectados':>20}")
+    heuristica = np.array([should_evaluate(r["answer"], r["question"]) for r in registros])
+    filas = [("heurística", heuristica)]
+    filas += [(f"clasificador p>={t:.2f}", p >= t) for t in (0.2, 0.3, 0.5, 0.7)]
+    filas.append((f"clasificador p>={umbral:.2f} *", p >= umbral))
+    for nombre, evaluar in filas:
+        tasa, recall = tasas(evaluar, y)
+        print(f"{nombre:<22} {tasa:>8.1%} {recall:>20.1%}")
+
+    tasa, recall = tasas(p >= umbral, y)
+    modelo = GateModel.fit(vectorizer, *_columnas(registros), y.tolist(), c=args.c)
+    modelo.threshold = umbral
+    modelo.meta = {
+        "n_train": len(registros),
+        "rejected_rate": float(y.mean()),
+        "cv_auc": auc,
+        "cv_eval_rate": tasa,
+        "cv_rejection_recall": recall,
+        "min_recall": args.min_recall,
+    }
+    modelo.save(args.out)
+    print(f"Modelo guardado en {args.out} (umbral {umbral:.3f})")
+
+
+if __name__ == "__main__":
+    main()
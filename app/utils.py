@@ -1,6 +1,18 @@
 # utils.py
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from openai import RateLimitError, APIStatusError
+import asyncio
+import sys
+from typing import TYPE_CHECKING, Optional
+
+from tenacity import retry, wait_exponential, retry_if_exception
+
+from app.config import LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE, LLM_TIMEOUT
+from app.tokens import MESSAGE_OVERHEAD, TokenCounter, get_token_counter, prompt_budget
+from app.metrics import LLM_FALLBACKS, LLM_RETRIES, record_usage
+from app.llm_scheduler import get_scheduler
+from app.resilience import DeadlineExceeded, LLMUnavailable, get_breaker, remaining
+
+if TYPE_CHECKING:
+    import httpx
 
 
 def approx_tokens(s: str) -> int:
@@ -11,22 +23,32 @@ def approx_tokens(s: str) -> int:
     return max(1, len(s) // 4)
 
 
-def budget_messages(messages: list[dict], max_tokens: int = 6000) -> list[dict]:
+def budget_messages(
+    messages: list[dict],
+    max_tokens: int = 6000,
+    counter: Optional[TokenCounter] = None,
+) -> list[dict]:
     """
     Mantiene el primer/primeros mensajes de system y recorta del historial lo más viejo
-    hasta que el total estimado de tokens sea <= max_tokens.
+    hasta que el total de tokens (según `counter`, por defecto el de app.tokens) sea <= max_tokens.
+    Los recuentos por mensaje están cacheados, así que cada turno sólo tokeniza lo nuevo.
     """
     if not messages:
         return messages
 
+    counter = counter or get_token_counter()
+
+    def tokens(m: dict) -> int:
+        return counter.count(m.get("content") or "") + MESSAGE_OVERHEAD
+
     sys_msgs = [m for m in messages if m.get("role") == "system"]
     other = [m for m in messages if m.get("role") != "system"]
 
-    total = sum(approx_tokens(m.get("content", "")) for m in sys_msgs)
+    total = sum(tokens(m) for m in sys_msgs)
     kept = []
 
     for m in reversed(other):
-        t = approx_tokens(m.get("content", ""))
+        t = tokens(m)
         if total + t > max_tokens:
             break
         kept.append(m)
@@ -35,20 +57,296 @@ def budget_messages(messages: list[dict], max_tokens: int = 6000) -> list[dict]:
     return sys_msgs + list(reversed(kept))
 
 
-@retry(
+def _contar_reintento(retry_state) -> None:
+    # call_chat(client, model, messages, ...): el modelo va como 2º posicional o por nombre
+    modelo = retry_state.kwargs.get("model") or (retry_state.args[1] if len(retry_state.args) > 1 else "")
+    error = retry_state.outcome.exception() if retry_state.outcome else None
+    LLM_RETRIES.inc(modelo, type(error).__name__ if error else "")
+
+
+# Estados que merece la pena reintentar; el resto de 4xx (400, 401, 413...)
+# fallaría igual en el siguiente intento
+ESTADOS_REINTENTABLES = {408, 409, 429}
+MAX_INTENTOS = 3
+# Un Retry-After más largo no se espera: se falla ya (o se pasa al modelo de reserva)
+MAX_ESPERA_REINTENTO = 10.0
+
+
+def _es_del_sdk(error: BaseException, clase: str) -> bool:
+    # Errores del SDK de openai (agente) o del de groq (evaluador). Se consultan
+    # en sys.modules para no cargar ningún SDK al importar el módulo: si una
+    # llamada falló, el suyo ya está cargado.
+    for sdk in ("openai", "groq"):
+        modulo = sys.modules.get(sdk)
+        if modulo is not None and isinstance(error, getattr(modulo, clase)):
+            return True
+    return False
+
+
+def error_transitorio(error: BaseException) -> bool:
+    """
+    429, 408/409, 5xx o fallo de conexión/timeout: puede salir bien si se repite.
+    """
+    if _es_del_sdk(error, "APIStatusError"):
+        return error.status_code in ESTADOS_REINTENTABLES or error.status_code >= 500
+    return _es_del_sdk(error, "APIConnectionError")  # incluye APITimeoutError
+
+
+def _fallo_del_modelo(error: BaseException) -> bool:
+    # Lo que cuenta para el circuit breaker: un 429 es cuota, no un modelo caído
+    return error_transitorio(error) and getattr(error, "status_code", None) != 429
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    # Segundos de la cabecera Retry-After de un 429/503, si el proveedor la manda
+    respuesta = getattr(error, "response", None)
+    if getattr(respuesta, "status_code", None) not in (429, 503):
+        return None
+    try:
+        return float(respuesta.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+_espera_exponencial = wait_exponential(multiplier=0.5, min=0.5, max=4)
+
+
+def _espera(retry_state) -> float:
+    retry_after = _retry_after(retry_state.outcome.exception())
+    return retry_after if retry_after is not None else _espera_exponencial(retry_state)
+
+
+def _parar(retry_state) -> bool:
+    # Sin más intentos, o la espera no cabe en el plazo de la petición
+    if retry_state.attempt_number >= MAX_INTENTOS:
+        return True
+    espera, queda = _espera(retry_state), remaining()
+    return espera > MAX_ESPERA_REINTENTO or (queda is not None and espera >= queda)
+
+
+# Política de reintentos común a la ruta síncrona y a la asíncrona
+RETRY_POLICY = dict(
     reraise=True,
-    stop=stop_after_attempt(3),
-    wait=wait_exponential(multiplier=0.5, min=0.5, max=4),
-    retry=(
-        retry_if_exception_type(RateLimitError)
-        | retry_if_exception_type(APIStatusError)
-    ),
+    stop=_parar,
+    wait=_espera,
+    retry=retry_if_exception(error_transitorio),
+    before_sleep=_contar_reintento,
 )
-def call_chat(client, model: str, messages: list[dict], **kwargs):
+
+
+def _plazo_del_intento(model: str, kwargs: dict) -> None:
+    # El intento no puede pasar del plazo de la petición: se usa como timeout
+    queda = remaining()
+    if queda is not None:
+        if queda <= 0:
+            raise DeadlineExceeded(model)
+        kwargs["timeout"] = queda
+
+
+def _error_del_intento(model: str, breaker, error: BaseException) -> BaseException:
+    """
+    Anota el fallo en el circuito de `model` y devuelve la excepción a lanzar.
+    """
+    if _fallo_del_modelo(error):
+        breaker.record_failure()
+    else:
+        breaker.record_neutral()
+    queda = remaining()
+    if _es_del_sdk(error, "APITimeoutError") and queda is not None and queda <= 0:
+        return DeadlineExceeded(model)
+    return error
+
+
+@retry(**RETRY_POLICY)
+def call_chat(client, model: str, messages: list[dict], *, priority: str = "agent", **kwargs):
+    """
+    Envoltura con reintentos para client.chat.completions.create(...), con el
+    plazo de la petición (app/resilience.py) y el circuit breaker de `model`.
+
+    Cada intento pide cuota al LLMScheduler como call_chat_async, esperando
+    en el hilo (acquire_blocking): no se puede llamar desde el event loop.
+    """
+    _plazo_del_intento(model, kwargs)
+    breaker = get_breaker(model)
+    breaker.before_call()
+    scheduler = get_scheduler()
+    try:
+        reserva = scheduler.acquire_blocking(model, scheduler.estimate(messages, kwargs.get("max_tokens")), priority)
+        _plazo_del_intento(model, kwargs)
+    except BaseException:
+        breaker.record_neutral()
+        raise
+    try:
+        resp = client.chat.completions.create(model=model, messages=messages, **kwargs)
+    except BaseException as e:
+        scheduler.call_threadsafe(scheduler.settle, reserva)
+        retry_after = _retry_after(e)
+        if retry_after and getattr(e, "status_code", None) == 429:
+            scheduler.call_threadsafe(scheduler.penalize, model, retry_after)
+        error = _error_del_intento(model, breaker, e)
+        if error is e:
+            raise
+        raise error from e
+    breaker.record_success()
+    if kwargs.get("stream"):
+        scheduler.call_threadsafe(scheduler.settle, reserva)
+    else:
+        record_usage(model, messages, resp)
+        scheduler.call_threadsafe(scheduler.settle, reserva, getattr(getattr(resp, "usage", None), "total_tokens", None))
+    return resp
+
+
+@retry(**RETRY_POLICY)
+async def call_chat_async(client, model: str, messages: list[dict], *, priority: str = "agent", **kwargs):
+    """
+    Igual que call_chat pero para clientes asíncronos (AsyncOpenAI / AsyncGroq).
+    Las esperas entre reintentos son asyncio.sleep, así que no bloquean el event loop.
+    Con stream=True los tokens los registra quien consume el stream.
+
+    Cada intento pide cuota al LLMScheduler con su `priority` (agent, retry,
+    evaluator, alternative). LLMOverloaded, CircuitOpen y DeadlineExceeded
+    (LLMUnavailable) no se reintentan.
+    """
+    _plazo_del_intento(model, kwargs)
+    breaker = get_breaker(model)
+    breaker.before_call()
+    scheduler = get_scheduler()
+    try:
+        reserva = await scheduler.acquire(model, scheduler.estimate(messages, kwargs.get("max_tokens")), priority)
+        _plazo_del_intento(model, kwargs)  # la espera en cola gasta plazo
+    except BaseException:
+        breaker.record_neutral()
+        raise
+    try:
+        resp = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+    except BaseException as e:
+        scheduler.settle(reserva)
+        retry_after = _retry_after(e)
+        if retry_after and getattr(e, "status_code", None) == 429:
+            scheduler.penalize(model, retry_after)
+        error = _error_del_intento(model, breaker, e)
+        if error is e:
+            raise
+        raise error from e
+    breaker.record_success()
+    if kwargs.get("stream"):
+        scheduler.settle(reserva)
+    else:
+        record_usage(model, messages, resp)
+        scheduler.settle(reserva, getattr(getattr(resp, "usage", None), "total_tokens", None))
+    return resp
+
+
+async def _cerrar(resp) -> None:
+    # Un stream que no se va a leer se cierra para devolver su conexión al pool
+    cerrar = getattr(resp, "close", None)
+    if cerrar is not None and asyncio.iscoroutinefunction(cerrar):
+        await cerrar()
+
+
+async def _primero_en_responder(*tareas: asyncio.Task):
+    """
+    Resultado de la primera tarea que termine bien (a igualdad, la primera de
+    la lista); cancela el resto. Si fallan todas, lanza el error de la primera.
+    """
+    pendientes = set(tareas)
+    try:
+        while pendientes:
+            hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            buenas = [t for t in tareas if t in hechas and not t.cancelled() and t.exception() is None]
+            if buenas:
+                for t in buenas[1:]:
+                    await _cerrar(t.result())
+                return buenas[0].result()
+        raise next(t.exception() for t in tareas if not t.cancelled())
+    finally:
+        for t in pendientes:
+            t.cancel()
+
+
+async def with_fallback(
+    call,
+    client,
+    model: str,
+    messages: list[dict],
+    *,
+    fallback_model: Optional[str] = None,
+    hedge_after: float = 0.0,
+    **kwargs,
+):
     """
-    Envoltura con reintentos para client.chat.completions.create(...)
+    call(client, model, messages, **kwargs) (p.ej. call_chat_async) con un
+    modelo de reserva, que se usa:
+      - directamente, si el circuito de `model` está abierto;
+      - si `model` falla con un error transitorio (tras sus reintentos) o sin cuota;
+      - con hedge_after > 0, si `model` no ha respondido en ese tiempo: se lanza
+        también la reserva y gana la primera respuesta (la otra se cancela).
+    Los mensajes se recortan al presupuesto de tokens del modelo de reserva.
     """
-    return client.chat.completions.create(model=model, messages=messages, **kwargs)
+    if not fallback_model or fallback_model == model:
+        return await call(client, model, messages, **kwargs)
+
+    def reserva(motivo: str):
+        LLM_FALLBACKS.inc(fallback_model, motivo)
+        mensajes = budget_messages(messages, max_tokens=prompt_budget(fallback_model))
+        return call(client, fallback_model, mensajes, **kwargs)
+
+    if not get_breaker(model).available():
+        return await reserva("circuit_open")
+
+    principal = asyncio.ensure_future(call(client, model, messages, **kwargs))
+    try:
+        if hedge_after > 0:
+            hechas, _ = await asyncio.wait({principal}, timeout=hedge_after)
+            if not hechas:
+                return await _primero_en_responder(principal, asyncio.ensure_future(reserva("hedge")))
+        try:
+            return await principal
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            if not (isinstance(e, LLMUnavailable) or error_transitorio(e)):
+                raise
+        return await reserva("error")
+    finally:
+        if not principal.done():
+            principal.cancel()
+
+
+def build_async_http_client() -> "httpx.AsyncClient":
+    """
+    Cliente HTTP con pool de conexiones keep-alive para compartir entre peticiones.
+    """
+    import httpx
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        ),
+        timeout=httpx.Timeout(LLM_TIMEOUT, connect=10.0),
+    )
+
+
+# Preguntas en las que un dato inventado sale caro: siempre se evalúan
+KEYWORDS_SENSIBLES = [
+    "experiencia",
+    "años",
+    "responsable de",
+    "certificado",
+    "título",
+    "salario",
+    "senior",
+    "lead",
+]
+
+
+def pregunta_sensible(user_msg: str) -> bool:
+    """
+    Parte de should_evaluate que sólo depende de la pregunta (se puede decidir
+    antes de tener la respuesta).
+    """
+    return any(k.lower() in user_msg.lower() for k in KEYWORDS_SENSIBLES)
 
 
 def should_evaluate(answer: str, user_msg: str) -> bool:
@@ -58,17 +356,4 @@ def should_evaluate(answer: str, user_msg: str) -> bool:
     if approx_tokens(answer) > 150:  # ~600+ tokens aprox
         return True
 
-    keywords = [
-        "experiencia",
-        "años",
-        "responsable de",
-        "certificado",
-        "título",
-        "salario",
-        "senior",
-        "lead",
-    ]
-    if any(k.lower() in user_msg.lower() for k in keywords):
-        return True
-
-    return False
+    return pregunta_sensible(user_msg)
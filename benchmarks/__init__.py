@@ -0,0 +1,5 @@
+"""
+Benchmarks y utilidades de carga (stub LLM local, scripts de medición).
+
+No forman parte de la app; se ejecutan con `python -m benchmarks.<script>`.
+"""
@@ -0,0 +1,94 @@
+# benchmarks/bench_chat_async.py
+"""
+Benchmark de carga de /chat contra el stub LLM local.
+
+Arranca el stub y el backend con uvicorn y lanza la misma tanda de peticiones
+a distintas concurrencias. Con el backend asíncrono el throughput debería
+crecer con la concurrencia (~concurrencia / STUB_LATENCY) en vez de quedarse
+en ~1 / STUB_LATENCY peticiones por segundo.
+
+    python -m benchmarks.bench_chat_async --requests 40 --concurrency 1 5 20
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+STUB_PORT = 9100
+BACKEND_PORT = 8100
+
+
+def _levantar(modulo: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", modulo, "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _esperar(url: str, timeout: float = 30.0) -> None:
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} no responde")
+
+
+async def _tanda(url: str, n: int, concurrencia: int) -> float:
+    sem = asyncio.Semaphore(concurrencia)
+    payload = {"message": "¿Qué stack usas?", "history": []}
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        async def una():
+            async with sem:
+                r = await client.post(url, json=payload)
+                r.raise_for_status()
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(una() for _ in range(n)))
+        return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--latency", type=float, default=0.5, help="latencia del stub (s)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update(
+        STUB_LATENCY=str(args.latency),
+        GROQ_API_KEY=env.get("GROQ_API_KEY", "stub-key"),
+        GROQ_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+        RATE_LIMIT_MAX="1000000",
+    )
+    procs = [
+        _levantar("benchmarks.stub_llm:app", STUB_PORT, env),
+        _levantar("app.backend:app", BACKEND_PORT, env),
+    ]
+    try:
+        _esperar(f"http://127.0.0.1:{STUB_PORT}/docs")
+        _esperar(f"http://127.0.0.1:{BACKEND_PORT}/healthz")
+        url = f"http://127.0.0.1:{BACKEND_PORT}/chat"
+        print(f"{'concurrencia':>12} {'segundos':>9} {'req/s':>8}")
+        for c in args.concurrency:
+            dt = asyncio.run(_tanda(url, args.requests, c))
+            print(f"{c:>12} {dt:>9.2f} {args.requests / dt:>8.2f}")
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
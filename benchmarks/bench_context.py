@@ -0,0 +1,76 @@
+# benchmarks/bench_context.py
+"""
+Tokens de contexto recuperado por prompt del agente y si el dato esperado
+sigue en él, sobre las preguntas de benchmarks/questions.jsonl:
+
+  - "top-k": los k mejores fragmentos completos (lo de antes),
+  - "mmr": k fragmentos elegidos por MMR entre --candidates,
+  - "mmr+compresión": además, sin las frases que cubre el resumen o un
+    fragmento anterior y recortado a --max-tokens.
+
+"cubiertas" cuenta las preguntas cuyo dato esperado aparece en el contexto.
+
+    python -m benchmarks.bench_context --k 3 --candidates 8 --max-tokens 600
+"""
+import argparse
+import statistics
+import time
+
+from app.config import PDF_PATH, SUMMARY_PATH, CHUNK_MAX_CHARS
+from app.context import compress_passages, format_passages, select_mmr
+from app.grounding import normalizar
+from app.retrieval import read_pdf_text, chunk_text, TfidfRetriever
+from app.tokens import count_tokens
+from benchmarks.bench_retrievers import load_questions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--summary", default=SUMMARY_PATH)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--candidates", type=int, default=8)
+    parser.add_argument("--lambda", dest="lambda_", type=float, default=0.7)
+    parser.add_argument("--max-tokens", type=int, default=600)
+    parser.add_argument("--max-chars", type=int, default=CHUNK_MAX_CHARS, help="tamaño de chunk")
+    args = parser.parse_args()
+
+    with open(args.summary, encoding="utf-8") as f:
+        resumen = f.read()[:12000]
+    retriever = TfidfRetriever(chunk_text(read_pdf_text(args.pdf), max_chars=args.max_chars))
+    preguntas = load_questions()
+    candidatos = retriever.retrieve_batch([p["question"] for p in preguntas], k=max(args.k, args.candidates))
+
+    def topk(q, cand):
+        return [p for p, _ in cand[: args.k]]
+
+    def mmr(q, cand):
+        return [p for p, _ in select_mmr(q, cand, k=args.k, lambda_=args.lambda_)]
+
+    def comprimido(q, cand):
+        return compress_passages(q, mmr(q, cand), resumen, max_tokens=args.max_tokens).passages
+
+    print(f"{len(preguntas)} preguntas, k={args.k}, candidatos={args.candidates}, presupuesto {args.max_tokens} tokens")
+    print(f"{'modo':<16} {'tokens medios':>13} {'máx':>5} {'cubiertas':>10} {'µs/petición':>12}")
+    base = None
+    for nombre, ensamblar in (("top-k", topk), ("mmr", mmr), ("mmr+compresión", comprimido)):
+        tokens, cubiertas = [], 0
+        t0 = time.perf_counter()
+        contextos = [ensamblar(p["question"], cand) for p, cand in zip(preguntas, candidatos)]
+        us = (time.perf_counter() - t0) * 1e6 / len(preguntas)
+        for p, ctx in zip(preguntas, contextos):
+            texto = format_passages(ctx)
+            tokens.append(count_tokens(texto) if ctx else 0)
+            # El dato puede estar en el resumen, que va en el prompt de todas formas
+            visible = normalizar(texto + "\n" + resumen)
+            cubiertas += any(normalizar(e) in visible for e in p["expected"])
+        media = statistics.mean(tokens)
+        base = base or media
+        print(
+            f"{nombre:<16} {media:>13.0f} {max(tokens):>5} {cubiertas:>6}/{len(preguntas):<3} {us:>12.0f}"
+            + (f"  (-{1 - media / base:.0%})" if media < base else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_corpus.py
+"""
+Latencia de CorpusManager.retrieve a medida que crece el corpus.
+
+Genera documentos sintéticos (vocabulario con distribución Zipf), los añade
+incrementalmente y mide la mediana de latencia de consulta en cada tamaño,
+con y sin filtro de perfil.
+
+    python -m benchmarks.bench_corpus --sizes 100 1000 5000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.corpus import CorpusManager
+
+
+def _vocabulario(n: int) -> list[str]:
+    return [f"termino{i}" for i in range(n)]
+
+
+def _texto(rng: random.Random, vocab: list[str], pesos: list[float], parrafos: int = 5) -> str:
+    return "\n".join(
+        " ".join(rng.choices(vocab, weights=pesos, k=60)) for _ in range(parrafos)
+    )
+
+
+def _latencia_ms(corpus: CorpusManager, consultas: list[str], **kwargs) -> float:
+    tiempos = []
+    for q in consultas:
+        t0 = time.perf_counter()
+        corpus.retrieve(q, k=3, **kwargs)
+        tiempos.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--profiles", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocab = _vocabulario(20000)
+    pesos = [1 / (i + 1) for i in range(len(vocab))]
+    consultas = [" ".join(rng.choices(vocab, weights=pesos, k=4)) for _ in range(args.queries)]
+
+    corpus = CorpusManager(max_chars=400)
+    print(f"{'docs':>6} {'chunks':>7} {'alta (ms/doc)':>14} {'consulta (ms)':>14} {'con perfil (ms)':>16}")
+    for size in sorted(args.sizes):
+        t0 = time.perf_counter()
+        nuevos = size - len(corpus)
+        for i in range(len(corpus), size):
+            corpus.add_document(f"doc{i}", _texto(rng, vocab, pesos), profile_id=f"p{i % args.profiles}")
+        alta = (time.perf_counter() - t0) * 1000 / max(1, nuevos)
+
+        print(
+            f"{len(corpus):>6} {corpus.n_chunks:>7} {alta:>14.2f} "
+            f"{_latencia_ms(corpus, consultas):>14.2f} "
+            f"{_latencia_ms(corpus, consultas, profile_id='p0'):>16.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
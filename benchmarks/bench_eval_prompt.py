@@ -0,0 +1,67 @@
+# benchmarks/bench_eval_prompt.py
+"""
+Tokens de prompt por evaluación: modo "full" (resumen + CV completo) frente a
+"compact" (perfil resumido + fragmentos recuperados), sobre las preguntas de
+benchmarks/questions.jsonl. Distingue el prefijo estático (cacheable por el
+proveedor) de la parte que cambia en cada petición, y mide el coste de
+construir el prompt de sistema con y sin memoización.
+
+    python -m benchmarks.bench_eval_prompt
+"""
+import argparse
+import statistics
+import time
+
+from app.config import PDF_PATH, SUMMARY_PATH, NOMBRE
+from app.evaluator import build_eval_messages, build_system_prompt
+from app.retrieval import read_pdf_text, chunk_text, TfidfRetriever
+from app.utils import approx_tokens
+from benchmarks.bench_retrievers import load_questions
+
+RESPUESTA = "Tengo experiencia como Machine Learning Engineer en proyectos de IA generativa."
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--summary", default=SUMMARY_PATH)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--max-chars", type=int, default=1200, help="tamaño de chunk para la recuperación")
+    args = parser.parse_args()
+
+    perfil = read_pdf_text(args.pdf)
+    with open(args.summary, encoding="utf-8") as f:
+        resumen = f.read()
+    nombre = NOMBRE or "Nicolás"
+    retriever = TfidfRetriever(chunk_text(perfil, max_chars=args.max_chars))
+    preguntas = [p["question"] for p in load_questions()]
+    fragmentos = [[p for p, _ in res] for res in retriever.retrieve_batch(preguntas, k=args.k)]
+
+    print(f"{'modo':<8} {'prefijo':>8} {'variable':>9} {'total':>7}  (tokens medios por evaluación)")
+    totales = {}
+    for modo in ("full", "compact"):
+        prefijo, variable = [], []
+        for pregunta, frags in zip(preguntas, fragmentos):
+            system, user = build_eval_messages(
+                nombre, resumen, perfil, RESPUESTA, pregunta, [], fragmentos=frags, modo=modo
+            )
+            prefijo.append(approx_tokens(system["content"]))
+            variable.append(approx_tokens(user["content"]))
+        totales[modo] = statistics.mean(prefijo) + statistics.mean(variable)
+        print(f"{modo:<8} {statistics.mean(prefijo):>8.0f} {statistics.mean(variable):>9.0f} {totales[modo]:>7.0f}")
+    print(f"ahorro compact vs full: {1 - totales['compact'] / totales['full']:.0%}")
+
+    n = 2000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        build_system_prompt.__wrapped__(nombre, resumen, perfil)
+    sin_cache = (time.perf_counter() - t0) * 1e6 / n
+    t0 = time.perf_counter()
+    for _ in range(n):
+        build_system_prompt(nombre, resumen, perfil)
+    con_cache = (time.perf_counter() - t0) * 1e6 / n
+    print(f"build_system_prompt: {sin_cache:.2f} µs sin memoizar, {con_cache:.2f} µs memoizado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# benchmarks/bench_frontend.py
+"""
+Frontend antiguo (httpx síncrono, una conexión nueva por mensaje, historial
+completo en cada turno, un hilo por usuario) frente a FrontendClient (un
+AsyncClient compartido, sesiones en el servidor, varias réplicas), con
+--users conversaciones simultáneas de --turns turnos contra --replicas
+backends y el stub LLM.
+
+Muestra el tiempo hasta el primer token (p50/p95), el total, los bytes de
+petición por turno y el reparto entre réplicas. Con --kill-one se para una
+réplica a mitad de la prueba.
+
+    python -m benchmarks.bench_frontend --users 40 --turns 4 --replicas 2 --threads 40
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from app.frontend_client import FrontendClient, build_frontend_http_client, iter_sse
+from benchmarks.bench_chat_async import STUB_PORT, BACKEND_PORT, _levantar, _esperar
+
+PREGUNTAS = ["¿Qué stack usas?", "¿Dónde trabajas?", "¿Qué estudiaste?", "¿Hablas inglés?", "¿Qué proyectos has hecho?"]
+
+
+def conversacion_antigua(url: str, usuario: int, turnos: int) -> tuple[list[float], int]:
+    """
+    Lo que hacía frontend_gradio.gradio_chat: httpx.stream por mensaje y el historial entero.
+    """
+    history, ttft, enviados = [], [], 0
+    for t in range(turnos):
+        mensaje = f"{PREGUNTAS[(usuario + t) % len(PREGUNTAS)]} ({usuario}-{t})"
+        payload = {"message": mensaje, "history": history}
+        enviados += len(json.dumps(payload).encode("utf-8"))
+        t0, primero, respuesta = time.perf_counter(), None, ""
+        with httpx.stream("POST", f"{url}/chat/stream", json=payload, timeout=60) as resp:
+            for event, data in iter_sse(resp.iter_lines()):
+                if event == "token" and primero is None:
+                    primero = time.perf_counter() - t0
+                if event == "final":
+                    respuesta = data["answer"]
+        ttft.append(primero if primero is not None else time.perf_counter() - t0)
+        history += [{"role": "user", "content": mensaje}, {"role": "assistant", "content": respuesta}]
+    return ttft, enviados
+
+
+async def conversacion_nueva(cliente: FrontendClient, usuario: int, turnos: int) -> list[float]:
+    history, ttft = [], []
+    for t in range(turnos):
+        mensaje = f"{PREGUNTAS[(usuario + t) % len(PREGUNTAS)]} ({usuario}-{t})"
+        t0, primero, respuesta = time.perf_counter(), None, ""
+        async for parcial in cliente.chat(f"u{usuario}", mensaje, history):
+            if primero is None:
+                primero = time.perf_counter() - t0
+            respuesta = parcial
+        ttft.append(primero)
+        history += [{"role": "user", "content": mensaje}, {"role": "assistant", "content": respuesta}]
+    return ttft
+
+
+class _ContarBytes(httpx.AsyncHTTPTransport):
+    def __init__(self):
+        super().__init__()
+        self.enviados = 0
+        self.por_host: dict[str, int] = {}
+
+    async def handle_async_request(self, request):
+        self.enviados += len(request.content or b"")
+        clave = f"{request.url.host}:{request.url.port}"
+        if request.url.path.endswith("/stream"):
+            self.por_host[clave] = self.por_host.get(clave, 0) + 1
+        return await super().handle_async_request(request)
+
+
+def _resumen(nombre: str, ttft: list[float], total: float, bytes_turno: float) -> None:
+    p95 = statistics.quantiles(ttft, n=20)[-1] if len(ttft) > 1 else ttft[0]
+    print(f"{nombre:<10} {statistics.median(ttft) * 1000:>9.0f} {p95 * 1000:>9.0f} {total:>8.2f} {bytes_turno:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=40, help="hilos del frontend antiguo (límite de anyio en Gradio)")
+    parser.add_argument("--latency", type=float, default=0.3, help="latencia del stub (s)")
+    parser.add_argument("--kill-one", action="store_true", help="para la última réplica a mitad de la prueba nueva")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.update(
+        STUB_LATENCY=str(args.latency),
+        STUB_ANSWER_WORDS="30",
+        GROQ_API_KEY=env.get("GROQ_API_KEY", "stub-key"),
+        GROQ_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+        RATE_LIMIT_MAX="1000000",
+        CACHE_BACKEND="off",
+    )
+    puertos = [BACKEND_PORT + i for i in range(args.replicas)]
+    procs = [_levantar("benchmarks.stub_llm:app", STUB_PORT, env)]
+    procs += [_levantar("app.backend:app", p, env) for p in puertos]
+    urls = [f"http://127.0.0.1:{p}" for p in puertos]
+    try:
+        _esperar(f"http://127.0.0.1:{STUB_PORT}/docs")
+        for u in urls:
+            _esperar(f"{u}/healthz")
+
+        print(f"{args.users} usuarios x {args.turns} turnos, {args.replicas} réplicas, stub {args.latency}s")
+        print(f"{'frontend':<10} {'ttft p50':>9} {'ttft p95':>9} {'total s':>8} {'bytes/turno':>12}")
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            res = list(pool.map(lambda u: conversacion_antigua(urls[0], u, args.turns), range(args.users)))
+        total = time.perf_counter() - t0
+        _resumen("antiguo", [x for r, _ in res for x in r], total, sum(b for _, b in res) / (args.users * args.turns))
+
+        async def nueva():
+            transporte = _ContarBytes()
+            cliente = FrontendClient(urls=urls, client=build_frontend_http_client(transport=transporte),
+                                     health_interval=1.0)
+
+            async def matar():
+                await asyncio.sleep(args.latency * args.turns / 2)
+                procs[-1].terminate()
+
+            t0 = time.perf_counter()
+            tareas = [conversacion_nueva(cliente, u, args.turns) for u in range(args.users)]
+            if args.kill_one:
+                tareas.append(matar())
+            res = await asyncio.gather(*tareas)
+            total = time.perf_counter() - t0
+            await cliente.aclose()
+            ttft = [x for r in res if isinstance(r, list) for x in r]
+            _resumen("nuevo", ttft, total, transporte.enviados / (args.users * args.turns))
+            print(f"streams por réplica: {transporte.por_host}")
+
+        asyncio.run(nueva())
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/bench_grounding.py
+"""
+Comprobador local de datos (app/grounding.py) frente al evaluador LLM, sobre
+respuestas sintéticas a las preguntas de benchmarks/questions.jsonl:
+
+  - "respaldada": cita los datos esperados del CV (debería aceptarse),
+  - "inventada": los sustituye por una empresa/título/año/sigla que no está
+    en el CV (debería rechazarse),
+  - "conversacional": sin datos comprobables (debería quedar para el LLM).
+
+Muestra cuántas evaluaciones resuelve sin LLM, cuántas de esas decisiones
+coinciden con la etiqueta, la latencia del comprobador y los tokens de
+prompt del evaluador que se ahorran.
+
+    python -m benchmarks.bench_grounding
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.config import PDF_PATH, SUMMARY_PATH, NOMBRE
+from app.evaluator import build_eval_messages, build_fact_index
+from app.grounding import comprobar
+from app.retrieval import read_pdf_text
+from app.tokens import get_token_counter
+from benchmarks.bench_retrievers import load_questions
+
+INVENTADOS = [
+    "Google",
+    "Meta",
+    "la Universidad de Oxford",
+    "un doctorado en Física Teórica",
+    "la certificación PMP",
+    "Goldman Sachs desde 2011",
+    "un equipo de 25 personas en Amazon",
+]
+CONVERSACIONALES = [
+    "¡Buena pregunta! Encantado de contarte más si lo necesitas.",
+    "Claro, dime qué te interesa saber en concreto y te lo explico.",
+]
+
+
+def respuestas(preguntas: list[dict], seed: int) -> list[tuple[str, str, str]]:
+    """
+    (pregunta, respuesta, etiqueta) con etiqueta "accept" | "reject" | "ambiguous".
+    """
+    rng = random.Random(seed)
+    res = []
+    for p in preguntas:
+        res.append((p["question"], f"Sí, en mi perfil aparece: {', '.join(p['expected'])}.", "accept"))
+        res.append((p["question"], f"Sí, en mi perfil aparece: {rng.choice(INVENTADOS)}.", "reject"))
+        res.append((p["question"], rng.choice(CONVERSACIONALES), "ambiguous"))
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--summary", default=SUMMARY_PATH)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    perfil = read_pdf_text(args.pdf)
+    with open(args.summary, encoding="utf-8") as f:
+        resumen = f.read()
+    nombre = NOMBRE or "Nicolás"
+
+    t0 = time.perf_counter()
+    indice = build_fact_index(perfil, resumen)
+    t_indice = time.perf_counter() - t0
+
+    casos = respuestas(load_questions(), args.seed)
+    tiempos, por_etiqueta = [], {}
+    for pregunta, respuesta, etiqueta in casos:
+        t0 = time.perf_counter()
+        c = comprobar(indice, respuesta, pregunta)
+        tiempos.append(time.perf_counter() - t0)
+        por_etiqueta.setdefault(etiqueta, []).append(c.veredicto)
+
+    print(f"índice de hechos: {t_indice * 1000:.1f} ms; comprobación p50 {statistics.median(tiempos) * 1e6:.0f} µs, "
+          f"máx {max(tiempos) * 1e6:.0f} µs")
+    print(f"{'respuestas':<16} {'n':>4} {'accept':>7} {'reject':>7} {'ambiguous':>10}")
+    for etiqueta, veredictos in por_etiqueta.items():
+        n = len(veredictos)
+        print(
+            f"{etiqueta:<16} {n:>4} "
+            + " ".join(f"{veredictos.count(v) / n:>{w}.0%}" for v, w in (("accept", 7), ("reject", 7), ("ambiguous", 10)))
+        )
+
+    resueltas = sum(v != "ambiguous" for vs in por_etiqueta.values() for v in vs)
+    correctas = sum(v == e for e, vs in por_etiqueta.items() for v in vs if v != "ambiguous")
+    counter = get_token_counter()
+    tokens_eval = statistics.mean(
+        counter.count_messages(build_eval_messages(nombre, resumen, perfil, r, p, [], modo="full"))
+        for p, r, _ in casos
+    )
+    print(
+        f"\nresueltas sin LLM: {resueltas}/{len(casos)} ({resueltas / len(casos):.0%}), "
+        f"de ellas correctas {correctas}/{max(1, resueltas)} ({correctas / max(1, resueltas):.0%})"
+    )
+    print(
+        f"tokens de prompt del evaluador ahorrados: ~{tokens_eval:.0f} por evaluación resuelta "
+        f"(-{resueltas / len(casos):.0%} de llamadas y tokens con EVAL_GROUNDING=shortcircuit)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_ingest.py
+"""
+Ingesta de un PDF grande (el CV repetido --pages veces): extracción de
+páginas secuencial frente a repartida entre procesos, y troceado en streaming
+(app/ingest.py) frente al antiguo chunk_text (texto completo + concatenación
+de strings).
+
+    python -m benchmarks.bench_ingest --pages 200 --workers 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from pypdf import PdfReader, PdfWriter
+
+from app.config import PDF_PATH
+from app.ingest import chunk_paragraphs, iter_paragraphs, iter_pdf_pages, pages_text
+
+
+def chunk_text_anterior(text: str, max_chars: int = 1200) -> list[str]:
+    paras = [p.strip() for p in text.split("\n") if p.strip()]
+    chunks, buf = [], ""
+    for p in paras:
+        if len(buf) + len(p) + 1 <= max_chars:
+            buf = (buf + "\n" + p).strip()
+        else:
+            if buf:
+                chunks.append(buf)
+            buf = p
+    if buf:
+        chunks.append(buf)
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--max-chars", type=int, default=1200)
+    args = parser.parse_args()
+
+    escritor = PdfWriter()
+    origen = PdfReader(args.pdf).pages
+    for i in range(args.pages):
+        escritor.add_page(origen[i % len(origen)])
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = os.path.join(tmp, "grande.pdf")
+        with open(pdf, "wb") as f:
+            escritor.write(f)
+
+        print(f"{args.pages} páginas ({os.cpu_count()} CPUs)")
+        print(f"{'extracción':<14} {'s':>7} {'páginas/s':>10}")
+        paginas = None
+        for workers in args.workers:
+            t0 = time.perf_counter()
+            paginas = list(iter_pdf_pages(pdf, workers=workers))
+            dt = time.perf_counter() - t0
+            print(f"workers={workers:<6} {dt:>7.2f} {len(paginas) / dt:>10.0f}")
+
+    texto = pages_text(paginas)
+    t0 = time.perf_counter()
+    anterior = chunk_text_anterior(texto, args.max_chars)
+    t_anterior = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    nuevos = list(chunk_paragraphs(iter_paragraphs(paginas, doc="grande.pdf"), max_chars=args.max_chars))
+    t_nuevo = time.perf_counter() - t0
+    secciones = {c.section for c in nuevos}
+    print(f"\n{'troceado':<14} {'ms':>7} {'chunks':>7} {'máx chars':>10}")
+    print(f"{'chunk_text ant.':<14} {t_anterior * 1000:>7.1f} {len(anterior):>7} {max(map(len, anterior)):>10}")
+    print(f"{'streaming':<14} {t_nuevo * 1000:>7.1f} {len(nuevos):>7} {max(len(c.text) for c in nuevos):>10}")
+    print(f"secciones detectadas: {sorted(s for s in secciones if s)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_llm_scheduler.py
+"""
+Ráfaga de /chat contra el stub LLM con límites de cuota (STUB_RPM por modelo
+en una ventana de --window segundos), sin y con el LLMScheduler configurado
+con la misma cuota (LLM_RATE_LIMITS).
+
+Sin scheduler, lo que excede la cuota recibe 429 del proveedor y se reintenta
+a ciegas (SDK + tenacity): cientos de 429 y una cola de latencia que crece con
+la ráfaga, o 500 cuando se agotan los reintentos. Con él nada llega al
+proveedor por encima del límite: el agente espera su turno, las evaluaciones
+que no caben se omiten y lo que no puede atenderse a tiempo recibe 503 con
+Retry-After.
+
+    python -m benchmarks.bench_llm_scheduler --requests 60 --rpm 20 --window 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+from benchmarks.bench_chat_async import STUB_PORT, BACKEND_PORT, _levantar, _esperar
+
+# Preguntas sensibles: el gating heurístico manda todas al evaluador
+PREGUNTAS = [
+    "¿Cuántos años de experiencia tienes?",
+    "¿Tienes algún certificado de cloud?",
+    "¿Qué título universitario tienes?",
+    "¿Has sido responsable de algún equipo?",
+    "¿Te consideras senior?",
+]
+
+
+async def _rafaga(url: str, n: int) -> tuple[dict, list[float], int]:
+    estados, latencias, evaluadas = {}, [], 0
+    async with httpx.AsyncClient(timeout=180) as client:
+        async def una(i):
+            nonlocal evaluadas
+            t0 = time.perf_counter()
+            pregunta = f"{PREGUNTAS[i % len(PREGUNTAS)]} (#{i})"
+            r = await client.post(f"{url}/chat", json={"message": pregunta, "history": []})
+            latencias.append(time.perf_counter() - t0)
+            estados[r.status_code] = estados.get(r.status_code, 0) + 1
+            if r.status_code == 200 and r.json().get("evaluated"):
+                evaluadas += 1
+
+        await asyncio.gather(*(una(i) for i in range(n)))
+    return estados, latencias, evaluadas
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--rpm", type=int, default=20, help="peticiones por ventana y modelo del stub")
+    parser.add_argument("--window", type=float, default=5.0, help="ventana de cuota del stub y del scheduler (s)")
+    parser.add_argument("--latency", type=float, default=0.2, help="latencia del stub (s)")
+    args = parser.parse_args()
+
+    agente = os.getenv("AGENT_MODEL", "openai/gpt-oss-120b")
+    evaluador = os.getenv("EVAL_MODEL", "llama-3.1-8b-instant")
+    base = dict(os.environ)
+    base.update(
+        AGENT_MODEL=agente,
+        EVAL_MODEL=evaluador,
+        STUB_LATENCY=str(args.latency),
+        STUB_RPM=str(args.rpm),
+        STUB_WINDOW=str(args.window),
+        GROQ_API_KEY=base.get("GROQ_API_KEY", "stub-key"),
+        GROQ_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+        RATE_LIMIT_MAX="1000000",
+        CACHE_BACKEND="off",
+        PIPELINE_MODE="sequential",
+    )
+    escenarios = {
+        "sin scheduler": {},
+        "scheduler": {
+            "LLM_RATE_LIMITS": f"{agente}={args.rpm}/0,{evaluador}={args.rpm}/0",
+            "LLM_RATE_WINDOW": str(args.window),
+            "LLM_QUEUE_TIMEOUTS": f"agent={args.window * 3},evaluator={args.window / 5}",
+        },
+    }
+
+    print(f"{args.requests} peticiones a la vez, cuota del stub {args.rpm} peticiones/{args.window:g}s por modelo")
+    print(f"{'escenario':<14} {'200':>5} {'503':>5} {'500':>5} {'evaluadas':>10} {'429 stub':>9} {'p50 s':>7} {'p95 s':>7}")
+    for nombre, extra in escenarios.items():
+        env = {**base, **extra}
+        procs = [_levantar("benchmarks.stub_llm:app", STUB_PORT, env), _levantar("app.backend:app", BACKEND_PORT, env)]
+        try:
+            _esperar(f"http://127.0.0.1:{STUB_PORT}/docs")
+            _esperar(f"http://127.0.0.1:{BACKEND_PORT}/healthz")
+            estados, lat, evaluadas = asyncio.run(_rafaga(f"http://127.0.0.1:{BACKEND_PORT}", args.requests))
+            stub = httpx.get(f"http://127.0.0.1:{STUB_PORT}/stub/stats").json()
+            rechazadas = sum(m["rate_limited"] for m in stub.values())
+            p95 = statistics.quantiles(lat, n=20)[-1]
+            print(
+                f"{nombre:<14} {estados.get(200, 0):>5} {estados.get(503, 0):>5} {estados.get(500, 0):>5} "
+                f"{evaluadas:>10} {rechazadas:>9} {statistics.median(lat):>7.2f} {p95:>7.2f}"
+            )
+        finally:
+            for p in procs:
+                p.terminate()
+                p.wait()
+
+
+if __name__ == "__main__":
+    main()
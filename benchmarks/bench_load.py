@@ -0,0 +1,219 @@
+# benchmarks/bench_load.py
+"""
+Banco de pruebas de carga y de calidad offline, con salida JSON para seguir
+la evolución entre commits.
+
+  1. Recall@k offline del retriever configurado (RETRIEVER_MODE, CHUNK_MAX_CHARS)
+     sobre benchmarks/questions.jsonl, con retrieve_batch.
+  2. Arranca el stub LLM (latencia, ritmo de tokens, errores 429/5xx y tasa de
+     rechazo del evaluador configurables) y el backend real apuntando a él.
+  3. Reproduce la batería de preguntas contra /chat o /chat/stream a cada
+     concurrencia y mide throughput, latencia p50/p95/p99 (y primer token en
+     streaming), errores, tasa de invocación del evaluador y reintentos (de /metrics).
+
+    python -m benchmarks.bench_load --concurrency 1 8 32 --error-429 0.05 --output bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from app.config import PDF_PATH, INDEX_DIR, CHUNK_MAX_CHARS, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, RETRIEVER_MODE
+from app.frontend_client import iter_sse
+from benchmarks.bench_chat_async import STUB_PORT, BACKEND_PORT, _levantar, _esperar
+from benchmarks.bench_retrievers import load_questions, recall_at_k
+
+
+def recall_offline(preguntas: list[dict], ks: list[int]) -> dict:
+    from app.index_store import load_index
+    from app.retrievers import build_retriever
+
+    _texto, tfidf = load_index(
+        PDF_PATH, INDEX_DIR, CHUNK_MAX_CHARS, max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS
+    )
+    retriever = build_retriever(RETRIEVER_MODE, tfidf)
+    t0 = time.perf_counter()
+    resultados = retriever.retrieve_batch([p["question"] for p in preguntas], k=max(ks))
+    ms = (time.perf_counter() - t0) * 1000
+    return {
+        "mode": RETRIEVER_MODE,
+        "chunk_max_chars": CHUNK_MAX_CHARS,
+        "chunk_max_tokens": CHUNK_MAX_TOKENS,
+        "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS,
+        **{f"recall@{k}": recall_at_k(resultados, preguntas, k) for k in ks},
+        "batch_ms_per_query": ms / max(1, len(preguntas)),
+    }
+
+
+def _contador(metrics: str, nombre: str) -> float:
+    """
+    Suma todas las series de un contador del texto de /metrics.
+    """
+    total = 0.0
+    for linea in metrics.splitlines():
+        if linea.startswith(nombre) and not linea.startswith("#"):
+            total += float(linea.rsplit(" ", 1)[1])
+    return total
+
+
+async def _peticion_chat(client: httpx.AsyncClient, url: str, pregunta: str) -> dict:
+    t0 = time.perf_counter()
+    r = await client.post(url, json={"message": pregunta})
+    res = {"latency": time.perf_counter() - t0, "ok": r.status_code == 200, "status": r.status_code}
+    if res["ok"]:
+        res["evaluated"] = r.json().get("evaluated", False)
+    return res
+
+
+async def _peticion_stream(client: httpx.AsyncClient, url: str, pregunta: str) -> dict:
+    t0 = time.perf_counter()
+    res = {"ok": False, "status": None, "ttft": None}
+    async with client.stream("POST", url, json={"message": pregunta}) as r:
+        res["status"] = r.status_code
+        lineas = []
+        async for linea in r.aiter_lines():
+            if res["ttft"] is None and linea.startswith("event: token"):
+                res["ttft"] = time.perf_counter() - t0
+            lineas.append(linea)
+    for evento, data in iter_sse(lineas):
+        if evento == "final":
+            res["ok"] = True
+            res["evaluated"] = data.get("evaluated", False)
+    res["latency"] = time.perf_counter() - t0
+    return res
+
+
+async def _tanda(base_url: str, endpoint: str, preguntas: list[str], concurrencia: int) -> tuple[list[dict], float]:
+    sem = asyncio.Semaphore(concurrencia)
+    url = f"{base_url}/chat/stream" if endpoint == "stream" else f"{base_url}/chat"
+    hacer = _peticion_stream if endpoint == "stream" else _peticion_chat
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(timeout=300, limits=limites) as client:
+        async def una(pregunta):
+            async with sem:
+                try:
+                    return await hacer(client, url, pregunta)
+                except httpx.HTTPError as e:
+                    return {"ok": False, "status": type(e).__name__, "latency": None}
+
+        t0 = time.perf_counter()
+        resultados = await asyncio.gather(*(una(p) for p in preguntas))
+        return resultados, time.perf_counter() - t0
+
+
+def _resumen(resultados: list[dict], segundos: float) -> dict:
+    ok = [r for r in resultados if r["ok"]]
+    lat = np.array([r["latency"] for r in ok]) if ok else np.zeros(1)
+    res = {
+        "requests": len(resultados),
+        "errors": len(resultados) - len(ok),
+        "error_statuses": sorted({str(r["status"]) for r in resultados if not r["ok"]}),
+        "seconds": segundos,
+        "throughput_rps": len(ok) / segundos if segundos else 0.0,
+        "latency_s": {
+            "mean": float(lat.mean()),
+            "p50": float(np.percentile(lat, 50)),
+            "p95": float(np.percentile(lat, 95)),
+            "p99": float(np.percentile(lat, 99)),
+        },
+        "evaluator_rate": sum(r.get("evaluated", False) for r in ok) / max(1, len(ok)),
+    }
+    ttft = [r["ttft"] for r in ok if r.get("ttft") is not None]
+    if ttft:
+        res["ttft_s"] = {"p50": float(np.percentile(ttft, 50)), "p95": float(np.percentile(ttft, 95))}
+    return res
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--repeats", type=int, default=2, help="veces que se reproduce la batería por concurrencia")
+    parser.add_argument("--endpoint", choices=["chat", "stream"], default="chat")
+    parser.add_argument("--latency", type=float, default=0.3, help="latencia del stub hasta la respuesta (s)")
+    parser.add_argument("--tokens-per-s", type=float, default=200)
+    parser.add_argument("--answer-words", type=int, default=40)
+    parser.add_argument("--error-429", type=float, default=0.0)
+    parser.add_argument("--error-5xx", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--sdk-retries", type=int, default=0, help="LLM_SDK_RETRIES del backend")
+    parser.add_argument("--cache", action="store_true", help="mantener la caché de respuestas (por defecto off)")
+    parser.add_argument("--output", help="fichero JSON de salida (por defecto stdout)")
+    args = parser.parse_args()
+
+    preguntas = load_questions()
+    informe = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "retrieval": recall_offline(preguntas, args.k),
+        "runs": [],
+    }
+
+    env = dict(os.environ)
+    env.update(
+        STUB_LATENCY=str(args.latency),
+        STUB_TOKENS_PER_S=str(args.tokens_per_s),
+        STUB_ANSWER_WORDS=str(args.answer_words),
+        STUB_ERROR_429=str(args.error_429),
+        STUB_ERROR_5XX=str(args.error_5xx),
+        STUB_REJECT_RATE=str(args.reject_rate),
+        GROQ_API_KEY=env.get("GROQ_API_KEY", "stub-key"),
+        GROQ_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+        RATE_LIMIT_MAX="1000000",
+        RATE_LIMIT_BURST="1000000",
+        CACHE_BACKEND="memory" if args.cache else "off",
+        # Sin reintentos internos del SDK: los errores inyectados llegan a call_chat
+        LLM_SDK_RETRIES=str(args.sdk_retries),
+    )
+    procs = [
+        _levantar("benchmarks.stub_llm:app", STUB_PORT, env),
+        _levantar("app.backend:app", BACKEND_PORT, env),
+    ]
+    base_url = f"http://127.0.0.1:{BACKEND_PORT}"
+    try:
+        _esperar(f"http://127.0.0.1:{STUB_PORT}/docs")
+        _esperar(f"{base_url}/healthz")
+        consultas = [p["question"] for p in preguntas] * args.repeats
+        for c in args.concurrency:
+            reintentos_antes = _contador(httpx.get(f"{base_url}/metrics").text, "agente_cv_llm_retries_total")
+            resultados, segundos = asyncio.run(_tanda(base_url, args.endpoint, consultas, c))
+            reintentos = _contador(httpx.get(f"{base_url}/metrics").text, "agente_cv_llm_retries_total")
+            run = {"concurrency": c, **_resumen(resultados, segundos), "llm_retries": reintentos - reintentos_antes}
+            informe["runs"].append(run)
+            print(
+                f"concurrencia {c:>3}: {run['throughput_rps']:6.2f} req/s  "
+                f"p50 {run['latency_s']['p50']:.3f}s  p95 {run['latency_s']['p95']:.3f}s  "
+                f"p99 {run['latency_s']['p99']:.3f}s  errores {run['errors']}  "
+                f"evaluador {run['evaluator_rate']:.0%}  reintentos {run['llm_retries']:.0f}",
+                file=sys.stderr,
+            )
+    finally:
+        for p in procs:
+            p.terminate()
+            p.wait()
+
+    salida = json.dumps(informe, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(salida + "\n")
+    else:
+        print(salida)
+
+
+if __name__ == "__main__":
+    main()
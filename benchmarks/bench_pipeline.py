@@ -0,0 +1,92 @@
+# benchmarks/bench_pipeline.py
+"""
+Simulación de los modos de app/pipeline.py contra un LLM falso en proceso
+(latencias log-normales y tasas de rechazo configurables), sin red ni API.
+
+Para cada modo lanza la misma tanda de preguntas y muestra latencia p50/p95/p99
+y llamadas al LLM por petición (incluidas las desperdiciadas por especular).
+
+    python -m benchmarks.bench_pipeline --requests 400 --reject-rate 0.3
+"""
+import argparse
+import asyncio
+import random
+from types import SimpleNamespace
+
+from app.pipeline import MODOS, Etapas, PipelineStats, ejecutar
+
+SENSIBLE = "¿Cuántos años de experiencia tienes?"
+NEUTRA = "¿Qué stack usas?"
+
+
+class FakeLLM:
+    def __init__(self, args, rng: random.Random):
+        self.args = args
+        self.rng = rng
+
+    async def _esperar(self, media: float) -> None:
+        # log-normal con la media indicada: cola larga como la de una API real
+        sigma = self.args.sigma
+        await asyncio.sleep(self.rng.lognormvariate(0, sigma) * media / (2.718281828 ** (sigma**2 / 2)))
+
+    def etapas(self) -> Etapas:
+        async def generar():
+            await self._esperar(self.args.agent_latency)
+            return "primera"
+
+        async def alternativa():
+            await self._esperar(self.args.agent_latency)
+            return "alternativa"
+
+        async def evaluar(respuesta):
+            await self._esperar(self.args.eval_latency)
+            tasa = self.args.reject_rate if respuesta == "primera" else self.args.alt_reject_rate
+            # mismo contrato que app.evaluator.Evaluacion, sin importar los clientes LLM
+            return SimpleNamespace(es_aceptable=self.rng.random() >= tasa, retroalimentacion="")
+
+        async def reintentar(respuesta, retro):
+            await self._esperar(self.args.agent_latency)
+            return "reintento"
+
+        return Etapas(generar=generar, alternativa=alternativa, evaluar=evaluar, reintentar=reintentar)
+
+
+async def _tanda(modo: str, args) -> dict:
+    rng = random.Random(args.seed)
+    llm = FakeLLM(args, rng)
+    stats = PipelineStats(window=args.requests)
+    sem = asyncio.Semaphore(args.concurrency)
+    preguntas = [SENSIBLE if rng.random() < args.sensitive else NEUTRA for _ in range(args.requests)]
+
+    async def una(pregunta):
+        async with sem:
+            await ejecutar(modo, llm.etapas(), pregunta, stats=stats)
+
+    await asyncio.gather(*(una(p) for p in preguntas))
+    return stats.snapshot()[modo]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--agent-latency", type=float, default=0.20, help="media en segundos")
+    parser.add_argument("--eval-latency", type=float, default=0.08, help="media en segundos")
+    parser.add_argument("--sigma", type=float, default=0.5, help="dispersión log-normal")
+    parser.add_argument("--reject-rate", type=float, default=0.3, help="rechazo de la primera respuesta")
+    parser.add_argument("--alt-reject-rate", type=float, default=0.1, help="rechazo del candidato alternativo")
+    parser.add_argument("--sensitive", type=float, default=0.6, help="fracción de preguntas que se evalúan")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'modo':<12} {'p50 (s)':>8} {'p95 (s)':>8} {'p99 (s)':>8} {'LLM/pet':>8} {'desperd.':>9} {'sustituidas':>12}")
+    for modo in MODOS:
+        r = asyncio.run(_tanda(modo, args))
+        print(
+            f"{modo:<12} {r['p50_s']:>8.3f} {r['p95_s']:>8.3f} {r['p99_s']:>8.3f} "
+            f"{r['llm_calls_per_request']:>8.2f} {r['wasted_calls'] / r['requests']:>9.2f} {r['replaced']:>12}"
+        )
+
+
+if __name__ == "__main__":
+    main()
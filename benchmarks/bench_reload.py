@@ -0,0 +1,148 @@
+# benchmarks/bench_reload.py
+"""
+Recargas del perfil con tráfico: el backend (contra el stub) atiende /chat a
+concurrencia constante mientras se sustituye el CV por otro distinto (el
+original con N páginas repetidas, así que hay que parsearlo e indexarlo de
+nuevo) y se recarga, por POST /admin/reload o dejando que lo detecte el
+watcher (PROFILE_WATCH_INTERVAL).
+
+Cuenta las peticiones fallidas (deberían ser 0) y compara la latencia de las
+peticiones que coinciden con una reconstrucción con la del resto.
+
+    python -m benchmarks.bench_reload --duration 20 --concurrency 8 --reloads 4
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import httpx
+from pypdf import PdfReader, PdfWriter
+
+from app.config import PDF_PATH, SUMMARY_PATH
+from benchmarks.bench_chat_async import STUB_PORT, BACKEND_PORT, _levantar, _esperar
+
+TOKEN = "bench"
+
+
+def _escribir_cv(origen: str, destino: str, repeticiones: int) -> None:
+    escritor = PdfWriter()
+    paginas = PdfReader(origen).pages
+    for _ in range(repeticiones):
+        for pagina in paginas:
+            escritor.add_page(pagina)
+    tmp = destino + ".tmp"
+    with open(tmp, "wb") as f:
+        escritor.write(f)
+    os.replace(tmp, destino)  # como haría un despliegue: el PDF aparece entero
+
+
+async def _carga(url: str, args, cv_origen: str, cv: str, modo: str) -> dict:
+    fin = time.perf_counter() + args.duration
+    recargando: list[tuple[float, float]] = []  # intervalos con una reconstrucción en curso
+    lat, estados, versiones = [], {}, set()
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        async def usuario(u):
+            i = 0
+            while time.perf_counter() < fin:
+                t0 = time.perf_counter()
+                r = await client.post(f"{url}/chat", json={"message": f"¿Qué stack usas? ({u}-{i})", "history": []})
+                lat.append((t0, time.perf_counter() - t0))
+                estados[r.status_code] = estados.get(r.status_code, 0) + 1
+                i += 1
+
+        async def recargas():
+            pausa = args.duration / (args.reloads + 1)
+            for n in range(args.reloads):
+                await asyncio.sleep(pausa)
+                t0 = time.perf_counter()
+                await asyncio.to_thread(_escribir_cv, cv_origen, cv, n + 2)
+                if modo == "admin":
+                    await client.post(f"{url}/admin/reload", headers={"X-Admin-Token": TOKEN})
+                else:
+                    version = (await client.get(f"{url}/healthz")).json()["profile_version"]
+                    while (await client.get(f"{url}/healthz")).json()["profile_version"] == version:
+                        await asyncio.sleep(0.05)
+                recargando.append((t0, time.perf_counter()))
+                versiones.add((await client.get(f"{url}/healthz")).json()["profile_version"])
+
+        await asyncio.gather(recargas(), *(usuario(u) for u in range(args.concurrency)))
+
+    def durante(t0, dt):
+        return any(t0 < b and t0 + dt > a for a, b in recargando)
+
+    return {
+        "estados": estados,
+        "versiones": len(versiones),
+        "recarga_s": statistics.mean(b - a for a, b in recargando) if recargando else 0.0,
+        "durante": [dt for t0, dt in lat if durante(t0, dt)],
+        "fuera": [dt for t0, dt in lat if not durante(t0, dt)],
+    }
+
+
+def _p(valores: list[float], q: int) -> float:
+    if not valores:
+        return float("nan")
+    return statistics.quantiles(valores, n=100)[q - 1] if len(valores) > 1 else valores[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--summary", default=SUMMARY_PATH)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--reloads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1, help="latencia del stub (s)")
+    args = parser.parse_args()
+
+    print(f"{args.duration:g}s a concurrencia {args.concurrency}, {args.reloads} cambios de CV")
+    print(f"{'modo':<8} {'peticiones':>10} {'fallidas':>9} {'versiones':>10} {'recarga s':>10} "
+          f"{'p50/p99 fuera':>14} {'p50/p99 durante':>16}")
+    for modo in ("admin", "watcher"):
+        tmp = tempfile.mkdtemp(prefix="bench-reload-")
+        try:
+            cv = os.path.join(tmp, "cv.pdf")
+            shutil.copy(args.pdf, cv)
+            resumen = os.path.join(tmp, "resumen.txt")
+            shutil.copy(args.summary, resumen)
+            env = dict(os.environ)
+            env.update(
+                PDF_PATH=cv,
+                SUMMARY_PATH=resumen,
+                INDEX_DIR=os.path.join(tmp, "index"),
+                ADMIN_TOKEN=TOKEN,
+                PROFILE_WATCH_INTERVAL="0" if modo == "admin" else "0.5",
+                STUB_LATENCY=str(args.latency),
+                GROQ_API_KEY=env.get("GROQ_API_KEY", "stub-key"),
+                GROQ_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+                RATE_LIMIT_MAX="1000000",
+                CACHE_BACKEND="off",
+            )
+            procs = [_levantar("benchmarks.stub_llm:app", STUB_PORT, env), _levantar("app.backend:app", BACKEND_PORT, env)]
+            try:
+                _esperar(f"http://127.0.0.1:{STUB_PORT}/docs")
+                _esperar(f"http://127.0.0.1:{BACKEND_PORT}/healthz")
+                res = asyncio.run(_carga(f"http://127.0.0.1:{BACKEND_PORT}", args, args.pdf, cv, modo))
+            finally:
+                for p in procs:
+                    p.terminate()
+                    p.wait()
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        total = sum(res["estados"].values())
+        fallidas = total - res["estados"].get(200, 0)
+        fuera, durante = res["fuera"], res["durante"]
+        print(
+            f"{modo:<8} {total:>10} {fallidas:>9} {res['versiones']:>10} {res['recarga_s']:>10.2f} "
+            f"{_p(fuera, 50):>6.2f}/{_p(fuera, 99):<7.2f} {_p(durante, 50):>7.2f}/{_p(durante, 99):<8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
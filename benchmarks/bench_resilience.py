@@ -0,0 +1,102 @@
+# benchmarks/bench_resilience.py
+"""
+Latencia de /chat contra el stub en dos situaciones de fallo del modelo del
+agente, sin y con el modelo de reserva (AGENT_FALLBACK_MODEL):
+
+  - "cola lenta": una fracción --tail-rate de las llamadas tarda
+    --tail-latency segundos más. Con AGENT_HEDGE_AFTER, si el agente no ha
+    respondido en ese tiempo se lanza también la reserva y gana la primera.
+  - "agente caído": el stub responde 503 a todo lo del agente. Sin reserva
+    cada petición agota sus reintentos y falla; con ella, el circuit breaker
+    se abre tras CIRCUIT_FAILURES fallos y el resto va directo a la reserva.
+
+Las preguntas son cortas y no sensibles, así que no pasan por el evaluador.
+
+    python -m benchmarks.bench_resilience --requests 80 --concurrency 8 --hedge-after 1.0
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+from benchmarks.bench_chat_async import STUB_PORT, BACKEND_PORT, _levantar, _esperar
+
+
+async def _tanda(url: str, n: int, concurrencia: int) -> tuple[dict, list[float]]:
+    sem = asyncio.Semaphore(concurrencia)
+    estados, latencias = {}, []
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        async def una(i):
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post(url, json={"message": f"¿Qué stack usas? ({i})", "history": []})
+                latencias.append(time.perf_counter() - t0)
+                estados[r.status_code] = estados.get(r.status_code, 0) + 1
+
+        await asyncio.gather(*(una(i) for i in range(n)))
+    return estados, latencias
+
+
+def _percentil(valores: list[float], q: int) -> float:
+    return statistics.quantiles(valores, n=100)[q - 1] if len(valores) > 1 else valores[0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=80)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3, help="latencia del agente en el stub (s)")
+    parser.add_argument("--fallback-latency", type=float, default=0.15, help="latencia del modelo de reserva (s)")
+    parser.add_argument("--tail-rate", type=float, default=0.1)
+    parser.add_argument("--tail-latency", type=float, default=4.0)
+    parser.add_argument("--hedge-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    agente, reserva = "openai/gpt-oss-120b", "llama-3.1-8b-instant"
+    base = dict(os.environ)
+    base.update(
+        AGENT_MODEL=agente,
+        EVAL_MODEL=reserva,
+        STUB_LATENCY=str(args.latency),
+        STUB_MODEL_LATENCY=f"{reserva}={args.fallback_latency}",
+        GROQ_API_KEY=base.get("GROQ_API_KEY", "stub-key"),
+        GROQ_BASE_URL=f"http://127.0.0.1:{STUB_PORT}",
+        RATE_LIMIT_MAX="1000000",
+        CACHE_BACKEND="off",
+    )
+    cola = {"STUB_TAIL_RATE": str(args.tail_rate), "STUB_TAIL_LATENCY": str(args.tail_latency)}
+    escenarios = [
+        ("cola lenta", "sin reserva", cola),
+        ("cola lenta", "hedging", {**cola, "AGENT_FALLBACK_MODEL": reserva, "AGENT_HEDGE_AFTER": str(args.hedge_after)}),
+        ("agente caído", "sin reserva", {"STUB_FAIL_MODELS": agente}),
+        ("agente caído", "reserva", {"STUB_FAIL_MODELS": agente, "AGENT_FALLBACK_MODEL": reserva}),
+    ]
+
+    print(f"{args.requests} peticiones, concurrencia {args.concurrency}; agente {args.latency}s, reserva {args.fallback_latency}s")
+    print(f"{'situación':<13} {'modo':<12} {'200':>4} {'5xx':>4} {'p50 s':>6} {'p95 s':>6} {'p99 s':>6} {'llamadas agente/reserva':>24}")
+    for situacion, modo, extra in escenarios:
+        env = {**base, **extra}
+        procs = [_levantar("benchmarks.stub_llm:app", STUB_PORT, env), _levantar("app.backend:app", BACKEND_PORT, env)]
+        try:
+            _esperar(f"http://127.0.0.1:{STUB_PORT}/docs")
+            _esperar(f"http://127.0.0.1:{BACKEND_PORT}/healthz")
+            estados, lat = asyncio.run(_tanda(f"http://127.0.0.1:{BACKEND_PORT}/chat", args.requests, args.concurrency))
+            stub = httpx.get(f"http://127.0.0.1:{STUB_PORT}/stub/stats").json()
+            llamadas = [sum(stub.get(m, {}).values()) for m in (agente, reserva)]
+            errores = sum(v for k, v in estados.items() if k >= 500)
+            print(
+                f"{situacion:<13} {modo:<12} {estados.get(200, 0):>4} {errores:>4} {statistics.median(lat):>6.2f} "
+                f"{_percentil(lat, 95):>6.2f} {_percentil(lat, 99):>6.2f} {llamadas[0]:>12}/{llamadas[1]:<11}"
+            )
+        finally:
+            for p in procs:
+                p.terminate()
+                p.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_retrieval.py
+"""
+Microbenchmark de TfidfRetriever: consulta a consulta vs. retrieve_batch.
+
+Compara, sobre corpus sintéticos de 10^2 a 10^5 chunks:
+  - "argsort":  implementación anterior (cosine_similarity + argsort completo)
+  - "single":   retrieve() consulta a consulta (argpartition)
+  - "batch":    retrieve_batch() con todas las consultas en un único producto
+
+    python -m benchmarks.bench_retrieval --sizes 100 1000 10000 100000 --queries 200
+"""
+import argparse
+import random
+import time
+
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.retrieval import TfidfRetriever
+
+
+def _argsort_retrieve(retriever: TfidfRetriever, query: str, k: int) -> list[str]:
+    qv = retriever.vectorizer.transform([query])
+    sims = cosine_similarity(qv, retriever.doc_mat).ravel()
+    return [retriever.chunks[i] for i in sims.argsort()[::-1][:k]]
+
+
+def _ms_por_consulta(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000 / n
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocab = [f"t{i}" for i in range(5000)]
+    pesos = [1 / (i + 1) for i in range(len(vocab))]
+    consultas = [" ".join(rng.choices(vocab, weights=pesos, k=5)) for _ in range(args.queries)]
+
+    print(f"{'chunks':>7} {'argsort (ms/q)':>15} {'single (ms/q)':>14} {'batch (ms/q)':>13}")
+    for size in args.sizes:
+        chunks = [" ".join(rng.choices(vocab, weights=pesos, k=30)) for _ in range(size)]
+        retriever = TfidfRetriever(chunks)
+        retriever.retrieve_batch(consultas[:1], k=args.k)  # calienta la traspuesta
+
+        n = len(consultas)
+        viejo = _ms_por_consulta(lambda: [_argsort_retrieve(retriever, q, args.k) for q in consultas], n)
+        single = _ms_por_consulta(lambda: [retriever.retrieve(q, k=args.k) for q in consultas], n)
+        batch = _ms_por_consulta(lambda: retriever.retrieve_batch(consultas, k=args.k), n)
+        print(f"{size:>7} {viejo:>15.3f} {single:>14.3f} {batch:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
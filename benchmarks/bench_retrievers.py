@@ -0,0 +1,79 @@
+# benchmarks/bench_retrievers.py
+"""
+Recall@k y latencia de cada modo de retriever sobre el CV y la batería de
+preguntas de benchmarks/questions.jsonl.
+
+Una pregunta cuenta como acierto en k si alguno de los k fragmentos recuperados
+contiene alguno de sus textos "expected". Se trocea el CV más fino que en
+producción para que haya suficientes chunks y el recall sea informativo.
+
+    python -m benchmarks.bench_retrievers --max-chars 200 --k 1 3
+    python -m benchmarks.bench_retrievers --max-chars 1200 --max-tokens 60 --overlap-tokens 15
+"""
+import argparse
+import json
+import os
+import time
+
+from app.config import PDF_PATH
+from app.ingest import ingest_pdf
+from app.retrieval import TfidfRetriever
+from app.retrievers import RETRIEVER_MODES, build_retriever
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(__file__), "questions.jsonl")
+
+
+def load_questions(path: str = QUESTIONS_PATH) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def recall_at_k(resultados: list[list[tuple[str, float]]], preguntas: list[dict], k: int) -> float:
+    aciertos = 0
+    for res, p in zip(resultados, preguntas):
+        textos = [t.lower() for t, _ in res[:k]]
+        if any(e.lower() in t for e in p["expected"] for t in textos):
+            aciertos += 1
+    return aciertos / max(1, len(preguntas))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--max-chars", type=int, default=200)
+    parser.add_argument("--max-tokens", type=int, default=None)
+    parser.add_argument("--overlap-tokens", type=int, default=0)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3])
+    parser.add_argument("--modes", nargs="+", default=list(RETRIEVER_MODES))
+    args = parser.parse_args()
+
+    chunks = [
+        c.text
+        for c in ingest_pdf(args.pdf, max_chars=args.max_chars, max_tokens=args.max_tokens, overlap_tokens=args.overlap_tokens)
+    ]
+    preguntas = load_questions()
+    consultas = [p["question"] for p in preguntas]
+    tfidf = TfidfRetriever(chunks)
+    k_max = max(args.k)
+
+    cabecera = " ".join(f"{f'recall@{k}':>9}" for k in args.k)
+    print(f"{len(chunks)} chunks, {len(preguntas)} preguntas")
+    print(f"{'modo':<8} {cabecera} {'ms/consulta':>12} {'ms/lote':>9}")
+    for mode in args.modes:
+        retriever = build_retriever(mode, tfidf)
+
+        t0 = time.perf_counter()
+        for q in consultas:
+            retriever.retrieve_batch([q], k=k_max)
+        single = (time.perf_counter() - t0) * 1000 / len(consultas)
+
+        t0 = time.perf_counter()
+        resultados = retriever.retrieve_batch(consultas, k=k_max)
+        lote = (time.perf_counter() - t0) * 1000
+
+        recalls = " ".join(f"{recall_at_k(resultados, preguntas, k):>9.2f}" for k in args.k)
+        print(f"{mode:<8} {recalls} {single:>12.3f} {lote:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
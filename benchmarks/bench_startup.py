@@ -0,0 +1,156 @@
+# benchmarks/bench_startup.py
+"""
+Arranque del backend: tiempo y memoria.
+
+1. Un proceso nuevo por medición:
+     - "import": sólo `import app.backend` (con create_app perezoso no carga
+       el índice ni los SDK).
+     - "listo (sin índice)": import + primera consulta con INDEX_DIR vacío
+       -> parsea el PDF, ajusta TF-IDF y guarda el índice.
+     - "listo (con índice)": lo mismo reutilizando el índice ya construido.
+   Se da la mediana de tiempos y el RSS al terminar.
+
+2. Workers por fork (como `gunicorn --preload`): un maestro importa la app y
+   hace fork de --workers hijos que atienden una consulta. Con "preload" el
+   maestro carga los datos antes del fork; sin él, cada hijo los carga tras el
+   fork. Con todos los hijos vivos se lee su RSS y su PSS (memoria propia +
+   la compartida dividida entre quienes la comparten) de /proc/<pid>/smaps_rollup.
+
+    python -m benchmarks.bench_startup --repeats 5 --workers 4
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.backend as b
+t_import = time.perf_counter() - t0
+if sys.argv[1] == "ready":
+    b.recursos.retriever.retrieve("experiencia", k=3)
+rss = 0
+for linea in open("/proc/self/status"):
+    if linea.startswith("VmRSS:"):
+        rss = int(linea.split()[1]) / 1024
+print(json.dumps({"import_s": t_import, "total_s": time.perf_counter() - t0, "rss_mb": rss}))
+"""
+
+SNIPPET_FORK = """
+import json, os, sys, time
+
+def memoria(pid):
+    res = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for linea in f:
+                campo, valor = linea.split(":", 1)
+                if campo in ("Rss", "Pss"):
+                    res[campo.lower() + "_mb"] = int(valor.split()[0]) / 1024
+    except OSError:
+        pass
+    return res
+
+preload, n = sys.argv[1] == "1", int(sys.argv[2])
+t0 = time.perf_counter()
+import app.backend as b
+if preload:
+    b.recursos.preload()
+t_maestro = time.perf_counter() - t0
+
+listos_r, listos_w = os.pipe()
+salir_r, salir_w = os.pipe()
+hijos = []
+for _ in range(n):
+    pid = os.fork()
+    if pid == 0:
+        t = time.perf_counter()
+        b.recursos.preload()
+        b.recursos.retriever.retrieve("experiencia", k=3)
+        os.write(listos_w, (json.dumps({"ready_s": time.perf_counter() - t}) + "\\n").encode())
+        os.read(salir_r, 1)  # vivo hasta que el maestro haya medido a todos
+        os._exit(0)
+    hijos.append(pid)
+
+leido = b""
+while leido.count(b"\\n") < n:
+    leido += os.read(listos_r, 4096)
+listos = [json.loads(l) for l in leido.decode().splitlines()]
+workers = [{**l, **memoria(pid)} for l, pid in zip(listos, hijos)]
+os.write(salir_w, b"x" * n)
+for pid in hijos:
+    os.waitpid(pid, 0)
+print(json.dumps({"master_s": t_maestro, "master": memoria(os.getpid()), "workers": workers}))
+"""
+
+
+def _ejecutar(snippet: str, args: list[str], env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", snippet, *args],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def _fila(nombre: str, medidas: list[dict], clave: str) -> str:
+    tiempos = [m[clave] for m in medidas]
+    rss = statistics.median(m["rss_mb"] for m in medidas)
+    return f"{nombre:<20} {statistics.median(tiempos):>12.3f} {min(tiempos):>9.3f} {rss:>9.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("GROQ_API_KEY", "stub-key")
+    env.pop("APP_PRELOAD", None)
+
+    solo_import, frio, caliente = [], [], []
+    for _ in range(args.repeats):
+        with tempfile.TemporaryDirectory() as index_dir:
+            env["INDEX_DIR"] = index_dir
+            solo_import.append(_ejecutar(SNIPPET, ["import"], env))
+            frio.append(_ejecutar(SNIPPET, ["ready"], env))
+            caliente.append(_ejecutar(SNIPPET, ["ready"], env))
+
+    print(f"{'proceso nuevo':<20} {'mediana (s)':>12} {'min (s)':>9} {'RSS (MB)':>9}")
+    print(_fila("import", solo_import, "import_s"))
+    print(_fila("listo (sin índice)", frio, "total_s"))
+    print(_fila("listo (con índice)", caliente, "total_s"))
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("\n(sin /proc/<pid>/smaps_rollup: se omite la medición por worker)")
+        return
+
+    print(
+        f"\n{args.workers} workers por fork    {'maestro (s)':>11} {'listo (s)':>9} "
+        f"{'RSS/worker':>10} {'PSS/worker':>10} {'PSS total':>9}"
+    )
+    with tempfile.TemporaryDirectory() as index_dir:
+        env["INDEX_DIR"] = index_dir
+        _ejecutar(SNIPPET, ["ready"], env)  # construye el índice fuera de la medición
+        for nombre, preload in (("sin preload", "0"), ("con preload", "1")):
+            res = _ejecutar(SNIPPET_FORK, [preload, str(args.workers)], env)
+            w = res["workers"]
+            pss_total = res["master"].get("pss_mb", 0) + sum(x.get("pss_mb", 0) for x in w)
+            print(
+                f"{nombre:<24} {res['master_s']:>11.3f} "
+                f"{statistics.median(x['ready_s'] for x in w):>9.3f} "
+                f"{statistics.median(x.get('rss_mb', 0) for x in w):>10.0f} "
+                f"{statistics.median(x.get('pss_mb', 0) for x in w):>10.0f} "
+                f"{pss_total:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
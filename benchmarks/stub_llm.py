@@ -0,0 +1,181 @@
+# benchmarks/stub_llm.py
+"""
+Servidor LLM de pega compatible con la API de chat completions de OpenAI/Groq.
+
+Sirve para medir el backend sin gastar tokens ni depender de la red:
+    STUB_LATENCY=0.5 uvicorn benchmarks.stub_llm:app --port 9100
+
+y arrancar el backend con GROQ_BASE_URL=http://127.0.0.1:9100.
+
+Además de la latencia y el ritmo de tokens se pueden inyectar errores
+(429 con Retry-After y 5xx) para ejercitar los reintentos, y una tasa de
+rechazo del evaluador. Con STUB_RPM / STUB_TPM aplica además límites por
+modelo en una ventana deslizante de STUB_WINDOW segundos, como la cuenta de
+Groq: lo que los supera recibe 429 con el Retry-After correspondiente.
+GET /stub/stats devuelve las peticiones atendidas y rechazadas por modelo.
+
+Para medir plazos, hedging y modelos de reserva: STUB_MODEL_LATENCY fija la
+latencia de modelos concretos, STUB_TAIL_RATE / STUB_TAIL_LATENCY añaden
+picos de latencia a una fracción de las peticiones y los modelos de
+STUB_FAIL_MODELS responden siempre 503.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from collections import defaultdict, deque
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.5"))  # segundos hasta la respuesta / primer token
+STUB_TOKENS_PER_S = float(os.getenv("STUB_TOKENS_PER_S", "200"))  # ritmo de generación
+STUB_ANSWER_WORDS = int(os.getenv("STUB_ANSWER_WORDS", "8"))  # longitud de la respuesta del agente
+STUB_ERROR_429 = float(os.getenv("STUB_ERROR_429", "0"))  # fracción de peticiones con 429
+STUB_ERROR_5XX = float(os.getenv("STUB_ERROR_5XX", "0"))  # fracción de peticiones con 503
+STUB_REJECT_RATE = float(os.getenv("STUB_REJECT_RATE", "0"))  # fracción de veredictos es_aceptable=false
+STUB_RPM = int(os.getenv("STUB_RPM", "0"))  # peticiones por ventana y modelo (0 = sin límite)
+STUB_TPM = int(os.getenv("STUB_TPM", "0"))  # tokens (prompt + respuesta) por ventana y modelo
+STUB_WINDOW = float(os.getenv("STUB_WINDOW", "60"))
+# "modelo=segundos,modelo2=segundos": latencia propia de esos modelos (el resto, STUB_LATENCY)
+STUB_MODEL_LATENCY = {
+    m.strip(): float(v) for m, _, v in (i.rpartition("=") for i in os.getenv("STUB_MODEL_LATENCY", "").split(",")) if m
+}
+STUB_TAIL_RATE = float(os.getenv("STUB_TAIL_RATE", "0"))  # fracción de peticiones con un pico de latencia
+STUB_TAIL_LATENCY = float(os.getenv("STUB_TAIL_LATENCY", "3"))  # segundos extra del pico
+STUB_FAIL_MODELS = {m.strip() for m in os.getenv("STUB_FAIL_MODELS", "").split(",") if m.strip()}  # siempre 503
+
+_rng = random.Random(int(os.getenv("STUB_SEED", "0")))
+
+app = FastAPI(title="Stub LLM")
+
+# Por modelo: (instante, tokens) de las peticiones admitidas en la ventana
+_ventanas: dict[str, deque] = defaultdict(deque)
+_stats: dict[str, dict[str, int]] = defaultdict(lambda: {"ok": 0, "rate_limited": 0})
+
+
+def _admitir(model: str, tokens: int) -> float:
+    """
+    Aplica STUB_RPM/STUB_TPM: 0 si se admite, o los segundos hasta que cabría.
+    """
+    ahora = time.monotonic()
+    ventana = _ventanas[model]
+    while ventana and ventana[0][0] <= ahora - STUB_WINDOW:
+        ventana.popleft()
+    espera = 0.0
+    if STUB_RPM and len(ventana) >= STUB_RPM:
+        espera = ventana[len(ventana) - STUB_RPM][0] + STUB_WINDOW - ahora
+    if STUB_TPM and sum(t for _, t in ventana) + tokens > STUB_TPM:
+        sobran = sum(t for _, t in ventana) + tokens - STUB_TPM
+        for t0, t in ventana:
+            sobran -= t
+            if sobran <= 0:
+                espera = max(espera, t0 + STUB_WINDOW - ahora)
+                break
+        else:
+            espera = max(espera, STUB_WINDOW)
+    if espera <= 0:
+        ventana.append((ahora, tokens))
+    return espera
+
+
+def _completion(model: str, content: str, prompt_tokens: int = 0) -> dict:
+    completion_tokens = len(content.split())  # una "palabra" por token basta para el stub
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _chunk(model: str, delta: dict, finish_reason=None) -> str:
+    data = {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+
+async def _stream(model: str, content: str):
+    yield _chunk(model, {"role": "assistant", "content": ""})
+    for palabra in content.split(" "):
+        await asyncio.sleep(1 / STUB_TOKENS_PER_S)
+        yield _chunk(model, {"content": palabra + " "})
+    yield _chunk(model, {}, finish_reason="stop")
+    yield "data: [DONE]\n\n"
+
+
+def _error(status: int, mensaje: str, headers=None) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": mensaje, "type": "stub_error", "code": status}},
+        status_code=status,
+        headers=headers,
+    )
+
+
+def _respuesta_agente() -> str:
+    base = "Respuesta de prueba generada por el stub LLM.".split()
+    return " ".join(base[i % len(base)] for i in range(max(1, STUB_ANSWER_WORDS)))
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "stub")
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in body.get("messages", []))
+    espera = _admitir(model, prompt_tokens + (body.get("max_tokens") or STUB_ANSWER_WORDS))
+    if espera > 0:
+        _stats[model]["rate_limited"] += 1
+        return _error(429, "Rate limit reached (stub)", headers={"Retry-After": f"{espera:.2f}"})
+    if model in STUB_FAIL_MODELS:
+        _stats[model]["failed"] = _stats[model].get("failed", 0) + 1
+        return _error(503, "Model unavailable (stub)")
+    _stats[model]["ok"] += 1
+    latencia = STUB_MODEL_LATENCY.get(model, STUB_LATENCY)
+    if STUB_TAIL_RATE and _rng.random() < STUB_TAIL_RATE:
+        latencia += STUB_TAIL_LATENCY
+    await asyncio.sleep(latencia)
+
+    azar = _rng.random()
+    if azar < STUB_ERROR_429:
+        return _error(429, "Rate limit reached (stub)", headers={"Retry-After": "0"})
+    if azar < STUB_ERROR_429 + STUB_ERROR_5XX:
+        return _error(503, "Service unavailable (stub)")
+
+    # El evaluador pide response_format json_object
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        aceptable = _rng.random() >= STUB_REJECT_RATE
+        content = json.dumps({
+            "es_aceptable": aceptable,
+            "retroalimentacion": "OK (stub)" if aceptable else "Rechazada por el stub",
+        })
+    else:
+        content = _respuesta_agente()
+
+    if body.get("stream"):
+        return StreamingResponse(_stream(model, content), media_type="text/event-stream")
+    await asyncio.sleep(len(content.split()) / STUB_TOKENS_PER_S)
+    return _completion(model, content, prompt_tokens)
+
+
+@app.get("/stub/stats")
+async def stub_stats():
+    return _stats
@@ -48,4 +48,338 @@ def test_build_messages_usa_historial_si_existe():
     assert "profundizar en tu experiencia en datos" in texto_completo
 
     # Y el tamaño en 'tokens' aproximados no debe ser 0 (sanity check)
-    assert approx_tokens(texto_completo) > 0       
\ No newline at end of file
+    assert approx_tokens(texto_completo) > 0       
+
+def test_chat_stream_emite_tokens_y_evento_final(monkeypatch):
+    """
+    /chat/stream debe emitir los tokens del agente y un evento final con la
+    respuesta corregida si el evaluador rechaza la primera.
+    """
+    import json
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+    from app.evaluator import Evaluacion
+
+    async def fake_stream():
+        for t in ["Tengo ", "10 años ", "de experiencia."]:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=t))])
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        if kwargs.get("stream"):
+            return fake_stream()
+        msg = SimpleNamespace(content="Tengo 3 años de experiencia.")
+        return SimpleNamespace(choices=[SimpleNamespace(message=msg)])
+
+    async def fake_evaluar(**kwargs):
+        return Evaluacion(es_aceptable=False, retroalimentacion="Años incorrectos")
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    monkeypatch.setattr(backend, "evaluar_respuesta_async", fake_evaluar)
+
+    client = TestClient(backend.app)
+    resp = client.post("/chat/stream", json={"message": "¿Cuántos años de experiencia tienes?"})
+
+    assert resp.status_code == 200
+    eventos = [
+        (bloque.split("\n")[0][len("event: "):], json.loads(bloque.split("\n")[1][len("data: "):]))
+        for bloque in resp.text.strip().split("\n\n")
+    ]
+    assert [e for e, _ in eventos] == ["token", "token", "token", "final"]
+
+    final = eventos[-1][1]
+    assert final["evaluated"] is True
+    assert final["es_aceptable"] is False
+    assert final["replaced"] is True
+    assert final["answer"] == "Tengo 3 años de experiencia."
+
+
+def test_sesion_guarda_historial_en_el_servidor(monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+
+    recibidos = []
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        recibidos.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Hola, soy Nicolás."))])
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+
+    client = TestClient(backend.app)
+    session_id = client.post("/sessions", json={}).json()["session_id"]
+    for mensaje in ["hola", "¿qué tal?"]:
+        resp = client.post(f"/sessions/{session_id}/messages", json={"message": mensaje})
+        assert resp.json()["answer"] == "Hola, soy Nicolás."
+
+    # el segundo turno lleva el primero como historial sin que el cliente lo reenvíe
+    contenidos = [m["content"] for m in recibidos[-1]]
+    assert "hola" in contenidos and "Hola, soy Nicolás." in contenidos
+    assert client.get(f"/sessions/{session_id}").json()["n_messages"] == 4
+    assert client.post("/sessions/no-existe/messages", json={"message": "x"}).status_code == 404
+
+
+def test_sesion_en_streaming_guarda_el_turno(monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+
+    recibidos = []
+
+    async def fake_stream():
+        for t in ["Hola, ", "soy Nicolás."]:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=t))])
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        recibidos.append(messages)
+        return fake_stream()
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+
+    client = TestClient(backend.app)
+    session_id = client.post("/sessions", json={}).json()["session_id"]
+    for mensaje in ["hola", "¿qué tal?"]:
+        resp = client.post(f"/sessions/{session_id}/messages/stream", json={"message": mensaje})
+        assert resp.status_code == 200 and "event: final" in resp.text
+
+    contenidos = [m["content"] for m in recibidos[-1]]
+    assert "hola" in contenidos and "Hola, soy Nicolás." in contenidos
+    assert client.get(f"/sessions/{session_id}").json()["n_messages"] == 4
+    assert client.post("/sessions/no-existe/messages/stream", json={"message": "x"}).status_code == 404
+
+def test_preguntas_identicas_concurrentes_comparten_una_llamada(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    import httpx
+    import app.backend as backend
+    from app.coalesce import SingleFlight
+    from app.rate_limit import MemoryGCRAStore
+
+    llamadas = []
+
+    async def stub_llm(client, model, messages, **kwargs):
+        # LLM local lento: todas las peticiones llegan mientras la primera está en vuelo
+        llamadas.append(model)
+        await asyncio.sleep(0.2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Python y FastAPI."))])
+
+    monkeypatch.setattr(backend, "call_chat_async", stub_llm)
+    monkeypatch.setattr(backend, "single_flight", SingleFlight())
+    monkeypatch.setattr(backend.rate_limiter, "store", MemoryGCRAStore())
+
+    async def rafaga():
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            payloads = [{"message": "¿Qué stack técnico usas?"}] * 8 + [{"message": "¿Que stack tecnico usas"}] * 2
+            return await asyncio.gather(*(client.post("/chat", json=p) for p in payloads))
+
+    respuestas = asyncio.run(rafaga())
+
+    assert all(r.status_code == 200 and r.json()["answer"] == "Python y FastAPI." for r in respuestas)
+    assert len(llamadas) == 1
+    assert backend.single_flight.stats()["upstream_calls_saved"] == 9
+
+
+def test_metrics_expone_latencia_por_etapa(monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+    from app.evaluator import Evaluacion
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Unos 5 años."))])
+
+    async def fake_evaluar(**kwargs):
+        return Evaluacion(es_aceptable=True, retroalimentacion="OK")
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    monkeypatch.setattr(backend, "evaluar_respuesta_async", fake_evaluar)
+
+    client = TestClient(backend.app)
+    client.post("/chat", json={"message": "¿Cuántos años de experiencia tienes en métricas?"})
+    texto = client.get("/metrics").text
+
+    for etapa in ("retrieval", "build_messages", "budget_messages", "agent", "evaluator"):
+        assert f'agente_cv_stage_seconds_count{{stage="{etapa}"}}' in texto
+    assert 'agente_cv_request_seconds_bucket{endpoint="/chat",le="+Inf"}' in texto
+    assert "# TYPE agente_cv_llm_retries_total counter" in texto
+    assert "# TYPE agente_cv_rate_limited_total counter" in texto
+
+
+def test_importar_backend_no_carga_indice_ni_sdks():
+    """
+    create_app es perezoso: importar la app (incluso sin GROQ_API_KEY) no carga
+    el índice, scikit-learn ni los SDK de los LLM; se cargan en el primer uso.
+    """
+    import json
+    import os
+    import subprocess
+    import sys
+
+    codigo = (
+        "import json, sys\n"
+        "import app.backend as b\n"
+        "pesados = ['sklearn', 'openai', 'groq', 'app.index_store']\n"
+        "antes = [m for m in pesados if m in sys.modules]\n"
+        "b.recursos.retriever.retrieve('experiencia', k=1)\n"
+        "print(json.dumps({'antes': antes, 'cargados': b.recursos.cargados()}))\n"
+    )
+    env = {k: v for k, v in os.environ.items() if k != "GROQ_API_KEY"}
+    out = subprocess.run([sys.executable, "-c", codigo], env=env, capture_output=True, text=True, check=True)
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert res["antes"] == []
+    assert "retriever" in res["cargados"] and "client_openai" not in res["cargados"]
+
+
+def test_llm_sin_cuota_omite_evaluacion_o_responde_503(monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+    from app.llm_scheduler import LLMOverloaded
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Tengo 3 años."))])
+
+    async def evaluador_sin_cuota(**kwargs):
+        raise LLMOverloaded("eval", "evaluator", 2.0)
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    monkeypatch.setattr(backend, "evaluar_respuesta_async", evaluador_sin_cuota)
+    client = TestClient(backend.app)
+
+    resp = client.post("/chat", json={"message": "¿Tienes algún certificado oficial de idiomas?"})
+    assert resp.status_code == 200
+    assert resp.json()["answer"] == "Tengo 3 años." and resp.json()["evaluated"] is False
+
+    async def agente_sin_cuota(client, model, messages, **kwargs):
+        raise LLMOverloaded("agente", kwargs.get("priority", "agent"), 2.5)
+
+    monkeypatch.setattr(backend, "call_chat_async", agente_sin_cuota)
+    resp = client.post("/chat", json={"message": "¿Qué aficiones tienes fuera del trabajo?"})
+    assert resp.status_code == 503 and resp.headers["Retry-After"] == "3"
+
+
+def test_alternativa_sin_conexion_recurre_al_reintento(monkeypatch):
+    from types import SimpleNamespace
+    import httpx
+    from fastapi.testclient import TestClient
+    from openai import APIConnectionError
+    import app.backend as backend
+    from app.evaluator import Evaluacion
+    from app.gating import Decision
+
+    monkeypatch.setattr(backend, "PIPELINE_MODE", "speculative")
+    monkeypatch.setitem(backend.recursos.__dict__, "gate", SimpleNamespace(decide=lambda *a: Decision(True, 1.0)))
+    prioridades = []
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        prioridades.append(kwargs.get("priority", "agent"))
+        if kwargs.get("priority") == "alternative":
+            raise APIConnectionError(request=httpx.Request("POST", "https://api.groq.com"))
+        contenido = "Corregida." if kwargs.get("priority") == "retry" else "Mala."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=contenido))])
+
+    async def fake_evaluar(**kwargs):
+        return Evaluacion(es_aceptable=kwargs["respuesta"] != "Mala.", retroalimentacion="Inventa datos.")
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    monkeypatch.setattr(backend, "evaluar_respuesta_async", fake_evaluar)
+    client = TestClient(backend.app)
+
+    resp = client.post("/chat", json={"message": "¿Cuántos años llevas programando en Python?"})
+    assert resp.status_code == 200 and resp.json()["answer"] == "Corregida."
+    assert "alternative" in prioridades and "retry" in prioridades
+
+
+def test_corpus_usa_los_datos_de_cada_perfil_y_404_si_no_existe(monkeypatch):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+    from app.corpus import CorpusManager
+    from app.evaluator import Evaluacion
+    from app.gating import Decision
+
+    corpus = CorpusManager()
+    corpus.add_document("ana/cv.txt", "Ana trabaja con Kubernetes desde 2019.", profile_id="ana")
+    corpus.set_profile("ana", name="Ana Pérez", summary="Ingeniera de plataforma.")
+    monkeypatch.setitem(backend.recursos.__dict__, "corpus", corpus)
+    # Que se evalúen todas las respuestas
+    monkeypatch.setitem(backend.recursos.__dict__, "gate", SimpleNamespace(decide=lambda *a: Decision(True, 1.0)))
+
+    agente, evaluador = [], []
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        agente.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Con Kubernetes."))])
+
+    async def fake_evaluar(**kwargs):
+        evaluador.append(kwargs)
+        return Evaluacion(es_aceptable=True, retroalimentacion="OK")
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    monkeypatch.setattr(backend, "evaluar_respuesta_async", fake_evaluar)
+    client = TestClient(backend.app)
+
+    resp = client.post("/chat", json={"message": "¿Con qué orquestador de contenedores trabajas?", "profile_id": "ana"})
+    assert resp.status_code == 200
+    assert "Actúas como Ana Pérez" in agente[-1][0]["content"] and "Ingeniera de plataforma." in agente[-1][0]["content"]
+    assert evaluador[-1]["nombre"] == "Ana Pérez" and evaluador[-1]["perfil"] == "Ana trabaja con Kubernetes desde 2019."
+
+    assert client.post("/chat", json={"message": "hola", "profile_id": "nadie"}).status_code == 404
+    assert client.post("/chat/stream", json={"message": "hola", "profile_id": "nadie"}).status_code == 404
+    assert client.post("/sessions", json={"profile_id": "nadie"}).status_code == 404
+
+
+def test_sin_profile_id_recupera_solo_del_cv_configurado(monkeypatch):
+    import app.backend as backend
+    from app.corpus import CorpusManager
+
+    corpus = CorpusManager()
+    corpus.add_document("ana/cv.txt", "Ana trabaja con Python y Kubernetes desde 2019.", profile_id="ana")
+    corpus.add_document("luis/cv.txt", "Luis programa en Python y administra redes.", profile_id="luis")
+    monkeypatch.setitem(backend.recursos.__dict__, "corpus", corpus)
+    pregunta = "¿Con qué lenguajes de programación como Python trabajas?"
+
+    fragmentos = [texto for texto, _ in backend.recuperar_fragmentos(pregunta)]
+    assert fragmentos and all(texto in backend.recursos.retriever.chunks for texto in fragmentos)
+    assert not set(fragmentos) & {"Ana trabaja con Python y Kubernetes desde 2019.", "Luis programa en Python y administra redes."}
+
+    fragmentos_ana = [texto for texto, _ in backend.recuperar_fragmentos(pregunta, profile_id="ana")]
+    assert fragmentos_ana == ["Ana trabaja con Python y Kubernetes desde 2019."]
+
+
+def test_admin_reload_sincroniza_el_corpus_en_marcha(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+    from app.corpus import CorpusManager
+
+    (tmp_path / "ana").mkdir()
+    cv = tmp_path / "ana" / "cv.txt"
+    cv.write_text("Ana trabaja con Kubernetes y Terraform.", encoding="utf-8")
+    corpus = CorpusManager()
+    corpus.sync_directory(str(tmp_path))
+    monkeypatch.setitem(backend.recursos.__dict__, "corpus", corpus)
+    monkeypatch.setattr(backend, "CORPUS_DIR", str(tmp_path))
+    monkeypatch.setattr(backend, "ADMIN_TOKEN", "secreto")
+    monkeypatch.setattr(backend, "PROFILE_WATCH_INTERVAL", 0)
+    contextos = []
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        contextos.append(" ".join(m["content"] for m in messages if m["role"] == "system"))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Con Rust."))])
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    with TestClient(backend.app) as client:
+        pregunta = {"message": "¿Con qué lenguaje de sistemas trabajas ahora?", "profile_id": "ana"}
+        client.post("/chat", json=pregunta)
+        assert "Terraform" in contextos[-1]
+
+        cv.write_text("Ana ahora trabaja con Rust y sistemas embebidos.", encoding="utf-8")
+        res = client.post("/admin/reload", headers={"X-Admin-Token": "secreto"}).json()
+        assert res["corpus"]["updated"] == 1
+
+        client.post("/chat", json=pregunta)
+        assert "Rust y sistemas embebidos" in contextos[-1] and "Terraform" not in contextos[-1]
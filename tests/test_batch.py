@@ -0,0 +1,50 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.batch import completed_ids, read_items, run_batch
+
+
+def test_lote_guarda_resultados_y_reanuda_solo_lo_pendiente(monkeypatch, tmp_path):
+    import app.backend as backend
+
+    entrada = tmp_path / "preguntas.jsonl"
+    entrada.write_text(
+        "\n".join(json.dumps(x, ensure_ascii=False) for x in [
+            {"id": "stack", "question": "¿Qué stack usas?"},
+            {"question": "¿Qué aficiones tienes?"},
+            {"message": "¿Dónde vives?", "history": [{"role": "user", "content": "hola"}]},
+        ]),
+        encoding="utf-8",
+    )
+    salida = tmp_path / "respuestas.jsonl"
+    llamadas, fallar = [], {"¿Qué aficiones tienes?"}
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        pregunta = messages[-1]["content"]
+        llamadas.append(pregunta)
+        await asyncio.sleep(0.01)
+        if pregunta in fallar:
+            raise RuntimeError("se cortó la conexión")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"Respuesta a {pregunta}"))])
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    items = read_items(str(entrada))
+    assert [it["id"] for it in items] == ["stack", "2", "3"]
+
+    resumen = asyncio.run(run_batch(items, str(salida), concurrency=2, mode="sequential"))
+    assert (resumen["ok"], resumen["errors"], resumen["skipped"]) == (2, 1, 0)
+    registros = {r["id"]: r for r in map(json.loads, salida.read_text(encoding="utf-8").splitlines())}
+    assert registros["stack"]["answer"] == "Respuesta a ¿Qué stack usas?"
+    assert registros["stack"]["passages"] and registros["stack"]["tokens"]["prompt"] > 0
+    assert {"retrieval_s", "build_s", "pipeline_s", "total_s"} <= set(registros["stack"]["timings"])
+    assert "error" in registros["2"]
+
+    # Reanudación (con la última línea cortada a medias): sólo se repite la fallida
+    with open(salida, "a", encoding="utf-8") as f:
+        f.write('{"id": "3", "answ')
+    fallar.clear()
+    llamadas.clear()
+    resumen = asyncio.run(run_batch(items, str(salida), concurrency=2, mode="sequential"))
+    assert (resumen["ok"], resumen["skipped"]) == (1, 2) and llamadas == ["¿Qué aficiones tienes?"]
+    assert completed_ids(str(salida)) == {"stack", "2", "3"}
@@ -0,0 +1,89 @@
+# tests/test_cache.py
+from app.cache import (
+    MemoryCacheBackend,
+    ResponseCache,
+    SqliteCacheBackend,
+    normalizar_pregunta,
+    retrieval_fingerprint,
+)
+
+PAYLOAD = {"answer": "Unos 3 años.", "evaluated": True, "es_aceptable": True, "retroalimentacion": "OK"}
+
+
+class _Reloj:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_normalizar_pregunta_ignora_tildes_signos_y_mayusculas():
+    assert normalizar_pregunta("¿Cuántos  AÑOS de experiencia tienes?") == "cuantos anos de experiencia tienes"
+
+
+def test_acierto_exacto_casi_duplicado_y_fallo():
+    cache = ResponseCache(MemoryCacheBackend(), threshold=0.85)
+    fp = retrieval_fingerprint(["fragmento A", "fragmento B"])
+    cache.store("¿Cuántos años de experiencia tienes?", fp, PAYLOAD)
+
+    assert cache.lookup("cuantos años de experiencia tienes", fp) == PAYLOAD
+    assert cache.lookup("¿Cuántos años de experiencia tiene?", fp) == PAYLOAD
+    # Misma pregunta con otro contexto recuperado: no se reutiliza
+    assert cache.lookup("¿Cuántos años de experiencia tienes?", retrieval_fingerprint(["otro"])) is None
+
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["near_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_memoria_expira_por_ttl_y_desaloja_lru():
+    reloj = _Reloj()
+    cache = ResponseCache(MemoryCacheBackend(max_entries=2, ttl=60, clock=reloj))
+    cache.store("uno", "fp", PAYLOAD)
+    cache.store("dos", "fp", PAYLOAD)
+    cache.lookup("uno", "fp")  # "uno" pasa a ser el más reciente
+    cache.store("tres", "fp", PAYLOAD)
+
+    assert cache.lookup("dos", "fp") is None
+    assert cache.lookup("uno", "fp") == PAYLOAD
+
+    reloj.t += 61
+    assert cache.lookup("uno", "fp") is None
+
+
+def test_sqlite_se_comparte_entre_instancias(tmp_path):
+    """
+    Dos ResponseCache sobre el mismo fichero simulan dos workers.
+    """
+    ruta = str(tmp_path / "cache.sqlite")
+    worker_a = ResponseCache(SqliteCacheBackend(ruta))
+    worker_b = ResponseCache(SqliteCacheBackend(ruta))
+
+    worker_a.store("¿Qué stack usas?", "fp", PAYLOAD)
+
+    assert worker_b.lookup("que stack usas", "fp") == PAYLOAD
+    assert worker_b.stats()["size"] == 1
+
+
+def test_sqlite_en_un_hilo_no_bloquea_el_event_loop(tmp_path):
+    import asyncio
+    import sqlite3
+
+    ruta = str(tmp_path / "cache.sqlite")
+    cache = ResponseCache(SqliteCacheBackend(ruta))
+    otro = sqlite3.connect(ruta, isolation_level=None)  # otro worker escribiendo
+    otro.execute("BEGIN IMMEDIATE")
+
+    async def escenario():
+        tics = 0
+        guardado = asyncio.create_task(cache.astore("¿Cuántos años?", "fp", PAYLOAD))
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            tics += 1
+        otro.execute("COMMIT")
+        await guardado
+        return tics, await cache.alookup("cuantos anos", "fp")
+
+    tics, cached = asyncio.run(escenario())
+    assert tics == 10 and cached == PAYLOAD
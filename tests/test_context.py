@@ -0,0 +1,41 @@
+from app.context import compress_passages, select_mmr
+from app.tokens import count_tokens
+
+
+def test_mmr_prefiere_un_fragmento_distinto_a_un_casi_duplicado():
+    passages = [
+        ("Machine Learning Engineer en Accenture desde 2021, proyectos de IA generativa.", 0.9),
+        ("Machine Learning Engineer en Accenture desde 2021, proyectos de IA generativa y RAG.", 0.85),
+        ("Data Scientist en Aplazame entre 2018 y 2021, modelos de riesgo.", 0.6),
+    ]
+    elegidos = select_mmr("¿Dónde has trabajado?", passages, k=2, lambda_=0.7)
+    assert [p for p, _ in elegidos] == [passages[0][0], passages[2][0]]
+    # Con lambda = 1 sólo cuenta la relevancia: el top-k de siempre
+    assert select_mmr("¿Dónde has trabajado?", passages, k=2, lambda_=1.0) == passages[:2]
+
+
+def test_compresion_quita_lo_que_ya_dice_el_resumen_y_lo_repetido():
+    resumen = "Ingeniero de Machine Learning en Accenture especializado en IA generativa."
+    passages = [
+        "Machine Learning en Accenture, IA generativa. Certificación AWS Solutions Architect en 2022.",
+        "Certificación AWS Solutions Architect en 2022. Máster en Ciencia de Datos por la Universidad de Sevilla.",
+    ]
+    ctx = compress_passages("¿Qué certificaciones tienes?", passages, resumen, max_tokens=500)
+    assert ctx.passages == [
+        "Certificación AWS Solutions Architect en 2022.",
+        "Máster en Ciencia de Datos por la Universidad de Sevilla.",
+    ]
+    assert ctx.tokens_saved > 0 and ctx.tokens_after < ctx.tokens_before
+
+
+def test_compresion_respeta_el_presupuesto_y_prioriza_la_pregunta():
+    passages = [f"Proyecto {i} de análisis de datos con Python y Spark para el cliente {i}." for i in range(10)]
+    passages.append("Inglés C1 (Cambridge Advanced) y francés B2.")
+    ctx = compress_passages("¿Qué idiomas hablas? Inglés, francés", passages, max_tokens=60)
+    assert ctx.tokens_after <= 60
+    assert any("Inglés C1" in p for p in ctx.passages)
+
+    # 0 = sin compresión
+    sin = compress_passages("x", passages, max_tokens=0)
+    assert sin.passages == passages and sin.tokens_saved == 0
+    assert sin.tokens_before == count_tokens("\n\n".join(f"- {p}" for p in passages))
@@ -0,0 +1,114 @@
+# tests/test_corpus.py
+from app.corpus import CorpusManager
+
+
+def _corpus():
+    corpus = CorpusManager(compact_every=2)
+    corpus.add_document("ana/cv.txt", "Ana trabaja con Kubernetes y Terraform en la nube.", profile_id="ana")
+    corpus.add_document("ana/portfolio.md", "Proyecto de visión artificial con PyTorch.", profile_id="ana")
+    corpus.add_document("luis/cv.txt", "Luis es experto en Kubernetes y redes.", profile_id="luis")
+    return corpus
+
+
+def test_retrieve_filtra_por_perfil_y_documento():
+    corpus = _corpus()
+
+    assert len(corpus.retrieve("Kubernetes", k=5)) == 2
+    assert corpus.retrieve("Kubernetes", k=5, profile_id="luis") == ["Luis es experto en Kubernetes y redes."]
+    assert corpus.retrieve("PyTorch", k=5, doc_ids=["ana/cv.txt"]) == []
+
+
+def test_actualizar_y_borrar_sin_reajuste_completo():
+    """
+    Los cambios se ven en la siguiente consulta, tanto si el documento
+    ya estaba fusionado en el índice principal como si sigue en el delta.
+    """
+    corpus = _corpus()
+
+    assert corpus.add_document("luis/cv.txt", "Luis ahora trabaja con Rust.", profile_id="luis")
+    assert not corpus.add_document("luis/cv.txt", "Luis ahora trabaja con Rust.", profile_id="luis")
+    assert corpus.retrieve("Kubernetes", k=5, profile_id="luis") == []
+    assert corpus.retrieve("Rust", k=1) == ["Luis ahora trabaja con Rust."]
+
+    corpus.remove_document("ana/cv.txt")
+    assert corpus.retrieve("Terraform", k=5) == []
+    assert len(corpus) == 2
+
+
+def test_sync_directory_detecta_altas_cambios_y_bajas(tmp_path):
+    (tmp_path / "ana").mkdir()
+    (tmp_path / "ana" / "cv.txt").write_text("Ana: Kubernetes y Terraform.", encoding="utf-8")
+    (tmp_path / "notas.md").write_text("Notas generales sobre Python.", encoding="utf-8")
+
+    corpus = CorpusManager()
+    assert corpus.sync_directory(str(tmp_path))["added"] == 2
+    assert corpus.document_ids(profile_id="ana") == ["ana/cv.txt"]
+
+    (tmp_path / "ana" / "cv.txt").write_text("Ana: Go y gRPC.", encoding="utf-8")
+    (tmp_path / "notas.md").unlink()
+    resumen = corpus.sync_directory(str(tmp_path))
+
+    assert resumen["updated"] == 1 and resumen["removed"] == 1
+    assert corpus.retrieve("gRPC", k=1, profile_id="ana") == ["Ana: Go y gRPC."]
+
+
+def test_sync_directory_no_borra_documentos_de_directorios_hermanos(tmp_path):
+    raiz, hermano = tmp_path / "corpus", tmp_path / "corpus2"
+    raiz.mkdir()
+    hermano.mkdir()
+    (raiz / "cv.txt").write_text("CV principal.", encoding="utf-8")
+    (hermano / "extra.txt").write_text("Documento del directorio hermano.", encoding="utf-8")
+
+    corpus = CorpusManager()
+    corpus.add_document("corpus2/extra.txt", "Documento del directorio hermano.", path=str(hermano / "extra.txt"))
+    resumen = corpus.sync_directory(str(raiz))
+
+    assert resumen["removed"] == 0
+    assert sorted(corpus.document_ids()) == ["corpus2/extra.txt", "cv.txt"]
+
+
+def test_cada_perfil_tiene_nombre_resumen_y_cv(tmp_path):
+    (tmp_path / "ana").mkdir()
+    (tmp_path / "ana" / "cv.txt").write_text("Ana: Kubernetes y Terraform.", encoding="utf-8")
+    (tmp_path / "ana" / "profile.json").write_text('{"name": "Ana Pérez"}', encoding="utf-8")
+    (tmp_path / "ana" / "resumen.txt").write_text("Ingeniera de plataforma.", encoding="utf-8")
+    (tmp_path / "luis").mkdir()
+    (tmp_path / "luis" / "cv.txt").write_text("Luis: redes.", encoding="utf-8")
+
+    corpus = CorpusManager()
+    corpus.sync_directory(str(tmp_path))
+    ana = corpus.profile("ana")
+
+    assert (ana.name, ana.summary, ana.cv_text) == ("Ana Pérez", "Ingeniera de plataforma.", "Ana: Kubernetes y Terraform.")
+    assert corpus.document_ids(profile_id="ana") == ["ana/cv.txt"]  # el resumen no se indexa
+    assert corpus.profile("luis").name is None and corpus.profile("nadie") is None
+
+    (tmp_path / "ana" / "resumen.txt").write_text("Ingeniera de plataforma y SRE.", encoding="utf-8")
+    corpus.sync_directory(str(tmp_path))
+    assert corpus.profile("ana").summary == "Ingeniera de plataforma y SRE."
+    assert corpus.profile("ana").version != ana.version
+
+
+def test_watch_sincroniza_los_cambios_del_directorio(tmp_path):
+    import asyncio
+
+    (tmp_path / "ana").mkdir()
+    cv = tmp_path / "ana" / "cv.txt"
+    cv.write_text("Ana: Kubernetes y Terraform.", encoding="utf-8")
+    corpus = CorpusManager()
+    corpus.sync_directory(str(tmp_path))
+
+    async def escenario():
+        vigilante = asyncio.create_task(corpus.watch(str(tmp_path), 0.02))
+        cv.write_text("Ana: Go y gRPC.", encoding="utf-8")
+        (tmp_path / "ana" / "charla.md").write_text("Charla sobre observabilidad.", encoding="utf-8")
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if corpus.retrieve("gRPC", k=1, profile_id="ana") and len(corpus) == 2:
+                break
+        vigilante.cancel()
+
+    asyncio.run(escenario())
+    assert corpus.retrieve("gRPC", k=1, profile_id="ana") == ["Ana: Go y gRPC."]
+    assert corpus.retrieve("Terraform", k=1) == []
+    assert corpus.retrieve("observabilidad", k=1) == ["Charla sobre observabilidad."]
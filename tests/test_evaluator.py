@@ -0,0 +1,47 @@
+from app.evaluator import build_eval_messages
+
+RESUMEN = "Ingeniero de Machine Learning con experiencia en IA generativa."
+PERFIL = "CV COMPLETO " * 200
+
+
+def test_prompt_de_sistema_memoizado_e_identico_entre_peticiones():
+    a = build_eval_messages("Nicolás", RESUMEN, PERFIL, "Respuesta 1", "Pregunta 1", [], modo="full")
+    b = build_eval_messages("Nicolás", RESUMEN, PERFIL, "Respuesta 2", "Pregunta 2", [], modo="full")
+
+    # mismo objeto cacheado y lo que cambia va sólo en el mensaje de usuario
+    assert a[0]["content"] is b[0]["content"]
+    assert PERFIL in a[0]["content"]
+    assert "Pregunta 1" in a[1]["content"] and "Pregunta 1" not in a[0]["content"]
+
+
+def test_modo_compact_envia_fragmentos_en_vez_del_cv():
+    fragmentos = ["Python y PyTorch en producción"]
+    system, user = build_eval_messages(
+        "Nicolás", RESUMEN, PERFIL, "Uso PyTorch", "¿Qué frameworks usas?", [],
+        fragmentos=fragmentos, modo="compact",
+    )
+
+    assert "CV COMPLETO" not in system["content"]
+    assert RESUMEN in system["content"]
+    assert fragmentos[0] in user["content"]
+
+    # sin fragmentos no hay evidencia suficiente: se vuelve al modo completo
+    system, _ = build_eval_messages("Nicolás", RESUMEN, PERFIL, "x", "y", [], modo="compact")
+    assert PERFIL in system["content"]
+
+
+def test_evaluacion_local_evita_el_llm_en_los_casos_claros():
+    from app.evaluator import evaluacion_local
+
+    perfil = "Machine Learning Engineer en Accenture desde 2024. Python y SQL."
+    rechazo = evaluacion_local(perfil, RESUMEN, "Trabajé en Google en 2015.", "¿Dónde trabajaste?", modo="shortcircuit")
+    assert rechazo.es_aceptable is False and "Google" in rechazo.retroalimentacion
+    assert rechazo.source == "grounding"
+
+    ok = evaluacion_local(perfil, RESUMEN, "Trabajo en Accenture con Python.", "¿Dónde trabajas?", modo="shortcircuit")
+    assert ok.es_aceptable is True
+
+    # ambiguo: el LLM decide (None), salvo en modo "local"
+    assert evaluacion_local(perfil, RESUMEN, "¡Hola!", "hola", modo="shortcircuit") is None
+    assert evaluacion_local(perfil, RESUMEN, "¡Hola!", "hola", modo="local").es_aceptable is True
+    assert evaluacion_local(perfil, RESUMEN, "Trabajé en Google en 2015.", "x", modo="off") is None
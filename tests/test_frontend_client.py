@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+import httpx
+
+from app.frontend_client import FrontendClient, iter_sse
+
+
+def _sse(*tokens: str, final: str = None) -> str:
+    eventos = [f"event: token\ndata: {json.dumps({'delta': t})}\n\n" for t in tokens]
+    eventos.append(f"event: final\ndata: {json.dumps({'answer': final or ''.join(tokens)})}\n\n")
+    return "".join(eventos)
+
+
+class _Backends:
+    """
+    Réplicas falsas del backend: registran las peticiones y pueden estar caídas.
+    """
+
+    def __init__(self, *hosts):
+        self.caidos = set()
+        self.peticiones = []
+        self.sesiones = {h: set() for h in hosts}
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        host, ruta = request.url.host, request.url.path
+        if host in self.caidos:
+            raise httpx.ConnectError("conexión rechazada", request=request)
+        cuerpo = json.loads(request.content) if request.content else None
+        self.peticiones.append((host, ruta, cuerpo))
+        if ruta == "/healthz":
+            return httpx.Response(200, json={"status": "ok"})
+        if ruta == "/sessions":
+            sid = f"s{len(self.peticiones)}"
+            self.sesiones[host].add(sid)
+            return httpx.Response(200, json={"session_id": sid})
+        if ruta.startswith("/sessions/"):
+            if ruta.split("/")[2] not in self.sesiones[host]:
+                return httpx.Response(404, json={"detail": "Sesión no encontrada o caducada"})
+            return httpx.Response(200, text=_sse("Hola ", host), headers={"content-type": "text/event-stream"})
+        if ruta == "/chat/stream":
+            return httpx.Response(200, text=_sse("Sin ", "sesión"), headers={"content-type": "text/event-stream"})
+        return httpx.Response(404)
+
+
+def _cliente(backends: _Backends) -> FrontendClient:
+    return FrontendClient(
+        urls=[f"http://{h}" for h in backends.sesiones],
+        client=httpx.AsyncClient(transport=httpx.MockTransport(backends)),
+        health_interval=0,
+    )
+
+
+async def _respuesta(cliente, conversacion, mensaje, history=None) -> list[str]:
+    return [p async for p in cliente.chat(conversacion, mensaje, history)]
+
+
+def test_iter_sse_parsea_eventos():
+    lineas = _sse("a", "b", final="ab").split("\n")
+    assert list(iter_sse(lineas)) == [("token", {"delta": "a"}), ("token", {"delta": "b"}), ("final", {"answer": "ab"})]
+
+
+def test_conversacion_usa_sesion_y_no_reenvia_historial():
+    backends = _Backends("a")
+    cliente = _cliente(backends)
+
+    async def conversacion():
+        primera = await _respuesta(cliente, "c1", "hola")
+        historial = [{"role": "user", "content": "hola"}, {"role": "assistant", "content": primera[-1]}]
+        segunda = await _respuesta(cliente, "c1", "¿y tu experiencia?", historial)
+        return primera, segunda
+
+    primera, segunda = asyncio.run(conversacion())
+
+    assert primera == ["Hola ", "Hola a", "Hola a"]
+    assert segunda[-1] == "Hola a"
+    mensajes = [(ruta, cuerpo) for _, ruta, cuerpo in backends.peticiones if ruta.endswith("/stream")]
+    assert len(mensajes) == 2 and mensajes[0][0] == mensajes[1][0]  # misma sesión
+    assert mensajes[1][1] == {"message": "¿y tu experiencia?"}  # sin historial
+
+
+def test_replica_caida_reintenta_en_otra_y_vuelve_tras_healthz():
+    backends = _Backends("a", "b")
+    backends.caidos.add("a")
+    cliente = _cliente(backends)
+
+    async def escenario():
+        respuestas = [(await _respuesta(cliente, f"c{i}", "hola"))[-1] for i in range(4)]
+        sanas_con_a_caida = {r.url: r.healthy for r in cliente.pool.replicas}
+        backends.caidos.clear()
+        estado = await cliente.pool.check(cliente.client)
+        return respuestas, sanas_con_a_caida, estado
+
+    respuestas, sanas, estado = asyncio.run(escenario())
+
+    assert respuestas == ["Hola b"] * 4  # ninguna conversación ve el fallo
+    assert sanas == {"http://a": False, "http://b": True}
+    assert estado == {"http://a": True, "http://b": True}
+
+
+def test_sesion_caducada_continua_con_historial_completo():
+    backends = _Backends("a")
+    cliente = _cliente(backends)
+
+    async def escenario():
+        await _respuesta(cliente, "c1", "hola")
+        backends.sesiones["a"].clear()  # el backend reinicia y pierde las sesiones
+        historial = [{"role": "user", "content": "hola"}, {"role": "assistant", "content": "Hola a", "metadata": None}]
+        return await _respuesta(cliente, "c1", "¿sigues ahí?", historial)
+
+    respuesta = asyncio.run(escenario())
+
+    assert respuesta[-1] == "Sin sesión"
+    host, ruta, cuerpo = backends.peticiones[-1]
+    assert ruta == "/chat/stream" and cuerpo["history"][-1] == {"role": "assistant", "content": "Hola a"}
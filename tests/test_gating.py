@@ -0,0 +1,107 @@
+import random
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from app.gating import (
+    DENSE_FEATURES,
+    ClassifierGate,
+    GateModel,
+    HeuristicGate,
+    VerdictLog,
+    grounding_features,
+    read_verdicts,
+)
+
+FRAGMENTOS = [
+    ("Ingeniero de datos en Acme desde 2019, con Python, Spark y Airflow.", 0.8),
+    ("Máster en Inteligencia Artificial por la Universidad de Sevilla en 2018.", 0.5),
+]
+
+
+def _datos(n=60, seed=0):
+    """
+    Respuestas aceptadas que citan los fragmentos y rechazadas con cifras y datos inventados.
+    """
+    rng = random.Random(seed)
+    buenas = [
+        "Trabajo como ingeniero de datos en Acme desde 2019 con Python y Spark.",
+        "Tengo un máster en Inteligencia Artificial por la Universidad de Sevilla.",
+        "Uso Python, Spark y Airflow en Acme.",
+    ]
+    malas = [
+        "Tengo {} años de experiencia liderando equipos de {} personas en Google.",
+        "Soy doctor en física cuántica desde {} y cobré {} euros.",
+    ]
+    preguntas, respuestas, rechazadas = [], [], []
+    for i in range(n):
+        mala = i % 2 == 0
+        preguntas.append(rng.choice(["¿Dónde trabajas?", "¿Qué estudiaste?", "¿Cuántos años de experiencia tienes?"]))
+        if mala:
+            respuestas.append(rng.choice(malas).format(rng.randint(5, 30), rng.randint(3, 90)))
+        else:
+            respuestas.append(rng.choice(buenas))
+        rechazadas.append(mala)
+    return preguntas, respuestas, [FRAGMENTOS] * n, rechazadas
+
+
+def _vectorizer():
+    return TfidfVectorizer(ngram_range=(1, 2)).fit([t for t, _ in FRAGMENTOS])
+
+
+def test_grounding_features_detecta_cifras_sin_respaldo():
+    citada = grounding_features("¿Dónde trabajas?", "En Acme desde 2019, con Python.", FRAGMENTOS)
+    inventada = grounding_features("¿Dónde trabajas?", "Llevo 12 años en Google.", FRAGMENTOS)
+    rasgos = dict(zip(DENSE_FEATURES, citada)), dict(zip(DENSE_FEATURES, inventada))
+
+    assert rasgos[0]["overlap_1"] == 1.0 and rasgos[0]["unsupported_numbers"] == 0
+    assert rasgos[1]["overlap_1"] < 0.5 and rasgos[1]["unsupported_numbers"] == 1
+    assert rasgos[0]["top_score"] == 0.8
+
+
+def test_gate_model_aprende_rechazos_y_se_guarda(tmp_path):
+    preguntas, respuestas, fragmentos, rechazadas = _datos()
+    modelo = GateModel.fit(_vectorizer(), preguntas, respuestas, fragmentos, rechazadas)
+
+    p = modelo.predict_proba(
+        ["¿Cuántos años de experiencia tienes?"] * 2,
+        ["Tengo 25 años de experiencia liderando equipos de 40 personas en Google.", "Uso Python y Spark en Acme."],
+        [FRAGMENTOS] * 2,
+    )
+    assert p[0] > 0.5 > p[1]
+
+    modelo.threshold = 0.4
+    modelo.save(tmp_path / "gate")
+    cargado = GateModel.load(tmp_path / "gate")
+    assert cargado.threshold == 0.4
+    assert abs(cargado.predict_proba(["q"], ["Uso Python en Acme."], [FRAGMENTOS])[0]
+               - modelo.predict_proba(["q"], ["Uso Python en Acme."], [FRAGMENTOS])[0]) < 1e-9
+
+
+def test_classifier_gate_respeta_umbral_y_exploracion():
+    modelo = GateModel.fit(_vectorizer(), *_datos())
+    gate = ClassifierGate(modelo, threshold=0.5, explore=0.0)
+
+    assert gate.decide("¿Dónde trabajas?", "Tengo 20 años de experiencia en Google con 50 personas.", FRAGMENTOS).evaluate
+    segura = gate.decide("¿Dónde trabajas?", "Uso Python y Spark en Acme.", FRAGMENTOS)
+    assert not segura.evaluate and segura.p_reject < 0.5
+
+    explorando = ClassifierGate(modelo, threshold=0.5, explore=0.1, rng=lambda: 0.05)
+    decision = explorando.decide("¿Dónde trabajas?", "Uso Python y Spark en Acme.", FRAGMENTOS)
+    assert decision.evaluate and decision.explored
+
+    # la heurística sigue disponible como gate
+    assert HeuristicGate().decide("¿Cuántos años de experiencia tienes?", "Cinco.").evaluate
+
+
+def test_verdict_log_registra_jsonl(tmp_path):
+    log = VerdictLog(str(tmp_path / "veredictos.jsonl"))
+    log.append("¿Dónde trabajas?", "En Acme.", FRAGMENTOS, True, "OK")
+    log.append("¿Dónde trabajas?", "En Google.", FRAGMENTOS, False, "No consta")
+
+    log.append("¿Dónde trabajas?", "En Acme desde 2019.", FRAGMENTOS, True, "Consta", source="grounding")
+
+    registros = read_verdicts(log.path)
+    assert [r["es_aceptable"] for r in registros] == [True, False, True]
+    assert registros[0]["passages"][0] == [FRAGMENTOS[0][0], 0.8]
+    # train_gate sólo aprende de los veredictos del LLM
+    assert [r["answer"] for r in read_verdicts(log.path, source="llm")] == ["En Acme.", "En Google."]
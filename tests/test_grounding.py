@@ -0,0 +1,41 @@
+from app.grounding import FactIndex, comprobar, extraer_afirmaciones
+
+CV = (
+    "Machine Learning Engineer en Accenture | Madrid | 2024 - Actualidad. "
+    "Científico de datos en Aplazame | 2023 - 2024. "
+    "Máster en Big Data & Business Analytics, EAE Business School. "
+    "Grado en Organización Industrial, Universidad de Vigo. Python, SQL, Azure."
+)
+INDICE = FactIndex([CV, "Especializado en Inteligencia Artificial Generativa."])
+
+
+def test_extrae_anios_cifras_duraciones_y_entidades():
+    afirmaciones = {
+        (a.texto, a.tipo)
+        for a in extraer_afirmaciones("Trabajo en Accenture desde 2024. Tengo 3 años de experiencia con AWS y 1.200 usuarios.")
+    }
+    assert ("2024", "anio") in afirmaciones
+    assert ("3", "duracion") in afirmaciones
+    assert ("1200", "numero") in afirmaciones
+    assert ("Accenture", "entidad") in afirmaciones
+    assert ("AWS", "sigla") in afirmaciones
+    # la mayúscula inicial de la frase no es una entidad
+    assert not any(t == "Trabajo" for t, _ in afirmaciones)
+
+
+def test_respuesta_respaldada_se_acepta():
+    c = comprobar(INDICE, "Ahora trabajo en Accenture como Machine Learning Engineer, sobre todo con Python.")
+    assert c.veredicto == "accept"
+
+
+def test_dato_inventado_se_rechaza_con_los_datos_sin_respaldo():
+    c = comprobar(INDICE, "Trabajé en Google desde 2015 como Staff Engineer.")
+    assert c.veredicto == "reject"
+    assert "2015" in c.sin_respaldo and "Google" in c.sin_respaldo
+
+
+def test_casos_dudosos_quedan_para_el_llm():
+    # sin datos comprobables, duración calculable o entidad que viene de la pregunta
+    assert comprobar(INDICE, "¡Hola! Encantado de ayudarte.").veredicto == "ambiguous"
+    assert comprobar(INDICE, "Llevo unos 2 años en Accenture.").veredicto == "ambiguous"
+    assert comprobar(INDICE, "No, nunca he trabajado en Google.", "¿Has trabajado en Google?").veredicto == "ambiguous"
@@ -0,0 +1,80 @@
+from pypdf import PdfReader, PdfWriter
+
+from app.index_store import build_index, load_chunk_meta
+from app.ingest import chunk_paragraphs, detectar_seccion, iter_paragraphs, iter_pdf_pages
+
+CV_PDF = "app/data/CV_Nicolas_Rodriguez_Gomez.pdf"
+
+CV_MD = """# Ana Pérez
+Ingeniera de datos.
+
+## Experiencia
+Acme (2019 - 2023): pipelines con Spark y Airflow.
+Beta (2023 - actualidad): plataforma de ML en AWS.
+
+FORMACIÓN ACADÉMICA
+Máster en Inteligencia Artificial, Universidad de Sevilla.
+"""
+
+
+def _palabras(texto: str) -> int:
+    return len(texto.split())
+
+
+def test_detectar_seccion_reconoce_cabeceras():
+    assert detectar_seccion("EXPERIENCIA LABORAL") == "Experiencia"
+    assert detectar_seccion("## Formación:") == "Formación"
+    assert detectar_seccion("Habilidades") == "Habilidades"
+    assert detectar_seccion("ESTUDIOS ACADÉMICOS EXPERIENCIA LABORAL") == "Formación"
+    assert detectar_seccion("## Publicaciones") == "Publicaciones"
+    assert detectar_seccion("Trabajé tres años en experiencia de usuario.") is None
+
+
+def test_chunks_no_cruzan_secciones_y_llevan_offsets():
+    chunks = list(chunk_paragraphs(iter_paragraphs([(1, CV_MD)], doc="ana.md"), max_chars=500))
+
+    assert [c.section for c in chunks] == ["Ana Pérez", "Experiencia", "Formación"]
+    assert "Acme" in chunks[1].text and "Beta" in chunks[1].text
+    for c in chunks:
+        assert c.doc == "ana.md" and c.page == 1
+        # el chunk es el rango [start, end) del texto sin las líneas en blanco
+        assert CV_MD[c.start:c.end].replace("\n\n", "\n") == c.text
+
+
+def test_presupuesto_de_tokens_solape_y_parrafos_largos():
+    texto = "## Experiencia\n" + "\n".join(f"Proyecto {i} con Python y Spark." for i in range(10))
+    chunks = list(chunk_paragraphs(
+        iter_paragraphs([(1, texto)]), max_chars=1000, max_tokens=13, overlap_tokens=6, count=_palabras
+    ))
+
+    assert all(_palabras(c.text) <= 13 for c in chunks)
+    # cada chunk repite el último párrafo del anterior
+    for anterior, siguiente in zip(chunks, chunks[1:]):
+        assert siguiente.text.split("\n")[0] == anterior.text.split("\n")[-1]
+    assert "Proyecto 9" in chunks[-1].text
+
+    largo = "Frase corta. " * 40
+    trozos = list(chunk_paragraphs(iter_paragraphs([(1, largo)]), max_chars=100))
+    assert len(trozos) > 1 and all(len(c.text) <= 100 for c in trozos)
+    assert "".join(c.text for c in trozos).replace(" ", "") == largo.replace(" ", "")
+
+
+def test_extraccion_en_paralelo_y_metadatos_del_indice(tmp_path):
+    escritor = PdfWriter()
+    pagina = PdfReader(CV_PDF).pages[0]
+    for _ in range(5):
+        escritor.add_page(pagina)
+    pdf = str(tmp_path / "cv_x5.pdf")
+    with open(pdf, "wb") as f:
+        escritor.write(f)
+
+    secuencial = list(iter_pdf_pages(pdf))
+    assert list(iter_pdf_pages(pdf, workers=2, pages_per_task=2)) == secuencial
+    assert [n for n, _ in secuencial] == [1, 2, 3, 4, 5]
+
+    ruta = build_index(pdf, str(tmp_path / "index"), max_chars=400, workers=2)
+    meta = load_chunk_meta(ruta)
+    texto = (tmp_path / "index" / ruta.split("/")[-1] / "texto.txt").read_text(encoding="utf-8")
+    assert {m["page"] for m in meta} == {1, 2, 3, 4, 5}
+    assert any(m["section"] == "Certificaciones" for m in meta)
+    assert all(texto[m["start"]:m["end"]].strip() for m in meta)
@@ -0,0 +1,146 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.llm_scheduler import Limite, LLMOverloaded, LLMScheduler, parse_limits
+from app.metrics import LLM_SHED
+
+
+def test_parse_limits():
+    assert parse_limits("m1=30/6000, m2=0/1000") == {"m1": Limite(30, 6000), "m2": Limite(0, 1000)}
+    assert parse_limits(None) == {}
+
+
+def test_agente_pasa_antes_que_el_evaluador_en_cola():
+    scheduler = LLMScheduler({"m": Limite(rpm=1)}, window=0.1)
+    orden = []
+
+    async def llamada(prioridad):
+        await scheduler.acquire("m", 10, prioridad)
+        orden.append(prioridad)
+
+    async def escenario():
+        await scheduler.acquire("m", 10, "agent")  # agota la ventana
+        evaluador = asyncio.create_task(llamada("evaluator"))
+        await asyncio.sleep(0)
+        agente = asyncio.create_task(llamada("agent"))
+        await asyncio.gather(evaluador, agente)
+
+    asyncio.run(escenario())
+
+    assert orden == ["agent", "evaluator"]
+
+
+def test_cancelar_tras_la_concesion_devuelve_la_cuota():
+    ahora = [0.0]
+    scheduler = LLMScheduler({"m-cancel": Limite(rpm=1)}, window=0.1, clock=lambda: ahora[0])
+
+    async def escenario():
+        await scheduler.acquire("m-cancel", 10, "agent")  # agota la ventana
+        espera = asyncio.create_task(scheduler.acquire("m-cancel", 10, "agent"))
+        await asyncio.sleep(0)
+        ahora[0] = 1.0
+        scheduler._despachar("m-cancel")  # se le concede la cuota...
+        espera.cancel()  # ...pero se cancela antes de usarla
+        with pytest.raises(asyncio.CancelledError):
+            await espera
+        # la cuota liberada permite una llamada que no puede esperar
+        await scheduler.acquire("m-cancel", 10, "alternative")
+
+    asyncio.run(escenario())
+
+    assert scheduler.snapshot()["m-cancel"]["requests_last_window"] == 1
+
+
+def test_la_ruta_sincrona_espera_en_la_misma_cola():
+    scheduler = LLMScheduler({"m-sync": Limite(rpm=1)}, window=0.2)
+    orden = []
+
+    def evaluador_sincrono():
+        scheduler.acquire_blocking("m-sync", 10, "evaluator")
+        orden.append("evaluator")
+
+    async def agente():
+        await scheduler.acquire("m-sync", 10, "agent")
+        orden.append("agent")
+
+    async def escenario():
+        await scheduler.acquire("m-sync", 10, "agent")  # agota la ventana
+        hilo = asyncio.create_task(asyncio.to_thread(evaluador_sincrono))
+        await asyncio.sleep(0.05)
+        assert scheduler.snapshot()["m-sync"]["queued"] == 1
+        await asyncio.gather(hilo, agente())
+        with pytest.raises(RuntimeError):
+            scheduler.acquire_blocking("m-sync", 10, "agent")
+
+    asyncio.run(escenario())
+
+    assert orden == ["agent", "evaluator"]
+    # Sin event loop en marcha también espera su turno
+    scheduler.acquire_blocking("m-sync", 10, "agent")
+    assert scheduler.snapshot()["m-sync"]["requests_last_window"] >= 1
+
+
+def test_sin_cuota_se_descarta_segun_la_prioridad():
+    scheduler = LLMScheduler({"m-shed": Limite(tpm=100)}, timeouts={"evaluator": 0.05}, window=30)
+    antes = LLM_SHED.value("m-shed", "evaluator")
+
+    async def escenario():
+        reserva = await scheduler.acquire("m-shed", 90, "agent")
+        with pytest.raises(LLMOverloaded) as exc:
+            await scheduler.acquire("m-shed", 50, "evaluator")
+        # el usage real fue menor que la estimación: la cuota sobrante vuelve
+        scheduler.settle(reserva, 20)
+        await scheduler.acquire("m-shed", 50, "evaluator")
+        return exc.value
+
+    error = asyncio.run(escenario())
+
+    assert error.priority == "evaluator" and error.retry_after > 0
+    assert LLM_SHED.value("m-shed", "evaluator") == antes + 1
+    assert scheduler.snapshot()["m-shed"]["tokens_last_window"] == 70
+
+
+def test_contra_stub_limitado_no_provoca_429(monkeypatch):
+    """
+    Ráfaga de llamadas contra el stub con 3 peticiones por ventana: sin
+    scheduler el stub devuelve 429; con él ninguna, y las evaluaciones que no
+    caben se descartan en lugar de fallar contra el proveedor.
+    """
+    from openai import AsyncOpenAI, RateLimitError
+    import app.utils as utils
+    from benchmarks import stub_llm
+
+    for nombre, valor in {"STUB_RPM": 3, "STUB_WINDOW": 0.5, "STUB_LATENCY": 0.0, "STUB_TOKENS_PER_S": 1e6}.items():
+        monkeypatch.setattr(stub_llm, nombre, valor)
+    stub_llm._ventanas.clear()
+    stub_llm._stats.clear()
+
+    cliente = AsyncOpenAI(
+        api_key="stub",
+        base_url="http://stub/openai/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_llm.app)),
+    )
+    mensajes = [{"role": "user", "content": "hola"}]
+    llamar = utils.call_chat_async.retry_with(stop=lambda _: True)  # sin reintentos
+
+    async def rafaga(prioridades):
+        return await asyncio.gather(
+            *(llamar(cliente, "m-stub", mensajes, priority=p) for p in prioridades), return_exceptions=True
+        )
+
+    monkeypatch.setattr(utils, "get_scheduler", lambda: LLMScheduler())
+    sin_scheduler = asyncio.run(rafaga(["agent"] * 5))
+    assert sum(isinstance(r, RateLimitError) for r in sin_scheduler) == 2
+
+    stub_llm._ventanas.clear()
+    stub_llm._stats.clear()
+    scheduler = LLMScheduler({"m-stub": Limite(rpm=3)}, timeouts={"evaluator": 0.1}, window=0.5)
+    monkeypatch.setattr(utils, "get_scheduler", lambda: scheduler)
+    con_scheduler = asyncio.run(rafaga(["agent"] * 3 + ["evaluator"] * 2 + ["agent"]))
+
+    assert stub_llm._stats["m-stub"]["rate_limited"] == 0
+    assert [type(r).__name__ for r in con_scheduler[3:5]] == ["LLMOverloaded"] * 2
+    assert not isinstance(con_scheduler[5], Exception)  # el agente esperó a la siguiente ventana
@@ -0,0 +1,37 @@
+import json
+
+from app.metrics import Registry
+
+
+def test_histograma_y_contador_en_formato_prometheus():
+    registry = Registry()
+    latencia = registry.histogram("lat_seconds", "Latencia", ("stage",), buckets=(0.1, 1.0))
+    errores = registry.counter("errores_total", "Errores", ("tipo",))
+    latencia.observe(0.05, "retrieval")
+    latencia.observe(0.5, "retrieval")
+    errores.inc("429", amount=2)
+
+    texto = registry.render()
+    assert "# TYPE lat_seconds histogram" in texto
+    assert 'lat_seconds_bucket{stage="retrieval",le="0.1"} 1' in texto
+    assert 'lat_seconds_bucket{stage="retrieval",le="+Inf"} 2' in texto
+    assert 'lat_seconds_count{stage="retrieval"} 2' in texto
+    assert 'errores_total{tipo="429"} 2.0' in texto
+
+
+def test_suma_el_estado_de_otros_workers(tmp_path):
+    registry = Registry(str(tmp_path))
+    contador = registry.counter("peticiones_total", "Peticiones", ("endpoint",))
+    latencia = registry.histogram("lat_seconds", "Latencia", buckets=(1.0,))
+    contador.inc("/chat")
+    latencia.observe(0.5)
+
+    # otro worker ya volcó su estado en el directorio compartido
+    otro = {"peticiones_total": {json.dumps(["/chat"]): 3.0}, "lat_seconds": {json.dumps([]): [[0, 1], 2.0]}}
+    (tmp_path / "999999.json").write_text(json.dumps(otro))
+    registry.flush()
+
+    texto = registry.render()
+    assert 'peticiones_total{endpoint="/chat"} 4.0' in texto
+    assert 'lat_seconds_bucket{le="1.0"} 1' in texto
+    assert 'lat_seconds_count 2' in texto
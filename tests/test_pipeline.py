@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app.evaluator import Evaluacion
+from app.pipeline import Etapas, PipelineStats, ejecutar
+
+PREGUNTA = "¿Cuántos años de experiencia tienes?"
+
+
+def _etapas(llamadas, acepta=lambda r: r != "mala"):
+    async def generar():
+        llamadas.append("generar")
+        await asyncio.sleep(0.01)
+        return "mala"
+
+    async def alternativa():
+        llamadas.append("alternativa")
+        await asyncio.sleep(0.01)
+        return "buena"
+
+    async def evaluar(respuesta):
+        llamadas.append("evaluar")
+        await asyncio.sleep(0.01)
+        return Evaluacion(es_aceptable=acepta(respuesta), retroalimentacion="fb")
+
+    async def reintentar(respuesta, retro):
+        llamadas.append("reintentar")
+        return "corregida"
+
+    return Etapas(generar=generar, alternativa=alternativa, evaluar=evaluar, reintentar=reintentar)
+
+
+@pytest.mark.parametrize(
+    "modo,respuesta,reintentos",
+    [("sequential", "corregida", 1), ("speculative", "buena", 0), ("parallel", "buena", 0)],
+)
+def test_respuesta_rechazada_se_sustituye_segun_el_modo(modo, respuesta, reintentos):
+    llamadas, stats = [], PipelineStats()
+    res = asyncio.run(ejecutar(modo, _etapas(llamadas), PREGUNTA, stats=stats))
+
+    assert res.answer == respuesta and res.replaced and res.es_aceptable is False
+    assert llamadas.count("reintentar") == reintentos
+    assert stats.snapshot()[modo]["requests"] == 1
+
+
+def test_especulacion_descartada_cuenta_como_desperdicio():
+    llamadas, stats = [], PipelineStats()
+    res = asyncio.run(ejecutar("speculative", _etapas(llamadas, acepta=lambda r: True), PREGUNTA, stats=stats))
+
+    assert res.answer == "mala" and not res.replaced
+    assert stats.snapshot()["speculative"]["wasted_calls"] == 1
+
+
+def test_sin_evaluacion_no_lanza_candidatos_extra():
+    llamadas = []
+    res = asyncio.run(ejecutar("parallel", _etapas(llamadas), "hola"))
+
+    assert res.evaluated is False
+    assert llamadas == ["generar"]
+
+
+def test_debe_evaluar_sustituye_a_la_heuristica():
+    # pregunta sensible, pero el gating decide no evaluar
+    llamadas = []
+    etapas = _etapas(llamadas)
+    etapas.debe_evaluar = lambda respuesta: False
+    res = asyncio.run(ejecutar("sequential", etapas, PREGUNTA))
+
+    assert res.evaluated is False and res.answer == "mala"
+    assert llamadas == ["generar"]
+
+
+@pytest.mark.parametrize("modo", ["sequential", "speculative", "parallel"])
+def test_evaluacion_omitida_deja_la_respuesta_sin_evaluar(modo):
+    # el evaluador no tuvo cuota (LLMOverloaded en el backend): evaluar devuelve None
+    llamadas = []
+    etapas = _etapas(llamadas)
+
+    async def sin_cuota(respuesta):
+        llamadas.append("evaluar")
+        return None
+
+    etapas.evaluar = sin_cuota
+    res = asyncio.run(ejecutar(modo, etapas, PREGUNTA))
+
+    assert res.answer == "mala" and res.evaluated is False and not res.replaced
+    assert "reintentar" not in llamadas
+
+
+def test_alternativa_descartada_recurre_al_reintento():
+    llamadas = []
+    etapas = _etapas(llamadas)
+
+    async def sin_cuota():
+        return None
+
+    etapas.alternativa = sin_cuota
+    res = asyncio.run(ejecutar("speculative", etapas, PREGUNTA))
+
+    assert res.answer == "corregida" and res.replaced
+
+
+@pytest.mark.parametrize("modo", ["speculative", "parallel"])
+def test_alternativa_con_error_transitorio_recurre_al_reintento(modo):
+    import httpx
+    from openai import APIConnectionError
+
+    llamadas = []
+    etapas = _etapas(llamadas)
+
+    async def sin_conexion():
+        raise APIConnectionError(request=httpx.Request("POST", "https://api.groq.com"))
+
+    etapas.alternativa = sin_conexion
+    res = asyncio.run(ejecutar(modo, etapas, PREGUNTA))
+
+    assert res.answer == "corregida" and res.replaced
+    assert llamadas.count("reintentar") == 1
+
+
+@pytest.mark.parametrize("sin_cuota,desperdicio", [(False, 2), (True, 1)])
+def test_segundo_candidato_descartado_cuenta_cada_llamada_una_vez(sin_cuota, desperdicio):
+    # parallel: se acepta el primero; el segundo (y su evaluación, si empezó) se desperdician
+    llamadas, stats = [], PipelineStats()
+    etapas = _etapas(llamadas, acepta=lambda r: True)
+
+    async def alternativa_sin_cuota():
+        return None
+
+    if sin_cuota:
+        etapas.alternativa = alternativa_sin_cuota
+    asyncio.run(ejecutar("parallel", etapas, PREGUNTA, stats=stats))
+
+    assert stats.snapshot()["parallel"]["wasted_calls"] == desperdicio
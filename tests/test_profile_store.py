@@ -0,0 +1,96 @@
+import dataclasses
+import os
+
+import pytest
+
+from app.profile_store import Perfil, ProfileStore
+
+
+def _store(tmp_path, cargas):
+    resumen = tmp_path / "resumen.txt"
+    resumen.write_text("v1", encoding="utf-8")
+
+    def loader():
+        texto = resumen.read_text(encoding="utf-8")
+        if texto == "roto":
+            raise ValueError("PDF a medio copiar")
+        cargas.append(texto)
+        return Perfil(texto, "cv " + texto, None, None, texto)
+
+    return ProfileStore(loader, sources=(str(resumen),)), resumen
+
+
+def _tocar(path, texto):
+    path.write_text(texto, encoding="utf-8")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))  # mtime distinto aunque sea el mismo segundo
+
+
+def test_recarga_cambia_de_version_y_las_peticiones_en_curso_conservan_la_suya(tmp_path):
+    cargas, avisos = [], []
+    store, resumen = _store(tmp_path, cargas)
+    store.on_swap(lambda anterior, nuevo: avisos.append((anterior.version, nuevo.version)))
+
+    assert store.current().version == "v1"
+    assert store.reload()["reloaded"] is False and cargas == ["v1"]  # sin cambios no reconstruye
+    with store.pinned() as en_curso:
+        _tocar(resumen, "v2")
+        res = store.reload()
+        assert res == {**res, "reloaded": True, "version": "v2", "previous": "v1"}
+        assert store.get() is en_curso and store.get().resumen == "v1"
+    assert store.get().resumen == "v2"
+    assert avisos == [("v1", "v2")]
+
+
+def test_recarga_fallida_o_sin_cambios_de_contenido_mantiene_el_perfil(tmp_path):
+    cargas = []
+    store, resumen = _store(tmp_path, cargas)
+    store.current()
+
+    _tocar(resumen, "roto")
+    with pytest.raises(ValueError):
+        store.reload()
+    assert store.version == "v1" and store.changed()
+
+    _tocar(resumen, "v1")  # mismo contenido, fichero tocado
+    assert store.reload()["reloaded"] is False
+    assert not store.changed() and store.version == "v1"
+
+
+def test_admin_reload_invalida_la_cache_y_exige_token(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+    from fastapi.testclient import TestClient
+    import app.backend as backend
+
+    base = backend.recursos.profiles.current()
+    resumen = tmp_path / "resumen.txt"
+    resumen.write_text(base.resumen, encoding="utf-8")
+
+    def loader():
+        texto = resumen.read_text(encoding="utf-8")
+        return dataclasses.replace(base, version=str(abs(hash(texto))), resumen=texto)
+
+    monkeypatch.setitem(backend.recursos.__dict__, "profiles", ProfileStore(loader, sources=(str(resumen),)))
+    monkeypatch.setattr(backend, "ADMIN_TOKEN", "secreto")
+    llamadas = []
+
+    async def fake_call_chat_async(client, model, messages, **kwargs):
+        llamadas.append(messages[0]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Hola."))])
+
+    monkeypatch.setattr(backend, "call_chat_async", fake_call_chat_async)
+    with TestClient(backend.app) as client:
+        pregunta = {"message": "¿Cuál es tu stack favorito para backend?"}
+        client.post("/chat", json=pregunta)
+        client.post("/chat", json=pregunta)  # de la caché
+        assert len(llamadas) == 1
+        version = client.get("/healthz").json()["profile_version"]
+
+        assert client.post("/admin/reload").status_code == 403
+        _tocar(resumen, base.resumen + "\nAhora también trabajo con Rust.")
+        res = client.post("/admin/reload", headers={"X-Admin-Token": "secreto"}).json()
+        assert res["reloaded"] is True and res["previous"] == version
+        assert client.get("/healthz").json()["profile_version"] == res["version"]
+
+        client.post("/chat", json=pregunta)  # la respuesta cacheada era del perfil anterior
+        assert len(llamadas) == 2 and "Rust" in llamadas[-1]
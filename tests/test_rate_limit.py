@@ -0,0 +1,77 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.rate_limit import Budget, MemoryGCRAStore, RateLimiter, RateLimitMiddleware, SqliteGCRAStore
+
+LLM = Budget("llm", limit=2, window=10, burst=2)  # una plaza cada 5 s
+
+
+def test_gcra_admite_rafaga_y_recupera_una_plaza_por_intervalo():
+    ahora = [0.0]
+    store = MemoryGCRAStore(clock=lambda: ahora[0])
+
+    assert [store.hit("ip", LLM)[0] for _ in range(3)] == [True, True, False]
+    assert store.hit("ip", LLM)[1] == 5.0  # retry_after
+    ahora[0] = 5.0
+    assert store.hit("ip", LLM)[0] is True
+
+    # una clave inactiva (bucket lleno) no ocupa memoria tras la limpieza
+    ahora[0] = 100.0
+    assert store.evict() == 1 and len(store) == 0
+
+
+def test_sqlite_comparte_el_limite_entre_workers(tmp_path):
+    ruta = str(tmp_path / "rl.sqlite")
+    a, b = SqliteGCRAStore(ruta), SqliteGCRAStore(ruta)
+
+    assert a.hit("ip", LLM)[0] and b.hit("ip", LLM)[0]
+    assert a.hit("ip", LLM)[0] is False and b.hit("ip", LLM)[0] is False
+
+
+def test_middleware_separa_presupuestos_por_ruta():
+    app = FastAPI()
+
+    @app.post("/chat")
+    async def chat():
+        return {"ok": True}
+
+    @app.get("/cache/stats")
+    async def stats():
+        return {"ok": True}
+
+    limiter = RateLimiter(
+        MemoryGCRAStore(),
+        budgets=[Budget("llm", 1, 60, 1), Budget("cheap", 100, 60, 100)],
+        rules=[(r"^/chat$", "llm")],
+        default="cheap",
+    )
+    app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    client = TestClient(app)
+
+    assert client.post("/chat").status_code == 200
+    bloqueada = client.post("/chat")
+    assert bloqueada.status_code == 429 and int(bloqueada.headers["Retry-After"]) >= 1
+    assert client.get("/cache/stats").status_code == 200
+
+
+def test_sqlite_no_bloquea_el_event_loop(tmp_path):
+    import asyncio
+    import sqlite3
+
+    ruta = str(tmp_path / "rl.sqlite")
+    limiter = RateLimiter(SqliteGCRAStore(ruta), budgets=[LLM], rules=[], default="llm")
+    # Otro worker tiene el fichero bloqueado en una transacción
+    otro = sqlite3.connect(ruta, isolation_level=None)
+    otro.execute("BEGIN IMMEDIATE")
+
+    async def escenario():
+        tics = 0
+        peticion = asyncio.create_task(limiter.ahit("/chat", "ip"))
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            tics += 1
+        otro.execute("COMMIT")
+        return tics, await peticion
+
+    tics, (ok, _retry_after, budget) = asyncio.run(escenario())
+    assert tics == 10 and ok and budget is LLM
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from openai import BadRequestError, InternalServerError
+
+from app.resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, deadline, remaining
+from app.utils import call_chat_async, with_fallback
+
+
+def _error(clase, status, headers=None):
+    resp = httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://stub"))
+    return clase(str(status), response=resp, body=None)
+
+
+def _cliente(*resultados):
+    """
+    Cliente falso: cada llamada devuelve (o lanza) el siguiente resultado.
+    """
+    llamadas = []
+
+    class _Completions:
+        async def create(self, **kwargs):
+            llamadas.append(kwargs)
+            r = resultados[min(len(llamadas), len(resultados)) - 1]
+            if isinstance(r, Exception):
+                raise r
+            return r
+
+    class _Client:
+        class chat:
+            completions = _Completions()
+
+    return _Client(), llamadas
+
+
+def test_plazo_anidado_conserva_el_mas_estricto():
+    assert remaining() is None
+    with deadline(1.0):
+        with deadline(60.0):
+            assert 0 < remaining() <= 1.0
+        with deadline(0.01):
+            time.sleep(0.02)
+            assert remaining() < 0
+    assert remaining() is None
+
+
+def test_circuit_breaker_abre_prueba_y_cierra():
+    ahora = [0.0]
+    breaker = CircuitBreaker("m", failures=2, cooldown=10, clock=lambda: ahora[0])
+    breaker.record_failure()
+    breaker.before_call()  # un fallo no basta
+    breaker.record_failure()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    ahora[0] = 10.0
+    breaker.before_call()  # semiabierto: pasa una de prueba...
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()  # ...y sólo una
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_no_reintenta_4xx_y_respeta_retry_after_y_plazo():
+    mensajes = [{"role": "user", "content": "hola"}]
+
+    cliente, llamadas = _cliente(_error(BadRequestError, 400))
+    with pytest.raises(BadRequestError):
+        asyncio.run(call_chat_async(cliente, "m-400", mensajes))
+    assert len(llamadas) == 1
+
+    cliente, llamadas = _cliente(_error(InternalServerError, 503, {"retry-after": "0"}), "ok")
+    assert asyncio.run(call_chat_async(cliente, "m-503", mensajes)) == "ok"
+    assert len(llamadas) == 2
+
+    # Retry-After de 5 s con 0.3 s de plazo: no se espera, falla ya
+    cliente, llamadas = _cliente(_error(InternalServerError, 503, {"retry-after": "5"}), "ok")
+    t0 = time.perf_counter()
+    with deadline(0.3), pytest.raises(InternalServerError):
+        asyncio.run(call_chat_async(cliente, "m-503-plazo", mensajes))
+    assert len(llamadas) == 1 and time.perf_counter() - t0 < 0.3
+    assert 0 < llamadas[0]["timeout"] <= 0.3  # el intento usa lo que queda de plazo
+
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceeded):
+            asyncio.run(call_chat_async(cliente, "m-503-plazo", mensajes))
+
+
+def test_fallback_por_error_y_hedging_por_lentitud():
+    llamadas = []
+
+    async def llamar(client, model, messages, **kwargs):
+        llamadas.append(model)
+        if model == "caido":
+            raise _error(InternalServerError, 503)
+        if model == "lento":
+            await asyncio.sleep(1.0)
+        return model
+
+    mensajes = [{"role": "user", "content": "hola"}]
+    res = asyncio.run(with_fallback(llamar, None, "caido", mensajes, fallback_model="rapido"))
+    assert res == "rapido" and llamadas == ["caido", "rapido"]
+
+    llamadas.clear()
+    t0 = time.perf_counter()
+    res = asyncio.run(with_fallback(llamar, None, "lento", mensajes, fallback_model="rapido", hedge_after=0.05))
+    assert res == "rapido" and llamadas == ["lento", "rapido"]
+    assert time.perf_counter() - t0 < 0.5  # no espera al lento: se cancela
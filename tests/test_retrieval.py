@@ -36,4 +36,43 @@ def test_tfidf_retriever_devuelve_chunks_relevantes():
 
     assert len(top) == 1
     # Comprobación case-insensitive
-    assert "fútbol" in top[0].lower()                  
\ No newline at end of file
+    assert "fútbol" in top[0].lower()                  
+
+def test_tfidf_retriever_guardado_y_carga_perezosa(tmp_path):
+    """
+    Un retriever cargado desde disco debe dar los mismos resultados que el original,
+    y no debe leer nada hasta que se use.
+    """
+    chunks = [
+        "Me llamo Nicolás y trabajo con modelos de IA generativa.",
+        "También tengo experiencia en análisis de datos y machine learning.",
+        "En mi tiempo libre practico fútbol.",
+    ]
+    original = TfidfRetriever(chunks)
+    original.save(str(tmp_path))
+
+    cargado = TfidfRetriever.load(str(tmp_path))
+    assert "chunks" not in cargado.__dict__  # todavía no se ha cargado
+
+    query = "experiencia en machine learning"
+    assert cargado.retrieve(query, k=2) == original.retrieve(query, k=2)
+    assert cargado.chunks == chunks
+
+
+def test_retrieve_batch_equivale_a_retrieve_y_devuelve_scores():
+    chunks = [
+        "Me llamo Nicolás y trabajo con modelos de IA generativa.",
+        "También tengo experiencia en análisis de datos y machine learning.",
+        "En mi tiempo libre practico fútbol.",
+    ]
+    retriever = TfidfRetriever(chunks)
+    queries = ["IA generativa", "machine learning", "fútbol"]
+
+    batch = retriever.retrieve_batch(queries, k=2)
+
+    assert len(batch) == len(queries)
+    for q, res in zip(queries, batch):
+        assert [p for p, _ in res] == retriever.retrieve(q, k=2)
+        scores = [s for _, s in res]
+        assert scores == sorted(scores, reverse=True)
+    assert batch[2][0][0] == chunks[2] and batch[2][0][1] > 0
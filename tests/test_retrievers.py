@@ -0,0 +1,61 @@
+# tests/test_retrievers.py
+import numpy as np
+import pytest
+
+from app.retrieval import TfidfRetriever
+from app.retrievers import (
+    BM25Retriever,
+    DenseRetriever,
+    HybridRetriever,
+    build_retriever,
+    quantize,
+)
+
+CHUNKS = [
+    "Me llamo Nicolás y trabajo con modelos de IA generativa.",
+    "También tengo experiencia en análisis de datos y machine learning.",
+    "En mi tiempo libre practico fútbol.",
+]
+
+
+def test_bm25_prioriza_el_chunk_con_el_termino():
+    retriever = BM25Retriever(CHUNKS)
+    top = retriever.retrieve_batch(["machine learning"], k=3)[0]
+
+    assert top[0][0] == CHUNKS[1]
+    assert top[0][1] > top[1][1]
+
+
+def test_dense_int8_se_guarda_y_carga_con_los_mismos_resultados(tmp_path):
+    original = DenseRetriever(CHUNKS, dtype="int8")
+    original.save(str(tmp_path))
+    cargado = DenseRetriever.load(str(tmp_path), CHUNKS)
+
+    assert cargado.embeddings.dtype == np.int8
+    # n-gramas de caracteres: "práctica" casa con "practico"
+    assert cargado.retrieve("práctica deportiva", k=1) == original.retrieve("práctica deportiva", k=1)
+    assert cargado.retrieve("práctica deportiva", k=1) == [CHUNKS[2]]
+
+
+def test_quantize_int8_conserva_el_producto_escalar():
+    rng = np.random.default_rng(0)
+    emb = rng.normal(size=(20, 64)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+
+    q, scales = quantize(emb, "int8")
+    aprox = q.astype(np.float32) * scales[:, None]
+
+    assert np.abs(aprox @ emb[0] - emb @ emb[0]).max() < 0.02
+
+
+def test_hybrid_rrf_fusiona_por_posicion():
+    hybrid = HybridRetriever([TfidfRetriever(CHUNKS), BM25Retriever(CHUNKS)], k_rrf=60)
+    top = hybrid.retrieve_batch(["IA generativa"], k=2)[0]
+
+    assert top[0][0] == CHUNKS[0]
+    assert top[0][1] == pytest.approx(2 / 61)
+
+
+def test_build_retriever_rechaza_modo_desconocido():
+    with pytest.raises(ValueError):
+        build_retriever("semantico", TfidfRetriever(CHUNKS))
@@ -0,0 +1,79 @@
+from app.sessions import MemorySessionStore, SessionManager, SqliteSessionStore
+
+
+def test_turnos_antiguos_se_pliegan_en_el_resumen():
+    manager = SessionManager(MemorySessionStore(), max_history_tokens=60, summary_chars=300)
+    sesion = manager.create()
+
+    for i in range(20):
+        manager.append_turn(sesion, f"Pregunta número {i} sobre experiencia", f"Respuesta número {i}. Detalle extra.")
+
+    assert sesion.n_messages == 40
+    assert sesion.history_tokens <= 60
+    assert sesion.history_tokens == sum(m["tokens"] for m in sesion.turns)
+    assert 0 < len(sesion.summary) <= 300
+
+    historial = manager.history(sesion)
+    assert historial[0]["role"] == "system" and "Resumen" in historial[0]["content"]
+    assert historial[-1] == {"role": "assistant", "content": "Respuesta número 19. Detalle extra."}
+
+
+def test_memoria_desaloja_lru_y_caduca():
+    ahora = [0.0]
+    store = MemorySessionStore(max_sessions=2, ttl=10, clock=lambda: ahora[0])
+    manager = SessionManager(store, clock=lambda: ahora[0])
+    a, b = manager.create(), manager.create()
+    manager.get(a.session_id)
+    c = manager.create()
+
+    assert manager.get(b.session_id) is None  # la menos usada
+    ahora[0] = 11
+    assert manager.get(a.session_id) is None and manager.get(c.session_id) is None
+
+
+def test_sqlite_se_comparte_entre_instancias(tmp_path):
+    ruta = str(tmp_path / "sesiones.sqlite")
+    sesion = SessionManager(SqliteSessionStore(ruta)).create(profile_id="nicolas")
+    SessionManager(SqliteSessionStore(ruta)).append_turn(sesion, "hola", "buenas")
+
+    leida = SessionManager(SqliteSessionStore(ruta)).get(sesion.session_id)
+    assert leida.profile_id == "nicolas"
+    assert [m["content"] for m in leida.turns] == ["hola", "buenas"]
+
+
+def test_sqlite_en_un_hilo_no_bloquea_el_event_loop(tmp_path):
+    import asyncio
+    import sqlite3
+
+    ruta = str(tmp_path / "sesiones.sqlite")
+    manager = SessionManager(SqliteSessionStore(ruta))
+    sesion = manager.create()
+    otro = sqlite3.connect(ruta, isolation_level=None)  # otro worker escribiendo
+    otro.execute("BEGIN IMMEDIATE")
+
+    async def escenario():
+        tics = 0
+        turno = asyncio.create_task(manager.aappend_turn(sesion, "hola", "buenas"))
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            tics += 1
+        otro.execute("COMMIT")
+        await turno
+        return tics, await manager.aget(sesion.session_id)
+
+    tics, leida = asyncio.run(escenario())
+    assert tics == 10 and leida.n_messages == 2
+
+
+def test_turnos_concurrentes_no_se_pisan(tmp_path):
+    for store in (MemorySessionStore(), SqliteSessionStore(str(tmp_path / "sesiones.sqlite"))):
+        manager = SessionManager(store)
+        sesion_id = manager.create().session_id
+        # Dos peticiones de la misma sesión leen la misma versión y guardan después
+        a, b = manager.get(sesion_id), manager.get(sesion_id)
+        manager.append_turn(a, "¿Dónde trabajas?", "En Accenture.")
+        guardada = manager.append_turn(b, "¿Desde cuándo?", "Desde 2024.")
+
+        leida = manager.get(sesion_id)
+        assert [m["content"] for m in leida.turns] == ["¿Dónde trabajas?", "En Accenture.", "¿Desde cuándo?", "Desde 2024."]
+        assert leida.n_messages == 4 and leida.version == 2 == guardada.version
@@ -0,0 +1,41 @@
+import base64
+
+from app.tokens import BPECounter, HeuristicCounter, build_token_counter, context_window, prompt_budget
+from app.utils import budget_messages
+
+
+def _vocab(tmp_path, merges):
+    tokens = [bytes([i]) for i in range(256)] + merges
+    ruta = tmp_path / "mini.tiktoken"
+    ruta.write_bytes(b"".join(base64.b64encode(t) + b" %d\n" % i for i, t in enumerate(tokens)))
+    return str(ruta)
+
+
+def test_bpe_local_fusiona_por_rank_y_cachea(tmp_path):
+    counter = BPECounter(_vocab(tmp_path, [b"ab", b"abab", b" ab"]))
+
+    assert counter.count("abab") == 1
+    assert counter.count("ab ab") == 2      # "ab" + " ab"
+    assert counter.count("xyz") == 3        # sin fusiones: un token por byte
+
+    counter.count("abab")
+    assert counter.count.cache_info().hits == 1
+
+
+def test_sin_vocabulario_usa_heuristica():
+    assert isinstance(build_token_counter(None), HeuristicCounter)
+    assert isinstance(build_token_counter("/no/existe.tiktoken"), HeuristicCounter)
+    assert HeuristicCounter().count("¿Cuántos años de experiencia tienes?") > len("¿Cuántos años de experiencia tienes?") // 4
+
+
+def test_presupuesto_depende_del_modelo():
+    assert context_window("gemma2-9b-it") == 8192
+    assert prompt_budget("gemma2-9b-it", reserve=1024, max_tokens=100000) == 8192 - 1024
+    assert prompt_budget("llama-3.1-8b-instant", reserve=1024, max_tokens=6000) == 6000
+    # Sin tope (por defecto) cada modelo usa su ventana
+    assert prompt_budget("gemma2-9b-it", reserve=1024, max_tokens=0) == 8192 - 1024
+    assert prompt_budget("llama-3.1-8b-instant", reserve=1024, max_tokens=0) > prompt_budget("gemma2-9b-it", reserve=1024, max_tokens=0)
+
+    mensajes = [{"role": "system", "content": "S"}] + [{"role": "user", "content": "palabra " * 50}] * 10
+    recortados = budget_messages(mensajes, max_tokens=200, counter=HeuristicCounter())
+    assert recortados[0]["role"] == "system" and 1 < len(recortados) < len(mensajes)
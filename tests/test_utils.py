@@ -37,4 +37,64 @@ def test_budget_messages_recorta_historial():
     ],
 )
 def test_should_evaluate(answer, user_msg, expected):
-    assert should_evaluate(answer, user_msg) == expected        
\ No newline at end of file
+    assert should_evaluate(answer, user_msg) == expected        
+
+def test_call_chat_async_reintenta_rate_limit():
+    """
+    call_chat_async debe seguir la misma política que call_chat:
+    reintenta ante RateLimitError y devuelve la respuesta cuando el proveedor se recupera.
+    """
+    import asyncio
+    import httpx
+    from openai import RateLimitError
+    from tenacity import wait_none
+    from app.utils import call_chat_async
+
+    # Misma política pero sin esperas reales entre reintentos
+    llamar = call_chat_async.retry_with(wait=wait_none())
+
+    llamadas = []
+
+    class _Completions:
+        async def create(self, **kwargs):
+            llamadas.append(kwargs)
+            if len(llamadas) < 3:
+                req = httpx.Request("POST", "http://stub/chat/completions")
+                raise RateLimitError("429", response=httpx.Response(429, request=req), body=None)
+            return "ok"
+
+    class _Client:
+        class chat:
+            completions = _Completions()
+
+    res = asyncio.run(llamar(_Client(), "modelo", [{"role": "user", "content": "hola"}]))
+
+    assert res == "ok"
+    assert len(llamadas) == 3
+
+
+def test_call_chat_cuenta_reintentos_y_tokens():
+    from types import SimpleNamespace
+    from tenacity import wait_none
+    from openai import RateLimitError
+    import httpx
+    from app.metrics import LLM_RETRIES, LLM_TOKENS
+    from app.utils import call_chat
+
+    intentos = []
+
+    def create(model, messages, **kwargs):
+        intentos.append(model)
+        if len(intentos) == 1:
+            resp = httpx.Response(429, request=httpx.Request("POST", "http://stub"))
+            raise RateLimitError("rate limit", response=resp, body=None)
+        usage = SimpleNamespace(prompt_tokens=12, completion_tokens=3)
+        return SimpleNamespace(usage=usage, choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    antes = LLM_RETRIES.value("modelo-test", "RateLimitError")
+    call_chat.retry_with(wait=wait_none())(client, "modelo-test", [{"role": "user", "content": "hola"}])
+
+    assert LLM_RETRIES.value("modelo-test", "RateLimitError") == antes + 1
+    assert LLM_TOKENS.value("modelo-test", "prompt") >= 12
+    assert LLM_TOKENS.value("modelo-test", "completion") >= 3